@@ -0,0 +1,171 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import time
+import uuid
+import tempfile
+import importlib
+
+from deck_export import FakeDeckRenderer
+from ffmpeg_tools import find_ffmpeg, encode_still_image
+from output_profiles import profile_from_params
+from profiling import NULL_PROFILER
+from resource_governor import remove_temp_file
+
+
+class RenderBackend:
+    """渲染后端接口：打开演示文稿，把指定页导出为视频"""
+
+    # 是否支持整体渲染（render_deck）
+    supports_deck_render = False
+    # 各阶段计时，开启性能分析时由转换器替换为StageProfiler
+    profiler = NULL_PROFILER
+    # 渲染是否必须在打开后端的线程中进行（COM对象不能跨线程使用）
+    thread_affine = True
+    # 是否输出真实的视频文件；为False时流水线不解析视频头校验结果
+    produces_video = True
+    # 临时文件目录，转换时由转换器设为本次转换的临时目录（见resource_governor.TempSpace），None为系统临时目录
+    temp_dir = None
+    # 应用程序在系统中是否只有一个实例、由所有后端共用（如PowerPoint）；为True时并行导出由主进程负责启动和退出
+    shared_application = False
+
+    def start(self):
+        """启动应用程序（会话池预热时调用），不需要时为空操作"""
+        pass
+
+    def ping(self):
+        """探活：应用程序仍能响应时返回True"""
+        return True
+
+    def process_id(self):
+        """应用程序的进程号，用于检查内存和清理遗留进程；没有独立进程时返回None"""
+        return None
+
+    def owns_process(self):
+        """应用程序进程是否由本工具启动、且其中没有其他人打开的文档；为False时不能强制结束该进程"""
+        return True
+
+    def bind(self, is_cancelled=None, wait_stats=None, on_encode_progress=None):
+        """复用已启动的后端时，换成本次转换的取消检查和统计对象"""
+        pass
+
+    def open(self, pptx_path):
+        """打开演示文稿；已打开其他文件时先调用close_presentation"""
+        raise NotImplementedError
+
+    def export_slide(self, slide_index, output_path, params):
+        """导出单页，成功返回True"""
+        raise NotImplementedError
+
+    def prepare_slide(self, slide_index, params):
+        """生成渲染单页所需的源文件，可以在其他线程中执行；不需要时返回None"""
+        return None
+
+    def render_prepared(self, slide_index, source, output_path, params):
+        """用prepare_slide生成的源文件导出单页；默认与export_slide相同"""
+        return self.export_slide(slide_index, output_path, params)
+
+    def release_source(self, source):
+        """删除prepare_slide生成的源文件"""
+        remove_temp_file(source)
+
+    def render_deck(self, output_video, timings, vert_resolution, frames_per_second):
+        """按给定计时把整个演示文稿渲染为一个视频"""
+        raise NotImplementedError
+
+    @classmethod
+    def fast_path_available(cls):
+        """静态页快速通道需要用ffmpeg编码图片"""
+        return find_ffmpeg() is not None
+
+    def export_still(self, slide_index, image_path, vert_resolution):
+        """把单页渲染为一张PNG图片"""
+        raise NotImplementedError
+
+    def export_static_slide(self, slide_index, output_path, params, duration):
+        """静态页快速通道：只渲染一帧，再用ffmpeg编码为指定时长的视频"""
+        image_path = os.path.join(self.temp_dir or tempfile.gettempdir(), f"temp_still_{uuid.uuid4().hex}.png")
+        try:
+            with self.profiler.stage("export_still", slide_index):
+                self.export_still(slide_index, image_path, params["vert_resolution"])
+            with self.profiler.stage("encode_still", slide_index):
+                encode_still_image(image_path, output_path, duration, params["vert_resolution"], params["frames_per_second"],
+                                   profile_from_params(params).video_args(still=True))
+            return True
+        finally:
+            remove_temp_file(image_path)
+
+    def close_presentation(self):
+        """只关闭当前演示文稿，保留已启动的应用程序供下一个文件使用"""
+        self.close()
+
+    def close(self):
+        pass
+
+
+class FakeRenderBackend(RenderBackend):
+    """用于测试和基准测试的假后端，不依赖PowerPoint；每页固定耗时delay秒（静态页static_delay秒），结果可重复"""
+
+    supports_deck_render = True
+    thread_affine = False
+    produces_video = False
+
+    def __init__(self, delay=0.0, fail_slides=(), static_delay=0.0):
+        self.delay = delay
+        self.static_delay = static_delay
+        self.fail_slides = set(fail_slides)
+        self.pptx_path = None
+
+    def open(self, pptx_path):
+        self.pptx_path = pptx_path
+
+    def export_slide(self, slide_index, output_path, params):
+        with self.profiler.stage("fake_render", slide_index):
+            time.sleep(self.delay)
+        if slide_index in self.fail_slides:
+            return False
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(f"{self.pptx_path} {slide_index} {os.getpid()}\n")
+        return True
+
+    def render_deck(self, output_video, timings, vert_resolution, frames_per_second):
+        return FakeDeckRenderer().render_deck(output_video, timings, vert_resolution, frames_per_second)
+
+    @classmethod
+    def fast_path_available(cls):
+        return True
+
+    def export_static_slide(self, slide_index, output_path, params, duration):
+        with self.profiler.stage("fake_render_still", slide_index):
+            time.sleep(self.static_delay)
+        if slide_index in self.fail_slides:
+            return False
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(f"{self.pptx_path} {slide_index} {os.getpid()} static {duration}\n")
+        return True
+
+
+# 可选的渲染后端：名称 -> (模块, 类名)；模块在第一次使用该后端时才导入，
+# 查看页数、规划时长等不渲染的操作不会加载PowerPoint（COM）相关的模块
+BACKENDS = {
+    "com": ("com_backend", "ComRenderBackend"),
+    "libreoffice": ("libreoffice_backend", "LibreOfficeRenderBackend"),
+    "fake": ("backends", "FakeRenderBackend"),
+}
+
+
+# Windows下默认使用PowerPoint，其他平台默认使用LibreOffice
+DEFAULT_BACKEND = "com" if os.name == "nt" else "libreoffice"
+
+
+def backend_class(name):
+    """按名称获取渲染后端类，需要时导入其模块"""
+    if name not in BACKENDS:
+        raise ValueError(f"未知的渲染后端: {name}")
+    module_name, class_name = BACKENDS[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_backend(name, **kwargs):
+    """按名称创建渲染后端"""
+    return backend_class(name)(**kwargs)
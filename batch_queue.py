@@ -0,0 +1,381 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import glob
+import json
+import time
+import sqlite3
+import collections
+import multiprocessing
+
+from backends import DEFAULT_BACKEND
+from pptx_index import PptxIndex
+from progress_events import JsonLinesWriter
+from slide_selection import select_slides
+
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 单页状态，cached 表示直接使用了渲染缓存
+SLIDE_PENDING = "pending"
+SLIDE_DONE = "done"
+SLIDE_FAILED = "failed"
+SLIDE_CACHED = "cached"
+
+# 转换参数默认值，与命令行版本一致
+DEFAULT_JOB_OPTIONS = {
+    "default_slide_duration": 5,
+    "vert_resolution": 720,
+    "frames_per_second": 30,
+    "use_cache": True,
+    "fast_path": True,
+    "resume": False,
+    "profile": False,
+    "combine": False,
+    "output_profile": "wmv",
+    "stage_concurrency": None,
+    "slides": None,
+    "skip_hidden": False,
+    "dedup": False,
+    "resource_limits": None,
+}
+
+
+Job = collections.namedtuple("Job", ["id", "pptx_path", "output_dir", "options"])
+
+
+def default_queue_path():
+    """默认任务队列数据库位置"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pptx_to_single_video", "jobs.sqlite3")
+
+
+def collect_decks(patterns):
+    """把目录（递归）、通配符和文件路径展开为pptx文件列表，去重并保持顺序"""
+    decks = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "**", "*.pptx"), recursive=True))
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+        for path in matches:
+            # 跳过PowerPoint打开文件时生成的 ~$ 锁文件
+            if not path.lower().endswith(".pptx") or os.path.basename(path).startswith("~$"):
+                continue
+            path = os.path.normpath(os.path.abspath(path))
+            if path not in seen:
+                seen.add(path)
+                decks.append(path)
+    return decks
+
+
+class JobQueue:
+    """保存在SQLite中的转换任务队列，多个进程可以同时领取任务"""
+
+    def __init__(self, db_path=None):
+        self.db_path = os.path.normpath(os.path.abspath(db_path or default_queue_path()))
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # 自动提交模式，需要原子操作时显式使用 BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pptx_path TEXT NOT NULL,
+                output_dir TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                slide_count INTEGER,
+                success_count INTEGER,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS slides (
+                job_id INTEGER NOT NULL,
+                slide_index INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (job_id, slide_index)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _unique_output_dir(self, pptx_path, output_dir):
+        # 同一文件再次转换时沿用原来的输出目录，不同目录下的同名文件输出到不同的文件夹
+        row = self.conn.execute("SELECT output_dir FROM jobs WHERE pptx_path = ? ORDER BY id DESC LIMIT 1",
+                                (pptx_path,)).fetchone()
+        if row:
+            return row["output_dir"]
+        existing = {row["output_dir"] for row in self.conn.execute("SELECT output_dir FROM jobs")}
+        candidate = output_dir
+        n = 2
+        while candidate in existing:
+            candidate = f"{output_dir}_{n}"
+            n += 1
+        return candidate
+
+    def enqueue(self, pptx_path, output_root, options=None):
+        """加入一个任务，同一文件已在排队或转换中时返回已有任务的编号"""
+        pptx_path = os.path.normpath(os.path.abspath(pptx_path))
+        job_options = dict(DEFAULT_JOB_OPTIONS)
+        job_options.update(options or {})
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT id FROM jobs WHERE pptx_path = ? AND status IN (?, ?)",
+                                    (pptx_path, JOB_PENDING, JOB_RUNNING)).fetchone()
+            if row:
+                self.conn.execute("COMMIT")
+                return row["id"]
+
+            pptx_name = os.path.splitext(os.path.basename(pptx_path))[0]
+            output_dir = self._unique_output_dir(pptx_path, os.path.normpath(os.path.join(os.path.abspath(output_root), pptx_name)))
+            # 入队时读取页数和要输出的页，损坏的文件或无效的页码范围直接记为失败
+            slide_count, selected, error, status = None, [], None, JOB_PENDING
+            try:
+                with PptxIndex(pptx_path) as deck_index:
+                    slide_count = deck_index.slide_count
+                    selected = select_slides(pptx_path, list(deck_index), job_options["slides"],
+                                             job_options["skip_hidden"]).selected
+            except ValueError as e:
+                error, status = str(e), JOB_FAILED
+            except Exception as e:
+                error, status = f"无法读取PPT文件: {e}", JOB_FAILED
+
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (pptx_path, output_dir, options, status, slide_count, error, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pptx_path, output_dir, json.dumps(job_options), status, slide_count, error, time.time()))
+            job_id = cursor.lastrowid
+            now = time.time()
+            self.conn.executemany(
+                "INSERT INTO slides (job_id, slide_index, status, updated) VALUES (?, ?, ?, ?)",
+                [(job_id, i, SLIDE_PENDING, now) for i in selected])
+            self.conn.execute("COMMIT")
+            return job_id
+        except:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, worker_name, job_ids=None):
+        """领取最早的待处理任务，没有时返回None；job_ids不为None时只在其中领取"""
+        where, args = "status = ?", [JOB_PENDING]
+        if job_ids is not None:
+            where += f" AND id IN ({','.join('?' * len(job_ids))})"
+            args += list(job_ids)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(f"SELECT * FROM jobs WHERE {where} ORDER BY id LIMIT 1", args).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute("UPDATE jobs SET status = ?, worker = ?, started = ? WHERE id = ?",
+                              (JOB_RUNNING, worker_name, time.time(), row["id"]))
+            self.conn.execute("COMMIT")
+        except:
+            self.conn.execute("ROLLBACK")
+            raise
+        return Job(row["id"], row["pptx_path"], row["output_dir"], json.loads(row["options"]))
+
+    def set_slide_status(self, job_id, slide_index, status):
+        self.conn.execute("INSERT OR REPLACE INTO slides (job_id, slide_index, status, updated) VALUES (?, ?, ?, ?)",
+                          (job_id, slide_index, status, time.time()))
+
+    def finish(self, job_id, success_count, slide_count, error=None):
+        """记录任务结果，全部页成功才算完成"""
+        status = JOB_DONE if error is None and slide_count and success_count == slide_count else JOB_FAILED
+        if error is None and status == JOB_FAILED:
+            error = f"只成功导出{success_count}/{slide_count}页"
+        self.conn.execute("UPDATE jobs SET status = ?, success_count = ?, error = ?, finished = ? WHERE id = ?",
+                          (status, success_count, error, time.time(), job_id))
+        return status
+
+    def requeue_stale(self):
+        """上次运行中断时遗留的转换中任务重新排队，返回数量"""
+        cursor = self.conn.execute("UPDATE jobs SET status = ?, worker = NULL, started = NULL WHERE status = ?",
+                                   (JOB_PENDING, JOB_RUNNING))
+        return cursor.rowcount
+
+    def retry_failed(self):
+        """把失败的任务重新排队，返回数量"""
+        cursor = self.conn.execute("UPDATE jobs SET status = ?, error = NULL, finished = NULL WHERE status = ? "
+                                   "AND slide_count IS NOT NULL", (JOB_PENDING, JOB_FAILED))
+        return cursor.rowcount
+
+    def clear_finished(self):
+        """删除已完成的任务及其单页记录"""
+        self.conn.execute("DELETE FROM slides WHERE job_id IN (SELECT id FROM jobs WHERE status = ?)", (JOB_DONE,))
+        return self.conn.execute("DELETE FROM jobs WHERE status = ?", (JOB_DONE,)).rowcount
+
+    def get(self, job_id):
+        return self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def jobs(self, status=None):
+        if status:
+            return self.conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,)).fetchall()
+        return self.conn.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+
+    def slide_statuses(self, job_id):
+        """返回 {页码: 状态}"""
+        rows = self.conn.execute("SELECT slide_index, status FROM slides WHERE job_id = ?", (job_id,))
+        return {row["slide_index"]: row["status"] for row in rows}
+
+    def summary(self):
+        """统计任务和单页状态，同一文件多次入队时只统计最近一次"""
+        latest = "id IN (SELECT MAX(id) FROM jobs GROUP BY pptx_path)"
+        job_counts = {row["status"]: row["n"] for row in self.conn.execute(
+            f"SELECT status, COUNT(*) AS n FROM jobs WHERE {latest} GROUP BY status")}
+        slide_counts = {row["status"]: row["n"] for row in self.conn.execute(
+            f"SELECT status, COUNT(*) AS n FROM slides WHERE job_id IN (SELECT id FROM jobs WHERE {latest}) "
+            f"GROUP BY status")}
+        row = self.conn.execute(f"SELECT MIN(started) AS first, MAX(finished) AS last FROM jobs WHERE {latest}").fetchone()
+        failed = [{"pptx_path": r["pptx_path"], "error": r["error"]} for r in self.conn.execute(
+            f"SELECT pptx_path, error FROM jobs WHERE {latest} AND status = ? ORDER BY id", (JOB_FAILED,))]
+        elapsed = (row["last"] - row["first"]) if row["first"] and row["last"] else 0.0
+        return {"jobs": job_counts, "slides": slide_counts, "elapsed": elapsed, "failed": failed}
+
+
+def format_summary(summary):
+    """生成可读的汇总报告"""
+    jobs = summary["jobs"]
+    slides = summary["slides"]
+    lines = [
+        f"文件: 共{sum(jobs.values())}个，完成{jobs.get(JOB_DONE, 0)}个，失败{jobs.get(JOB_FAILED, 0)}个，"
+        f"未处理{jobs.get(JOB_PENDING, 0) + jobs.get(JOB_RUNNING, 0)}个",
+        f"幻灯片: 共{sum(slides.values())}页，渲染{slides.get(SLIDE_DONE, 0)}页，缓存{slides.get(SLIDE_CACHED, 0)}页，"
+        f"失败{slides.get(SLIDE_FAILED, 0)}页，未处理{slides.get(SLIDE_PENDING, 0)}页",
+        f"耗时: {summary['elapsed']:.0f}秒",
+    ]
+    for item in summary["failed"]:
+        lines.append(f"  失败: {item['pptx_path']}  {item['error'] or ''}")
+    return "\n".join(lines)
+
+
+def run_jobs(job_queue, backend, backend_name, worker_name, progress_callback=None, is_cancelled=None, converter=None, job_ids=None,
+             event_callback=None):
+    """在当前进程中依次处理队列中的任务，返回处理的任务数
+
+    backend 为已启动的渲染后端时所有文件共用它；为None时由converter创建，开启会话池时从池中取用（见enable_session_pool）。
+    给出event_callback时转换过程的文字信息只作为MESSAGE事件发送，progress_callback只接收任务开始和结束的信息。
+    """
+    # 转换器在处理任务时才导入，只使用队列和collect_decks时不加载渲染相关的模块
+    from converter import PPTToVideoConverter
+    is_cancelled = is_cancelled or (lambda: False)
+    converter = converter or PPTToVideoConverter()
+    processed = 0
+    while not is_cancelled():
+        job = job_queue.claim(worker_name, job_ids)
+        if job is None:
+            break
+        if progress_callback:
+            progress_callback(f"[{worker_name}] 开始转换: {job.pptx_path}")
+
+        result = {}
+
+        def on_complete(output_dir, success_count, slide_count):
+            result.update(output_dir=output_dir, success_count=success_count, slide_count=slide_count)
+
+        def on_progress(message):
+            if progress_callback:
+                progress_callback(f"[{worker_name}] {message}")
+
+        def on_slide(slide_index, status):
+            job_queue.set_slide_status(job.id, slide_index, status)
+
+        try:
+            converter.convert_ppt_to_videos(
+                job.pptx_path, progress_callback=None if event_callback else on_progress, completion_callback=on_complete,
+                event_callback=event_callback,
+                output_dir=job.output_dir, shared_backend=backend, slide_callback=on_slide,
+                backend=backend_name,
+                **{key: job.options[key] for key in DEFAULT_JOB_OPTIONS if key in job.options})
+            error = None if result.get("output_dir") else "转换过程中出错"
+        except Exception as e:
+            error = str(e)
+        status = job_queue.finish(job.id, result.get("success_count", 0), result.get("slide_count"), error)
+        processed += 1
+        if progress_callback:
+            progress_callback(f"[{worker_name}] {'完成' if status == JOB_DONE else '失败'}: {job.pptx_path}")
+    return processed
+
+
+def _batch_worker(worker_id, db_path, backend_name, pool_options, stop_event, json_events=False):
+    """批量转换工作进程入口：用会话池保持一个已启动的渲染后端并持续领取任务；json_events为True时向标准输出写JSON行事件
+
+    实例处理一定数量的文件、内存增长过多或失去响应后由会话池自动重启。
+    """
+    from converter import PPTToVideoConverter
+    worker_name = f"worker{worker_id}"
+    converter = PPTToVideoConverter()
+    converter.enable_session_pool(**pool_options)
+    try:
+        with JobQueue(db_path) as job_queue:
+            if json_events:
+                # 标准输出只保留JSON行，其他打印信息改到标准错误
+                writer = JsonLinesWriter(sys.stdout)
+                sys.stdout = sys.stderr
+                run_jobs(job_queue, None, backend_name, worker_name, is_cancelled=stop_event.is_set,
+                         converter=converter, event_callback=writer)
+            else:
+                run_jobs(job_queue, None, backend_name, worker_name, print, is_cancelled=stop_event.is_set,
+                         converter=converter)
+    finally:
+        converter.shutdown()
+
+
+class BatchRunner:
+    """用concurrency个进程处理队列，每个进程用会话池保持一个渲染后端直到队列为空
+
+    pool_options 传给各进程的会话池，例如 {"max_jobs": 50, "visible": False}。
+    """
+
+    def __init__(self, db_path=None, backend_name=None, concurrency=1, json_events=False, pool_options=None):
+        self.db_path = db_path or default_queue_path()
+        self.backend_name = backend_name or DEFAULT_BACKEND
+        self.concurrency = max(1, concurrency)
+        self.json_events = json_events
+        self.pool_options = pool_options or {}
+        self.log_stream = sys.stderr if json_events else sys.stdout
+        self.context = multiprocessing.get_context("spawn")
+
+    def run(self):
+        """处理所有待处理任务，直到队列为空或被中断"""
+        with JobQueue(self.db_path) as job_queue:
+            stale = job_queue.requeue_stale()
+        if stale:
+            print(f"已把上次中断的{stale}个任务重新排队", file=self.log_stream)
+
+        stop_event = self.context.Event()
+        processes = []
+        for worker_id in range(self.concurrency):
+            process = self.context.Process(target=_batch_worker,
+                                           args=(worker_id, self.db_path, self.backend_name, self.pool_options, stop_event,
+                                                 self.json_events))
+            process.start()
+            processes.append(process)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            print("正在停止批量转换，未完成的任务下次运行时会重新排队", file=self.log_stream)
+            stop_event.set()
+            for process in processes:
+                process.join()
@@ -0,0 +1,416 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+
+from converter import PPTToVideoConverter
+from pptx_package import NS_CONTENT_TYPES, NS_PACKAGE_RELATIONSHIPS, NS_PRESENTATION, NS_RELATIONSHIPS
+from slide_isolation import SlideIsolator
+
+
+DEFAULT_SIZES = (10, 100, 1000)
+DEFAULT_WORKERS = (1, 4)
+# 假后端每页耗时（秒）：完整渲染与静态页快速通道
+DEFAULT_DELAY = 0.002
+DEFAULT_STATIC_DELAY = 0.0005
+# 与基准结果相比，单页额外开销增加超过该比例视为性能退化
+DEFAULT_TOLERANCE = 0.25
+# 单页额外开销低于该值（秒）时不参与比较，避免计时噪声造成误报
+MIN_OVERHEAD_PER_SLIDE = 0.0005
+
+# 启动耗时基准：各入口模块在新进程中的导入耗时（python -X importtime），取多次的中位数
+IMPORT_MODULES = ("main", "main_gui", "converter", "http_service")
+IMPORT_REPEAT = 5
+# 导入耗时低于该值（秒）时不参与比较
+MIN_IMPORT_SECONDS = 0.005
+# 启动时不应加载的模块：PowerPoint（COM）相关、转换器和HTTP服务都应在用到时才导入
+HEAVY_MODULES = ("win32com", "pythoncom", "com_backend", "libreoffice_backend", "converter", "http_service", "asyncio")
+
+# 单页源文件基准：合成演示文稿中每几页嵌入一个视频、视频和版式背景图的大小（MB）、版式数
+ISOLATION_MEDIA_EVERY = 5
+ISOLATION_MEDIA_MB = 4.0
+ISOLATION_LAYOUTS = 4
+
+NS_DRAWING = "http://schemas.openxmlformats.org/drawingml/2006/main"
+REL_TYPE_BASE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+CT_BASE = "application/vnd.openxmlformats-officedocument.presentationml."
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_NAMESPACES = f'xmlns:a="{NS_DRAWING}" xmlns:r="{NS_RELATIONSHIPS}" xmlns:p="{NS_PRESENTATION}"'
+_ANIMATION = ('<p:timing><p:tnLst><p:par><p:cTn id="1" dur="indefinite" nodeType="tmRoot"><p:childTnLst><p:seq>'
+              '<p:cTn id="2" presetID="10" presetClass="entr" nodeType="clickEffect"/>'
+              '</p:seq></p:childTnLst></p:cTn></p:par></p:tnLst></p:timing>')
+
+
+def _relationships_xml(relationships):
+    items = "".join(f'<Relationship Id="{rel_id}" Type="{REL_TYPE_BASE}{rel_type}" Target="{target}"/>'
+                    for rel_id, rel_type, target in relationships)
+    return f'{_XML_HEADER}<Relationships xmlns="{NS_PACKAGE_RELATIONSHIPS}">{items}</Relationships>'
+
+
+def _media_bytes(seed, size):
+    """确定的随机内容，模拟已压缩过的图片和视频（deflate几乎压不小）"""
+    return random.Random(seed).getrandbits(size * 8).to_bytes(size, "little") if size else b""
+
+
+def build_synthetic_deck(path, slide_count, animated_every=5, media_every=0, media_size=0, layout_count=1):
+    """生成基准测试用的演示文稿：每animated_every页有一页带动画（走完整渲染），其余为静态页
+
+    media_every不为0时每media_every页嵌入一个media_size字节的视频；media_size不为0时每个版式带一张同样大小的背景图。
+    内容只由参数决定，同样的参数总是生成相同的文件。
+    """
+    layouts = range(1, layout_count + 1)
+    overrides = [("/ppt/presentation.xml", "presentation.main+xml"),
+                 ("/ppt/slideMasters/slideMaster1.xml", "slideMaster+xml")]
+    overrides += [(f"/ppt/slideLayouts/slideLayout{n}.xml", "slideLayout+xml") for n in layouts]
+    overrides += [(f"/ppt/slides/slide{i}.xml", "slide+xml") for i in range(1, slide_count + 1)]
+    content_types = (f'{_XML_HEADER}<Types xmlns="{NS_CONTENT_TYPES}">'
+                     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                     '<Default Extension="xml" ContentType="application/xml"/>'
+                     '<Default Extension="png" ContentType="image/png"/>'
+                     '<Default Extension="mp4" ContentType="video/mp4"/>'
+                     + "".join(f'<Override PartName="{name}" ContentType="{CT_BASE}{ct}"/>' for name, ct in overrides)
+                     + '<Override PartName="/ppt/theme/theme1.xml" '
+                       'ContentType="application/vnd.openxmlformats-officedocument.theme+xml"/></Types>')
+    slide_ids = "".join(f'<p:sldId id="{255 + i}" r:id="rId{i + 1}"/>' for i in range(1, slide_count + 1))
+    presentation_rels = [("rId1", "slideMaster", "slideMasters/slideMaster1.xml")]
+    presentation_rels += [(f"rId{i + 1}", "slide", f"slides/slide{i}.xml") for i in range(1, slide_count + 1)]
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", content_types)
+        zf.writestr("_rels/.rels", _relationships_xml([("rId1", "officeDocument", "ppt/presentation.xml")]))
+        zf.writestr("ppt/presentation.xml",
+                    f'{_XML_HEADER}<p:presentation {_NAMESPACES}><p:sldMasterIdLst>'
+                    f'<p:sldMasterId id="2147483648" r:id="rId1"/></p:sldMasterIdLst>'
+                    f'<p:sldIdLst>{slide_ids}</p:sldIdLst><p:sldSz cx="12192000" cy="6858000"/>'
+                    f'<p:notesSz cx="6858000" cy="9144000"/></p:presentation>')
+        zf.writestr("ppt/_rels/presentation.xml.rels", _relationships_xml(presentation_rels))
+        layout_ids = "".join(f'<p:sldLayoutId id="{2147483648 + n}" r:id="rId{n + 1}"/>' for n in layouts)
+        zf.writestr("ppt/slideMasters/slideMaster1.xml",
+                    f'{_XML_HEADER}<p:sldMaster {_NAMESPACES}><p:cSld/><p:sldLayoutIdLst>{layout_ids}'
+                    '</p:sldLayoutIdLst></p:sldMaster>')
+        zf.writestr("ppt/slideMasters/_rels/slideMaster1.xml.rels",
+                    _relationships_xml([("rId1", "theme", "../theme/theme1.xml")]
+                                       + [(f"rId{n + 1}", "slideLayout", f"../slideLayouts/slideLayout{n}.xml")
+                                          for n in layouts]))
+        for n in layouts:
+            layout_rels = [("rId1", "slideMaster", "../slideMasters/slideMaster1.xml")]
+            if media_size:
+                layout_rels.append(("rId2", "image", f"../media/layout{n}.png"))
+                zf.writestr(f"ppt/media/layout{n}.png", _media_bytes(-n, media_size))
+            zf.writestr(f"ppt/slideLayouts/slideLayout{n}.xml",
+                        f'{_XML_HEADER}<p:sldLayout {_NAMESPACES}><p:cSld/></p:sldLayout>')
+            zf.writestr(f"ppt/slideLayouts/_rels/slideLayout{n}.xml.rels", _relationships_xml(layout_rels))
+        zf.writestr("ppt/theme/theme1.xml", f'{_XML_HEADER}<a:theme xmlns:a="{NS_DRAWING}" name="benchmark"/>')
+        for i in range(1, slide_count + 1):
+            animation = _ANIMATION if animated_every and i % animated_every == 0 else ""
+            zf.writestr(f"ppt/slides/slide{i}.xml",
+                        f'{_XML_HEADER}<p:sld {_NAMESPACES}><p:cSld><p:spTree><p:sp><p:txBody><a:p><a:r>'
+                        f'<a:t>基准测试第{i}页</a:t></a:r></a:p></p:txBody></p:sp></p:spTree></p:cSld>{animation}</p:sld>')
+            slide_rels = [("rId1", "slideLayout", f"../slideLayouts/slideLayout{(i - 1) % layout_count + 1}.xml")]
+            if media_every and i % media_every == 0:
+                slide_rels.append(("rId2", "video", f"../media/media{i}.mp4"))
+                zf.writestr(f"ppt/media/media{i}.mp4", _media_bytes(i, media_size))
+            zf.writestr(f"ppt/slides/_rels/slide{i}.xml.rels", _relationships_xml(slide_rels))
+    return path
+
+
+def run_case(work_dir, slide_count, workers, delay=DEFAULT_DELAY, static_delay=DEFAULT_STATIC_DELAY, animated_every=5):
+    """用假后端转换一个合成演示文稿，返回耗时、吞吐量、调度开销和各阶段统计"""
+    deck_path = os.path.join(work_dir, f"deck_{slide_count}.pptx")
+    if not os.path.exists(deck_path):
+        build_synthetic_deck(deck_path, slide_count, animated_every)
+    output_dir = tempfile.mkdtemp(prefix=f"out_{slide_count}_{workers}_", dir=work_dir)
+
+    converter = PPTToVideoConverter()
+    converter.backend_settings = {"delay": delay, "static_delay": static_delay}
+    result = {}
+
+    def on_complete(out_dir, success_count, total_count):
+        result.update(success_count=success_count)
+
+    start = time.perf_counter()
+    try:
+        converter.convert_ppt_to_videos(deck_path, output_dir=output_dir, workers=workers, use_cache=False,
+                                        backend="fake", profile=True, completion_callback=on_complete)
+        wall = time.perf_counter() - start
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    # 假后端的渲染耗时已知，理想情况下总耗时为渲染时间平均分到各进程，多出的部分即为流水线本身的开销
+    animated_count = slide_count // animated_every if animated_every else 0
+    render_seconds = animated_count * delay + (slide_count - animated_count) * static_delay
+    ideal = render_seconds / max(1, min(workers, slide_count))
+    return {
+        "slides": slide_count,
+        "workers": workers,
+        "success_count": result.get("success_count", 0),
+        "wall": wall,
+        "slides_per_second": slide_count / wall if wall > 0 else 0.0,
+        "overhead": wall - ideal,
+        "overhead_per_slide": (wall - ideal) / slide_count,
+        "stages": converter.profiler.summary(),
+    }
+
+
+def isolate_all(deck_path, output_dir, recompress):
+    """把每一页写成单页pptx，返回写出的IO统计"""
+    with SlideIsolator(deck_path) as isolator:
+        for index in range(1, isolator.slide_count + 1):
+            isolator.write(index, os.path.join(output_dir, f"slide{index}.pptx"), recompress=recompress)
+        return isolator.stats.to_dict()
+
+
+def run_isolation_case(work_dir, slide_count, media_every, media_size, layout_count):
+    """比较生成单页源文件的两种方式：逐个解压再压缩（recompress）与原样复制压缩数据（raw），返回耗时、内存和IO"""
+    deck_path = os.path.join(work_dir, f"media_deck_{slide_count}_{media_every}_{media_size}_{layout_count}.pptx")
+    if not os.path.exists(deck_path):
+        build_synthetic_deck(deck_path, slide_count, media_every=media_every, media_size=media_size,
+                             layout_count=layout_count)
+    results = []
+    for mode in ("recompress", "raw"):
+        output_dir = tempfile.mkdtemp(prefix=f"isolate_{mode}_", dir=work_dir)
+        try:
+            start, cpu_start = time.perf_counter(), time.process_time()
+            stats = isolate_all(deck_path, output_dir, mode == "recompress")
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            # 内存峰值单独测一遍，tracemalloc本身的开销不计入耗时
+            tracemalloc.start()
+            try:
+                isolate_all(deck_path, output_dir, mode == "recompress")
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        results.append({
+            "mode": mode,
+            "slides": slide_count,
+            "deck_bytes": os.path.getsize(deck_path),
+            "wall": wall,
+            "cpu": cpu,
+            "seconds_per_slide": wall / slide_count,
+            "peak_memory": peak,
+            "io": stats,
+        })
+    return results
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 {模块名: (自身耗时秒, 累计耗时秒)}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        modules[fields[2].strip()] = (int(fields[0]) / 1e6, int(fields[1]) / 1e6)
+    return modules
+
+
+def measure_import(module, repeat=IMPORT_REPEAT):
+    """在新进程中导入module，返回导入耗时的中位数、加载的模块数、最慢的模块和加载了的重量级模块"""
+    times = []
+    modules = {}
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+        if process.returncode != 0:
+            lines = process.stderr.strip().splitlines()
+            return {"module": module, "error": lines[-1] if lines else f"退出码{process.returncode}"}
+        modules = parse_importtime(process.stderr)
+        times.append(modules.get(module, (0.0, 0.0))[1])
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:5]
+    return {
+        "module": module,
+        "seconds": statistics.median(times),
+        "module_count": len(modules),
+        "slowest": [[name, round(own, 6)] for name, (own, _) in slowest],
+        "heavy": [name for name in HEAVY_MODULES if name in modules and name != module],
+    }
+
+
+def find_import_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """与基准结果比较导入耗时和启动时加载的重量级模块，返回退化项的说明列表"""
+    previous = {item["module"]: item for item in baseline.get("imports", []) if "error" not in item}
+    regressions = []
+    for result in results:
+        base = previous.get(result["module"])
+        if base is None or "error" in result:
+            continue
+        limit = max(base["seconds"], MIN_IMPORT_SECONDS) * (1 + tolerance)
+        if result["seconds"] > limit:
+            regressions.append(f"import {result['module']}: {base['seconds'] * 1000:.1f}ms -> {result['seconds'] * 1000:.1f}ms")
+        added = sorted(set(result["heavy"]) - set(base["heavy"]))
+        if added:
+            regressions.append(f"import {result['module']}: 启动时新加载了 {', '.join(added)}")
+    return regressions
+
+
+def case_key(result):
+    return f"{result['slides']}x{result['workers']}"
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """与基准结果比较单页额外开销，返回退化项的说明列表"""
+    previous = {case_key(item): item for item in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = previous.get(case_key(result))
+        if base is None:
+            continue
+        if result["success_count"] < base["success_count"]:
+            regressions.append(f"{case_key(result)}: 成功页数 {base['success_count']} -> {result['success_count']}")
+        limit = max(base["overhead_per_slide"], MIN_OVERHEAD_PER_SLIDE) * (1 + tolerance)
+        if result["overhead_per_slide"] > limit:
+            regressions.append(f"{case_key(result)}: 单页开销 {base['overhead_per_slide'] * 1000:.2f}ms -> "
+                               f"{result['overhead_per_slide'] * 1000:.2f}ms")
+    return regressions
+
+
+def main(argv=None):
+    """基准测试命令行：用假后端转换10/100/1000页的合成演示文稿，可与上次结果比较"""
+    parser = argparse.ArgumentParser(description="转换流水线基准测试（使用假渲染后端，可在Linux上运行）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="演示文稿页数")
+    parser.add_argument("--workers", type=int, nargs="+", default=list(DEFAULT_WORKERS), help="并行进程数")
+    parser.add_argument("--delay", type=float, default=DEFAULT_DELAY, help="完整渲染每页耗时（秒）")
+    parser.add_argument("--static-delay", type=float, default=DEFAULT_STATIC_DELAY, help="静态页每页耗时（秒）")
+    parser.add_argument("--output", default=None, help="把结果写入JSON文件")
+    parser.add_argument("--baseline", default=None, help="与该JSON文件中的结果比较，性能退化时返回1")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="允许的单页开销增幅（默认0.25）")
+    parser.add_argument("--imports", nargs="*", metavar="模块", default=None,
+                        help=f"改为测量入口模块的启动（导入）耗时，默认: {' '.join(IMPORT_MODULES)}")
+    parser.add_argument("--repeat", type=int, default=IMPORT_REPEAT, help=f"每个模块导入的次数，取中位数（默认{IMPORT_REPEAT}）")
+    parser.add_argument("--isolation", action="store_true",
+                        help="改为测量生成单页源文件的耗时、内存峰值和读写量（重新压缩与原样复制对比）")
+    parser.add_argument("--media-every", type=int, default=ISOLATION_MEDIA_EVERY, help="--isolation: 每几页嵌入一个视频")
+    parser.add_argument("--media-size", type=float, default=ISOLATION_MEDIA_MB, help="--isolation: 每个视频和版式图片的大小（MB）")
+    parser.add_argument("--layouts", type=int, default=ISOLATION_LAYOUTS, help="--isolation: 母版中的版式数")
+    args = parser.parse_args(argv)
+    if args.imports is not None:
+        return run_import_benchmark(args)
+    if args.isolation:
+        return run_isolation_benchmark(args)
+
+    work_dir = tempfile.mkdtemp(prefix="pptx_benchmark_")
+    results = []
+    try:
+        for slide_count in args.sizes:
+            for workers in args.workers:
+                result = run_case(work_dir, slide_count, workers, args.delay, args.static_delay)
+                results.append(result)
+                print(f"{slide_count:>5}页 {workers:>2}进程: 总耗时{result['wall']:.3f}秒, "
+                      f"{result['slides_per_second']:.1f}页/秒, 单页开销{result['overhead_per_slide'] * 1000:.2f}ms, "
+                      f"成功{result['success_count']}页")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "delay": args.delay, "static_delay": args.static_delay,
+                       "results": results}, f, ensure_ascii=False, indent=1)
+        print(f"结果已写入{args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"性能退化 {line}")
+        if regressions:
+            return 1
+        print("未发现性能退化")
+    return 0
+
+
+def run_import_benchmark(args):
+    """--imports：测量各入口模块的导入耗时，可写入结果并与上次比较"""
+    results = []
+    for module in args.imports or IMPORT_MODULES:
+        result = measure_import(module, args.repeat)
+        results.append(result)
+        if "error" in result:
+            print(f"import {module}: 导入失败 {result['error']}")
+            continue
+        slowest = ", ".join(f"{name} {own * 1000:.1f}ms" for name, own in result["slowest"][:3])
+        heavy = f", 加载了 {', '.join(result['heavy'])}" if result["heavy"] else ""
+        print(f"import {module}: {result['seconds'] * 1000:.1f}ms, {result['module_count']}个模块（最慢: {slowest}）{heavy}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "python": sys.version, "imports": results}, f, ensure_ascii=False, indent=1)
+        print(f"结果已写入{args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_import_regressions(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"性能退化 {line}")
+        if regressions:
+            return 1
+        print("未发现性能退化")
+    return 0
+
+
+def run_isolation_benchmark(args):
+    """--isolation：在带大媒体的合成演示文稿上比较两种生成单页源文件的方式"""
+    work_dir = tempfile.mkdtemp(prefix="pptx_isolation_")
+    results = []
+    try:
+        for slide_count in args.sizes:
+            results += run_isolation_case(work_dir, slide_count, args.media_every, int(args.media_size * 1024 * 1024),
+                                          args.layouts)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    for result in results:
+        io = result["io"]
+        print(f"{result['slides']:>5}页 {result['mode']:>10}: 总耗时{result['wall']:.3f}秒, CPU{result['cpu']:.3f}秒, "
+              f"内存峰值{result['peak_memory'] / 1048576:.1f}MB, 写出{io['written_bytes'] / 1048576:.1f}MB, "
+              f"原样复制{io['copied_bytes'] / 1048576:.1f}MB, 重新压缩{io['compressed_input'] / 1048576:.1f}MB"
+              f"（源文件{result['deck_bytes'] / 1048576:.1f}MB）")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "isolation": results}, f, ensure_ascii=False, indent=1)
+        print(f"结果已写入{args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_isolation_regressions(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"性能退化 {line}")
+        if regressions:
+            return 1
+        print("未发现性能退化")
+    return 0
+
+
+def find_isolation_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """与基准结果比较原样复制方式的单页耗时和内存峰值，返回退化项的说明列表"""
+    previous = {(item["mode"], item["slides"]): item for item in baseline.get("isolation", [])}
+    regressions = []
+    for result in results:
+        base = previous.get((result["mode"], result["slides"]))
+        if base is None or result["mode"] != "raw":
+            continue
+        if result["seconds_per_slide"] > base["seconds_per_slide"] * (1 + tolerance):
+            regressions.append(f"单页源文件 {result['slides']}页: {base['seconds_per_slide'] * 1000:.2f}ms -> "
+                               f"{result['seconds_per_slide'] * 1000:.2f}ms")
+        if result["peak_memory"] > base["peak_memory"] * (1 + tolerance):
+            regressions.append(f"单页源文件 {result['slides']}页: 内存峰值 {base['peak_memory'] / 1048576:.1f}MB -> "
+                               f"{result['peak_memory'] / 1048576:.1f}MB")
+    return regressions
+
+
+if __name__ == "__main__":
+    sys.exit(main())
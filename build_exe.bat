@@ -36,7 +36,7 @@ echo   - 无控制台窗口 (--windowed)
 echo   - 包含所有依赖项
 echo.
 
-pyinstaller --onefile --windowed --name="PPT转视频工具" --icon=NONE --add-data "requirements.txt;." main_gui.py
+pyinstaller --onefile --windowed --name="PPT转视频工具" --icon=NONE --hidden-import=com_backend --hidden-import=libreoffice_backend --add-data "requirements.txt;." main_gui.py
 
 if errorlevel 1 (
     echo.
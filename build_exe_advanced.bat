@@ -48,7 +48,7 @@ echo 编译配置:
 echo   - 单文件打包 (--onefile)
 echo   - 窗口模式，无控制台 (--windowed)
 echo   - 优化导入 (--optimize=2)
-echo   - 包含隐藏导入
+echo   - 包含隐藏导入（渲染后端按需导入，需显式列出）
 echo   - 自定义名称和图标
 echo.
 
@@ -64,13 +64,16 @@ pyinstaller ^
     --workpath="build" ^
     --specpath="." ^
     --hidden-import=win32com.client ^
+    --hidden-import=pythoncom ^
+    --hidden-import=win32process ^
+    --hidden-import=com_backend ^
+    --hidden-import=libreoffice_backend ^
     --hidden-import=tkinter ^
     --hidden-import=tkinterdnd2 ^
     --hidden-import=threading ^
     --hidden-import=subprocess ^
     --add-data="requirements.txt;." ^
     --collect-submodules=tkinterdnd2 ^
-    --collect-submodules=win32com ^
     --noupx ^
     --console=False ^
     main_gui.py
@@ -0,0 +1,332 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import uuid
+import queue
+import tempfile
+import functools
+import threading
+
+from backends import RenderBackend
+from deck_export import ComDeckRenderer
+from session_pool import running_processes
+from slide_isolation import SlideIsolator
+from video_waiter import CompletionWaiter, ComVideoStatusProvider
+
+
+# CoInitializeEx：线程已按其他套间模型初始化
+RPC_E_CHANGED_MODE = -2147417850
+POWERPOINT_PROCESS = "POWERPNT.EXE"
+
+# 本进程中启动的PowerPoint进程号：同一进程中的其他后端连接到这些实例时也算作本工具启动的
+_launched_pids = set()
+
+
+class _MtaAnchor:
+    """进程内的多线程套间（MTA）锚定线程
+
+    PowerPoint实例在MTA中创建，代理可以在任何MTA线程中直接调用；该线程一直存活，MTA就不会因为创建实例的线程
+    （会话池的后台线程、GUI的转换线程）退出而销毁。已是单线程套间的线程（如使用OLE拖放的界面线程）不能加入MTA，
+    它们的调用转到本线程执行。
+    """
+
+    def __init__(self):
+        self.calls = queue.Queue()
+        self.ready = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="com-mta", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        try:
+            # pythoncom在第一次导入时按sys.coinit_flags初始化导入它的线程，这里保证是MTA（0即COINIT_MULTITHREADED）
+            sys.coinit_flags = 0
+            import pythoncom
+            pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            return
+        _apartment.mta = True
+        self.ready.set()
+        while True:
+            func, outcome, done = self.calls.get()
+            try:
+                outcome.append((True, func()))
+            except BaseException as e:
+                outcome.append((False, e))
+            finally:
+                done.set()
+
+    def call(self, func):
+        """在锚定线程中执行func并返回结果，异常原样抛出"""
+        outcome = []
+        done = threading.Event()
+        self.calls.put((func, outcome, done))
+        done.wait()
+        ok, value = outcome[0]
+        if not ok:
+            raise value
+        return value
+
+
+# 各线程是否已加入MTA（None为未初始化，False为已是单线程套间）
+_apartment = threading.local()
+_anchor = None
+_anchor_lock = threading.Lock()
+
+
+def _join_mta():
+    """当前线程加入MTA（需要时先启动锚定线程），返回是否成功；线程已是单线程套间时返回False"""
+    global _anchor
+    state = getattr(_apartment, "mta", None)
+    if state is not None:
+        return state
+    with _anchor_lock:
+        if _anchor is None:
+            _anchor = _MtaAnchor()
+    import pythoncom
+    try:
+        pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+        _apartment.mta = True
+    except pythoncom.com_error as e:
+        if e.args[0] != RPC_E_CHANGED_MODE:
+            raise
+        _apartment.mta = False
+    return _apartment.mta
+
+
+def in_mta(method):
+    """在MTA中调用：当前线程能加入MTA时直接调用，否则转到锚定线程执行"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _join_mta():
+            return method(*args, **kwargs)
+        return _anchor.call(lambda: method(*args, **kwargs))
+    return wrapper
+
+
+class ComRenderBackend(RenderBackend):
+    """通过PowerPoint COM接口渲染（仅Windows）"""
+
+    supports_deck_render = True
+    # PowerPoint是单实例程序，多个进程中的后端连接到的是同一个PowerPoint
+    shared_application = True
+
+    def __init__(self, is_cancelled=None, wait_stats=None, new_instance=False, on_encode_progress=None, visible=False):
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.wait_stats = wait_stats
+        # 视频编码过程中输出文件变化时调用 on_encode_progress(页码, 已等待秒数, 文件字节数)
+        self.on_encode_progress = on_encode_progress
+        # 为True时用DispatchEx创建；PowerPoint在系统中只有一个实例，已在运行时仍会连接到该实例
+        self.new_instance = new_instance
+        # 演示文稿都以WithWindow=False打开，不显示窗口可以省去界面绘制的开销
+        self.visible = visible
+        self.powerpoint = None
+        self.prs = None
+        # 用于生成单页演示文稿
+        self.isolator = None
+        # PowerPoint是否由本工具启动（而不是连接到用户已打开的实例），只有这样的实例才会退出或被强制结束
+        self.launched = False
+        # 本后端打开的演示文稿路径（normcase），其余的演示文稿属于用户或其他后端
+        self.opened = set()
+
+    def create_waiter(self, slide_index=None):
+        """创建等待视频导出完成的等待器"""
+        on_progress = None
+        if self.on_encode_progress and slide_index is not None:
+            on_progress = lambda elapsed, size: self.on_encode_progress(slide_index, elapsed, size)
+        return CompletionWaiter(is_cancelled=self.is_cancelled, stats=self.wait_stats, on_progress=on_progress)
+
+    def bind(self, is_cancelled=None, wait_stats=None, on_encode_progress=None):
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.wait_stats = wait_stats
+        self.on_encode_progress = on_encode_progress
+
+    # 调用COM的方法都用in_mta包装：会话池中的实例会在不同线程中启动、取用和关闭
+
+    @in_mta
+    def start(self):
+        """启动PowerPoint应用程序，已启动时直接返回
+
+        先记下已在运行的PowerPoint进程，创建后比较进程号，判断是新启动的还是连接到了用户已打开的实例。
+        """
+        if self.powerpoint is not None:
+            return
+        # 只在使用COM后端时才导入，其他平台可以正常导入本模块（in_mta已先在锚定线程中导入pythoncom）
+        import win32com.client
+
+        running = running_processes(POWERPOINT_PROCESS)
+        try:
+            if self.new_instance:
+                self.powerpoint = win32com.client.DispatchEx('PowerPoint.Application.16')
+            else:
+                self.powerpoint = win32com.client.Dispatch('PowerPoint.Application.16')
+            if self.visible:
+                self.powerpoint.Visible = 1
+        except Exception as e:
+            raise Exception(f"无法启动PowerPoint应用程序: {e}")
+        pid = self.process_id()
+        if pid is not None and running is not None:
+            launched = pid not in running
+        else:
+            # 无法确定进程号时，只有之前没有PowerPoint在运行才认为是本工具启动的
+            launched = running == set()
+        if launched and pid is not None:
+            _launched_pids.add(pid)
+        self.launched = launched or pid in _launched_pids
+
+    @in_mta
+    def ping(self):
+        """读取版本号和已打开的演示文稿数，PowerPoint崩溃或无响应时COM调用会失败"""
+        if self.powerpoint is None:
+            return False
+        try:
+            self.powerpoint.Version
+            self.powerpoint.Presentations.Count
+            return True
+        except Exception:
+            return False
+
+    @in_mta
+    def process_id(self):
+        """通过主窗口句柄获取PowerPoint进程号"""
+        if self.powerpoint is None:
+            return None
+        try:
+            import win32process
+            return win32process.GetWindowThreadProcessId(self.powerpoint.HWND)[1]
+        except Exception:
+            return None
+
+    def owns_process(self):
+        return self.launched
+
+    @staticmethod
+    def _normalize(path):
+        return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+    def _foreign_presentations(self):
+        """实例中不是本后端打开的演示文稿数"""
+        presentations = self.powerpoint.Presentations
+        return sum(1 for i in range(1, presentations.Count + 1)
+                   if self._normalize(presentations(i).FullName) not in self.opened)
+
+    @in_mta
+    def open(self, pptx_path):
+        self.close_presentation()
+        self.start()
+
+        # 打开PPT文件
+        self.opened.add(self._normalize(pptx_path))
+        try:
+            self.prs = self.powerpoint.Presentations.Open(pptx_path, WithWindow=False)
+        except Exception as e:
+            raise Exception(f"无法打开PPT文件: {e}\n文件路径: {pptx_path}")
+        self.isolator = SlideIsolator(pptx_path)
+
+    def prepare_slide(self, slide_index, params):
+        """直接从pptx压缩包生成只含这一页的演示文稿，不经过系统剪贴板"""
+        # 使用临时目录和英文文件名避免中文路径问题
+        temp_dir = self.temp_dir or tempfile.gettempdir()
+        temp_filename = f"temp_slide_{uuid.uuid4().hex}.pptx"
+        temp_pptx = os.path.join(temp_dir, temp_filename)
+        temp_pptx = os.path.normpath(temp_pptx)
+        with self.profiler.stage("isolate", slide_index):
+            self.isolator.write(slide_index, temp_pptx)
+        return temp_pptx
+
+    def export_slide(self, slide_index, output_path, params):
+        """导出单个幻灯片为视频"""
+        temp_pptx = None
+        try:
+            temp_pptx = self.prepare_slide(slide_index, params)
+            return self.render_prepared(slide_index, temp_pptx, output_path, params)
+        except Exception as e:
+            print(f"导出第{slide_index}页时出错: {e}")
+            return False
+        finally:
+            self.release_source(temp_pptx)
+
+    @in_mta
+    def render_prepared(self, slide_index, source, output_path, params):
+        """打开单页演示文稿并导出视频，source由调用方删除"""
+        if source is None:
+            return self.export_slide(slide_index, output_path, params)
+        try:
+            # 确保输出路径格式正确
+            output_path = os.path.normpath(os.path.abspath(output_path))
+            profiler = self.profiler
+
+            self.opened.add(self._normalize(source))
+            with profiler.stage("open_slide", slide_index):
+                single_prs = self.powerpoint.Presentations.Open(source, ReadOnly=True, WithWindow=False)
+
+            useTimingsAndNarrations = True
+            with profiler.stage("create_video", slide_index):
+                single_prs.CreateVideo(output_path, useTimingsAndNarrations, params["default_slide_duration"],
+                                       params["vert_resolution"], params["frames_per_second"], params["quality"])
+
+            # 被取消时等待器会立即返回
+            with profiler.stage("wait", slide_index):
+                result = self.create_waiter(slide_index).wait(ComVideoStatusProvider(single_prs), output_path)
+
+            with profiler.stage("close_slide", slide_index):
+                single_prs.Close()
+            self.opened.discard(self._normalize(source))
+            if result.state == "cancelled":
+                # 编码被中断，输出文件不完整，由调用方删除
+                return False
+            if result.state in ("failed", "timeout", "stalled"):
+                print(f"导出第{slide_index}页时出错: 视频导出状态为{result.state}，等待{result.elapsed:.1f}秒")
+                return False
+            return True
+        except Exception as e:
+            print(f"导出第{slide_index}页时出错: {e}")
+            return False
+
+    @in_mta
+    def render_deck(self, output_video, timings, vert_resolution, frames_per_second):
+        renderer = ComDeckRenderer(self.prs, waiter=self.create_waiter(), temp_dir=self.temp_dir)
+        return renderer.render_deck(output_video, timings, vert_resolution, frames_per_second)
+
+    @in_mta
+    def export_still(self, slide_index, image_path, vert_resolution):
+        # 按幻灯片宽高比计算宽度，保持为偶数以便编码
+        page_setup = self.prs.PageSetup
+        width = int(round(vert_resolution * page_setup.SlideWidth / page_setup.SlideHeight / 2)) * 2
+        self.prs.Slides(slide_index).Export(os.path.normpath(os.path.abspath(image_path)), "PNG", width, vert_resolution)
+
+    @in_mta
+    def close_presentation(self):
+        try:
+            if self.prs:
+                self.prs.Close()
+        except:
+            pass
+        self.prs = None
+        if self.isolator:
+            self.isolator.close()
+            self.isolator = None
+
+    @in_mta
+    def close(self):
+        """关闭本后端打开的演示文稿；只有本工具启动、且其中没有其他演示文稿的PowerPoint才退出"""
+        self.close_presentation()
+
+        try:
+            if self.powerpoint and self.launched:
+                if self._foreign_presentations():
+                    # 用户（或同一实例上的其他后端）还有打开的演示文稿：不退出，也不再允许强制结束
+                    self.launched = False
+                else:
+                    self.powerpoint.Quit()
+        except:
+            pass
+
+        # 不反初始化COM：MTA由锚定线程保持到进程退出，其他实例可能还在使用
+        self.powerpoint = None
@@ -0,0 +1,264 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import json
+import uuid
+import shutil
+import tempfile
+import collections
+
+from deck_export import SlideSegment, TimestampIndex
+from ffmpeg_tools import FFmpegError, find_ffmpeg, run_ffmpeg, run_tool
+
+
+CHAPTERS_SUFFIX = ".chapters.json"
+
+# 拼接方式：全部直接复制码流；部分片段先转为相同编码再复制
+MODE_COPY = "copy"
+MODE_CONFORM = "conform"
+
+# 能被stream copy拼接的条件：各片段视频（编码、宽、高、像素格式）和音频（编码、采样率、声道数）参数一致
+StreamSignature = collections.namedtuple("StreamSignature", ["video", "audio"])
+
+# 一个待拼接的片段：页码、文件路径、时长（秒）、编码参数
+SegmentInfo = collections.namedtuple("SegmentInfo", ["index", "path", "duration", "signature"])
+
+# ffmpeg可以编码的格式及对应的编码器和质量参数
+VIDEO_ENCODERS = {
+    "wmv2": ["-c:v", "wmv2", "-q:v", "2"],
+    "wmv1": ["-c:v", "wmv1", "-q:v", "2"],
+    "h264": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"],
+    "hevc": ["-c:v", "libx265", "-preset", "veryfast", "-crf", "22", "-tag:v", "hvc1"],
+    "mpeg4": ["-c:v", "mpeg4", "-q:v", "2"],
+}
+AUDIO_ENCODERS = {
+    "wmav2": ["-c:a", "wmav2", "-b:a", "128k"],
+    "aac": ["-c:a", "aac", "-b:a", "128k"],
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "128k"],
+}
+# 无法直接使用原编码时（例如PowerPoint输出的WMV9，ffmpeg不能编码）按输出格式选择的编码
+DEFAULT_CODECS = {".wmv": ("wmv2", "wmav2"), ".mp4": ("h264", "aac")}
+# MP4容器可以直接复制的编码
+MP4_CODECS = {"h264", "hevc", "mpeg4", "aac", "mp3"}
+
+
+def probe_segment(path, ffprobe_path=None):
+    """用ffprobe读取片段的时长和编码参数，返回 (秒数, StreamSignature)"""
+    ffprobe_path = ffprobe_path or find_ffmpeg("ffprobe")
+    if not ffprobe_path:
+        raise FFmpegError("找不到ffprobe，请安装ffmpeg或设置FFPROBE_PATH环境变量")
+    result = run_tool([ffprobe_path, "-v", "error", "-print_format", "json", "-show_entries",
+                       "format=duration:stream=codec_type,codec_name,width,height,pix_fmt,sample_rate,channels", path],
+                      error_class=FFmpegError)
+    data = json.loads(result.stdout.decode("utf-8", errors="replace"))
+    video = audio = None
+    for stream in data.get("streams", []):
+        if stream.get("codec_type") == "video" and video is None:
+            video = (stream.get("codec_name"), stream.get("width"), stream.get("height"), stream.get("pix_fmt"))
+        elif stream.get("codec_type") == "audio" and audio is None:
+            audio = (stream.get("codec_name"), int(stream.get("sample_rate") or 0), stream.get("channels"))
+    if video is None:
+        raise FFmpegError(f"文件中没有视频流: {path}")
+    duration = float(data.get("format", {}).get("duration") or 0)
+    return duration, StreamSignature(video, audio)
+
+
+def container_accepts(extension, signature):
+    """输出容器能否直接装入该编码"""
+    if extension.lower() != ".mp4":
+        return True
+    codecs = [signature.video[0]] + ([signature.audio[0]] if signature.audio else [])
+    return all(codec in MP4_CODECS for codec in codecs)
+
+
+def conform_cost(segments, target):
+    """按target拼接时需要转换的片段数，返回 (重新编码视频的片段数, 转换音频的片段数)；
+    有片段无法转为target（ffmpeg不能编码该参数）时返回None"""
+    video_count = audio_count = 0
+    for segment in segments:
+        if segment.signature.video != target.video:
+            if target.video[0] not in VIDEO_ENCODERS:
+                return None
+            video_count += 1
+        if segment.signature.audio != target.audio:
+            if target.audio and target.audio[0] not in AUDIO_ENCODERS:
+                return None
+            audio_count += 1
+    return video_count, audio_count
+
+
+def choose_target(segments, extension):
+    """选择拼接后的编码参数，使需要重新编码视频的片段最少，其次是需要转换音频的片段最少
+
+    候选为片段已有的视频参数与音频参数的组合，加上输出格式的默认编码；有片段带音频时目标必须带音频。
+    ffmpeg不能编码的参数（例如PowerPoint输出的WMV9）只有所有片段都已是该参数时才能作为目标，
+    否则只转码与目标不同的片段，而不是全部换成默认编码。
+    """
+    videos = [video for video, _ in collections.Counter(s.signature.video for s in segments).most_common()]
+    audios = [audio for audio, _ in collections.Counter(s.signature.audio for s in segments
+                                                        if s.signature.audio).most_common()]
+    video_codec, audio_codec = DEFAULT_CODECS.get(extension.lower(), DEFAULT_CODECS[".wmv"])
+    videos.append((video_codec,) + tuple(videos[0][1:3]) + ("yuv420p",))
+    if audios:
+        audios.append((audio_codec,) + tuple(audios[0][1:]))
+    else:
+        audios = [None]
+    best = best_cost = None
+    for video in videos:
+        for audio in audios:
+            candidate = StreamSignature(video, audio)
+            if not container_accepts(extension, candidate):
+                continue
+            cost = conform_cost(segments, candidate)
+            if cost is not None and (best_cost is None or cost < best_cost):
+                best, best_cost = candidate, cost
+    return best
+
+
+def conform_segment(segment, target, output_path, frames_per_second):
+    """把片段转为目标编码参数：视频或音频参数已一致的直接复制码流，只转换不一致的部分；
+    缺少音频时补静音，保证拼接后音视频同步"""
+    args = ["-i", segment.path]
+    if target.audio and not segment.signature.audio:
+        _, sample_rate, channels = target.audio
+        layout = "mono" if channels == 1 else "stereo"
+        args += ["-f", "lavfi", "-t", f"{segment.duration:.3f}", "-i", f"anullsrc=r={sample_rate}:cl={layout}",
+                 "-map", "0:v:0", "-map", "1:a:0"]
+    else:
+        args += ["-map", "0:v:0"] + (["-map", "0:a:0"] if target.audio else [])
+    if segment.signature.video == target.video:
+        args += ["-c:v", "copy"]
+    else:
+        _, width, height, pix_fmt = target.video
+        args += ["-vf", f"scale={width}:{height},format={pix_fmt or 'yuv420p'}", "-r", str(frames_per_second)]
+        args += VIDEO_ENCODERS[target.video[0]]
+    if not target.audio:
+        args.append("-an")
+    elif segment.signature.audio == target.audio:
+        args += ["-c:a", "copy"]
+    else:
+        args += AUDIO_ENCODERS[target.audio[0]] + ["-ar", str(target.audio[1]), "-ac", str(target.audio[2])]
+    args.append(output_path)
+    run_ffmpeg(args)
+
+
+def chapter_title(slide_index):
+    return f"第{slide_index}页"
+
+
+def _escape_metadata(value):
+    """ffmetadata中 = ; # \\ 和换行需要转义"""
+    for char in ("\\", "=", ";", "#", "\n"):
+        value = value.replace(char, "\\" + char)
+    return value
+
+
+def write_ffmetadata(path, index, title=None):
+    """把时间戳索引写成ffmpeg的元数据文件，每页一个章节"""
+    lines = [";FFMETADATA1"]
+    if title:
+        lines.append(f"title={_escape_metadata(title)}")
+    for segment in index.segments:
+        lines += ["[CHAPTER]", "TIMEBASE=1/1000", f"START={segment.start_ms}", f"END={segment.end_ms}",
+                  f"title={_escape_metadata(chapter_title(segment.index))}"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_concat_list(path, file_paths):
+    """concat分离器的文件列表，路径中的单引号需要转义"""
+    with open(path, "w", encoding="utf-8") as f:
+        for file_path in file_paths:
+            escaped = os.path.abspath(file_path).replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+def chapters_path_for(output_path):
+    return os.path.splitext(output_path)[0] + CHAPTERS_SUFFIX
+
+
+def write_chapters_json(path, index, video_path, mode):
+    """章节索引（页码 -> 起止时间）的JSON副本，供播放器以外的工具使用"""
+    data = {
+        "video": os.path.basename(video_path),
+        "duration_ms": index.total_ms,
+        "mode": mode,
+        "chapters": [dict(segment._asdict(), title=chapter_title(segment.index)) for segment in index.segments],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+class CombineResult:
+    """合并结果：输出视频、章节JSON、时间戳索引、拼接方式、转换的片段数和其中重新编码视频的片段数"""
+
+    def __init__(self, output_path, chapters_path, index, mode, conformed_count, reencoded_count=0):
+        self.output_path = output_path
+        self.chapters_path = chapters_path
+        self.index = index
+        self.mode = mode
+        self.conformed_count = conformed_count
+        self.reencoded_count = reencoded_count
+
+
+def combine_segments(segment_paths, output_path, frames_per_second=30, title=None, work_dir=None):
+    """把按顺序排列的 [(页码, 片段路径)] 拼接为一个视频，并写入章节
+
+    编码参数一致的片段直接复制码流，不重新编码；参数不同的片段先转为相同参数（只转码这些片段中不一致的音频或视频）。
+    章节同时嵌入视频（MP4章节 / ASF标记）并另存为同名的 .chapters.json。
+    """
+    if not segment_paths:
+        raise ValueError("没有可以合并的视频")
+    extension = os.path.splitext(output_path)[1]
+    segments = []
+    for slide_index, path in segment_paths:
+        duration, signature = probe_segment(path)
+        segments.append(SegmentInfo(slide_index, path, duration, signature))
+    target = choose_target(segments, extension)
+
+    temp_dir = tempfile.mkdtemp(prefix="concat_", dir=work_dir)
+    try:
+        inputs = []
+        conformed_count = reencoded_count = 0
+        for segment in segments:
+            if segment.signature == target:
+                inputs.append(segment.path)
+                continue
+            conformed = os.path.join(temp_dir, f"segment_{segment.index}{extension}")
+            conform_segment(segment, target, conformed, frames_per_second)
+            inputs.append(conformed)
+            conformed_count += 1
+            if segment.signature.video != target.video:
+                reencoded_count += 1
+
+        # 章节按实际片段时长累加，与拼接后的时间轴一致
+        chapters = []
+        position = 0
+        for segment in segments:
+            length = int(round(segment.duration * 1000))
+            chapters.append(SlideSegment(segment.index, position, position + length))
+            position += length
+        index = TimestampIndex(chapters)
+
+        list_path = os.path.join(temp_dir, "segments.txt")
+        metadata_path = os.path.join(temp_dir, "chapters.ffmeta")
+        write_concat_list(list_path, inputs)
+        write_ffmetadata(metadata_path, index, title)
+
+        # 先写临时文件再替换，中途失败不会留下不完整的合并视频
+        temp_output = os.path.join(temp_dir, f"combined_{uuid.uuid4().hex}{extension}")
+        args = ["-f", "concat", "-safe", "0", "-i", list_path, "-i", metadata_path,
+                "-map", "0", "-map_metadata", "1", "-map_chapters", "1", "-c", "copy"]
+        if extension.lower() == ".mp4":
+            # moov放在文件开头，播放器无需读完整个文件即可跳转
+            args += ["-movflags", "+faststart"]
+        args.append(temp_output)
+        run_ffmpeg(args)
+        shutil.move(temp_output, output_path)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    mode = MODE_COPY if conformed_count == 0 else MODE_CONFORM
+    chapters_path = chapters_path_for(output_path)
+    write_chapters_json(chapters_path, index, output_path, mode)
+    return CombineResult(output_path, chapters_path, index, mode, conformed_count, reencoded_count)
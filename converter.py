@@ -0,0 +1,662 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import time
+import functools
+from backends import DEFAULT_BACKEND, backend_class, create_backend
+from concat import combine_segments
+from ffmpeg_tools import find_ffmpeg
+from deck_export import WholeDeckExporter, FFmpegSplitter, slide_timings_from_infos
+from video_waiter import WaitStats
+from worker_pool import SlideScheduler
+from pptx_index import PptxIndex
+from render_cache import RenderCache, clone_file, compute_slide_digests, slide_cache_keys
+from progress_events import (DECK_COMBINED, DECK_FAILED, DECK_FINISHED, DECK_STARTED, ENCODE_PROGRESS, MESSAGE,
+                             RENDER_STARTED, RESOURCE_DECISION, SLIDE_DONE, SLIDE_FAILED, SLIDE_QUEUED, ProgressEvent)
+from manifest import (Manifest, ORIGIN_CACHE, ORIGIN_DUPLICATE, ORIGIN_RENDER, ORIGIN_RESUME, STATE_DONE, STATE_FAILED,
+                      STATE_PENDING)
+from fast_path import PATH_FAST, PATH_FULL, FastPathReport, static_slide_durations
+from duration_planner import plan_durations
+from output_profiles import profile_params, resolve_profile
+from profiling import NULL_PROFILER, StageProfiler
+from pipeline import DEFAULT_CONCURRENCY, STAGE_RENDER, SlideExportPipeline, retry_message
+from resource_governor import ResourceGovernor, describe_decision
+from session_pool import SessionPool
+from slide_selection import format_slide_ranges, select_slides
+
+
+def build_render_params(default_slide_duration, vert_resolution, frames_per_second, output_profile, backend_name):
+    """渲染参数（输出格式为OutputProfile），同时作为渲染缓存键的一部分"""
+    return {
+        "default_slide_duration": default_slide_duration,
+        "vert_resolution": vert_resolution,
+        "frames_per_second": frames_per_second,
+        "quality": output_profile.render_quality,
+        "backend": backend_name,
+        **profile_params(output_profile),
+    }
+
+
+class PPTToVideoConverter:
+    def __init__(self):
+        # 当前使用的渲染后端（RenderBackend）
+        self.backend = None
+        self.is_converting = False
+        # 记录每页等待CreateVideo完成的耗时
+        self.wait_stats = WaitStats()
+        # 渲染缓存，首次使用时创建
+        self.render_cache = None
+        self.backend_name = DEFAULT_BACKEND
+        # 为False时后端由调用方管理，清理时只关闭演示文稿
+        self.owns_backend = True
+        # 记录各页走快速通道还是完整渲染
+        self.fast_path_report = FastPathReport()
+        # 当前运行的转换记录及写入记录所需的信息
+        self.manifest = None
+        self.run_context = {}
+        self.slide_callback = None
+        # 结构化进度事件的接收者，以及每页开始渲染的时间
+        self.event_callback = None
+        self.current_deck = None
+        self.slide_started = {}
+        # 各阶段计时，convert_ppt_to_videos(profile=True)时为StageProfiler
+        self.profiler = NULL_PROFILER
+        # 额外传给渲染后端的参数，例如基准测试中假后端每页的耗时
+        self.backend_settings = {}
+        # 输出格式（容器、编码、码率）
+        self.output_profile = resolve_profile(None)
+        # 逐页导出流水线各阶段的并发数（见pipeline.DEFAULT_CONCURRENCY）及最近一次的队列统计
+        self.stage_concurrency = None
+        self.pipeline_metrics = None
+        # 会话池参数（enable_session_pool），按后端名称保存的会话池，以及本次转换取用的实例
+        self.pool_options = None
+        self.session_pools = {}
+        self.session = None
+        # 本次转换的资源调节器（同时渲染的页数和临时目录），只在需要渲染时创建
+        self.governor = None
+    
+    def enable_session_pool(self, **options):
+        """逐个文件转换时从会话池取用已启动的后端，转换结束不退出；options见SessionPool，另可指定visible"""
+        self.pool_options = options
+    
+    def get_session_pool(self, backend_name, progress_callback=None):
+        """获取（首次使用时创建并预热）该后端的会话池"""
+        pool = self.session_pools.get(backend_name)
+        if pool is None:
+            options = dict(self.pool_options)
+            backend_options = self.backend_options(backend_name)
+            visible = options.pop("visible", False)
+            if backend_name == "com":
+                # PowerPoint只有一个实例，可能连接到用户已打开的PowerPoint；后端会判断实例是否由本工具启动，
+                # 只有这样的实例才会在重启时退出或被强制结束（见ComRenderBackend.close、SessionPool）
+                backend_options.update(new_instance=True, visible=visible)
+            pool = SessionPool(functools.partial(create_backend, backend_name, **backend_options), name=backend_name,
+                               **options)
+            if progress_callback and backend_name == "com":
+                progress_callback("正在启动PowerPoint...")
+            reaped = pool.start()
+            if progress_callback and reaped:
+                progress_callback(f"已结束上次异常退出时遗留的{reaped}个实例进程")
+            self.session_pools[backend_name] = pool
+        return pool
+    
+    def backend_options(self, backend_name, parallel=False):
+        """创建渲染后端所需的参数"""
+        options = dict(self.backend_settings)
+        if backend_name != "com":
+            return options
+        if not parallel:
+            # 并行导出时各工作进程连接到同一个PowerPoint（由SlideScheduler在主进程中启动），只传可以pickle的参数
+            options.update(is_cancelled=lambda: not self.is_converting, wait_stats=self.wait_stats,
+                           on_encode_progress=self.encode_progress)
+        return options
+    
+    def emit(self, kind, **data):
+        """发送进度事件，每个事件都带上当前文件路径"""
+        if self.event_callback:
+            self.event_callback(ProgressEvent(kind, deck=self.current_deck, **data))
+    
+    def wrap_progress(self, progress_callback):
+        """文字进度信息同时作为MESSAGE事件发送"""
+        def report(message):
+            if progress_callback:
+                progress_callback(message)
+            self.emit(MESSAGE, text=message)
+        return report
+    
+    def render_started(self, slide_index, worker=0):
+        self.slide_started[slide_index] = time.perf_counter()
+        self.emit(RENDER_STARTED, slide=slide_index, worker=worker)
+    
+    def encode_progress(self, slide_index, elapsed, size):
+        self.emit(ENCODE_PROGRESS, slide=slide_index, elapsed=round(elapsed, 3), bytes=size)
+    
+    def export_single_slide_to_video(self, slide_index, output_wmv, default_slide_duration=5, vert_resolution=1080, frames_per_second=30, progress_callback=None, static_duration=None):
+        """导出单个幻灯片为视频（包括转码），static_duration不为None时走静态页快速通道"""
+        params = self.render_params(default_slide_duration, vert_resolution, frames_per_second)
+        static_durations = {slide_index: static_duration} if static_duration is not None else {}
+        pipeline = SlideExportPipeline(self.backend, params, static_durations, self.stage_concurrency,
+                                       resources=self.governor.gate if self.governor else None)
+        results = pipeline.run({slide_index: output_wmv}, is_cancelled=lambda: not self.is_converting)
+        for result in results:
+            if result.ok:
+                self.fast_path_report.record(result.slide, result.path, result.seconds)
+        return any(result.ok for result in results)
+    
+    def export_whole_deck(self, output_paths, slide_infos, default_slide_duration=5, vert_resolution=1080, frames_per_second=30, progress_callback=None):
+        """整体渲染一次后按时间戳切分为单页视频（直接编码为输出格式），返回成功导出的页码列表"""
+        timings = slide_timings_from_infos(slide_infos, default_slide_duration)
+        exporter = WholeDeckExporter(self.backend, FFmpegSplitter(encoder_args=self.output_profile.encoder_args()),
+                                     self.governor.gate.temp_dir if self.governor else None)
+        return exporter.export(timings, output_paths, vert_resolution, frames_per_second,
+                               progress_callback, is_cancelled=lambda: not self.is_converting)
+    
+    def export_slides_one_by_one(self, output_paths, default_slide_duration=5, vert_resolution=1080, frames_per_second=30, progress_callback=None, static_durations=None, slide_params=None, expected_durations=None):
+        """逐页导出为视频：准备、渲染、校验/转码、发布四个阶段流水线进行，返回成功导出的页码列表"""
+        params = self.render_params(default_slide_duration, vert_resolution, frames_per_second)
+        pipeline = SlideExportPipeline(self.backend, params, static_durations, self.stage_concurrency,
+                                       slide_params=slide_params, expected_durations=expected_durations,
+                                       resources=self.governor.gate if self.governor else None)
+        positions = {i: n for n, i in enumerate(sorted(output_paths), start=1)}
+        slide_count = len(output_paths)
+        exported = []
+        
+        def started(i):
+            if progress_callback:
+                progress_callback(f"正在导出第{i}页为视频... ({positions[i]}/{slide_count})")
+            self.render_started(i)
+            self.poll_resources()
+        
+        def finish(result):
+            if result.ok:
+                exported.append(result.slide)
+                self.fast_path_report.record(result.slide, result.path, result.seconds)
+            self.slide_finished(result.slide, result.ok, error=result.error)
+            self.poll_resources()
+            if progress_callback:
+                suffix = "完成" if result.ok else f"失败{': ' + result.error if result.error else ''}"
+                progress_callback(f"第{result.slide}页导出{suffix} ({len(exported)}/{slide_count})")
+        
+        def retry(i, attempt, error, delay):
+            if progress_callback:
+                progress_callback(retry_message(i, attempt, error, delay))
+        
+        try:
+            pipeline.run(output_paths, started, finish, is_cancelled=lambda: not self.is_converting, on_retry=retry)
+        finally:
+            self.pipeline_metrics = pipeline.metrics
+        if progress_callback and slide_count > 1:
+            progress_callback(f"流水线统计:\n{pipeline.metrics.format_summary()}")
+        return sorted(exported)
+    
+    def export_slides_in_parallel(self, pptx_path, output_paths, workers, default_slide_duration=5, vert_resolution=1080, frames_per_second=30, progress_callback=None, backend_name=DEFAULT_BACKEND, static_durations=None, slide_params=None, expected_durations=None):
+        """使用多个工作进程并行导出，每个进程打开一份演示文稿并导出分到的页，返回成功导出的页码列表"""
+        backend_factory = functools.partial(create_backend, backend_name, **self.backend_options(backend_name, parallel=True))
+        scheduler = SlideScheduler(backend_factory, workers)
+        params = self.render_params(default_slide_duration, vert_resolution, frames_per_second)
+        return scheduler.run(pptx_path, output_paths, params, progress_callback,
+                             is_cancelled=lambda: not self.is_converting,
+                             static_durations=static_durations, fast_path_report=self.fast_path_report,
+                             slide_callback=self.slide_finished, started_callback=self.render_started,
+                             profiler=self.profiler, stage_concurrency=self.stage_concurrency, slide_params=slide_params,
+                             expected_durations=expected_durations, governor=self.governor)
+    
+    def start_governor(self, max_renders, resource_limits=None, progress_callback=None):
+        """创建本次转换的资源调节器；resource_limits 见ResourceGovernor的参数，如 {"memory_reserve": 字节数, "temp_budget": 字节数}"""
+        def decided(decision):
+            self.emit(RESOURCE_DECISION, old_limit=decision.old_limit, new_limit=decision.new_limit, reason=decision.reason,
+                      rss=decision.sample.rss, memory_available=decision.sample.memory_available,
+                      temp_free=decision.sample.temp_free, temp_used=decision.sample.temp_used)
+            if progress_callback:
+                progress_callback(describe_decision(decision))
+        
+        self.governor = ResourceGovernor(max_renders=max_renders, on_decision=decided, **(resource_limits or {}))
+        if progress_callback and self.governor.temp_space.swept:
+            progress_callback(f"已删除上次异常退出时遗留的{self.governor.temp_space.swept}个临时目录")
+        return self.governor
+    
+    def poll_resources(self):
+        """单进程导出时按本进程和渲染后端的内存采样并调整并发
+
+        渲染要求在同一线程中进行的后端（PowerPoint）只有一个渲染线程，名额固定为1，采样只用于统计，实际起作用的是临时空间预算。
+        """
+        if self.governor is not None:
+            self.governor.poll([self.backend.process_id()] if self.backend else [])
+    
+    def slide_finished(self, slide_index, ok, origin=ORIGIN_RENDER, checkpoint=True, error=None):
+        """一页处理结束：写入转换记录（默认作为检查点保存，间隔见Manifest.checkpoint），并通知slide_callback；
+        error为失败原因，随SLIDE_FAILED事件发出"""
+        if self.manifest is not None:
+            ctx = self.run_context
+            self.manifest.record_slide(slide_index, STATE_DONE if ok else STATE_FAILED, ctx["digests"].get(slide_index),
+                                       ctx["slide_params"].get(slide_index, ctx["params"]), ctx["output_paths"][slide_index],
+                                       ctx["durations"].get(slide_index), origin)
+            if checkpoint:
+                try:
+                    with self.profiler.stage("checkpoint", slide_index):
+                        self.manifest.checkpoint()
+                except OSError as e:
+                    print(f"写入转换记录失败: {e}")
+        started = self.slide_started.pop(slide_index, None)
+        if ok:
+            output_path = self.run_context["output_paths"][slide_index] if self.run_context else None
+            size = os.path.getsize(output_path) if output_path and os.path.exists(output_path) else None
+            seconds = round(time.perf_counter() - started, 3) if started is not None else None
+            self.emit(SLIDE_DONE, slide=slide_index, origin=origin, seconds=seconds, bytes=size, path=output_path)
+        else:
+            self.emit(SLIDE_FAILED, slide=slide_index, error=error)
+        if self.slide_callback:
+            if not ok:
+                self.slide_callback(slide_index, "failed")
+            else:
+                self.slide_callback(slide_index, "cached" if origin == ORIGIN_CACHE else "done")
+    
+    def render_params(self, default_slide_duration, vert_resolution, frames_per_second):
+        """渲染参数，同时作为渲染缓存键的一部分"""
+        return build_render_params(default_slide_duration, vert_resolution, frames_per_second, self.output_profile,
+                                   self.backend_name)
+    
+    def fetch_cached_slides(self, cache_keys, output_paths, progress_callback=None):
+        """从渲染缓存取出未变化的页，返回仍需渲染的 {页码: 输出路径}"""
+        pending_paths = {}
+        slide_count = len(output_paths)
+        for n, i in enumerate(sorted(output_paths), start=1):
+            key = cache_keys.get(i)
+            if key and self.render_cache.fetch(key, output_paths[i]):
+                if progress_callback:
+                    progress_callback(f"第{i}页未变化，使用缓存 ({n}/{slide_count})")
+            else:
+                pending_paths[i] = output_paths[i]
+        return pending_paths
+    
+    def store_rendered_slides(self, cache_keys, output_paths, exported, pptx_path):
+        """把新渲染的页存入缓存，并按大小上限淘汰旧条目"""
+        for i in exported:
+            if i in cache_keys:
+                try:
+                    self.render_cache.store(cache_keys[i], output_paths[i], source=f"{os.path.basename(pptx_path)}#{i}")
+                except Exception as e:
+                    print(f"第{i}页写入缓存失败: {e}")
+        self.render_cache.prune()
+    
+    def convert_ppt_to_videos(self, pptx_path, default_slide_duration=5, vert_resolution=1080, frames_per_second=30, progress_callback=None, completion_callback=None, export_mode="per_slide", workers=1, use_cache=True, backend=None, fast_path=True, output_dir=None, shared_backend=None, slide_callback=None, resume=False, event_callback=None, profile=False, combine=False, output_profile=None, stage_concurrency=None, slides=None, skip_hidden=False, dedup=False, resource_limits=None):
+        """转换PPT为视频
+
+        shared_backend 为已启动的渲染后端时直接复用（批量转换时多个文件共用一个PowerPoint），
+        转换结束只关闭演示文稿，不退出后端；slide_callback(页码, 状态) 用于记录每页的结果。
+        输出目录中会写入 manifest.json 记录每页结果；resume为True时跳过上次已完成且未变化的页。
+        event_callback 接收结构化的进度事件（ProgressEvent），文字信息也会作为MESSAGE事件发送。
+        profile为True时记录各阶段耗时，结束后写入输出目录的 profile.csv 和 profile.json。
+        combine为True时再把各页视频拼接为一个完整视频（文件名与pptx相同），带每页的章节索引。
+        output_profile 为输出格式名称（见output_profiles.PROFILES）或OutputProfile，默认为PowerPoint输出的WMV。
+        stage_concurrency 为逐页导出流水线各阶段的并发数，例如 {"prepare": 2, "post": 2}。
+        slides 为要输出的页码范围（如 "1-10,15"）或页码列表，默认全部；skip_hidden为True时不输出隐藏页；
+        dedup为True时内容相同的页只渲染一次，其余页直接复用其视频文件。
+        resource_limits 为资源限制（见ResourceGovernor），同时渲染的页数按内存和临时空间在1到并发上限之间调整，
+        临时文件都写在本次转换的临时目录中，结束时删除。
+        """
+        self.event_callback = event_callback
+        self.current_deck = os.path.normpath(os.path.abspath(pptx_path))
+        self.slide_started = {}
+        self.run_context = {}
+        progress_callback = self.wrap_progress(progress_callback)
+        deck_start = time.perf_counter()
+        try:
+            backend = backend or DEFAULT_BACKEND
+            self.backend_name = backend
+            self.is_converting = True
+            self.wait_stats = WaitStats()
+            self.fast_path_report = FastPathReport()
+            self.slide_callback = slide_callback
+            self.manifest = None
+            self.profiler = profiler = StageProfiler() if profile else NULL_PROFILER
+            self.output_profile = resolve_profile(output_profile)
+            self.stage_concurrency = stage_concurrency
+            self.pipeline_metrics = None
+            if self.output_profile.transcodes and not find_ffmpeg():
+                raise Exception(f"输出格式\"{self.output_profile.label}\"需要ffmpeg转码，请安装ffmpeg或设置FFMPEG_PATH环境变量")
+            
+            # 规范化输入路径
+            pptx_path = os.path.normpath(os.path.abspath(pptx_path))
+            
+            # 检查文件是否存在
+            if not os.path.exists(pptx_path):
+                raise FileNotFoundError(f"文件不存在: {pptx_path}")
+            
+            # 根据pptx文件名创建输出目录
+            pptx_name = os.path.splitext(os.path.basename(pptx_path))[0]
+            output_dir = output_dir or pptx_name
+            
+            # 确保输出目录路径正确
+            output_dir = os.path.normpath(os.path.abspath(output_dir))
+            os.makedirs(output_dir, exist_ok=True)
+            
+            # 直接读取pptx规划任务，无需等待PowerPoint启动
+            # 每页时长按换片时间、动画时间线和嵌入媒体的时长规划，媒体时长只读取容器头部
+            with profiler.stage("plan"), PptxIndex(pptx_path) as deck_index:
+                slide_infos = list(deck_index)
+                duration_plan = plan_durations(deck_index, default_slide_duration)
+            slide_count = len(slide_infos)
+            hidden_count = sum(1 for info in slide_infos if info.hidden)
+            params = self.render_params(default_slide_duration, vert_resolution, frames_per_second)
+            slide_params = duration_plan.slide_params(params)
+            
+            # 按页码范围和隐藏页筛选要输出的页，内容相同的页只渲染一次
+            with profiler.stage("select"):
+                selection = select_slides(pptx_path, slide_infos, slides, skip_hidden, dedup, params, slide_params)
+            total_seconds = duration_plan.total_ms(selection.selected) / 1000.0
+            started = {} if selection.is_full else {"selected": format_slide_ranges(selection.selected)}
+            self.emit(DECK_STARTED, slide_count=slide_count, hidden_count=hidden_count, selected_count=len(selection.selected),
+                      duplicate_count=len(selection.duplicates), planned_seconds=total_seconds, output_dir=output_dir,
+                      **started)
+            if progress_callback:
+                progress_callback(f"共{slide_count}页幻灯片（其中隐藏{hidden_count}页），预计视频总时长{total_seconds:.0f}秒")
+                if selection.summary():
+                    progress_callback(f"页面筛选: {selection.summary()}")
+                if duration_plan.summary():
+                    progress_callback(f"时长规划: {duration_plan.summary()}")
+            
+            # 每页内容哈希同时用于渲染缓存和转换记录
+            if progress_callback:
+                progress_callback("正在计算幻灯片内容哈希...")
+            with profiler.stage("hash"):
+                slide_digests = compute_slide_digests(pptx_path)
+            
+            # 使用英文文件名避免中文路径问题
+            output_paths = {}
+            for i in selection.selected:
+                video_filename = f"{pptx_name}_{i}{self.output_profile.extension}"
+                video_path = os.path.join(output_dir, video_filename)
+                output_paths[i] = os.path.normpath(os.path.abspath(video_path))
+            
+            # 断点续传：跳过上次已完成、内容和参数未变且输出文件完好的页
+            manifest = Manifest.load(output_dir) if resume else None
+            resumed = []
+            selected = None if selection.is_full else selection.selected
+            if manifest is not None:
+                resumed = [i for i in output_paths
+                           if manifest.is_slide_complete(i, slide_digests.get(i), slide_params.get(i, params), output_paths[i])]
+                manifest.start_run(pptx_path, params, slide_count, selected)
+            else:
+                manifest = Manifest.create(output_dir, pptx_path, params, slide_count, selected)
+            self.manifest = manifest
+            self.run_context = {
+                "digests": slide_digests,
+                "params": params,
+                "slide_params": slide_params,
+                "output_paths": output_paths,
+                "durations": {plan.index: plan.duration_ms / 1000.0 for plan in duration_plan},
+            }
+            pending_paths = {i: path for i, path in output_paths.items() if i not in resumed}
+            for i in sorted(output_paths):
+                if i in resumed:
+                    self.slide_finished(i, True, ORIGIN_RESUME, checkpoint=False)
+                else:
+                    manifest.record_slide(i, STATE_PENDING, slide_digests.get(i), slide_params.get(i, params), output_paths[i],
+                                          self.run_context["durations"].get(i))
+            manifest.save()
+            if progress_callback and resume:
+                progress_callback(f"继续上次的转换，跳过已完成的{len(resumed)}页")
+            
+            # 没有动画、切换和媒体的页只需渲染一帧
+            static_durations = {}
+            if fast_path and backend_class(backend).fast_path_available():
+                static_durations = static_slide_durations(slide_infos, default_slide_duration)
+            elif fast_path and progress_callback:
+                progress_callback("未找到ffmpeg，静态页快速通道不可用，所有页使用完整渲染")
+            
+            deck_backend = type(shared_backend) if shared_backend is not None else backend_class(backend)
+            if export_mode == "whole_deck" and not deck_backend.supports_deck_render:
+                if progress_callback:
+                    progress_callback(f"渲染后端{backend}不支持整体导出，改为逐页导出")
+                export_mode = "per_slide"
+            
+            # 再检查渲染缓存，全部命中时无需启动PowerPoint；导出通道也是缓存键的一部分，
+            # 从整体渲染中切分的视频、单帧编码的静态页和逐页渲染的结果不互相命中
+            cache_keys = {}
+            if use_cache:
+                if self.render_cache is None:
+                    self.render_cache = RenderCache()
+                if progress_callback:
+                    progress_callback("正在检查渲染缓存...")
+                if export_mode == "whole_deck":
+                    routes = {i: export_mode for i in output_paths}
+                else:
+                    routes = {i: PATH_FAST if i in static_durations else PATH_FULL for i in output_paths}
+                cache_keys = slide_cache_keys(slide_digests, params, slide_params, routes)
+                with profiler.stage("cache_fetch"):
+                    to_render = self.fetch_cached_slides(cache_keys, pending_paths, progress_callback)
+                cached = [i for i in sorted(pending_paths) if i not in to_render]
+                for i in cached:
+                    self.slide_finished(i, True, ORIGIN_CACHE, checkpoint=False)
+                pending_paths = to_render
+                manifest.save()
+            else:
+                cached = []
+            cached_count = len(cached)
+            
+            # 重复页：与之相同的页已有结果时直接复用，否则等那一页渲染完成后再复用
+            pending_duplicates = {i: source for i, source in selection.duplicates.items() if i in pending_paths}
+            ready = {i: source for i, source in pending_duplicates.items() if source not in pending_paths}
+            waiting_duplicates = {i: source for i, source in pending_duplicates.items() if source in pending_paths}
+            duplicated = self.reuse_duplicates(ready, output_paths, output_paths)
+            pending_paths = {i: path for i, path in pending_paths.items() if i not in selection.duplicates}
+            if ready:
+                manifest.save()
+            
+            for i in sorted(pending_paths):
+                self.emit(SLIDE_QUEUED, slide=i, path="fast" if i in static_durations else "full")
+            if progress_callback:
+                static_count = sum(1 for i in pending_paths if i in static_durations)
+                progress_callback(f"开始转换，共{slide_count}页幻灯片，需要渲染{len(pending_paths)}页（其中静态页{static_count}页），"
+                                  f"输出格式: {self.output_profile.label}")
+            
+            # 并行导出时主进程不需要打开演示文稿；复用外部后端时只能逐页导出
+            parallel = export_mode == "per_slide" and workers > 1 and shared_backend is None
+            governor = None
+            if pending_paths:
+                if parallel:
+                    max_renders = workers
+                else:
+                    max_renders = dict(DEFAULT_CONCURRENCY, **(stage_concurrency or {}))[STAGE_RENDER]
+                governor = self.start_governor(max_renders, resource_limits, progress_callback)
+            if not pending_paths:
+                exported = []
+            elif parallel:
+                with profiler.stage("parallel"):
+                    exported = self.export_slides_in_parallel(pptx_path, pending_paths, workers, default_slide_duration, vert_resolution, frames_per_second, progress_callback, backend, static_durations, slide_params, self.run_context["durations"])
+            else:
+                with profiler.stage("backend_open"):
+                    if shared_backend is not None:
+                        self.backend = shared_backend
+                        self.owns_backend = False
+                    elif self.pool_options is not None:
+                        self.session = self.get_session_pool(backend, progress_callback).acquire()
+                        self.backend = self.session.app
+                        self.owns_backend = False
+                    else:
+                        if progress_callback:
+                            progress_callback("正在打开PowerPoint..." if backend == "com" else f"正在启动渲染后端({backend})...")
+                        self.backend = create_backend(backend, **self.backend_options(backend))
+                        self.owns_backend = True
+                    self.backend.profiler = profiler
+                    self.backend.temp_dir = governor.gate.temp_dir
+                    self.backend.bind(lambda: not self.is_converting, self.wait_stats, self.encode_progress)
+                    self.backend.open(pptx_path)
+                
+                if export_mode == "whole_deck":
+                    with profiler.stage("whole_deck"):
+                        exported = self.export_whole_deck(pending_paths, slide_infos, default_slide_duration, vert_resolution, frames_per_second, progress_callback)
+                    # 被取消时未导出的页保持待处理状态
+                    for i in sorted(pending_paths):
+                        if i in exported or self.is_converting:
+                            self.slide_finished(i, i in exported)
+                else:
+                    exported = self.export_slides_one_by_one(pending_paths, default_slide_duration, vert_resolution, frames_per_second, progress_callback, static_durations, slide_params, self.run_context["durations"])
+            
+            if waiting_duplicates:
+                duplicated += self.reuse_duplicates(waiting_duplicates, output_paths, set(exported))
+            if use_cache:
+                with profiler.stage("cache_store"):
+                    self.store_rendered_slides(cache_keys, output_paths, list(exported) + duplicated, pptx_path)
+            success_count = len(resumed) + cached_count + len(exported) + len(duplicated)
+            if combine and self.is_converting:
+                with profiler.stage("combine"):
+                    self.combine_deck(pptx_name, output_dir, output_paths, slide_infos,
+                                      set(resumed) | set(cached) | set(exported) | set(duplicated), frames_per_second,
+                                      progress_callback)
+            if governor is not None:
+                manifest.data["resources"] = governor.summary()
+            manifest.finish_run(success_count)
+            manifest.save()
+            
+            with profiler.stage("cleanup"):
+                # 需要渲染的页全部失败时，交回会话池前先探活
+                self.cleanup(failed=bool(pending_paths) and not exported)
+            
+            if progress_callback and self.wait_stats.count:
+                progress_callback(f"视频导出等待统计: {self.wait_stats.summary()}")
+            if progress_callback and self.fast_path_report.records:
+                progress_callback(f"导出通道统计: {self.fast_path_report.summary()}")
+            if progress_callback and cached_count:
+                progress_callback(f"渲染缓存命中{cached_count}页，节省了{cached_count}次渲染")
+            selection_saved = len(selection.skipped_hidden) + len(duplicated)
+            avoided_renders = selection_saved + cached_count + len(resumed)
+            if progress_callback and selection_saved:
+                progress_callback(f"页面筛选节省了{selection_saved}次渲染（跳过隐藏页{len(selection.skipped_hidden)}页，"
+                                  f"复用重复页{len(duplicated)}页），本次共避免{avoided_renders}次渲染")
+            if progress_callback and backend in self.session_pools:
+                progress_callback(f"渲染后端实例: {self.session_pools[backend].format_stats()}")
+            resources = {}
+            if governor is not None:
+                resources["resources"] = governor.summary()
+                if progress_callback:
+                    progress_callback(f"资源调节: {governor.format_summary()}")
+            if profiler.enabled:
+                self.save_profile(output_dir, progress_callback)
+            
+            self.emit(DECK_FINISHED, success_count=success_count, slide_count=len(output_paths),
+                      elapsed=round(time.perf_counter() - deck_start, 3), output_dir=output_dir,
+                      avoided_renders=avoided_renders, **resources)
+            if completion_callback:
+                completion_callback(output_dir, success_count, len(output_paths))
+                
+        except Exception as e:
+            error_msg = f"转换过程中出错: {str(e)}"
+            print(error_msg)
+            if progress_callback:
+                progress_callback(error_msg)
+            self.cleanup(failed=True)
+            self.emit(DECK_FAILED, error=str(e))
+            if completion_callback:
+                completion_callback(None, 0, 0)
+    
+    def reuse_duplicates(self, duplicates, output_paths, available):
+        """把与之相同的页的视频复制（支持时克隆）为重复页的视频，返回复用成功的页
+
+        duplicates 为 {重复页: 与之相同的页}；与之相同的页不在available中（未导出成功）时重复页记为失败，被取消时保持待处理。
+        """
+        reused = []
+        for i in sorted(duplicates):
+            source = duplicates[i]
+            if source not in available:
+                if self.is_converting:
+                    self.slide_finished(i, False, error=f"与之相同的第{source}页未导出成功")
+                continue
+            try:
+                clone_file(output_paths[source], output_paths[i])
+            except OSError as e:
+                print(f"第{i}页复用第{source}页的视频失败: {e}")
+                self.slide_finished(i, False, error=str(e))
+                continue
+            self.slide_finished(i, True, ORIGIN_DUPLICATE)
+            reused.append(i)
+        return reused
+    
+    def combine_deck(self, pptx_name, output_dir, output_paths, slide_infos, succeeded, frames_per_second, progress_callback=None):
+        """把本次输出的未隐藏页按放映顺序拼接为一个视频并写入章节索引，返回合并视频路径；有页未成功导出时不合并"""
+        slides = [info.index for info in slide_infos if not info.hidden and info.index in output_paths]
+        if not slides:
+            if progress_callback:
+                progress_callback("本次没有输出未隐藏的页，不生成合并视频")
+            return None
+        missing = [i for i in slides if i not in succeeded]
+        if missing:
+            if progress_callback:
+                progress_callback(f"有{len(missing)}页未导出成功，不生成合并视频")
+            return None
+        if not find_ffmpeg():
+            if progress_callback:
+                progress_callback("未找到ffmpeg，无法生成合并视频")
+            return None
+        
+        extension = os.path.splitext(output_paths[slides[0]])[1]
+        combined_path = os.path.join(output_dir, pptx_name + extension)
+        if progress_callback:
+            progress_callback(f"正在合并{len(slides)}页视频...")
+        try:
+            result = combine_segments([(i, output_paths[i]) for i in slides], combined_path, frames_per_second,
+                                      title=pptx_name)
+        except Exception as e:
+            if progress_callback:
+                progress_callback(f"合并视频失败: {e}")
+            return None
+        
+        self.manifest.data["combined"] = {
+            "output": os.path.basename(result.output_path),
+            "chapters": os.path.basename(result.chapters_path),
+            "mode": result.mode,
+            "slides": slides,
+        }
+        self.emit(DECK_COMBINED, path=result.output_path, chapters_path=result.chapters_path, mode=result.mode,
+                  duration_ms=result.index.total_ms)
+        if progress_callback:
+            if result.conformed_count:
+                how = f"其中{result.conformed_count}段编码参数不一致，已转换后拼接（重新编码视频{result.reencoded_count}段）"
+            else:
+                how = "直接复制码流，未重新编码"
+            progress_callback(f"合并视频已生成: {result.output_path}（{how}，总时长{result.index.total_ms / 1000.0:.1f}秒）")
+        return result.output_path
+    
+    def save_profile(self, output_dir, progress_callback=None):
+        """把各阶段计时写入输出目录"""
+        try:
+            csv_path, _ = self.profiler.save(output_dir)
+        except OSError as e:
+            print(f"写入性能分析结果失败: {e}")
+            return
+        if progress_callback:
+            progress_callback(f"各阶段耗时（毫秒）已写入{csv_path}:\n{self.profiler.format_summary()}")
+    
+    def cleanup(self, failed=False):
+        """清理资源；后端来自会话池时交回，failed为True时会话池先探活，无响应则重启；删除本次转换的临时目录"""
+        try:
+            if self.backend:
+                # 临时目录随后删除，复用的后端不能再写入
+                self.backend.temp_dir = None
+                if self.owns_backend:
+                    self.backend.close()
+                else:
+                    self.backend.close_presentation()
+        except:
+            failed = True
+        
+        if self.session is not None:
+            session, self.session = self.session, None
+            self.session_pools[self.backend_name].release(session, failed)
+        self.backend = None
+        if self.governor is not None:
+            governor, self.governor = self.governor, None
+            governor.close()
+        self.is_converting = False
+    
+    def shutdown(self):
+        """退出会话池中的所有实例（程序退出时调用）"""
+        self.cleanup()
+        for pool in self.session_pools.values():
+            pool.close()
+        self.session_pools = {}
+    
+    def stop_conversion(self):
+        """停止转换"""
+        self.is_converting = False
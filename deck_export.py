@@ -0,0 +1,216 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import uuid
+import tempfile
+from collections import namedtuple
+
+from ffmpeg_tools import run_ffmpeg
+from resource_governor import remove_temp_file
+from video_waiter import CompletionWaiter, ComVideoStatusProvider
+
+
+# 每页幻灯片在整体视频中的时长构成（毫秒）：切换动画时长 + 停留时长
+SlideTiming = namedtuple("SlideTiming", ["index", "transition_ms", "advance_ms"])
+
+# 时间戳索引中的一段：第index页在整体视频中的起止时间（毫秒）
+SlideSegment = namedtuple("SlideSegment", ["index", "start_ms", "end_ms"])
+
+# PowerPoint中的msoTrue
+MSO_TRUE = -1
+
+
+def slide_timings_from_infos(slide_infos, default_slide_duration):
+    """根据pptx索引中的切换和自动换片时间计算每页时长"""
+    default_ms = int(round(default_slide_duration * 1000))
+    timings = []
+    for info in slide_infos:
+        advance_ms = default_ms if info.advance_after_ms is None else info.advance_after_ms
+        timings.append(SlideTiming(info.index, info.transition_ms, advance_ms))
+    return timings
+
+
+class TimestampIndex:
+    """整体视频的时间戳索引，记录每页幻灯片的起止时间"""
+
+    def __init__(self, segments):
+        self.segments = list(segments)
+
+    @classmethod
+    def from_timings(cls, timings):
+        """按幻灯片顺序累加时长，生成索引"""
+        segments = []
+        position = 0
+        for timing in timings:
+            length = timing.transition_ms + timing.advance_ms
+            segments.append(SlideSegment(timing.index, position, position + length))
+            position += length
+        return cls(segments)
+
+    @property
+    def total_ms(self):
+        """整体视频总时长"""
+        if not self.segments:
+            return 0
+        return self.segments[-1].end_ms
+
+    def segment_for(self, slide_index):
+        """获取指定页的时间段"""
+        for segment in self.segments:
+            if segment.index == slide_index:
+                return segment
+        raise KeyError(slide_index)
+
+    def slide_at(self, position_ms):
+        """获取某一时间点所在的幻灯片页码"""
+        for segment in self.segments:
+            if segment.start_ms <= position_ms < segment.end_ms:
+                return segment.index
+        return None
+
+    def to_list(self):
+        """转换为可序列化的列表"""
+        return [segment._asdict() for segment in self.segments]
+
+
+class VideoSplitter:
+    """视频切分器接口：按时间段从整体视频中切出单页视频"""
+
+    def split(self, video_path, segment, output_path):
+        raise NotImplementedError
+
+
+class FFmpegSplitter(VideoSplitter):
+    """使用本地ffmpeg切分视频"""
+
+    def __init__(self, stream_copy=False, ffmpeg_path=None, encoder_args=None):
+        # 直接复制码流速度最快，但只能在关键帧处切分，边界可能有偏差
+        self.stream_copy = stream_copy
+        self.ffmpeg_path = ffmpeg_path
+        # 重新编码时的参数，默认输出WMV
+        self.encoder_args = encoder_args
+
+    def split(self, video_path, segment, output_path):
+        start = segment.start_ms / 1000.0
+        duration = (segment.end_ms - segment.start_ms) / 1000.0
+        args = ["-ss", f"{start:.3f}", "-i", video_path, "-t", f"{duration:.3f}"]
+        if self.stream_copy:
+            args += ["-c", "copy"]
+        elif self.encoder_args:
+            args += list(self.encoder_args)
+        else:
+            args += ["-c:v", "wmv2", "-q:v", "2", "-c:a", "wmav2"]
+        args.append(output_path)
+        run_ffmpeg(args, self.ffmpeg_path)
+
+
+class DeckRenderer:
+    """整体渲染接口：把整个演示文稿按给定时长一次性渲染为一个视频"""
+
+    def render_deck(self, output_video, timings, vert_resolution, frames_per_second):
+        raise NotImplementedError
+
+
+class ComDeckRenderer(DeckRenderer):
+    """通过PowerPoint的CreateVideo一次性渲染整个演示文稿"""
+
+    def __init__(self, prs, quality=100, waiter=None, temp_dir=None):
+        self.prs = prs
+        self.quality = quality
+        self.waiter = waiter or CompletionWaiter()
+        self.temp_dir = temp_dir or tempfile.gettempdir()
+
+    def render_deck(self, output_video, timings, vert_resolution, frames_per_second):
+        powerpoint = self.prs.Application
+        # 在副本上修改计时，避免改动用户的原文件
+        temp_pptx = os.path.normpath(os.path.join(self.temp_dir, f"temp_deck_{uuid.uuid4().hex}.pptx"))
+        self.prs.SaveCopyAs(temp_pptx)
+        deck = powerpoint.Presentations.Open(temp_pptx, WithWindow=False)
+        try:
+            for timing in timings:
+                transition = deck.Slides(timing.index).SlideShowTransition
+                # 隐藏页不会出现在视频中，取消隐藏以保证索引与页码一一对应
+                transition.Hidden = 0
+                transition.AdvanceOnTime = MSO_TRUE
+                transition.AdvanceTime = timing.advance_ms / 1000.0
+
+            # 每页都已设置自动换片时间，默认时长参数不会生效
+            deck.CreateVideo(output_video, True, 5, vert_resolution, frames_per_second, self.quality)
+            result = self.waiter.wait(ComVideoStatusProvider(deck), output_video)
+            return result.state == "done"
+        finally:
+            deck.Close()
+            remove_temp_file(temp_pptx)
+
+
+class FakeDeckRenderer(DeckRenderer):
+    """用于测试的假渲染器：每帧写一行页码，不依赖PowerPoint"""
+
+    def render_deck(self, output_video, timings, vert_resolution, frames_per_second):
+        index = TimestampIndex.from_timings(timings)
+        frame_count = int(index.total_ms * frames_per_second // 1000)
+        with open(output_video, "w", encoding="utf-8") as f:
+            f.write(f"FAKEVIDEO {vert_resolution} {frames_per_second}\n")
+            for frame in range(frame_count):
+                f.write(f"{index.slide_at(frame * 1000.0 / frames_per_second)}\n")
+        return True
+
+
+class FakeSplitter(VideoSplitter):
+    """与FakeDeckRenderer配套的切分器，按帧时间切出对应的行"""
+
+    def split(self, video_path, segment, output_path):
+        with open(video_path, "r", encoding="utf-8") as f:
+            header = f.readline()
+            frames = f.read().splitlines()
+        fps = float(header.split()[2])
+        first = int(segment.start_ms * fps // 1000)
+        last = int(segment.end_ms * fps // 1000)
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(header)
+            for frame in frames[first:last]:
+                f.write(frame + "\n")
+
+
+class WholeDeckExporter:
+    """整体导出：渲染一次，再按时间戳索引切分为单页视频"""
+
+    def __init__(self, renderer, splitter, work_dir=None):
+        self.renderer = renderer
+        self.splitter = splitter
+        self.work_dir = work_dir or tempfile.gettempdir()
+
+    def export(self, timings, output_paths, vert_resolution=1080, frames_per_second=30,
+               progress_callback=None, is_cancelled=None):
+        """导出所有页，返回成功导出的页码列表"""
+        is_cancelled = is_cancelled or (lambda: False)
+        index = TimestampIndex.from_timings(timings)
+        deck_video = os.path.normpath(os.path.join(self.work_dir, f"temp_deck_{uuid.uuid4().hex}.wmv"))
+
+        if progress_callback:
+            progress_callback(f"正在整体渲染演示文稿，总时长{index.total_ms / 1000.0:.1f}秒...")
+
+        exported = []
+        try:
+            if not self.renderer.render_deck(deck_video, timings, vert_resolution, frames_per_second):
+                return exported
+
+            # 只切分需要输出的页（其余页可能已从缓存取得）
+            total = len(output_paths)
+            for segment in index.segments:
+                if is_cancelled():
+                    break
+                if segment.index not in output_paths:
+                    continue
+                output_path = output_paths[segment.index]
+                try:
+                    self.splitter.split(deck_video, segment, output_path)
+                    exported.append(segment.index)
+                    if progress_callback:
+                        progress_callback(f"第{segment.index}页导出完成 ({len(exported)}/{total})")
+                except Exception as e:
+                    if progress_callback:
+                        progress_callback(f"第{segment.index}页切分失败: {e} ({segment.index}/{total})")
+            return exported
+        finally:
+            remove_temp_file(deck_video)
@@ -0,0 +1,791 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import threading
+import multiprocessing
+
+from backends import DEFAULT_BACKEND
+from batch_queue import DEFAULT_JOB_OPTIONS
+from converter import build_render_params
+from duration_planner import plan_durations
+from fast_path import PATH_FAST, PATH_FULL, static_slide_durations
+from manifest import (Manifest, ORIGIN_CACHE, ORIGIN_DUPLICATE, ORIGIN_RENDER, ORIGIN_RESUME, STATE_DONE, STATE_FAILED,
+                      STATE_PENDING)
+from output_profiles import resolve_profile
+from pipeline import DEFAULT_CONCURRENCY, STAGE_RENDER, SlideExportPipeline
+from pptx_index import PptxIndex
+from progress_events import DECK_FINISHED, DECK_STARTED, MESSAGE, SLIDE_DONE, SLIDE_FAILED, ProgressEvent
+from render_cache import RenderCache, clone_file, compute_slide_digests, slide_cache_keys
+from resource_governor import ResourceGovernor, describe_decision
+from slide_selection import format_slide_ranges, select_slides
+
+
+# 共享目录结构：
+#   decks/<编号>/deck.json     协调节点写入的转换计划（最后写入，工作节点只处理有该文件的目录）
+#   decks/<编号>/source.pptx   演示文稿副本，各节点从这里打开
+#   decks/<编号>/leases/<页码>.lease         租约，用O_EXCL创建，同一时间只有一个节点能持有
+#   decks/<编号>/done/<页码>.json            已发布到输出目录的页
+#   decks/<编号>/errors/<页码>.<随机>.json   每次导出失败一个文件
+#   decks/<编号>/stale/<页码>.<随机>.lease   被收回的过期租约（持有者失联），与导出失败一样计为一次尝试
+#   decks/<编号>/result.json   协调节点汇总后写入，之后工作节点不再处理该文件
+# 只依赖同一文件系统上的O_EXCL创建和原子改名，不使用文件锁（网络文件系统上的锁和SQLite都不可靠）。
+DECKS_DIR = "decks"
+DECK_FILE = "deck.json"
+SOURCE_NAME = "source.pptx"
+RESULT_FILE = "result.json"
+LEASES_DIR = "leases"
+DONE_DIR = "done"
+ERRORS_DIR = "errors"
+STALE_DIR = "stale"
+DECK_VERSION = 1
+
+# 租约有效期（秒）：持有者每隔三分之一有效期续约一次，超过有效期未续约的页可以被其他节点收回
+DEFAULT_LEASE_SECONDS = 60
+# 判断租约过期时额外等待的秒数，容忍各节点时钟的偏差；各节点的时钟应同步（NTP），偏差远小于该值
+CLOCK_SKEW_ALLOWANCE = 10
+# 一页最多尝试的次数（导出失败和持有者失联都算一次），用完后该页记为失败
+DEFAULT_MAX_ATTEMPTS = 3
+# 工作节点一次领取的页数，同一流水线中准备下一页与渲染当前页重叠
+DEFAULT_PREFETCH = 2
+# 协调节点检查进度、空闲的工作节点查找新任务的间隔（秒）
+POLL_INTERVAL = 1.0
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再替换，其他节点不会读到写了一半的内容"""
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def read_json(path):
+    """读取JSON文件，不存在、正在写入或损坏时返回None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _slide_of(name, suffix):
+    """从 "<页码>.xxx<suffix>" 形式的文件名中取出页码，临时文件和其他文件返回None"""
+    if not name.endswith(suffix):
+        return None
+    head = name.split(".", 1)[0]
+    return int(head) if head.isdigit() else None
+
+
+def _list_slides(directory, suffix):
+    """目录中每页的文件数 {页码: 数量}"""
+    counts = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return counts
+    for name in names:
+        index = _slide_of(name, suffix)
+        if index is not None:
+            counts[index] = counts.get(index, 0) + 1
+    return counts
+
+
+def _int_keys(mapping):
+    """JSON对象的键是字符串，读回时转换为页码"""
+    return {int(key): value for key, value in (mapping or {}).items()}
+
+
+class Lease:
+    """一页的租约：持有期间由心跳线程续约，导出结束后释放"""
+
+    def __init__(self, deck, slide_index, worker, token, lease_seconds):
+        self.deck = deck
+        self.slide = slide_index
+        self.worker = worker
+        self.token = token
+        self.lease_seconds = lease_seconds
+        self.path = deck.lease_path(slide_index)
+        # 续约时发现租约已被收回
+        self.lost = False
+
+    def record(self):
+        now = time.time()
+        return {"worker": self.worker, "token": self.token, "host": socket.gethostname(), "pid": os.getpid(),
+                "renewed": now, "expires": now + self.lease_seconds}
+
+    def create(self):
+        """用O_EXCL创建租约文件，已存在时返回False"""
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.record(), f)
+        return True
+
+    def renew(self):
+        """续约，返回是否仍持有；租约文件被误收回、尚未被其他节点领取时重新创建"""
+        if self.lost:
+            return False
+        record = read_json(self.path)
+        if record is None and not os.path.exists(self.path) and self.create():
+            return True
+        if record is None or record.get("token") != self.token:
+            # 持有者停顿超过有效期，租约已被其他节点收回；继续导出也不会出错（发布是幂等的），只是重复渲染
+            self.lost = True
+            return False
+        # 先写好临时文件，替换前再确认一次租约仍是自己的：读取和替换之间租约被收回并重新领取时，
+        # 不会用自己的记录覆盖新持有者的租约（只剩替换前一瞬间的窗口）
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.record(), f)
+        record = read_json(self.path)
+        if record is None or record.get("token") != self.token:
+            os.remove(temp_path)
+            self.lost = True
+            return False
+        os.replace(temp_path, self.path)
+        return True
+
+    def release(self):
+        """删除租约文件（只删除自己的）"""
+        record = read_json(self.path)
+        if record is not None and record.get("token") == self.token:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class SharedDeck:
+    """共享目录中的一个文件及其各页的状态，目录结构见本模块开头的说明
+
+    lease_seconds 为本节点配置的租约有效期，用于判断刚创建、还没有写入内容的租约是否过期。
+    """
+
+    def __init__(self, root, deck_id, data, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.root = root
+        self.deck_id = deck_id
+        self.path = os.path.join(root, DECKS_DIR, deck_id)
+        self.data = data
+        self.tasks = list(data["tasks"])
+        self.params = data["params"]
+        self.slide_params = _int_keys(data.get("slide_params"))
+        self.static_durations = _int_keys(data.get("static_durations"))
+        self.expected_durations = _int_keys(data.get("expected_durations"))
+        self.output_paths = {i: self.resolve(path) for i, path in _int_keys(data["output_paths"]).items()}
+        self.max_attempts = data.get("max_attempts", DEFAULT_MAX_ATTEMPTS)
+        self.lease_seconds = lease_seconds
+
+    @classmethod
+    def load(cls, root, deck_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """读取转换计划，还没有写完（或已被删除）时返回None"""
+        data = read_json(os.path.join(root, DECKS_DIR, deck_id, DECK_FILE))
+        if data is None or data.get("version") != DECK_VERSION:
+            return None
+        return cls(root, deck_id, data, lease_seconds)
+
+    def resolve(self, path):
+        """deck.json中共享目录内的路径是相对路径，各节点可以把共享目录挂载在不同位置"""
+        return os.path.normpath(os.path.join(self.root, path))
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.data["pptx_path"]))[0]
+
+    @property
+    def source_path(self):
+        return os.path.join(self.path, SOURCE_NAME)
+
+    @property
+    def output_dir(self):
+        return self.resolve(self.data["output_dir"])
+
+    @property
+    def finalized(self):
+        return os.path.exists(os.path.join(self.path, RESULT_FILE))
+
+    def subdir(self, name):
+        return os.path.join(self.path, name)
+
+    def lease_path(self, slide_index):
+        return os.path.join(self.subdir(LEASES_DIR), f"{slide_index}.lease")
+
+    def done(self):
+        """已完成的页 {页码: 完成记录}"""
+        done = {}
+        for index in _list_slides(self.subdir(DONE_DIR), ".json"):
+            record = read_json(os.path.join(self.subdir(DONE_DIR), f"{index}.json"))
+            if record is not None:
+                done[index] = record
+        return done
+
+    def attempts(self):
+        """每页已用掉的尝试次数：导出失败次数加上租约被收回的次数"""
+        attempts = _list_slides(self.subdir(ERRORS_DIR), ".json")
+        for index, count in _list_slides(self.subdir(STALE_DIR), ".lease").items():
+            attempts[index] = attempts.get(index, 0) + count
+        return attempts
+
+    def last_errors(self):
+        """每页最近一次导出失败的错误信息"""
+        errors = {}
+        directory = self.subdir(ERRORS_DIR)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return errors
+        for name in names:
+            index = _slide_of(name, ".json")
+            record = read_json(os.path.join(directory, name)) if index is not None else None
+            if record is not None and record.get("time", 0) >= errors.get(index, {}).get("time", 0):
+                errors[index] = record
+        return errors
+
+    def states(self):
+        """各页的状态，返回 (已完成 {页码: 记录}, 已失败的页, 租约有效的页, 可以领取的页)"""
+        done = self.done()
+        attempts = self.attempts()
+        leased = set(_list_slides(self.subdir(LEASES_DIR), ".lease"))
+        failed = []
+        running = []
+        claimable = []
+        for index in self.tasks:
+            if index in done:
+                continue
+            # 尝试次数已用完但持有者仍在导出（其租约曾被误收回）时等它结束
+            if index in leased and not self.lease_expired(index):
+                running.append(index)
+            elif attempts.get(index, 0) >= self.max_attempts:
+                failed.append(index)
+            else:
+                claimable.append(index)
+        return done, failed, running, claimable
+
+    def lease_expired(self, slide_index, record=None):
+        """租约已过期；刚用O_EXCL创建还没写入内容的租约按文件修改时间和本节点的租约有效期判断"""
+        path = self.lease_path(slide_index)
+        record = record or read_json(path)
+        now = time.time()
+        if record is None:
+            try:
+                return now > os.path.getmtime(path) + self.lease_seconds + CLOCK_SKEW_ALLOWANCE
+            except OSError:
+                return True
+        return now > record.get("expires", 0) + CLOCK_SKEW_ALLOWANCE
+
+    def try_claim(self, slide_index, worker, lease_seconds):
+        """领取一页，成功时返回Lease；已被其他节点持有时返回None，持有者失联（租约过期）时先收回"""
+        lease = Lease(self, slide_index, worker, uuid.uuid4().hex, lease_seconds)
+        for _ in range(3):
+            if lease.create():
+                return lease
+            record = read_json(lease.path)
+            if not self.lease_expired(slide_index, record):
+                return None
+            self.reclaim(slide_index)
+        return None
+
+    def reclaim(self, slide_index):
+        """把过期的租约改名移到stale目录，多个节点同时收回时只有一个改名成功"""
+        stale_path = os.path.join(self.subdir(STALE_DIR), f"{slide_index}.{uuid.uuid4().hex}.lease")
+        try:
+            os.rename(self.lease_path(slide_index), stale_path)
+        except FileNotFoundError:
+            return
+        moved = read_json(stale_path)
+        if moved is not None and time.time() <= moved.get("expires", 0) + CLOCK_SKEW_ALLOWANCE:
+            # 判断过期之后、改名之前已有其他节点收回并重新领取：移走的是有效的租约，不计入尝试次数，
+            # 其持有者下次续约时会重新创建
+            os.remove(stale_path)
+
+    def record_done(self, slide_index, record):
+        write_json_atomic(os.path.join(self.subdir(DONE_DIR), f"{slide_index}.json"), record)
+
+    def record_error(self, slide_index, record):
+        write_json_atomic(os.path.join(self.subdir(ERRORS_DIR), f"{slide_index}.{uuid.uuid4().hex}.json"), record)
+
+
+def list_decks(root):
+    """共享目录中的文件编号，按提交顺序排列"""
+    try:
+        return sorted(os.listdir(os.path.join(root, DECKS_DIR)))
+    except FileNotFoundError:
+        return []
+
+
+class DistributedWorker:
+    """工作节点：从共享目录领取各文件的页，用逐页导出流水线渲染，结果原子地发布到该文件的输出目录
+
+    backend_factory 创建渲染后端，同一个后端依次打开各文件；prefetch 为一次领取的页数（同一文件）；
+    没有可领取的页超过idle_timeout秒时退出，None为一直等待新文件；resource_limits 见ResourceGovernor，
+    临时文件写在本节点自己的临时目录中，退出时删除。
+    """
+
+    def __init__(self, root, backend_factory, name=None, lease_seconds=DEFAULT_LEASE_SECONDS, prefetch=DEFAULT_PREFETCH,
+                 idle_timeout=None, stage_concurrency=None, progress_callback=None, resource_limits=None):
+        self.root = os.path.abspath(root)
+        self.backend_factory = backend_factory
+        self.name = name or default_worker_name()
+        self.lease_seconds = lease_seconds
+        self.prefetch = max(1, prefetch)
+        self.idle_timeout = idle_timeout
+        self.stage_concurrency = stage_concurrency
+        self.progress_callback = progress_callback
+        self.resource_limits = resource_limits
+        self.governor = None
+        self.backend = None
+        self.open_deck_id = None
+        # 转换计划写入后不再改变，读过的文件和已汇总的文件不再重复读取
+        self.decks = {}
+        self.finished = set()
+        self.held = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.processed = 0
+
+    def report(self, message):
+        if self.progress_callback:
+            self.progress_callback(f"[{self.name}] {message}")
+
+    def heartbeat(self):
+        """心跳线程：定期为持有的租约续约"""
+        while not self.stopped.wait(self.lease_seconds / 3.0):
+            with self.lock:
+                held = list(self.held)
+            for lease in held:
+                try:
+                    if not lease.renew():
+                        self.report(f"{lease.deck.name}第{lease.slide}页的租约已被其他节点收回")
+                except OSError as e:
+                    self.report(f"{lease.deck.name}第{lease.slide}页续约失败: {e}")
+
+    def claim(self):
+        """在最早提交的、还有可领取页的文件中领取最多prefetch页，返回 (SharedDeck, [Lease])"""
+        for deck_id in list_decks(self.root):
+            if deck_id in self.finished:
+                continue
+            deck = self.decks.get(deck_id) or SharedDeck.load(self.root, deck_id, self.lease_seconds)
+            if deck is None:
+                continue
+            if deck.finalized:
+                self.finished.add(deck_id)
+                self.decks.pop(deck_id, None)
+                continue
+            self.decks[deck_id] = deck
+            leases = []
+            for index in deck.states()[3]:
+                lease = deck.try_claim(index, self.name, self.lease_seconds)
+                if lease is not None:
+                    leases.append(lease)
+                    if len(leases) >= self.prefetch:
+                        break
+            if leases:
+                return deck, leases
+        return None, []
+
+    def open_deck(self, deck):
+        """后端打开该文件的副本，切换文件时只关闭演示文稿"""
+        if self.backend is None:
+            self.backend = self.backend_factory()
+            self.backend.temp_dir = self.governor.gate.temp_dir if self.governor else None
+            self.open_deck_id = None
+        if self.open_deck_id != deck.deck_id:
+            if self.open_deck_id is not None:
+                self.backend.close_presentation()
+                self.open_deck_id = None
+            self.backend.open(deck.source_path)
+            self.open_deck_id = deck.deck_id
+        return self.backend
+
+    def close_backend(self):
+        if self.backend is not None:
+            try:
+                self.backend.close()
+            except:
+                pass
+        self.backend = None
+        self.open_deck_id = None
+
+    def render(self, deck, leases, is_cancelled):
+        """导出领取的页，每页结束时写入完成或失败记录并释放租约"""
+        with self.lock:
+            self.held = list(leases)
+        by_slide = {lease.slide: lease for lease in leases}
+        slides = "、".join(str(i) for i in sorted(by_slide))
+
+        def finish(result):
+            lease = by_slide.pop(result.slide)
+            record = {"worker": self.name, "host": socket.gethostname(), "time": time.time()}
+            if result.ok:
+                path = deck.output_paths[result.slide]
+                record.update(path=result.path, seconds=result.seconds, bytes=os.path.getsize(path))
+                deck.record_done(result.slide, record)
+                self.report(f"{deck.name}第{result.slide}页导出完成")
+            else:
+                record.update(error=result.error or "导出失败")
+                deck.record_error(result.slide, record)
+                self.report(f"{deck.name}第{result.slide}页导出失败: {record['error']}")
+            with self.lock:
+                self.held.remove(lease)
+            lease.release()
+            self.processed += 1
+            if self.governor is not None and self.backend is not None:
+                self.governor.poll([self.backend.process_id()])
+
+        try:
+            self.report(f"领取{deck.name}第{slides}页")
+            try:
+                backend = self.open_deck(deck)
+            except Exception as e:
+                self.close_backend()
+                for index in sorted(by_slide):
+                    deck.record_error(index, {"worker": self.name, "host": socket.gethostname(), "time": time.time(),
+                                              "error": f"打开演示文稿失败: {e}"})
+                self.report(f"打开{deck.name}失败: {e}")
+                return
+            os.makedirs(deck.output_dir, exist_ok=True)
+            # 本节点没有ffmpeg时静态页也走完整渲染
+            static_durations = deck.static_durations if type(backend).fast_path_available() else {}
+            # 失败的页释放租约后由任意节点重新领取，次数由租约的max_attempts限制；流水线不再重试，
+            # 否则一页最多会渲染 max_attempts × (retries + 1) 次
+            pipeline = SlideExportPipeline(backend, deck.params, static_durations, self.stage_concurrency,
+                                           slide_params=deck.slide_params, expected_durations=deck.expected_durations,
+                                           retries=0, resources=self.governor.gate if self.governor else None)
+            pipeline.run({i: deck.output_paths[i] for i in by_slide}, on_result=finish, is_cancelled=is_cancelled)
+        finally:
+            # 被取消时未导出的页直接释放，不计为失败
+            for lease in by_slide.values():
+                lease.release()
+            with self.lock:
+                self.held = []
+
+    def run(self, is_cancelled=None):
+        """持续领取并导出，直到被取消或空闲超时，返回处理的页数"""
+        is_cancelled = is_cancelled or (lambda: False)
+        heartbeat = threading.Thread(target=self.heartbeat, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        idle_since = time.monotonic()
+        self.report(f"开始从{self.root}领取任务")
+        max_renders = dict(DEFAULT_CONCURRENCY, **(self.stage_concurrency or {}))[STAGE_RENDER]
+        self.governor = ResourceGovernor(max_renders=max_renders, on_decision=lambda d: self.report(describe_decision(d)),
+                                         **(self.resource_limits or {}))
+        try:
+            while not is_cancelled():
+                deck, leases = self.claim()
+                if not leases:
+                    if self.idle_timeout is not None and time.monotonic() - idle_since >= self.idle_timeout:
+                        break
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                self.render(deck, leases, is_cancelled)
+                idle_since = time.monotonic()
+        finally:
+            self.stopped.set()
+            heartbeat.join()
+            self.close_backend()
+            governor, self.governor = self.governor, None
+            governor.close()
+        if self.processed:
+            self.report(f"资源调节: {governor.format_summary()}")
+        self.report(f"退出，共处理{self.processed}页")
+        return self.processed
+
+
+def _worker_process(root, backend_factory, lease_seconds, idle_timeout, stage_concurrency, stop_event, resource_limits=None,
+                    processed=None):
+    """本机工作进程入口，节点名称为主机名加进程号；处理的页数累加到共享计数processed"""
+    worker = DistributedWorker(root, backend_factory, lease_seconds=lease_seconds, idle_timeout=idle_timeout,
+                               stage_concurrency=stage_concurrency, progress_callback=print, resource_limits=resource_limits)
+    try:
+        worker.run(stop_event.is_set)
+    except KeyboardInterrupt:
+        # Ctrl+C同时发给了子进程，停止由主进程的stop_event通知
+        pass
+    finally:
+        if processed is not None:
+            with processed.get_lock():
+                processed.value += worker.processed
+
+
+def run_workers(root, backend_factory, count=1, lease_seconds=DEFAULT_LEASE_SECONDS, idle_timeout=None,
+                stage_concurrency=None, resource_limits=None):
+    """在本机启动count个工作进程（每个进程一个渲染后端），等待全部退出，返回各进程处理的页数之和；backend_factory必须可以被pickle"""
+    if count <= 1:
+        worker = DistributedWorker(root, backend_factory, lease_seconds=lease_seconds, idle_timeout=idle_timeout,
+                                   stage_concurrency=stage_concurrency, progress_callback=print,
+                                   resource_limits=resource_limits)
+        try:
+            return worker.run()
+        except KeyboardInterrupt:
+            return worker.processed
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    processed = context.Value("i", 0)
+    processes = []
+    for _ in range(count):
+        process = context.Process(target=_worker_process,
+                                  args=(root, backend_factory, lease_seconds, idle_timeout, stage_concurrency, stop_event,
+                                        resource_limits, processed))
+        process.start()
+        processes.append(process)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("正在停止工作进程，已领取未完成的页会释放给其他节点")
+        stop_event.set()
+        for process in processes:
+            process.join()
+    return processed.value
+
+
+class DistributedCoordinator:
+    """协调节点：把文件拆分为逐页任务写入共享目录，等待工作节点完成后在输出目录中写入转换记录
+
+    输出目录必须在所有节点上都能以同一路径访问，最好放在共享目录中（以相对路径记录，各节点的挂载位置可以不同）。
+    渲染缓存只在协调节点上使用：提交时取出命中的页，汇总时存入新渲染的页。
+    lease_seconds 应与工作节点的租约有效期一致，用于判断刚创建的租约是否过期。
+    """
+
+    def __init__(self, root, backend_name=DEFAULT_BACKEND, max_attempts=DEFAULT_MAX_ATTEMPTS, progress_callback=None,
+                 event_callback=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.root = os.path.abspath(root)
+        self.backend_name = backend_name
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.progress_callback = progress_callback
+        self.event_callback = event_callback
+        os.makedirs(os.path.join(self.root, DECKS_DIR), exist_ok=True)
+
+    def report(self, message, deck=None):
+        if self.progress_callback:
+            self.progress_callback(message)
+        self.emit(MESSAGE, deck, text=message)
+
+    def emit(self, kind, deck=None, **data):
+        if self.event_callback:
+            self.event_callback(ProgressEvent(kind, deck=deck, **data))
+
+    def shared_path(self, path):
+        """共享目录内的路径记为相对路径，其他路径保持绝对路径"""
+        path = os.path.normpath(os.path.abspath(path))
+        try:
+            relative = os.path.relpath(path, self.root)
+        except ValueError:
+            # Windows下不在同一个盘
+            return path
+        return path if relative == os.pardir or relative.startswith(os.pardir + os.sep) else relative
+
+    def submit(self, pptx_path, output_dir, options=None):
+        """规划一个文件并写入共享目录，返回文件编号；options与批量任务相同（见batch_queue.DEFAULT_JOB_OPTIONS）
+
+        resume为True时跳过输出目录中上次已完成的页；合并视频不在分布式模式中生成。
+        """
+        options = dict(DEFAULT_JOB_OPTIONS, **(options or {}))
+        pptx_path = os.path.normpath(os.path.abspath(pptx_path))
+        output_dir = os.path.normpath(os.path.abspath(output_dir))
+        pptx_name = os.path.splitext(os.path.basename(pptx_path))[0]
+        output_profile = resolve_profile(options["output_profile"])
+        default_slide_duration = options["default_slide_duration"]
+        params = build_render_params(default_slide_duration, options["vert_resolution"], options["frames_per_second"],
+                                     output_profile, self.backend_name)
+        with PptxIndex(pptx_path) as deck_index:
+            slide_infos = list(deck_index)
+            duration_plan = plan_durations(deck_index, default_slide_duration)
+        slide_params = duration_plan.slide_params(params)
+        selection = select_slides(pptx_path, slide_infos, options["slides"], options["skip_hidden"], options["dedup"],
+                                  params, slide_params)
+        digests = compute_slide_digests(pptx_path)
+        durations = {plan.index: plan.duration_ms / 1000.0 for plan in duration_plan}
+        output_paths = {i: os.path.join(output_dir, f"{pptx_name}_{i}{output_profile.extension}") for i in selection.selected}
+        os.makedirs(output_dir, exist_ok=True)
+
+        # 上次已完成的页和渲染缓存命中的页不再分发
+        manifest = Manifest.load(output_dir) if options["resume"] else None
+        resumed = []
+        selected = None if selection.is_full else selection.selected
+        if manifest is not None:
+            resumed = [i for i in output_paths
+                       if manifest.is_slide_complete(i, digests.get(i), slide_params.get(i, params), output_paths[i])]
+            manifest.start_run(pptx_path, params, len(slide_infos), selected)
+        else:
+            manifest = Manifest.create(output_dir, pptx_path, params, len(slide_infos), selected)
+        # 工作节点都逐页导出，没有ffmpeg的节点静态页也走完整渲染，缓存键按规划的通道计算
+        static_durations = static_slide_durations(slide_infos, default_slide_duration) if options["fast_path"] else {}
+        cached = []
+        cache_keys = {}
+        if options["use_cache"]:
+            routes = {i: PATH_FAST if i in static_durations else PATH_FULL for i in output_paths}
+            cache_keys = slide_cache_keys(digests, params, slide_params, routes)
+            cache = RenderCache()
+            cached = [i for i in selection.unique
+                      if i not in resumed and i in cache_keys and cache.fetch(cache_keys[i], output_paths[i])]
+        tasks = [i for i in selection.unique if i not in resumed and i not in cached]
+        for i in sorted(output_paths):
+            origin = ORIGIN_RESUME if i in resumed else ORIGIN_CACHE if i in cached else None
+            manifest.record_slide(i, STATE_DONE if origin else STATE_PENDING, digests.get(i), slide_params.get(i, params),
+                                  output_paths[i], durations.get(i), origin)
+        manifest.save()
+
+        deck_id = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        deck_path = os.path.join(self.root, DECKS_DIR, deck_id)
+        for name in (LEASES_DIR, DONE_DIR, ERRORS_DIR, STALE_DIR):
+            os.makedirs(os.path.join(deck_path, name))
+        shutil.copyfile(pptx_path, os.path.join(deck_path, SOURCE_NAME))
+        write_json_atomic(os.path.join(deck_path, DECK_FILE), {
+            "version": DECK_VERSION,
+            "pptx_path": pptx_path,
+            "output_dir": self.shared_path(output_dir),
+            "output_paths": {i: self.shared_path(path) for i, path in output_paths.items()},
+            "tasks": tasks,
+            "params": params,
+            "slide_params": {i: value for i, value in slide_params.items() if i in tasks},
+            "static_durations": {i: value for i, value in static_durations.items() if i in tasks},
+            "expected_durations": {i: durations[i] for i in tasks if i in durations},
+            "slide_count": len(slide_infos),
+            "digests": {i: digests.get(i) for i in output_paths},
+            "cache_keys": {i: cache_keys[i] for i in output_paths if i in cache_keys},
+            "durations": {i: durations.get(i) for i in output_paths},
+            "duplicates": selection.duplicates,
+            "selected": selected,
+            "resumed": resumed,
+            "cached": cached,
+            "skipped_hidden": selection.skipped_hidden,
+            "use_cache": options["use_cache"],
+            "max_attempts": self.max_attempts,
+            "coordinator": default_worker_name(),
+            "created": time.time(),
+        })
+        started = {} if selection.is_full else {"selected": format_slide_ranges(selection.selected)}
+        self.emit(DECK_STARTED, pptx_path, slide_count=len(slide_infos), hidden_count=sum(1 for info in slide_infos if info.hidden),
+                  selected_count=len(selection.selected), duplicate_count=len(selection.duplicates),
+                  planned_seconds=duration_plan.total_ms(selection.selected) / 1000.0, output_dir=output_dir,
+                  deck_id=deck_id, **started)
+        skipped = len(output_paths) - len(tasks)
+        self.report(f"已提交{pptx_path}: 分发{len(tasks)}页" + (f"，其余{skipped}页已有结果或复用重复页" if skipped else ""),
+                    pptx_path)
+        if options["combine"]:
+            self.report("分布式模式不生成合并视频，需要时在全部完成后用--combine重新运行（已完成的页会被续传）", pptx_path)
+        return deck_id
+
+    def wait(self, deck_ids=None, is_cancelled=None, poll_interval=POLL_INTERVAL):
+        """等待文件的所有页完成或失败并汇总，返回 {文件编号: 汇总结果}；deck_ids为None时等待共享目录中所有未汇总的文件"""
+        is_cancelled = is_cancelled or (lambda: False)
+        if deck_ids is None:
+            deck_ids = [deck_id for deck_id in list_decks(self.root)
+                        if not os.path.exists(os.path.join(self.root, DECKS_DIR, deck_id, RESULT_FILE))]
+        pending = list(deck_ids)
+        reported = {deck_id: set() for deck_id in pending}
+        progress = {}
+        results = {}
+        while pending and not is_cancelled():
+            for deck_id in list(pending):
+                deck = SharedDeck.load(self.root, deck_id, self.lease_seconds)
+                if deck is None:
+                    pending.remove(deck_id)
+                    continue
+                done, failed, running, claimable = deck.states()
+                self.report_slides(deck, done, failed, reported[deck_id])
+                state = (len(done), len(failed), len(running))
+                if state != progress.get(deck_id):
+                    progress[deck_id] = state
+                    workers = {record.get("worker") for record in done.values()}
+                    self.report(f"{deck.name}: 完成{len(done)}/{len(deck.tasks)}页，失败{len(failed)}页，"
+                                f"正在渲染{len(running)}页，参与节点{len(workers)}个", deck.data["pptx_path"])
+                if not running and not claimable:
+                    results[deck_id] = self.finalize(deck, done, failed)
+                    pending.remove(deck_id)
+            if pending:
+                time.sleep(poll_interval)
+        return results
+
+    def report_slides(self, deck, done, failed, reported):
+        """发送新完成和新失败的页的事件"""
+        errors = None
+        for index in sorted(set(done) | set(failed)):
+            if index in reported:
+                continue
+            reported.add(index)
+            if index in done:
+                record = done[index]
+                self.emit(SLIDE_DONE, deck.data["pptx_path"], slide=index, origin=ORIGIN_RENDER, seconds=record.get("seconds"),
+                          bytes=record.get("bytes"), path=deck.output_paths[index], worker=record.get("worker"))
+            else:
+                errors = errors if errors is not None else deck.last_errors()
+                error = errors.get(index, {}).get("error") or "持有该页的节点失联"
+                self.emit(SLIDE_FAILED, deck.data["pptx_path"], slide=index, error=error)
+                self.report(f"{deck.name}第{index}页失败{deck.max_attempts}次，不再重试: {error}", deck.data["pptx_path"])
+
+    def finalize(self, deck, done, failed):
+        """复用重复页，写入转换记录和渲染缓存，在共享目录中写入汇总结果"""
+        data = deck.data
+        pptx_path = data["pptx_path"]
+        output_paths = deck.output_paths
+        digests = _int_keys(data["digests"])
+        durations = _int_keys(data["durations"])
+        params = data["params"]
+        slide_params = _int_keys(data.get("slide_params"))
+        origins = {i: ORIGIN_RENDER for i in done}
+        origins.update((i, ORIGIN_RESUME) for i in data["resumed"])
+        origins.update((i, ORIGIN_CACHE) for i in data["cached"])
+        for i, source in sorted(_int_keys(data["duplicates"]).items()):
+            if i in origins or source not in origins:
+                continue
+            try:
+                clone_file(output_paths[source], output_paths[i])
+            except OSError as e:
+                self.report(f"第{i}页复用第{source}页的视频失败: {e}", pptx_path)
+                continue
+            origins[i] = ORIGIN_DUPLICATE
+
+        manifest = Manifest.load(deck.output_dir) or Manifest.create(deck.output_dir, pptx_path, params, data["slide_count"],
+                                                                     data.get("selected"))
+        for i in sorted(output_paths):
+            origin = origins.get(i)
+            manifest.record_slide(i, STATE_DONE if origin else STATE_FAILED, digests.get(i), slide_params.get(i, params),
+                                  output_paths[i], durations.get(i), origin)
+        workers = {}
+        for record in done.values():
+            workers[record.get("worker")] = workers.get(record.get("worker"), 0) + 1
+        manifest.data["distributed"] = {"deck_id": deck.deck_id, "workers": workers}
+        manifest.finish_run(len(origins))
+        manifest.save()
+
+        if data.get("use_cache"):
+            cache_keys = _int_keys(data.get("cache_keys"))
+            cache = RenderCache()
+            for i, origin in origins.items():
+                if origin in (ORIGIN_RENDER, ORIGIN_DUPLICATE) and i in cache_keys:
+                    try:
+                        cache.store(cache_keys[i], output_paths[i], source=f"{os.path.basename(pptx_path)}#{i}")
+                    except Exception as e:
+                        print(f"第{i}页写入缓存失败: {e}")
+            cache.prune()
+
+        duplicated = sum(1 for origin in origins.values() if origin == ORIGIN_DUPLICATE)
+        avoided_renders = len(data["skipped_hidden"]) + duplicated + len(data["cached"]) + len(data["resumed"])
+        result = {"pptx_path": pptx_path, "output_dir": deck.output_dir, "success_count": len(origins),
+                  "slide_count": len(output_paths), "failed": sorted(i for i in output_paths if i not in origins),
+                  "workers": workers, "avoided_renders": avoided_renders,
+                  "elapsed": round(time.time() - data["created"], 3), "finished": time.time()}
+        write_json_atomic(os.path.join(deck.path, RESULT_FILE), result)
+        # 各节点不再需要演示文稿副本
+        try:
+            os.remove(deck.source_path)
+        except OSError as e:
+            self.report(f"删除{deck.source_path}失败: {e}", pptx_path)
+        self.emit(DECK_FINISHED, pptx_path, success_count=result["success_count"], slide_count=result["slide_count"],
+                  elapsed=result["elapsed"], output_dir=deck.output_dir, avoided_renders=avoided_renders)
+        self.report(f"{deck.name}完成: 成功导出{result['success_count']}/{result['slide_count']}页到{deck.output_dir}，"
+                    f"由{len(workers)}个节点渲染", pptx_path)
+        return result
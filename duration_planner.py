@@ -0,0 +1,139 @@
+# -*- coding: UTF-8 -*-
+
+import math
+
+from media_probe import probe_member
+
+
+# 决定本页停留时长的因素
+SOURCE_DEFAULT = "default"
+SOURCE_TIMING = "timing"
+SOURCE_ANIMATION = "animation"
+SOURCE_MEDIA = "media"
+SOURCE_LABELS = {SOURCE_DEFAULT: "默认时长", SOURCE_TIMING: "换片时间", SOURCE_ANIMATION: "动画", SOURCE_MEDIA: "音视频"}
+
+
+class SlidePlan:
+    """一页的时长规划（毫秒）：视频时长为切换时长加停留时长"""
+
+    def __init__(self, index, transition_ms, hold_ms, source, advance_after_ms=None, animation_ms=0, media_ms=0):
+        self.index = index
+        self.transition_ms = transition_ms
+        self.hold_ms = hold_ms
+        self.source = source
+        self.advance_after_ms = advance_after_ms
+        self.animation_ms = animation_ms
+        self.media_ms = media_ms
+
+    @property
+    def duration_ms(self):
+        return self.transition_ms + self.hold_ms
+
+    @property
+    def timed(self):
+        """设置了自动换片时间，PowerPoint按该时间换片，不使用默认时长"""
+        return self.advance_after_ms is not None
+
+    def to_dict(self):
+        return dict(self.__dict__, duration_ms=self.duration_ms)
+
+
+def plan_slide(info, default_ms, media_ms=0):
+    """计算一页最短的正确停留时长
+
+    设置了换片时间时按换片时间，动画未播完时PowerPoint会等动画结束；超出换片时间的媒体按作者的设置截断。
+    未设置换片时间时至少停留默认时长，动画或嵌入的音视频更长时延长到播放结束，避免视频被截断。
+    """
+    if info.advance_after_ms is not None:
+        hold_ms, source = info.advance_after_ms, SOURCE_TIMING
+        if info.animation_ms > hold_ms:
+            hold_ms, source = info.animation_ms, SOURCE_ANIMATION
+    else:
+        hold_ms, source = default_ms, SOURCE_DEFAULT
+        if max(info.animation_ms, media_ms) > hold_ms:
+            hold_ms = max(info.animation_ms, media_ms)
+            source = SOURCE_MEDIA if media_ms >= info.animation_ms else SOURCE_ANIMATION
+    return SlidePlan(info.index, info.transition_ms, hold_ms, source, info.advance_after_ms, info.animation_ms, media_ms)
+
+
+def media_duration_ms(zf, info, durations=None):
+    """本页嵌入媒体中最长的播放时长（毫秒，已扣除剪裁）；链接到外部的媒体无法读取，不计入
+
+    durations 为 {媒体部件路径: 毫秒} 的缓存，同一媒体被多页引用时只读取一次。
+    """
+    durations = {} if durations is None else durations
+    longest = 0
+    for target in info.media:
+        if target not in durations:
+            durations[target] = probe_member(zf, target)
+        length = durations[target]
+        if length is None:
+            continue
+        start, end = info.media_trims.get(target, (0, None))
+        end = length if end is None else min(end, length)
+        longest = max(longest, end - start)
+    return longest
+
+
+class DurationPlan:
+    """整个演示文稿各页的时长规划"""
+
+    def __init__(self, slides, default_slide_duration):
+        self.slides = {plan.index: plan for plan in slides}
+        self.default_slide_duration = default_slide_duration
+
+    def __getitem__(self, index):
+        return self.slides[index]
+
+    def __iter__(self):
+        for index in sorted(self.slides):
+            yield self.slides[index]
+
+    def duration_ms(self, index):
+        return self.slides[index].duration_ms
+
+    def total_ms(self, indexes=None):
+        indexes = self.slides if indexes is None else indexes
+        return sum(self.slides[i].duration_ms for i in indexes)
+
+    def render_duration(self, index):
+        """完整渲染时传给CreateVideo的默认时长（整数秒）；与统一的默认时长相同时返回None"""
+        plan = self.slides[index]
+        if plan.timed or plan.source == SOURCE_DEFAULT:
+            return None
+        seconds = int(math.ceil(plan.hold_ms / 1000.0))
+        return seconds if seconds != self.default_slide_duration else None
+
+    def slide_params(self, params):
+        """需要单独设置时长的页的渲染参数 {页码: 参数}，其余页沿用params；同时作为这些页的缓存键和转换记录参数"""
+        result = {}
+        for index in self.slides:
+            seconds = self.render_duration(index)
+            if seconds is not None:
+                result[index] = dict(params, default_slide_duration=seconds)
+        return result
+
+    def summary(self):
+        """按因素统计时长被调整的页，没有调整时返回空字符串"""
+        parts = []
+        for source in (SOURCE_MEDIA, SOURCE_ANIMATION):
+            plans = [plan for plan in self if plan.source == source and not plan.timed]
+            if plans:
+                extra = sum(plan.hold_ms for plan in plans) - len(plans) * self.default_slide_duration * 1000
+                parts.append(f"{len(plans)}页按{SOURCE_LABELS[source]}延长{extra / 1000.0:.1f}秒")
+        shorter = [plan for plan in self if plan.timed and plan.hold_ms < self.default_slide_duration * 1000]
+        if shorter:
+            saved = len(shorter) * self.default_slide_duration * 1000 - sum(plan.hold_ms for plan in shorter)
+            parts.append(f"{len(shorter)}页按换片时间缩短{saved / 1000.0:.1f}秒")
+        return "，".join(parts)
+
+
+def plan_durations(deck_index, default_slide_duration):
+    """根据各页的换片时间、动画时间线和嵌入媒体的时长规划每页视频时长，deck_index为PptxIndex"""
+    default_ms = int(round(default_slide_duration * 1000))
+    media_durations = {}
+    slides = []
+    for info in deck_index:
+        media_ms = media_duration_ms(deck_index.zf, info, media_durations) if info.media else 0
+        slides.append(plan_slide(info, default_ms, media_ms))
+    return DurationPlan(slides, default_slide_duration)
@@ -0,0 +1,66 @@
+# -*- coding: UTF-8 -*-
+
+import time
+
+
+# 导出通道名称
+PATH_FAST = "fast"
+PATH_FULL = "full"
+
+
+def is_static_slide(info):
+    """没有动画（p:timing）、媒体和切换效果的页，视频中每一帧都相同"""
+    return not (info.has_timing or info.has_media or info.has_transition)
+
+
+def static_slide_durations(slide_infos, default_slide_duration):
+    """静态页及其视频时长（秒），返回 {页码: 秒数}"""
+    durations = {}
+    for info in slide_infos:
+        if is_static_slide(info):
+            advance_ms = info.advance_after_ms
+            durations[info.index] = default_slide_duration if advance_ms is None else advance_ms / 1000.0
+    return durations
+
+
+def export_with_fast_path(backend, slide_index, output_path, params, static_duration=None, render_path=None, source=None):
+    """静态页先走快速通道（只渲染一帧），失败时回退到完整渲染；返回 (是否成功, 通道, 耗时秒数)
+
+    快速通道直接编码为output_path；给出render_path时完整渲染写入render_path，由调用方再转码为output_path。
+    source为backend.prepare_slide事先生成的单页文件，为None时由后端自行生成。
+    """
+    start = time.perf_counter()
+    if static_duration is not None:
+        try:
+            if backend.export_static_slide(slide_index, output_path, params, static_duration):
+                return True, PATH_FAST, time.perf_counter() - start
+        except Exception as e:
+            print(f"第{slide_index}页快速导出失败，改为完整渲染: {e}")
+        start = time.perf_counter()
+    ok = backend.render_prepared(slide_index, source, render_path or output_path, params)
+    return ok, PATH_FULL, time.perf_counter() - start
+
+
+class FastPathReport:
+    """统计各页走的导出通道和耗时，估算快速通道节省的时间"""
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, slide_index, path, seconds):
+        self.records.append((slide_index, path, seconds))
+
+    def _times(self, path):
+        return [seconds for _, p, seconds in self.records if p == path]
+
+    def summary(self):
+        """生成可读的统计摘要"""
+        fast_times = self._times(PATH_FAST)
+        full_times = self._times(PATH_FULL)
+        text = f"快速通道{len(fast_times)}页（共{sum(fast_times):.1f}秒），完整渲染{len(full_times)}页（共{sum(full_times):.1f}秒）"
+        if fast_times and full_times:
+            # 按本次完整渲染的平均耗时估算静态页如果走完整渲染需要的时间
+            average_full = sum(full_times) / len(full_times)
+            saved = max(0.0, average_full * len(fast_times) - sum(fast_times))
+            text += f"，估计节省{saved:.1f}秒"
+        return text
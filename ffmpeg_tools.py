@@ -0,0 +1,80 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import shutil
+import subprocess
+
+
+class ToolError(Exception):
+    """外部工具执行失败"""
+    pass
+
+
+class FFmpegError(ToolError):
+    """ffmpeg执行失败"""
+    pass
+
+
+def find_tool(name, extra_paths=()):
+    """查找本地可执行文件"""
+    # 优先使用环境变量指定的路径，其次是程序目录，然后是PATH，最后是常见安装位置
+    env_path = os.environ.get(name.upper() + "_PATH")
+    if env_path and os.path.isfile(env_path):
+        return env_path
+
+    exe_name = name + ".exe" if os.name == "nt" else name
+    local_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), exe_name)
+    if os.path.isfile(local_path):
+        return local_path
+
+    found = shutil.which(name)
+    if found:
+        return found
+
+    for path in extra_paths:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def find_ffmpeg(name="ffmpeg"):
+    """查找本地ffmpeg/ffprobe可执行文件"""
+    return find_tool(name)
+
+
+def run_tool(cmd, timeout=None, error_class=ToolError):
+    """运行外部命令，失败时抛出error_class"""
+    # Windows下不弹出控制台窗口
+    creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            creationflags=creationflags, timeout=timeout)
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", errors="replace").strip()
+        raise error_class(f"{os.path.basename(cmd[0])}执行失败 (返回码 {result.returncode}): {stderr}")
+    return result
+
+
+def run_ffmpeg(args, ffmpeg_path=None):
+    """运行ffmpeg命令，失败时抛出FFmpegError"""
+    ffmpeg_path = ffmpeg_path or find_ffmpeg()
+    if not ffmpeg_path:
+        raise FFmpegError("找不到ffmpeg，请安装ffmpeg或设置FFMPEG_PATH环境变量")
+
+    return run_tool([ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y"] + list(args), error_class=FFmpegError)
+
+
+def encode_still_image(image_path, output_path, duration, vert_resolution, frames_per_second, video_args=None):
+    """把一张静态图片编码为指定时长的视频，每帧内容相同，编码开销很小；video_args为输出格式的视频编码参数"""
+    args = ["-loop", "1", "-framerate", str(frames_per_second), "-i", image_path,
+            "-t", f"{duration:.3f}", "-r", str(frames_per_second),
+            "-vf", f"scale=-2:{vert_resolution},format=yuv420p"]
+    if video_args:
+        args += list(video_args)
+    elif output_path.lower().endswith(".wmv"):
+        args += ["-c:v", "wmv2", "-q:v", "2"]
+    else:
+        args += ["-c:v", "libx264", "-tune", "stillimage", "-preset", "veryfast"]
+    if output_path.lower().endswith(".mp4"):
+        args += ["-movflags", "+faststart"]
+    args.append(output_path)
+    run_ffmpeg(args)
@@ -0,0 +1,671 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import json
+import time
+import queue
+import uuid
+import shutil
+import asyncio
+import tempfile
+import threading
+import urllib.parse
+
+from backends import DEFAULT_BACKEND
+from batch_queue import DEFAULT_JOB_OPTIONS, JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING
+from converter import PPTToVideoConverter
+from output_profiles import get_profile
+from pipeline import parse_concurrency
+from progress_events import (DECK_COMBINED, DECK_STARTED, ENCODE_PROGRESS, RENDER_STARTED, SLIDE_DONE, SLIDE_FAILED,
+                             SLIDE_QUEUED, ProgressEvent, ProgressState)
+from slide_selection import parse_slide_ranges
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 同时处理的文件数（每个工作线程一个转换器和一个PowerPoint）及排队上限，超过上限的上传返回503
+DEFAULT_WORKERS = 1
+DEFAULT_MAX_PENDING = 8
+MAX_UPLOAD_SIZE = 512 * 1024 * 1024
+# 只保留最近这么多个已结束的任务，更早的连同文件一起删除
+MAX_FINISHED_JOBS = 100
+CHUNK_SIZE = 64 * 1024
+# 读取请求头的超时（秒），防止不发完请求的连接一直占用
+HEADER_TIMEOUT = 30
+MAX_HEADERS = 100
+# 客户端等待多久后重试（秒），用于503的Retry-After和SSE的retry
+RETRY_AFTER = 5
+# 每个SSE连接最多积压的事件数；客户端接收太慢时断开，由客户端带Last-Event-ID重连补发
+SSE_QUEUE_SIZE = 256
+SSE_KEEPALIVE = 15
+
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# 任务状态变化事件：job, status, error
+JOB_STATUS = "job_status"
+
+# 单页状态
+SLIDE_PENDING = "pending"
+SLIDE_QUEUED_STATE = "queued"
+SLIDE_RENDERING = "rendering"
+SLIDE_DONE_STATE = "done"
+SLIDE_FAILED_STATE = "failed"
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 206: "Partial Content", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 409: "Conflict", 411: "Length Required", 413: "Payload Too Large",
+               415: "Unsupported Media Type", 416: "Range Not Satisfiable", 431: "Request Header Fields Too Large",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+CONTENT_TYPES = {".wmv": "video/x-ms-wmv", ".mp4": "video/mp4", ".json": "application/json"}
+
+
+class HttpError(Exception):
+    """返回给客户端的错误响应"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class Request:
+    """解析后的请求：方法、路径、查询参数（每个参数取第一个值）和请求头（名称小写）"""
+
+    def __init__(self, method, target, headers):
+        self.method = method.upper()
+        url = urllib.parse.urlsplit(target)
+        self.path = urllib.parse.unquote(url.path)
+        self.query = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+        self.headers = headers
+
+
+def parse_address(value):
+    """解析 host:port 或 port，返回 (host, port)"""
+    host, _, port = value.rpartition(":")
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"无效的监听地址: {value}（格式为 host:port 或 port）")
+    return host or DEFAULT_HOST, int(port)
+
+
+def _parse_bool(value):
+    value = value.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"无效的布尔值: {value}")
+
+
+def parse_job_options(query, defaults=None):
+    """把查询参数转为convert_ppt_to_videos的参数，未给出的参数使用defaults；参数无效时抛出ValueError"""
+    options = dict(DEFAULT_JOB_OPTIONS, resume=False)
+    options.update(defaults or {})
+    integers = {"duration": "default_slide_duration", "resolution": "vert_resolution", "fps": "frames_per_second"}
+    for key, option in integers.items():
+        if key in query:
+            if not query[key].isdigit() or int(query[key]) <= 0:
+                raise ValueError(f"参数{key}应为正整数: {query[key]}")
+            options[option] = int(query[key])
+    flags = {"cache": "use_cache", "fast_path": "fast_path", "combine": "combine", "profile": "profile",
+             "skip_hidden": "skip_hidden", "dedup": "dedup"}
+    for key, option in flags.items():
+        if key in query:
+            options[option] = _parse_bool(query[key])
+    profile_keys = ("format", "codec", "preset", "crf", "bitrate")
+    if any(key in query for key in profile_keys):
+        crf = query.get("crf")
+        if crf is not None and not crf.isdigit():
+            raise ValueError(f"参数crf应为整数: {crf}")
+        options["output_profile"] = get_profile(query.get("format"), query.get("codec"), query.get("preset"),
+                                                int(crf) if crf is not None else None, query.get("bitrate"))
+    if "stages" in query:
+        options["stage_concurrency"] = parse_concurrency(query["stages"]) or None
+    if "slides" in query:
+        options["slides"] = query["slides"] or None
+    return options
+
+
+class ServiceJob:
+    """服务中的一个转换任务；只在事件循环线程中修改，转换线程的事件通过call_soon_threadsafe转交"""
+
+    def __init__(self, job_id, name, job_dir, options):
+        self.id = job_id
+        self.name = name
+        self.job_dir = job_dir
+        self.deck_path = os.path.join(job_dir, name)
+        self.output_dir = os.path.join(job_dir, "output")
+        self.options = options
+        self.status = JOB_PENDING
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.success_count = None
+        # 页码 -> 该页的状态字典
+        self.slides = {}
+        self.combined_path = None
+        self.progress = ProgressState()
+        # 已发送的事件（SSE连接时补发），编码进度只实时推送不保存
+        self.events = []
+        self.subscribers = set()
+        # 运行中的转换器，取消时调用其stop_conversion；cancel_requested由转换线程读取
+        self.converter = None
+        self.cancel_requested = False
+        # 正在下载的视频数，大于0时不会因结束的任务过多而被删除
+        self.downloads = 0
+
+    @property
+    def is_finished(self):
+        return self.status in FINISHED_STATES
+
+    def slide(self, slide_index):
+        return self.slides.setdefault(slide_index, {"status": SLIDE_PENDING})
+
+    def apply(self, event):
+        """根据事件更新任务和各页状态"""
+        kind = event.kind
+        self.progress.apply(event)
+        if kind == DECK_STARTED:
+            slide_count = event.get("slide_count", 0)
+            selected = event.get("selected")
+            for i in parse_slide_ranges(selected, slide_count) if selected else range(1, slide_count + 1):
+                self.slide(i)
+        elif kind == SLIDE_QUEUED:
+            self.slide(event["slide"])["status"] = SLIDE_QUEUED_STATE
+        elif kind == RENDER_STARTED:
+            self.slide(event["slide"])["status"] = SLIDE_RENDERING
+        elif kind == SLIDE_DONE:
+            self.slide(event["slide"]).update(status=SLIDE_DONE_STATE, origin=event.get("origin"),
+                                              seconds=event.get("seconds"), bytes=event.get("bytes"),
+                                              path=event.get("path"))
+        elif kind == SLIDE_FAILED:
+            self.slide(event["slide"]).update(status=SLIDE_FAILED_STATE, error=event.get("error"))
+        elif kind == DECK_COMBINED:
+            self.combined_path = event.get("path")
+        elif kind == JOB_STATUS:
+            self.status = event["status"]
+            if self.status == JOB_RUNNING:
+                self.started = event.time
+            elif self.is_finished:
+                self.finished = event.time
+                self.error = event.get("error")
+                self.success_count = event.get("success_count")
+
+    def publish(self, event):
+        """应用事件并推送给所有SSE连接；积压过多的连接标记为溢出，由其自行断开"""
+        self.apply(event)
+        if event.kind == ENCODE_PROGRESS:
+            event_id = None
+        else:
+            self.events.append(event)
+            event_id = len(self.events)
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.put_nowait((event_id, event))
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.subscribers.discard(subscriber)
+
+    def slide_url(self, slide_index):
+        return f"/jobs/{self.id}/slides/{slide_index}"
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "created": round(self.created, 3),
+            "slide_count": self.progress.slide_count,
+            "finished_slides": self.progress.finished,
+            "failed_slides": self.progress.failed,
+            "percent": self.progress.percent,
+            "url": f"/jobs/{self.id}",
+        }
+
+    def to_dict(self):
+        data = self.summary()
+        slides = []
+        for i in sorted(self.slides):
+            slide = {key: value for key, value in self.slides[i].items() if key != "path"}
+            slide["slide"] = i
+            if slide["status"] == SLIDE_DONE_STATE:
+                slide["url"] = self.slide_url(i)
+            slides.append(slide)
+        data.update(
+            started=round(self.started, 3) if self.started else None,
+            finished=round(self.finished, 3) if self.finished else None,
+            error=self.error,
+            success_count=self.success_count,
+            slides_per_minute=round(self.progress.throughput(), 2),
+            message=self.progress.message,
+            slides=slides,
+            combined_url=f"/jobs/{self.id}/combined" if self.combined_path else None,
+            events_url=f"/jobs/{self.id}/events",
+        )
+        return data
+
+
+class ConversionService:
+    """本地HTTP转换服务：上传PPT创建任务，查询每页进度，用SSE接收实时事件，每页完成后即可下载
+
+    接口：
+      POST   /jobs?name=a.pptx&format=mp4...  请求体为pptx文件，返回202和任务信息
+      GET    /jobs                            任务列表
+      GET    /jobs/{id}                       任务状态和每页进度
+      GET    /jobs/{id}/events                SSE进度事件（支持Last-Event-ID补发）
+      GET    /jobs/{id}/slides/{n}            下载已完成的第n页视频（支持Range）
+      GET    /jobs/{id}/combined              下载合并视频
+      DELETE /jobs/{id}                       取消任务；已结束的任务删除其文件
+      GET    /health                          服务状态
+
+    workers个工作线程各自持有一个转换器（开启会话池），排队和上传中的任务超过max_pending时返回503。
+    """
+
+    def __init__(self, work_dir=None, backend_name=DEFAULT_BACKEND, workers=DEFAULT_WORKERS,
+                 max_pending=DEFAULT_MAX_PENDING, pool_options=None, default_options=None, backend_settings=None,
+                 max_upload_size=MAX_UPLOAD_SIZE):
+        self.owns_work_dir = work_dir is None
+        self.work_dir = os.path.abspath(work_dir) if work_dir else tempfile.mkdtemp(prefix="ppt_service_")
+        self.backend_name = backend_name
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.pool_options = pool_options or {}
+        self.default_options = default_options or {}
+        self.backend_settings = backend_settings or {}
+        self.max_upload_size = max_upload_size
+        self.jobs = {}
+        self.job_queue = queue.Queue()
+        # 正在上传的任务数，与排队的任务一起计入max_pending
+        self.uploading = 0
+        self.threads = []
+        self.loop = None
+        self.server = None
+
+    # ---- 任务执行（工作线程） ----
+
+    def _post(self, job, event):
+        """从转换线程把事件交给事件循环"""
+        try:
+            self.loop.call_soon_threadsafe(self._publish, job, event)
+        except RuntimeError:
+            # 事件循环已关闭（服务正在退出）
+            pass
+
+    def _publish(self, job, event):
+        job.publish(event)
+        if job.is_finished:
+            self._prune_finished()
+
+    def _worker(self, worker_id):
+        converter = PPTToVideoConverter()
+        converter.backend_settings = dict(self.backend_settings)
+        converter.enable_session_pool(**self.pool_options)
+        try:
+            while True:
+                job = self.job_queue.get()
+                if job is None:
+                    break
+                if job.cancel_requested:
+                    continue
+                self._run_job(converter, job, worker_id)
+        finally:
+            converter.shutdown()
+
+    def _run_job(self, converter, job, worker_id):
+        self._post(job, ProgressEvent(JOB_STATUS, job=job.id, status=JOB_RUNNING, worker=worker_id))
+        result = {}
+
+        def on_complete(output_dir, success_count, slide_count):
+            result.update(output_dir=output_dir, success_count=success_count, slide_count=slide_count)
+
+        def on_event(event):
+            # 取消可能在设置job.converter之前、或转换器开始转换（is_converting置为True）之前到达，这里补上停止
+            if job.cancel_requested and converter.is_converting:
+                converter.stop_conversion()
+            self._post(job, event)
+
+        job.converter = converter
+        try:
+            if job.cancel_requested:
+                error = None
+            else:
+                converter.convert_ppt_to_videos(job.deck_path, completion_callback=on_complete, output_dir=job.output_dir,
+                                                backend=self.backend_name, event_callback=on_event, **job.options)
+                error = None if result.get("output_dir") else "转换过程中出错"
+        except Exception as e:
+            error = str(e)
+        finally:
+            job.converter = None
+        if job.cancel_requested:
+            status, error = JOB_CANCELLED, None
+        else:
+            status = JOB_FAILED if error else JOB_DONE
+        self._post(job, ProgressEvent(JOB_STATUS, job=job.id, status=status, error=error,
+                                      success_count=result.get("success_count", 0)))
+
+    # ---- 任务管理（事件循环线程） ----
+
+    def pending_count(self):
+        return sum(1 for job in self.jobs.values() if job.status == JOB_PENDING) + self.uploading
+
+    def _prune_finished(self):
+        finished = sorted((job for job in self.jobs.values() if job.is_finished), key=lambda job: job.finished)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            # 正在下载的任务等下载结束后再删除
+            if not job.downloads:
+                self._remove_job(job)
+
+    def _remove_job(self, job):
+        self.jobs.pop(job.id, None)
+        shutil.rmtree(job.job_dir, ignore_errors=True)
+
+    def cancel_job(self, job):
+        """取消排队或运行中的任务，返回是否已直接结束（运行中的任务在转换线程停止后才结束）"""
+        job.cancel_requested = True
+        if job.status == JOB_PENDING:
+            job.publish(ProgressEvent(JOB_STATUS, job=job.id, status=JOB_CANCELLED))
+            return True
+        if job.converter is not None:
+            job.converter.stop_conversion()
+        return False
+
+    # ---- HTTP ----
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """启动工作线程并开始监听，返回实际监听的端口（port为0时自动分配）"""
+        self.loop = asyncio.get_running_loop()
+        os.makedirs(self.work_dir, exist_ok=True)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(i + 1,), name=f"service-worker-{i + 1}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """停止监听，取消所有任务并等待工作线程退出（退出时关闭各自的PowerPoint）"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for job in list(self.jobs.values()):
+            if not job.is_finished:
+                self.cancel_job(job)
+        for _ in self.threads:
+            self.job_queue.put(None)
+        for thread in self.threads:
+            await self.loop.run_in_executor(None, thread.join)
+        self.threads = []
+        if self.owns_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    async def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT, on_ready=None):
+        port = await self.start(host, port)
+        if on_ready:
+            on_ready(host, port)
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(self.read_request(reader), HEADER_TIMEOUT)
+            if request is not None:
+                await self.dispatch(request, reader, writer)
+        except HttpError as e:
+            await self.send_json(writer, e.status, {"error": e.message}, e.headers)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            try:
+                await self.send_json(writer, 500, {"error": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """读取请求行和请求头；连接直接关闭时返回None"""
+        try:
+            line = await reader.readline()
+        except ValueError:
+            raise HttpError(431, "请求行过长")
+        if not line.strip():
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise HttpError(400, "无效的请求行")
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HttpError(431, "请求头过长")
+            if not line:
+                raise asyncio.IncompleteReadError(b"", None)
+            line = line.decode("latin-1").strip()
+            if not line:
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(431, "请求头过多")
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return Request(parts[0], parts[1], headers)
+
+    async def dispatch(self, request, reader, writer):
+        parts = [part for part in request.path.split("/") if part]
+        if parts == ["health"] and request.method == "GET":
+            return await self.send_json(writer, 200, self.health())
+        if not parts or parts[0] != "jobs":
+            raise HttpError(404, f"未知的路径: {request.path}")
+        if len(parts) == 1:
+            if request.method == "POST":
+                return await self.create_job(request, reader, writer)
+            if request.method == "GET":
+                jobs = sorted(self.jobs.values(), key=lambda job: job.created)
+                return await self.send_json(writer, 200, {"jobs": [job.summary() for job in jobs]})
+            raise HttpError(405, "只支持GET和POST")
+        job = self.jobs.get(parts[1])
+        if job is None:
+            raise HttpError(404, f"任务不存在: {parts[1]}")
+        if len(parts) == 2:
+            if request.method == "GET":
+                return await self.send_json(writer, 200, job.to_dict())
+            if request.method == "DELETE":
+                return await self.delete_job(job, writer)
+            raise HttpError(405, "只支持GET和DELETE")
+        if request.method != "GET":
+            raise HttpError(405, "只支持GET")
+        if parts[2:] == ["events"]:
+            return await self.stream_events(job, request, writer)
+        if parts[2:] == ["combined"]:
+            if not job.combined_path:
+                raise HttpError(409, "合并视频尚未生成")
+            return await self.send_file(writer, request, job.combined_path, job)
+        if len(parts) == 4 and parts[2] == "slides" and parts[3].isdigit():
+            return await self.send_slide(job, int(parts[3]), request, writer)
+        raise HttpError(404, f"未知的路径: {request.path}")
+
+    def health(self):
+        running = sum(1 for job in self.jobs.values() if job.status == JOB_RUNNING)
+        return {"status": "ok", "backend": self.backend_name, "workers": self.workers, "running": running,
+                "pending": self.pending_count(), "max_pending": self.max_pending}
+
+    async def create_job(self, request, reader, writer):
+        """接收上传的pptx并排队；排队已满时在读取请求体之前返回503"""
+        if "content-length" not in request.headers:
+            raise HttpError(411, "需要Content-Length")
+        try:
+            length = int(request.headers["content-length"])
+        except ValueError:
+            raise HttpError(400, "无效的Content-Length")
+        if length <= 0:
+            raise HttpError(400, "请求体为空，请上传pptx文件")
+        if length > self.max_upload_size:
+            raise HttpError(413, f"文件超过上限{self.max_upload_size // (1024 * 1024)}MB")
+        try:
+            options = parse_job_options(request.query, self.default_options)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        if self.pending_count() >= self.max_pending:
+            raise HttpError(503, f"排队的任务已达上限{self.max_pending}，请稍后重试",
+                            {"Retry-After": str(RETRY_AFTER)})
+
+        name = os.path.basename(request.query.get("name", "").replace("\\", "/")) or "deck.pptx"
+        if not name.lower().endswith(".pptx"):
+            name += ".pptx"
+        job_id = uuid.uuid4().hex[:12]
+        job = ServiceJob(job_id, name, os.path.join(self.work_dir, job_id), options)
+        os.makedirs(job.job_dir)
+        self.uploading += 1
+        try:
+            await self.receive_body(reader, job.deck_path, length)
+        except BaseException:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+            raise
+        finally:
+            self.uploading -= 1
+
+        self.jobs[job_id] = job
+        job.publish(ProgressEvent(JOB_STATUS, job=job_id, status=JOB_PENDING))
+        self.job_queue.put(job)
+        await self.send_json(writer, 202, job.to_dict(), {"Location": f"/jobs/{job_id}"})
+
+    async def receive_body(self, reader, path, length):
+        """把请求体分块写入文件，不整体读入内存"""
+        remaining = length
+        with open(path, "wb") as f:
+            while remaining > 0:
+                chunk = await reader.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                if remaining == length and not chunk.startswith(b"PK"):
+                    raise HttpError(415, "上传的文件不是pptx")
+                f.write(chunk)
+                remaining -= len(chunk)
+
+    async def delete_job(self, job, writer):
+        if job.is_finished:
+            self._remove_job(job)
+            return await self.send_json(writer, 200, {"id": job.id, "status": "deleted"})
+        self.cancel_job(job)
+        await self.send_json(writer, 202, job.summary())
+
+    async def send_slide(self, job, slide_index, request, writer):
+        slide = job.slides.get(slide_index)
+        if slide is None:
+            raise HttpError(404, f"第{slide_index}页不存在")
+        if slide["status"] != SLIDE_DONE_STATE or not slide.get("path"):
+            raise HttpError(409, f"第{slide_index}页尚未完成（{slide['status']}）")
+        await self.send_file(writer, request, slide["path"], job)
+
+    async def stream_events(self, job, request, writer):
+        """SSE：先补发Last-Event-ID之后的历史事件，再推送实时事件，任务结束后关闭"""
+        last_id = request.headers.get("last-event-id") or request.query.get("after") or "0"
+        last_id = int(last_id) if last_id.isdigit() else 0
+        subscriber = asyncio.Queue(SSE_QUEUE_SIZE)
+        subscriber.overflowed = False
+        backlog = list(enumerate(job.events[last_id:], last_id + 1))
+        if not job.is_finished:
+            job.subscribers.add(subscriber)
+        try:
+            await self.send_head(writer, 200, {"Content-Type": "text/event-stream; charset=utf-8",
+                                               "Cache-Control": "no-cache"})
+            writer.write(f"retry: {RETRY_AFTER * 1000}\n\n".encode("utf-8"))
+            for event_id, event in backlog:
+                await self.send_event(writer, event_id, event)
+            while not job.is_finished or not subscriber.empty():
+                if subscriber.overflowed and subscriber.empty():
+                    break
+                try:
+                    event_id, event = await asyncio.wait_for(subscriber.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                await self.send_event(writer, event_id, event)
+        finally:
+            job.subscribers.discard(subscriber)
+
+    async def send_event(self, writer, event_id, event):
+        lines = [f"id: {event_id}"] if event_id is not None else []
+        lines += [f"event: {event.kind}", f"data: {event.to_json()}"]
+        writer.write(("\n".join(lines) + "\n\n").encode("utf-8"))
+        await writer.drain()
+
+    async def send_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8"))
+
+    async def send_json(self, writer, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        headers = dict(headers or {}, **{"Content-Type": "application/json; charset=utf-8",
+                                         "Content-Length": str(len(body))})
+        await self.send_head(writer, status, headers)
+        writer.write(body)
+        await writer.drain()
+
+    async def send_file(self, writer, request, path, job=None):
+        """分块发送文件，每块等待客户端接收（drain），慢速下载不会在内存中堆积；支持单个Range
+
+        job为文件所属的任务，下载期间该任务不会被清理。
+        """
+        if job is not None:
+            job.downloads += 1
+            try:
+                return await self.send_file(writer, request, path)
+            finally:
+                job.downloads -= 1
+                self._prune_finished()
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            raise HttpError(404, "文件不存在")
+        start, end, status = 0, size - 1, 200
+        range_header = request.headers.get("range", "")
+        if range_header.startswith("bytes=") and "," not in range_header:
+            first, _, last = range_header[6:].partition("-")
+            try:
+                if first:
+                    start, end = int(first), int(last) if last else size - 1
+                else:
+                    start = max(0, size - int(last))
+            except ValueError:
+                raise HttpError(416, "无效的Range")
+            end = min(end, size - 1)
+            if start > end:
+                raise HttpError(416, "Range超出文件范围", {"Content-Range": f"bytes */{size}"})
+            status = 206
+        headers = {"Content-Type": CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream"),
+                   "Content-Length": str(end - start + 1), "Accept-Ranges": "bytes",
+                   "Content-Disposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(os.path.basename(path))}"}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        with open(path, "rb") as f:
+            f.seek(start)
+            await self.send_head(writer, status, headers)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+                remaining -= len(chunk)
+
+
+def run_service(host=DEFAULT_HOST, port=DEFAULT_PORT, **options):
+    """在当前线程运行服务直到Ctrl+C，options见ConversionService"""
+    service = ConversionService(**options)
+
+    def on_ready(host, port):
+        print(f"转换服务已启动: http://{host}:{port}（工作线程{service.workers}个，最多排队{service.max_pending}个任务）")
+        print(f"工作目录: {service.work_dir}")
+
+    try:
+        asyncio.run(service.serve_forever(host, port, on_ready))
+    except KeyboardInterrupt:
+        print("服务已停止")
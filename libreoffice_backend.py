@@ -0,0 +1,96 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import glob
+import shutil
+import pathlib
+import tempfile
+
+from backends import RenderBackend
+from ffmpeg_tools import ToolError, find_tool, run_tool
+from pptx_index import PptxIndex
+
+
+# LibreOffice在Windows下的常见安装位置
+SOFFICE_PATHS = (
+    r"C:\Program Files\LibreOffice\program\soffice.exe",
+    r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+    "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+)
+
+
+class LibreOfficeRenderBackend(RenderBackend):
+    """使用本地LibreOffice（soffice）栅格化幻灯片，再用ffmpeg把静态画面编码为视频
+
+    soffice先把整个演示文稿导出为PDF（包含隐藏页，保证页码一致），再由pdftoppm按目标分辨率
+    栅格化。动画、切换和媒体不会被渲染，适合在没有PowerPoint的Linux节点上批量处理静态页。
+    """
+
+    def __init__(self, timeout=600):
+        self.timeout = timeout
+        self.soffice = find_tool("soffice", SOFFICE_PATHS) or find_tool("libreoffice")
+        self.pdftoppm = find_tool("pdftoppm")
+        self.work_dir = None
+        self.pdf_path = None
+        self.deck_index = None
+        self.images = {}
+
+    def open(self, pptx_path):
+        if not self.soffice:
+            raise ToolError("找不到LibreOffice（soffice），请安装LibreOffice或设置SOFFICE_PATH环境变量")
+        if not self.pdftoppm:
+            raise ToolError("找不到pdftoppm，请安装poppler-utils或设置PDFTOPPM_PATH环境变量")
+
+        # 放在本次转换的临时目录中，PDF和栅格化的图片计入临时空间预算，异常退出后也会被清理
+        self.work_dir = tempfile.mkdtemp(prefix="soffice_render_", dir=self.temp_dir)
+        self.deck_index = PptxIndex(pptx_path)
+        # 每个实例使用独立的用户配置目录，允许多个soffice同时运行
+        profile_uri = pathlib.Path(self.work_dir, "profile").as_uri()
+        pdf_filter = 'pdf:impress_pdf_Export:{"ExportHiddenSlides":{"type":"boolean","value":"true"}}'
+        with self.profiler.stage("convert_pdf"):
+            run_tool([self.soffice, f"-env:UserInstallation={profile_uri}", "--headless", "--norestore",
+                      "--convert-to", pdf_filter, "--outdir", self.work_dir, pptx_path], timeout=self.timeout)
+
+        pdf_name = os.path.splitext(os.path.basename(pptx_path))[0] + ".pdf"
+        self.pdf_path = os.path.join(self.work_dir, pdf_name)
+        if not os.path.exists(self.pdf_path):
+            raise ToolError(f"LibreOffice未能生成PDF: {pptx_path}")
+
+    def rasterize(self, vert_resolution):
+        """按目标分辨率把PDF的每一页栅格化为PNG，结果按分辨率缓存"""
+        if vert_resolution in self.images:
+            return self.images[vert_resolution]
+        prefix = os.path.join(self.work_dir, f"slide_{vert_resolution}")
+        with self.profiler.stage("rasterize"):
+            run_tool([self.pdftoppm, "-png", "-scale-to-y", str(vert_resolution), "-scale-to-x", "-1",
+                      self.pdf_path, prefix], timeout=self.timeout)
+        # pdftoppm 按页数位数补零，例如 slide_1080-01.png
+        images = sorted(glob.glob(prefix + "-*.png"))
+        self.images[vert_resolution] = images
+        return images
+
+    def export_still(self, slide_index, image_path, vert_resolution):
+        images = self.rasterize(vert_resolution)
+        if slide_index > len(images):
+            raise ToolError(f"PDF中只有{len(images)}页")
+        shutil.copyfile(images[slide_index - 1], image_path)
+
+    def export_slide(self, slide_index, output_path, params):
+        # 本后端只能输出静态画面，每一页都等同于快速通道
+        try:
+            info = self.deck_index.slide(slide_index)
+            duration_ms = info.advance_after_ms
+            if duration_ms is None:
+                duration_ms = params["default_slide_duration"] * 1000
+            return self.export_static_slide(slide_index, output_path, params, duration_ms / 1000.0)
+        except Exception as e:
+            print(f"导出第{slide_index}页时出错: {e}")
+            return False
+
+    def close(self):
+        if self.deck_index:
+            self.deck_index.close()
+            self.deck_index = None
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
@@ -1,69 +1,295 @@
 import os
-import time
-import win32com.client
-
-def export_single_slide_to_video(prs, slide_index, output_wmv):
-    """导出单个幻灯片为视频"""
-    powerpoint = prs.Application
-    single_prs = powerpoint.Presentations.Add()
-    prs.Slides(slide_index).Copy()
-    single_prs.Slides.Paste()
-    temp_pptx = os.path.abspath(f"temp_slide_{slide_index}.pptx")
-    single_prs.SaveAs(temp_pptx)
-    single_prs.CreateVideo(output_wmv, False, 5, 720, 30, 100)
-    while single_prs.CreateVideoStatus != 3:
-        print(f"幻灯片 {slide_index} 转换状态: {single_prs.CreateVideoStatus}")
-        time.sleep(1)
-    single_prs.Close()
-    if os.path.exists(temp_pptx):
-        os.remove(temp_pptx)
-
-def convert_ppt_to_videos(src_pptx):
+import sys
+import argparse
+import multiprocessing
+from backends import BACKENDS, DEFAULT_BACKEND
+from output_profiles import DEFAULT_PROFILE, PRESETS, PROFILES, VIDEO_CODECS, CODEC_COPY, get_profile
+from pipeline import STAGES, parse_concurrency
+from session_pool import DEFAULT_MAX_JOBS
+
+# 转换器、任务队列和HTTP服务在用到时才导入：--info/--plan只读取pptx，不加载渲染相关的模块
+
+def convert_ppt_to_videos(src_pptx, workers=1, resume=False, converter=None):
     """转换PPT为视频"""
-    # 根据pptx文件名创建输出目录
-    pptx_name = os.path.splitext(os.path.basename(src_pptx))[0]
-    output_dir = pptx_name
-    os.makedirs(output_dir, exist_ok=True)
-    
     print(f"输入文件: {src_pptx}")
-    print(f"输出目录: {output_dir}")
     
-    powerpoint = None
-    prs = None
+    def on_complete(output_dir, success_count, slide_count):
+        if output_dir:
+            print(f"\n转换完成！成功导出 {success_count}/{slide_count} 个视频到目录: {output_dir}")
     
-    try:
-        powerpoint = win32com.client.Dispatch('PowerPoint.Application.16')
-        powerpoint.Visible = 1
-        prs = powerpoint.Presentations.Open(src_pptx, WithWindow=False)
-        slide_count = prs.Slides.Count
-        
-        print(f"开始转换，共 {slide_count} 页幻灯片")
-        
-        success_count = 0
-        for i in range(1, slide_count + 1):
-            wmv_path = os.path.abspath(os.path.join(output_dir, f"{pptx_name}_{i}.wmv"))
-            print(f"正在导出第 {i} 页为视频: {wmv_path}")
-            
+    from converter import PPTToVideoConverter
+    converter = converter or PPTToVideoConverter()
+    converter.convert_ppt_to_videos(src_pptx, 5, 720, 30, print, on_complete, workers=workers, resume=resume)
+
+def ask_resume(src_pptx):
+    """输出目录中有未完成的转换记录时，询问是否继续上次的转换"""
+    from manifest import has_unfinished_manifest
+    output_dir = os.path.splitext(os.path.basename(src_pptx))[0]
+    if not has_unfinished_manifest(output_dir):
+        return False
+    while True:
+        choice = input("检测到上次未完成的转换，是否继续并跳过已完成的页？(y/n): ").strip().lower()
+        if choice in ['y', 'yes', '是']:
+            return True
+        elif choice in ['n', 'no', '否']:
+            return False
+        print("请输入 y 或 n")
+
+def ask_worker_count():
+    """询问并行导出的进程数"""
+    max_workers = os.cpu_count() or 1
+    while True:
+        choice = input(f"请输入并行导出的进程数（1-{max_workers}，直接回车为1）: ").strip()
+        if not choice:
+            return 1
+        if choice.isdigit() and 1 <= int(choice) <= max_workers:
+            return int(choice)
+        print(f"请输入1到{max_workers}之间的整数")
+
+def job_options(args):
+    """命令行参数中的转换参数"""
+    output_profile = get_profile(args.format, args.codec, args.preset, args.crf, args.bitrate)
+    return {"default_slide_duration": args.duration, "vert_resolution": args.resolution,
+            "frames_per_second": args.fps, "use_cache": not args.no_cache, "resume": args.resume,
+            "profile": args.profile, "combine": args.combine, "output_profile": output_profile.to_dict(),
+            "stage_concurrency": parse_concurrency(args.stage_concurrency) or None,
+            "slides": args.slides, "skip_hidden": args.skip_hidden, "dedup": args.dedup,
+            "resource_limits": resource_limits(args)}
+
+def resource_limits(args):
+    """命令行中的资源限制（MB）转换为ResourceGovernor的参数（字节），都未指定时返回None"""
+    limits = {"memory_reserve": args.memory_reserve, "max_rss": args.max_rss, "temp_budget": args.temp_budget,
+              "min_temp_free": args.min_temp_free}
+    limits = {name: int(value * 1024 * 1024) for name, value in limits.items() if value is not None}
+    return limits or None
+
+def pool_options(args):
+    return {"max_jobs": args.recycle_after, "visible": args.show_powerpoint}
+
+def run_batch(args):
+    """批量模式：把目录或通配符匹配的文件加入任务队列，再用多个进程处理"""
+    from batch_queue import BatchRunner, JobQueue, collect_decks, format_summary
+    from progress_events import JsonLinesWriter, ProgressEvent
+    decks = collect_decks(args.batch or [])
+    options = job_options(args)
+    # 输出JSON行事件时，标准输出只保留事件，其他信息写到标准错误
+    log_stream = sys.stderr if args.json_events else sys.stdout
+    with JobQueue(args.queue) as job_queue:
+        if args.retry_failed:
+            print(f"已把{job_queue.retry_failed()}个失败的任务重新排队", file=log_stream)
+        for pptx_path in decks:
+            job_queue.enqueue(pptx_path, args.output_dir, options)
+        print(f"找到{len(decks)}个PPT文件，任务队列: {job_queue.db_path}", file=log_stream)
+
+    BatchRunner(args.queue, args.backend, args.concurrency, json_events=args.json_events,
+                pool_options=pool_options(args)).run()
+
+    with JobQueue(args.queue) as job_queue:
+        summary = job_queue.summary()
+    if args.json_events:
+        JsonLinesWriter(sys.stdout)(ProgressEvent("batch_summary", **summary))
+    else:
+        print("\n" + "="*50)
+        print(format_summary(summary))
+
+def serve(args):
+    """服务模式：在本地提供HTTP接口，上传的文件由concurrency个工作线程转换，命令行的转换参数作为默认值"""
+    from http_service import DEFAULT_HOST, DEFAULT_MAX_PENDING, DEFAULT_PORT, parse_address, run_service
+    host, port = parse_address(args.serve or f"{DEFAULT_HOST}:{DEFAULT_PORT}")
+    options = dict(job_options(args), resume=False)
+    max_pending = DEFAULT_MAX_PENDING if args.max_pending is None else args.max_pending
+    run_service(host, port, work_dir=args.service_dir, backend_name=args.backend, workers=args.concurrency,
+                max_pending=max_pending, pool_options=pool_options(args), default_options=options)
+
+def coordinate(args):
+    """分布式模式的协调节点：把--batch中的文件拆分为逐页任务写入共享目录，等待工作节点完成后汇总；
+    不给出--batch时只等待并汇总共享目录中未完成的文件（例如协调节点中断后重新运行）"""
+    from batch_queue import collect_decks
+    from distributed import DEFAULT_LEASE_SECONDS, DistributedCoordinator
+    from progress_events import JsonLinesWriter
+    log_stream = sys.stderr if args.json_events else sys.stdout
+    coordinator = DistributedCoordinator(args.coordinate, args.backend,
+                                         progress_callback=lambda message: print(message, file=log_stream),
+                                         event_callback=JsonLinesWriter(sys.stdout) if args.json_events else None,
+                                         lease_seconds=args.lease_seconds or DEFAULT_LEASE_SECONDS)
+    options = job_options(args)
+    deck_ids = None
+    if args.batch:
+        deck_ids = []
+        used = set()
+        for pptx_path in collect_decks(args.batch):
+            # 不同目录下的同名文件输出到不同的文件夹
+            pptx_name = os.path.splitext(os.path.basename(pptx_path))[0]
+            output_dir = os.path.normpath(os.path.join(os.path.abspath(args.output_dir), pptx_name))
+            candidate, n = output_dir, 2
+            while candidate in used:
+                candidate, n = f"{output_dir}_{n}", n + 1
+            used.add(candidate)
             try:
-                export_single_slide_to_video(prs, i, wmv_path)
-                success_count += 1
-                print(f"第 {i} 页导出完成")
+                deck_ids.append(coordinator.submit(pptx_path, candidate, options))
             except Exception as e:
-                print(f"第 {i} 页导出失败: {e}")
-        
-        print(f"\n转换完成！成功导出 {success_count}/{slide_count} 个视频到目录: {output_dir}")
-        
-    except Exception as e:
-        print(f"转换过程中出现错误: {e}")
-    finally:
-        # 清理资源
-        if prs:
-            prs.Close()
-        if powerpoint:
-            powerpoint.Quit()
+                print(f"{pptx_path}: 无法提交: {e}", file=log_stream)
+    results = coordinator.wait(deck_ids)
+    failed = [result for result in results.values() if result["success_count"] < result["slide_count"]]
+    print(f"\n共{len(results)}个文件，全部页成功{len(results) - len(failed)}个，有页失败{len(failed)}个", file=log_stream)
+    return 1 if failed else 0
+
+def work(args):
+    """分布式模式的工作节点：从共享目录领取页并渲染，--concurrency为本机启动的工作进程数"""
+    import functools
+    from backends import create_backend
+    from converter import PPTToVideoConverter
+    from distributed import DEFAULT_LEASE_SECONDS, run_workers
+    backend_factory = functools.partial(create_backend, args.backend,
+                                        **PPTToVideoConverter().backend_options(args.backend, parallel=True))
+    run_workers(args.work, backend_factory, args.concurrency, args.lease_seconds or DEFAULT_LEASE_SECONDS, args.idle_timeout,
+                parse_concurrency(args.stage_concurrency) or None, resource_limits(args))
+
+def show_decks(args):
+    """--info/--plan：不启动渲染后端，只读取pptx打印页数、时长规划和需要完整渲染的页，有文件无法读取时返回1"""
+    from batch_queue import collect_decks
+    from duration_planner import SOURCE_LABELS, plan_durations
+    from fast_path import static_slide_durations
+    from pptx_index import PptxIndex
+    from progress_events import JsonLinesWriter, ProgressEvent
+    from slide_selection import format_slide_ranges, select_slides
+    details = bool(args.plan)
+    decks = collect_decks(args.plan or args.info)
+    if not decks:
+        print("没有找到pptx文件", file=sys.stderr)
+        return 1
+    write_event = JsonLinesWriter(sys.stdout) if args.json_events else None
+    status = 0
+    for pptx_path in decks:
+        try:
+            with PptxIndex(pptx_path) as deck_index:
+                slide_infos = list(deck_index)
+                duration_plan = plan_durations(deck_index, args.duration)
+            # 渲染参数对各页相同，只需按时长规划区分
+            selection = select_slides(pptx_path, slide_infos, args.slides, args.skip_hidden, args.dedup, {},
+                                      duration_plan.slide_params({}))
+        except ValueError as e:
+            print(f"{pptx_path}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        except Exception as e:
+            print(f"{pptx_path}: 无法读取PPT文件: {e}", file=sys.stderr)
+            status = 1
+            continue
+        static = static_slide_durations(slide_infos, args.duration)
+        hidden_count = sum(1 for info in slide_infos if info.hidden)
+        # 时长和渲染页数都只计算筛选后的页，重复页不需要渲染
+        total_seconds = duration_plan.total_ms(selection.selected) / 1000.0
+        static_count = sum(1 for i in selection.unique if i in static)
+        full_count = len(selection.unique) - static_count
+        if write_event:
+            data = {"path": pptx_path, "slide_count": len(slide_infos), "hidden_count": hidden_count,
+                    "planned_seconds": total_seconds, "static_count": static_count, "full_count": full_count,
+                    "selected": format_slide_ranges(selection.selected), "render_count": len(selection.unique),
+                    "avoided_renders": selection.avoided_renders}
+            if details:
+                data["slides"] = [dict(plan.to_dict(), hidden=info.hidden, fast_path=info.index in static,
+                                       selected=info.index in selection.selected,
+                                       duplicate_of=selection.duplicates.get(info.index))
+                                  for info, plan in zip(slide_infos, duration_plan)]
+            write_event(ProgressEvent("deck_plan", **data))
+            continue
+        print(f"{pptx_path}: 共{len(slide_infos)}页（其中隐藏{hidden_count}页），预计视频总时长{total_seconds:.0f}秒，"
+              f"静态页{static_count}页，需要完整渲染{full_count}页")
+        if selection.summary():
+            print(f"  页面筛选: {selection.summary()}，需要渲染{len(selection.unique)}页")
+        if not details:
+            continue
+        for info, plan in zip(slide_infos, duration_plan):
+            hidden = "（隐藏）" if info.hidden else ""
+            if info.index not in selection.selected:
+                channel = "不输出"
+            elif info.index in selection.duplicates:
+                channel = f"复用第{selection.duplicates[info.index]}页"
+            else:
+                channel = "快速通道" if info.index in static else "完整渲染"
+            print(f"  第{info.index}页{hidden}: {plan.duration_ms / 1000.0:.1f}秒，按{SOURCE_LABELS[plan.source]}，{channel}")
+        if duration_plan.summary():
+            print(f"  时长规划: {duration_plan.summary()}")
+    return status
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PPT转视频工具，不带参数时进入交互模式")
+    parser.add_argument("--batch", nargs="+", metavar="路径", help="批量转换的目录、通配符或文件")
+    parser.add_argument("--info", nargs="+", metavar="路径", help="只显示页数和预计时长，不转换（不启动PowerPoint）")
+    parser.add_argument("--plan", nargs="+", metavar="路径", help="逐页显示时长规划和导出通道，不转换（不启动PowerPoint）")
+    parser.add_argument("--serve", nargs="?", const="", default=None, metavar="地址:端口",
+                        help="以本地HTTP服务方式运行（默认只监听本机），接口和默认端口见http_service.py")
+    parser.add_argument("--coordinate", default=None, metavar="共享目录",
+                        help="分布式模式的协调节点：把--batch中的文件拆分为逐页任务写入共享目录并等待完成")
+    parser.add_argument("--work", default=None, metavar="共享目录",
+                        help="分布式模式的工作节点：从共享目录领取页并渲染，可以在多台机器上同时运行")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="工作节点没有可领取的页超过该秒数时退出（默认一直等待）")
+    parser.add_argument("--lease-seconds", type=float, default=None,
+                        help="工作节点的租约有效期（秒），节点失联超过该时间后其页由其他节点收回；协调节点应使用相同的值（默认值见distributed.py）")
+    parser.add_argument("--service-dir", default=None, help="服务模式保存上传文件和输出视频的目录（默认临时目录，退出时删除）")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="服务模式最多排队的任务数，超过时返回503（默认值见http_service.py）")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时处理的文件数，每个进程（服务模式为线程）一个PowerPoint；工作节点为本机的工作进程数（默认1）")
+    parser.add_argument("--output-dir", default=".", help="输出根目录，每个文件一个子目录（默认当前目录）")
+    parser.add_argument("--queue", default=None, help="任务队列数据库路径（默认在用户缓存目录）")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND, help="渲染后端")
+    parser.add_argument("--duration", type=int, default=5, help="每页默认时长（秒）")
+    parser.add_argument("--resolution", type=int, default=720, help="视频高度")
+    parser.add_argument("--fps", type=int, default=30, help="帧率")
+    parser.add_argument("--format", choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help="输出格式：" + "，".join(f"{name}={profile.label}" for name, profile in PROFILES.items()))
+    parser.add_argument("--codec", choices=sorted(VIDEO_CODECS) + [CODEC_COPY], default=None,
+                        help="覆盖输出格式的视频编码（copy为只重新封装）")
+    parser.add_argument("--preset", choices=PRESETS, default=None, help="编码预设：fast速度优先，small体积优先")
+    parser.add_argument("--crf", type=int, default=None, help="覆盖编码质量（H.264/HEVC为CRF，WMV为-q:v，越大文件越小）")
+    parser.add_argument("--bitrate", default=None, help="使用固定码率代替CRF，例如 2M")
+    parser.add_argument("--slides", default=None, metavar="页码范围", help="只输出这些页，例如 1-10,15 或 3-（到最后一页）")
+    parser.add_argument("--skip-hidden", action="store_true", help="不输出隐藏页")
+    parser.add_argument("--dedup", action="store_true", help="内容相同的页只渲染一次，其余页复用其视频")
+    parser.add_argument("--no-cache", action="store_true", help="不使用渲染缓存")
+    parser.add_argument("--resume", action="store_true", help="跳过输出目录转换记录中已完成且未变化的页")
+    parser.add_argument("--combine", action="store_true", help="另外把每个文件的各页视频拼接为一个带章节的完整视频")
+    parser.add_argument("--profile", action="store_true", help="记录各阶段耗时，写入每个输出目录的profile.csv和profile.json")
+    parser.add_argument("--stage-concurrency", default=None, metavar="阶段=线程数",
+                        help=f"逐页导出流水线各阶段的线程数，例如 prepare=2,post=2（阶段: {', '.join(STAGES)}）")
+    parser.add_argument("--memory-reserve", type=float, default=None, metavar="MB",
+                        help="系统至少保留的可用内存，低于该值时减少同时渲染的页数（默认为总内存的10%%，至少1024MB）")
+    parser.add_argument("--max-rss", type=float, default=None, metavar="MB",
+                        help="本程序及PowerPoint进程合计的内存上限，超过时减少同时渲染的页数（默认不限）")
+    parser.add_argument("--temp-budget", type=float, default=None, metavar="MB",
+                        help="每次转换的临时文件总大小上限，超过时等待其他页的临时文件删除后再生成（默认2048MB，0为不限）")
+    parser.add_argument("--min-temp-free", type=float, default=None, metavar="MB",
+                        help="临时目录所在磁盘至少保留的剩余空间（默认1024MB，0为不检查）")
+    parser.add_argument("--recycle-after", type=int, default=DEFAULT_MAX_JOBS,
+                        help=f"每个PowerPoint实例处理多少个文件后重启（默认{DEFAULT_MAX_JOBS}，0为不按数量重启）")
+    parser.add_argument("--show-powerpoint", action="store_true", help="显示PowerPoint窗口（默认隐藏以减少界面绘制开销）")
+    parser.add_argument("--json-events", action="store_true", help="在标准输出中逐行输出JSON格式的进度事件")
+    parser.add_argument("--retry-failed", action="store_true", help="重新处理队列中失败的任务")
+    args = parser.parse_args(argv)
+    try:
+        get_profile(args.format, args.codec, args.preset, args.crf, args.bitrate)
+        parse_concurrency(args.stage_concurrency)
+        if args.serve:
+            from http_service import parse_address
+            parse_address(args.serve)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
 
 def main():
-    """主函数 - 支持重复使用"""
+    """主函数 - 支持重复使用，多个文件共用已启动的PowerPoint"""
+    from converter import PPTToVideoConverter
+    converter = PPTToVideoConverter()
+    converter.enable_session_pool()
+    try:
+        interactive_loop(converter)
+    finally:
+        converter.shutdown()
+
+def interactive_loop(converter):
+    """交互模式：反复询问文件路径并转换，直到输入quit"""
     while True:
         print("\n" + "="*50)
         print("PPT转视频工具")
@@ -94,7 +320,8 @@ def main():
         src_pptx = os.path.abspath(src_pptx)
         
         # 开始转换
-        convert_ppt_to_videos(src_pptx)
+        resume = ask_resume(src_pptx)
+        convert_ppt_to_videos(src_pptx, ask_worker_count(), resume, converter)
         
         # 询问是否继续
         while True:
@@ -108,4 +335,19 @@ def main():
                 print("请输入 y 或 n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # 打包为EXE后，并行导出的子进程需要此调用
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        args = parse_args()
+        if args.info or args.plan:
+            sys.exit(show_decks(args))
+        if args.coordinate:
+            sys.exit(coordinate(args))
+        if args.work:
+            work(args)
+        elif args.serve is not None:
+            serve(args)
+        else:
+            run_batch(args)
+    else:
+        main()
\ No newline at end of file
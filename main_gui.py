@@ -1,202 +1,92 @@
 # -*- coding: UTF-8 -*-
 
 import os
-import time
 import threading
+import multiprocessing
 import subprocess
-import win32com.client
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
-import uuid
-import tempfile
-import pythoncom
+from pptx_index import PptxIndex
+from backends import DEFAULT_BACKEND
+from batch_queue import JOB_DONE, JobQueue, collect_decks, run_jobs
+from manifest import has_unfinished_manifest
+from output_profiles import DEFAULT_PROFILE, PROFILES
+from progress_events import MESSAGE, EventQueue, ProgressState
+from slide_selection import parse_slide_ranges
 
 
-class PPTToVideoConverter:
-    def __init__(self):
-        self.prs = None
-        self.powerpoint = None
-        self.is_converting = False
-        
-    def export_single_slide_to_video(self, slide_index, output_wmv, default_slide_duration=5, vert_resolution=1080, frames_per_second=30, progress_callback=None):
-        """导出单个幻灯片为视频"""
-        try:
-            # 确保COM库已初始化（可能在不同线程中）
-            try:
-                pythoncom.CoInitialize()
-            except:
-                pass
-            
-            powerpoint = self.prs.Application
-            single_prs = powerpoint.Presentations.Add()
-            self.prs.Slides(slide_index).Copy()
-            single_prs.Slides.Paste()
-            
-            # 使用临时目录和英文文件名避免中文路径问题
-            temp_dir = tempfile.gettempdir()
-            temp_filename = f"temp_slide_{uuid.uuid4().hex}.pptx"
-            temp_pptx = os.path.join(temp_dir, temp_filename)
-            temp_pptx = os.path.normpath(temp_pptx)
-            
-            # 确保输出路径格式正确
-            output_wmv = os.path.normpath(os.path.abspath(output_wmv))
-            
-            single_prs.SaveAs(temp_pptx)
+# GUI中显示的导出模式名称与转换器参数的对应关系
+EXPORT_MODES = {
+    "逐页导出": "per_slide",
+    "整体导出后切分": "whole_deck",
+}
 
-            useTimingsAndNarrations = True
-            defaultSlideDuration = default_slide_duration
-            vertResolution = vert_resolution
-            framesPerSecond = frames_per_second
-            quality = 100
-            single_prs.CreateVideo(output_wmv, useTimingsAndNarrations, defaultSlideDuration, vertResolution, framesPerSecond, quality)
-            
-            while single_prs.CreateVideoStatus != 3:
-                if not self.is_converting:  # 检查是否被取消
-                    break
-                # 减少状态更新频率，避免覆盖主要进度信息
-                time.sleep(2)
-                
-            single_prs.Close()
-            if os.path.exists(temp_pptx):
-                try:
-                    os.remove(temp_pptx)
-                except:
-                    pass
-            return True
-        except Exception as e:
-            print(f"导出第{slide_index}页时出错: {e}")
-            return False
-    
-    def convert_ppt_to_videos(self, pptx_path, default_slide_duration=5, vert_resolution=1080, frames_per_second=30, progress_callback=None, completion_callback=None):
-        """转换PPT为视频"""
-        try:
-            # 初始化COM库
-            pythoncom.CoInitialize()
-            
-            self.is_converting = True
-            
-            # 规范化输入路径
-            pptx_path = os.path.normpath(os.path.abspath(pptx_path))
-            
-            # 检查文件是否存在
-            if not os.path.exists(pptx_path):
-                raise FileNotFoundError(f"文件不存在: {pptx_path}")
-            
-            # 根据pptx文件名创建输出目录
-            pptx_name = os.path.splitext(os.path.basename(pptx_path))[0]
-            output_dir = pptx_name
-            
-            # 确保输出目录路径正确
-            output_dir = os.path.normpath(os.path.abspath(output_dir))
-            os.makedirs(output_dir, exist_ok=True)
-            
-            if progress_callback:
-                progress_callback("正在打开PowerPoint...")
-            
-            # 启动PowerPoint应用程序
-            try:
-                self.powerpoint = win32com.client.Dispatch('PowerPoint.Application.16')
-                self.powerpoint.Visible = 1
-            except Exception as e:
-                raise Exception(f"无法启动PowerPoint应用程序: {e}")
-            
-            # 打开PPT文件
-            try:
-                self.prs = self.powerpoint.Presentations.Open(pptx_path, WithWindow=False)
-            except Exception as e:
-                raise Exception(f"无法打开PPT文件: {e}\n文件路径: {pptx_path}")
-            
-            slide_count = self.prs.Slides.Count
-            
-            if progress_callback:
-                progress_callback(f"开始转换，共{slide_count}页幻灯片")
-            
-            success_count = 0
-            for i in range(1, slide_count + 1):
-                if not self.is_converting:  # 检查是否被取消
-                    break
-                    
-                # 使用英文文件名避免中文路径问题
-                wmv_filename = f"{pptx_name}_{i}.wmv"
-                wmv_path = os.path.join(output_dir, wmv_filename)
-                wmv_path = os.path.normpath(os.path.abspath(wmv_path))
-                
-                if progress_callback:
-                    progress_callback(f"正在导出第{i}页为视频... ({i}/{slide_count})")
-                
-                if self.export_single_slide_to_video(i, wmv_path, default_slide_duration, vert_resolution, frames_per_second, progress_callback):
-                    success_count += 1
-                    if progress_callback:
-                        progress_callback(f"第{i}页导出完成 ({success_count}/{slide_count})")
-                else:
-                    if progress_callback:
-                        progress_callback(f"第{i}页导出失败 ({i}/{slide_count})")
-            
-            self.cleanup()
-            
-            if completion_callback:
-                completion_callback(output_dir, success_count, slide_count)
-                
-        except Exception as e:
-            error_msg = f"转换过程中出错: {str(e)}"
-            print(error_msg)
-            if progress_callback:
-                progress_callback(error_msg)
-            self.cleanup()
-            if completion_callback:
-                completion_callback(None, 0, 0)
-        finally:
-            # 确保COM库被正确反初始化
-            try:
-                pythoncom.CoUninitialize()
-            except:
-                pass
-    
-    def cleanup(self):
-        """清理资源"""
-        try:
-            if self.prs:
-                self.prs.Close()
-        except:
-            pass
-        
-        try:
-            if self.powerpoint:
-                self.powerpoint.Quit()
-        except:
-            pass
-        
-        self.prs = None
-        self.powerpoint = None
-        self.is_converting = False
-    
-    def stop_conversion(self):
-        """停止转换"""
-        self.is_converting = False
+# 界面刷新频率：每帧批量处理队列中的进度事件
+PROGRESS_FPS = 20
+MAX_EVENTS_PER_FRAME = 1000
+
+# 界面内部使用的事件：转换线程结束后由主线程处理
+UI_CONVERSION_COMPLETE = "ui_conversion_complete"
+UI_BATCH_COMPLETE = "ui_batch_complete"
+
+# GUI中显示的渲染后端名称
+RENDER_BACKENDS = {
+    "PowerPoint": "com",
+    "LibreOffice": "libreoffice",
+}
+
+# GUI中显示的输出格式名称
+OUTPUT_FORMATS = {profile.label: name for name, profile in PROFILES.items()}
 
 
 class PPTToVideoGUI:
     def __init__(self):
         self.root = TkinterDnD.Tk()
         self.root.title("PPT转视频工具")
-        self.root.geometry("600x620")
+        self.root.geometry("600x695")
         self.root.resizable(False, False)
         
-        self.converter = PPTToVideoConverter()
+        # 转换器在第一次转换时才创建（见get_converter），窗口不必等待转换相关的模块加载
+        self.converter = None
         self.selected_file = tk.StringVar()
+        # 拖入或选择多个文件时进入批量模式
+        self.batch_files = []
+        self.batch_stopped = False
         self.conversion_thread = None
         self.total_slides = 0
+        # 所选文件的页数（验证页码范围用），进度中的总页数只计本次输出的页
+        self.deck_slide_count = 0
         self.current_slide = 0
+        # 转换线程写入进度事件，主线程按固定频率取出
+        self.events = EventQueue()
+        self.progress_state = ProgressState()
         
         # 添加配置参数变量
         self.default_slide_duration = tk.StringVar(value="5")
         self.vert_resolution = tk.StringVar(value="1080")
         self.frames_per_second = tk.StringVar(value="30")
+        self.export_mode = tk.StringVar(value="逐页导出")
+        self.worker_count = tk.StringVar(value="1")
+        self.use_cache = tk.BooleanVar(value=True)
+        self.combine_video = tk.BooleanVar(value=False)
+        self.slide_range = tk.StringVar(value="")
+        self.skip_hidden = tk.BooleanVar(value=False)
+        self.dedup_slides = tk.BooleanVar(value=False)
+        self.output_format = tk.StringVar(value=PROFILES[DEFAULT_PROFILE].label)
+        self.render_backend = tk.StringVar(value={v: k for k, v in RENDER_BACKENDS.items()}[DEFAULT_BACKEND])
         
         self.setup_ui()
         self.setup_drag_drop()
         
+    def get_converter(self):
+        """第一次转换时导入并创建转换器；多次转换共用已启动的PowerPoint，退出程序时才关闭"""
+        if self.converter is None:
+            from converter import PPTToVideoConverter
+            self.converter = PPTToVideoConverter()
+            self.converter.enable_session_pool()
+        return self.converter
+        
     def setup_ui(self):
         """设置用户界面"""
         # 主框架
@@ -248,18 +138,65 @@ class PPTToVideoGUI:
         self.fps_entry = ttk.Entry(config_frame, textvariable=self.frames_per_second, width=10)
         self.fps_entry.grid(row=1, column=1, padx=(0, 20), sticky=tk.W, pady=(10, 0))
         
+        # 导出模式：逐页导出，或整体渲染一次后切分（需要本地ffmpeg）
+        mode_label = ttk.Label(config_frame, text="导出模式:")
+        mode_label.grid(row=1, column=2, padx=(0, 10), sticky=tk.W, pady=(10, 0))
+        self.mode_combo = ttk.Combobox(config_frame, textvariable=self.export_mode,
+                                       values=list(EXPORT_MODES.keys()), state="readonly", width=12)
+        self.mode_combo.grid(row=1, column=3, padx=(0, 20), sticky=tk.W, pady=(10, 0))
+        
+        # 并行进程数（仅逐页导出模式有效）
+        workers_label = ttk.Label(config_frame, text="并行进程数:")
+        workers_label.grid(row=2, column=0, padx=(0, 10), sticky=tk.W, pady=(10, 0))
+        self.workers_entry = ttk.Entry(config_frame, textvariable=self.worker_count, width=10)
+        self.workers_entry.grid(row=2, column=1, padx=(0, 20), sticky=tk.W, pady=(10, 0))
+        
+        # 渲染缓存：未修改的页直接复用上次的视频
+        self.cache_check = ttk.Checkbutton(config_frame, text="使用渲染缓存", variable=self.use_cache)
+        self.cache_check.grid(row=2, column=2, columnspan=2, sticky=tk.W, pady=(10, 0))
+        
+        # 渲染后端：PowerPoint（完整效果）或LibreOffice+ffmpeg（仅静态画面）
+        backend_label = ttk.Label(config_frame, text="渲染后端:")
+        backend_label.grid(row=3, column=0, padx=(0, 10), sticky=tk.W, pady=(10, 0))
+        self.backend_combo = ttk.Combobox(config_frame, textvariable=self.render_backend,
+                                          values=list(RENDER_BACKENDS.keys()), state="readonly", width=12)
+        self.backend_combo.grid(row=3, column=1, padx=(0, 20), sticky=tk.W, pady=(10, 0))
+        
+        # 另外生成一个拼接好的完整视频，每页一个章节
+        self.combine_check = ttk.Checkbutton(config_frame, text="合并为单个视频（带章节）", variable=self.combine_video)
+        self.combine_check.grid(row=3, column=2, columnspan=2, sticky=tk.W, pady=(10, 0))
+        
+        # 输出格式：除WMV和MP4原始输出外，其余格式在渲染下一页的同时用ffmpeg转码
+        format_label = ttk.Label(config_frame, text="输出格式:")
+        format_label.grid(row=4, column=0, padx=(0, 10), sticky=tk.W, pady=(10, 0))
+        self.format_combo = ttk.Combobox(config_frame, textvariable=self.output_format,
+                                         values=list(OUTPUT_FORMATS.keys()), state="readonly", width=28)
+        self.format_combo.grid(row=4, column=1, columnspan=3, sticky=tk.W, pady=(10, 0))
+        
+        # 页面筛选：页码范围为空时输出全部页；内容相同的页只渲染一次
+        range_label = ttk.Label(config_frame, text="输出页码:")
+        range_label.grid(row=5, column=0, padx=(0, 10), sticky=tk.W, pady=(10, 0))
+        self.range_entry = ttk.Entry(config_frame, textvariable=self.slide_range, width=10)
+        self.range_entry.grid(row=5, column=1, padx=(0, 20), sticky=tk.W, pady=(10, 0))
+        selection_frame = ttk.Frame(config_frame)
+        selection_frame.grid(row=5, column=2, columnspan=2, sticky=tk.W, pady=(10, 0))
+        self.skip_hidden_check = ttk.Checkbutton(selection_frame, text="跳过隐藏页", variable=self.skip_hidden)
+        self.skip_hidden_check.grid(row=0, column=0, padx=(0, 10), sticky=tk.W)
+        self.dedup_check = ttk.Checkbutton(selection_frame, text="重复页只渲染一次", variable=self.dedup_slides)
+        self.dedup_check.grid(row=0, column=1, sticky=tk.W)
+        
         # 参数说明
         config_help_label = ttk.Label(config_frame, 
-                                     text="说明: 放映每张幻灯片的秒数和帧率必须为大于等于0的数字",
+                                     text="说明: 放映每张幻灯片的秒数和帧率必须为大于等于0的数字；输出页码如 1-10,15，留空为全部",
                                      font=("微软雅黑", 8), foreground="gray")
-        config_help_label.grid(row=2, column=0, columnspan=4, pady=(5, 0), sticky=tk.W)
+        config_help_label.grid(row=6, column=0, columnspan=4, pady=(5, 0), sticky=tk.W)
         
         # 重要提示
         warning_frame = ttk.LabelFrame(main_frame, text="⚠️ 重要提示", padding="10")
         warning_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
         
         warning_text = ttk.Label(warning_frame, 
-                                text="转换过程中请勿进行复制粘贴操作（Ctrl+C、Ctrl+V）\n"
+                                text="转换过程中请勿关闭PowerPoint程序\n"
                                      "否则可能导致转换失败！转换期间请耐心等待。", 
                                 font=("微软雅黑", 10), 
                                 foreground="red",
@@ -274,9 +211,13 @@ class PPTToVideoGUI:
         self.start_btn = ttk.Button(control_frame, text="开始导出", command=self.start_conversion)
         self.start_btn.grid(row=0, column=0, padx=(0, 10))
         
+        # 继续按钮：输出目录中有未完成的转换记录时可用，跳过已完成的页
+        self.resume_btn = ttk.Button(control_frame, text="继续", command=lambda: self.start_conversion(resume=True), state="disabled")
+        self.resume_btn.grid(row=0, column=1, padx=(0, 10))
+        
         # 停止按钮
         self.stop_btn = ttk.Button(control_frame, text="停止转换", command=self.stop_conversion, state="disabled")
-        self.stop_btn.grid(row=0, column=1)
+        self.stop_btn.grid(row=0, column=2)
         
         # 进度显示区域
         progress_frame = ttk.LabelFrame(main_frame, text="转换进度", padding="10")
@@ -320,29 +261,56 @@ class PPTToVideoGUI:
         self.file_label.dnd_bind('<<Drop>>', self.on_file_drop)
     
     def on_file_drop(self, event):
-        """处理文件拖拽"""
+        """处理文件拖拽，支持多个文件和文件夹"""
         files = self.root.tk.splitlist(event.data)
         if files:
-            file_path = files[0]
-            if file_path.lower().endswith('.pptx'):
-                # 规范化路径
-                file_path = os.path.normpath(file_path)
-                self.selected_file.set(file_path)
-                self.status_text.set("文件已选择")
+            decks = collect_decks(files)
+            if decks:
+                self.select_files(decks)
             else:
                 messagebox.showerror("错误", "请选择.pptx文件")
     
     def browse_file(self):
         """浏览文件"""
-        file_path = filedialog.askopenfilename(
+        file_paths = filedialog.askopenfilenames(
             title="选择PPT文件",
             filetypes=[("PowerPoint文件", "*.pptx"), ("所有文件", "*.*")]
         )
-        if file_path:
-            # 规范化路径
-            file_path = os.path.normpath(file_path)
-            self.selected_file.set(file_path)
-            self.status_text.set("文件已选择")
+        if file_paths:
+            self.select_files([os.path.normpath(path) for path in file_paths])
+    
+    def select_files(self, file_paths):
+        """选择一个文件时显示页数，多个文件时进入批量模式"""
+        if len(file_paths) == 1:
+            self.batch_files = []
+            self.selected_file.set(file_paths[0])
+            self.load_slide_plan(file_paths[0])
+        else:
+            self.batch_files = list(file_paths)
+            self.selected_file.set(f"已选择{len(file_paths)}个文件: {os.path.basename(file_paths[0])} 等")
+            self.total_slides = 0
+            self.status_text.set(f"批量模式，共{len(file_paths)}个文件，将依次转换并共用一个PowerPoint")
+            self.update_resume_button()
+    
+    def load_slide_plan(self, file_path):
+        """直接读取pptx中的页数，提前规划进度"""
+        try:
+            with PptxIndex(file_path) as deck_index:
+                self.total_slides = self.deck_slide_count = deck_index.slide_count
+                hidden_count = len(deck_index.hidden_slides)
+            self.status_text.set(f"文件已选择，共{self.total_slides}页幻灯片（其中隐藏{hidden_count}页）")
+        except Exception as e:
+            self.total_slides = self.deck_slide_count = 0
+            self.status_text.set(f"文件已选择，但无法读取页数: {e}")
+        self.update_resume_button()
+    
+    def update_resume_button(self):
+        """输出目录中有未完成的转换记录时启用"继续"按钮"""
+        can_resume = False
+        if not self.batch_files and self.selected_file.get():
+            output_dir = os.path.splitext(os.path.basename(self.selected_file.get()))[0]
+            can_resume = has_unfinished_manifest(output_dir)
+        self.resume_btn.config(state="normal" if can_resume else "disabled")
     
     def validate_config(self):
         """验证配置参数"""
@@ -362,18 +330,31 @@ class PPTToVideoGUI:
             if resolution not in [720, 1080]:
                 raise ValueError("分辨率必须为720或1080")
             
+            # 验证并行进程数
+            max_workers = os.cpu_count() or 1
+            if not self.worker_count.get().isdigit() or not 1 <= int(self.worker_count.get()) <= max_workers:
+                raise ValueError(f"并行进程数必须为1到{max_workers}之间的整数")
+            
+            # 验证页码范围（已读取页数时）
+            if self.slide_range.get().strip() and self.deck_slide_count and not self.batch_files:
+                parse_slide_ranges(self.slide_range.get(), self.deck_slide_count)
+            
             return True, duration, resolution, fps
             
         except ValueError as e:
             messagebox.showerror("参数错误", str(e))
             return False, None, None, None
     
-    def start_conversion(self):
-        """开始转换"""
+    def start_conversion(self, resume=False):
+        """开始转换，resume为True时跳过上次已完成的页"""
         if not self.selected_file.get():
             messagebox.showerror("错误", "请先选择PPT文件")
             return
         
+        if self.batch_files:
+            self.start_batch_conversion()
+            return
+        
         file_path = os.path.normpath(self.selected_file.get())
         if not os.path.exists(file_path):
             messagebox.showerror("错误", "选择的文件不存在")
@@ -393,12 +374,11 @@ class PPTToVideoGUI:
             messagebox.showerror("错误", f"无法访问文件，可能是路径或文件名包含特殊字符: {e}")
             return
         
-        # 重要提醒：转换过程中不要使用复制粘贴
+        # 重要提醒：转换过程中不要关闭PowerPoint
         result = messagebox.askokcancel("重要提醒", 
                                       "⚠️ 转换过程中请务必注意：\n\n"
-                                      "1. 请勿进行任何复制粘贴操作（Ctrl+C、Ctrl+V）\n"
-                                      "2. 请勿关闭PowerPoint程序\n"
-                                      "3. 转换期间请耐心等待，不要操作电脑\n\n"
+                                      "1. 请勿关闭PowerPoint程序\n"
+                                      "2. 转换期间请耐心等待\n\n"
                                       "违反以上操作可能导致转换失败！\n\n"
                                       "点击'确定'开始转换，点击'取消'中止操作。",
                                       icon='warning')
@@ -407,26 +387,102 @@ class PPTToVideoGUI:
         
         # 更新UI状态
         self.start_btn.config(state="disabled")
+        self.resume_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
         self.progress_var.set(0)
         self.status_text.set("正在转换...")
         # 显示转换期间的警告提示
-        self.converting_warning.set("⚠️ 转换进行中，请勿进行复制粘贴操作！")
-        # 重置进度计数器
-        self.total_slides = 0
+        self.converting_warning.set("⚠️ 转换进行中，请勿关闭PowerPoint程序！")
+        # 重置进度计数器，总页数在转换前直接从pptx读取
+        self.load_slide_plan(file_path)
         self.current_slide = 0
+        if self.total_slides:
+            self.progress_text.set(f"准备转换，共{self.total_slides}页幻灯片 (0/{self.total_slides})")
         
         # 在新线程中执行转换
         self.conversion_thread = threading.Thread(
-            target=self.converter.convert_ppt_to_videos,
-            args=(file_path, duration, resolution, fps, self.update_progress, self.conversion_complete)
+            target=self.get_converter().convert_ppt_to_videos,
+            args=(file_path, duration, resolution, fps, None, self.conversion_complete,
+                  EXPORT_MODES[self.export_mode.get()], int(self.worker_count.get()), self.use_cache.get(),
+                  RENDER_BACKENDS[self.render_backend.get()]),
+            kwargs={"resume": resume, "event_callback": self.events.put, "combine": self.combine_video.get(),
+                    "output_profile": OUTPUT_FORMATS[self.output_format.get()], **self.selection_options()}
+        )
+        self.conversion_thread.daemon = True
+        self.conversion_thread.start()
+    
+    def selection_options(self):
+        """页面筛选参数：页码范围、跳过隐藏页、重复页只渲染一次"""
+        return {"slides": self.slide_range.get().strip() or None, "skip_hidden": self.skip_hidden.get(),
+                "dedup": self.dedup_slides.get()}
+    
+    def start_batch_conversion(self):
+        """批量转换：所有文件加入任务队列，在后台线程中依次处理"""
+        is_valid, duration, resolution, fps = self.validate_config()
+        if not is_valid:
+            return
+        
+        result = messagebox.askokcancel("重要提醒",
+                                      f"即将批量转换{len(self.batch_files)}个文件。\n\n"
+                                      "转换过程中请勿关闭PowerPoint程序。\n\n"
+                                      "点击'确定'开始转换，点击'取消'中止操作。",
+                                      icon='warning')
+        if not result:
+            return
+        
+        self.start_btn.config(state="disabled")
+        self.resume_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
+        self.progress_var.set(0)
+        self.status_text.set("正在批量转换...")
+        self.converting_warning.set("⚠️ 转换进行中，请勿关闭PowerPoint程序！")
+        self.batch_stopped = False
+        
+        options = {"default_slide_duration": duration, "vert_resolution": resolution,
+                   "frames_per_second": fps, "use_cache": self.use_cache.get(), "combine": self.combine_video.get(),
+                   "output_profile": OUTPUT_FORMATS[self.output_format.get()], **self.selection_options()}
+        # 在主线程中创建转换器，停止按钮随时可以访问它
+        self.get_converter()
+        self.conversion_thread = threading.Thread(
+            target=self.run_batch,
+            args=(list(self.batch_files), options, RENDER_BACKENDS[self.render_backend.get()])
         )
         self.conversion_thread.daemon = True
         self.conversion_thread.start()
     
+    def run_batch(self, file_paths, options, backend_name):
+        """在后台线程中处理本次加入的任务，所有文件共用会话池中的渲染后端"""
+        try:
+            with JobQueue() as job_queue:
+                job_ids = [job_queue.enqueue(path, os.getcwd(), options) for path in file_paths]
+                run_jobs(job_queue, None, backend_name, "gui", self.update_progress,
+                         is_cancelled=lambda: self.batch_stopped, converter=self.converter, job_ids=job_ids,
+                         event_callback=self.events.put)
+                done_count = sum(1 for job_id in job_ids if job_queue.get(job_id)["status"] == JOB_DONE)
+        except Exception as e:
+            self.update_progress(f"批量转换出错: {e}")
+            done_count = 0
+        self.batch_complete(done_count, len(file_paths))
+    
+    def batch_complete(self, done_count, total_count):
+        """批量转换结束（在转换线程中调用）"""
+        self.events.emit(UI_BATCH_COMPLETE, done_count=done_count, total_count=total_count)
+    
+    def on_batch_complete(self, done_count, total_count):
+        self.reset_ui()
+        self.converting_warning.set("")
+        self.status_text.set("批量转换已停止" if self.batch_stopped else "批量转换完成")
+        self.progress_text.set(f"成功转换 {done_count}/{total_count} 个文件")
+        if not self.batch_stopped:
+            self.progress_var.set(100)
+            messagebox.showinfo("批量转换完成", f"成功转换 {done_count}/{total_count} 个文件\n\n"
+                                              f"输出目录位于: {os.getcwd()}")
+    
     def stop_conversion(self):
         """停止转换"""
-        self.converter.stop_conversion()
+        self.batch_stopped = True
+        if self.converter:
+            self.converter.stop_conversion()
         self.reset_ui()
         self.status_text.set("转换已停止")
         # 清除警告提示
@@ -436,38 +492,58 @@ class PPTToVideoGUI:
         self.current_slide = 0
     
     def update_progress(self, message):
-        """更新进度"""
-        self.root.after(0, lambda: self.progress_text.set(message))
-        
-        # 尝试从消息中提取进度信息
-        if "(" in message and "/" in message and ")" in message:
-            try:
-                # 提取 (x/y) 格式的进度
-                progress_part = message[message.find("("):message.find(")")+1]
-                if "/" in progress_part:
-                    current, total = progress_part.strip("()").split("/")
-                    self.current_slide = int(current)
-                    self.total_slides = int(total)
-                    progress_percent = int((int(current) / int(total)) * 100)
-                    self.root.after(0, lambda: self.progress_var.set(progress_percent))
-            except:
-                pass
+        """更新进度文字（可在任意线程中调用）"""
+        self.events.emit(MESSAGE, text=message)
+    
+    def poll_events(self):
+        """每帧取出队列中的所有事件，汇总后只刷新一次界面"""
+        completions = []
+        message_changed = False
+        for event in self.events.drain(MAX_EVENTS_PER_FRAME):
+            if event.kind in (UI_CONVERSION_COMPLETE, UI_BATCH_COMPLETE):
+                completions.append(event)
+            else:
+                self.progress_state.apply(event)
+                message_changed = True
+        
+        if message_changed and self.is_busy():
+            state = self.progress_state
+            if state.slide_count:
+                self.total_slides = state.slide_count
+                self.current_slide = state.finished
+                self.progress_var.set(state.percent)
+                rate = state.throughput()
+                speed = f", {rate:.1f}页/分钟" if rate else ""
+                self.progress_text.set(f"{state.message} - 总进度: {state.finished}/{state.slide_count} ({state.percent}%{speed})")
+            else:
+                self.progress_text.set(state.message)
         
-        # 如果消息包含"导出完成"，更新进度显示
-        if "导出完成" in message and self.total_slides > 0:
-            progress_text = f"{message} - 总进度: {self.current_slide}/{self.total_slides} ({int(self.current_slide/self.total_slides*100)}%)"
-            self.root.after(0, lambda: self.progress_text.set(progress_text))
+        # 结束事件最后处理，避免完成提示被同一帧中的进度信息覆盖
+        for event in completions:
+            if event.kind == UI_CONVERSION_COMPLETE:
+                self.on_conversion_complete(event["output_dir"], event["success_count"], event["total_count"])
+            else:
+                self.on_batch_complete(event["done_count"], event["total_count"])
+        self.root.after(int(1000 / PROGRESS_FPS), self.poll_events)
+    
+    def is_busy(self):
+        return self.conversion_thread is not None and self.conversion_thread.is_alive()
     
     def conversion_complete(self, output_dir, success_count, total_count):
-        """转换完成"""
-        self.root.after(0, lambda: self.reset_ui())
+        """转换完成（在转换线程中调用），排在进度事件之后由主线程处理"""
+        self.events.emit(UI_CONVERSION_COMPLETE, output_dir=output_dir, success_count=success_count, total_count=total_count)
+    
+    def on_conversion_complete(self, output_dir, success_count, total_count):
+        self.reset_ui()
         # 清除警告提示
-        self.root.after(0, lambda: self.converting_warning.set(""))
+        self.converting_warning.set("")
         
         if output_dir and success_count > 0:
-            self.root.after(0, lambda: self.progress_var.set(100))
-            self.root.after(0, lambda: self.progress_text.set(f"转换完成！成功导出 {success_count}/{total_count} 个视频"))
-            self.root.after(0, lambda: self.status_text.set("转换完成"))
+            self.progress_var.set(100)
+            avoided = self.progress_state.avoided_renders
+            saved = f"，避免了{avoided}次渲染" if avoided else ""
+            self.progress_text.set(f"转换完成！成功导出 {success_count}/{total_count} 个视频{saved}")
+            self.status_text.set("转换完成")
             
             # 询问是否打开输出文件夹
             result = messagebox.askyesno("转换完成", 
@@ -475,13 +551,14 @@ class PPTToVideoGUI:
             if result:
                 self.open_output_folder(output_dir)
         else:
-            self.root.after(0, lambda: self.progress_text.set("转换失败或被取消"))
-            self.root.after(0, lambda: self.status_text.set("转换失败"))
+            self.progress_text.set("转换失败或被取消")
+            self.status_text.set("转换失败")
     
     def reset_ui(self):
         """重置UI状态"""
         self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
+        self.update_resume_button()
     
     def open_output_folder(self, output_dir):
         """打开输出文件夹"""
@@ -493,21 +570,25 @@ class PPTToVideoGUI:
     
     def on_closing(self):
         """窗口关闭事件"""
-        if self.converter.is_converting:
+        if self.converter and self.converter.is_converting:
             result = messagebox.askyesno("确认", "转换正在进行中，确定要退出吗？")
             if not result:
                 return
             self.converter.stop_conversion()
         
-        self.converter.cleanup()
+        if self.converter:
+            self.converter.shutdown()
         self.root.destroy()
     
     def run(self):
         """运行应用程序"""
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.poll_events()
         self.root.mainloop()
 
 
 if __name__ == "__main__":
+    # 打包为EXE后，并行导出的子进程需要此调用
+    multiprocessing.freeze_support()
     app = PPTToVideoGUI()
     app.run() 
\ No newline at end of file
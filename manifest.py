@@ -0,0 +1,143 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import json
+import time
+import uuid
+
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# 逐页检查点的最短间隔（秒）：每次保存都重写整个文件，页数很多时每页都保存的总开销随页数平方增长
+CHECKPOINT_INTERVAL = 1.0
+
+# 单页状态
+STATE_PENDING = "pending"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+# 单页结果来源：本次渲染、渲染缓存、上次运行（断点续传）、复用内容相同的页
+ORIGIN_RENDER = "render"
+ORIGIN_CACHE = "cache"
+ORIGIN_RESUME = "resume"
+ORIGIN_DUPLICATE = "duplicate"
+
+
+def manifest_path(output_dir):
+    return os.path.join(output_dir, MANIFEST_NAME)
+
+
+class Manifest:
+    """保存在输出目录中的转换记录，记录每页的内容哈希、渲染参数、输出文件和状态，用于断点续传"""
+
+    def __init__(self, path, data=None):
+        self.path = path
+        self.data = data or {"version": MANIFEST_VERSION, "slides": {}}
+        self.saved_at = None
+
+    @classmethod
+    def load(cls, output_dir):
+        """读取输出目录中的记录，不存在或损坏时返回None"""
+        path = manifest_path(output_dir)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != MANIFEST_VERSION or not isinstance(data.get("slides"), dict):
+            return None
+        return cls(path, data)
+
+    @classmethod
+    def create(cls, output_dir, pptx_path, params, slide_count, selected=None):
+        manifest = cls(manifest_path(output_dir))
+        manifest.start_run(pptx_path, params, slide_count, selected)
+        return manifest
+
+    def start_run(self, pptx_path, params, slide_count, selected=None):
+        """开始新的一次运行，保留已有的单页记录；selected为只输出部分页时的页码列表"""
+        now = time.time()
+        self.data.update({
+            "pptx_path": pptx_path,
+            "params": params,
+            "slide_count": slide_count,
+            "selected": list(selected) if selected is not None else None,
+            "started": now,
+            "finished": None,
+            "success_count": None,
+        })
+        self.data.setdefault("created", now)
+        # 页数减少时去掉多余的记录
+        self.data["slides"] = {key: entry for key, entry in self.data["slides"].items() if int(key) <= slide_count}
+
+    def save(self):
+        """原子写入：先写临时文件再替换，中途崩溃不会留下损坏的记录"""
+        self.data["updated"] = time.time()
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+        self.saved_at = time.perf_counter()
+
+    def checkpoint(self, interval=CHECKPOINT_INTERVAL):
+        """距上次保存超过interval秒时才保存，返回是否已保存；中断时最多丢失这段时间内的记录，续传时重新导出即可"""
+        if self.saved_at is not None and time.perf_counter() - self.saved_at < interval:
+            return False
+        self.save()
+        return True
+
+    def slide(self, slide_index):
+        return self.data["slides"].get(str(slide_index))
+
+    def record_slide(self, slide_index, state, source_hash, params, output_path, duration, origin=None):
+        """更新一页的记录，成功时记录输出文件大小"""
+        size = None
+        if state == STATE_DONE and os.path.exists(output_path):
+            size = os.path.getsize(output_path)
+        self.data["slides"][str(slide_index)] = {
+            "state": state,
+            "source_hash": source_hash,
+            "params": params,
+            "output": os.path.basename(output_path),
+            "size": size,
+            "duration": duration,
+            "origin": origin,
+            "updated": time.time(),
+        }
+
+    def is_slide_complete(self, slide_index, source_hash, params, output_path):
+        """上次已成功导出，且内容、参数和输出文件都没有变化"""
+        entry = self.slide(slide_index)
+        if not entry or entry.get("state") != STATE_DONE:
+            return False
+        if entry.get("source_hash") != source_hash or entry.get("params") != params:
+            return False
+        if entry.get("output") != os.path.basename(output_path) or not os.path.exists(output_path):
+            return False
+        size = entry.get("size")
+        return bool(size) and os.path.getsize(output_path) == size
+
+    def finish_run(self, success_count):
+        self.data["finished"] = time.time()
+        self.data["success_count"] = success_count
+
+    def counts(self):
+        """各状态的页数"""
+        counts = {}
+        for entry in self.data["slides"].values():
+            counts[entry["state"]] = counts.get(entry["state"], 0) + 1
+        return counts
+
+    @property
+    def is_complete(self):
+        selected = self.data.get("selected")
+        if selected is not None:
+            return all((self.slide(i) or {}).get("state") == STATE_DONE for i in selected)
+        slide_count = self.data.get("slide_count") or 0
+        return slide_count > 0 and self.counts().get(STATE_DONE, 0) == slide_count
+
+
+def has_unfinished_manifest(output_dir):
+    """输出目录中是否有未全部完成的转换记录"""
+    manifest = Manifest.load(output_dir)
+    return manifest is not None and not manifest.is_complete
@@ -0,0 +1,268 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import struct
+import zipfile
+
+from zip_writer import member_data_offset
+
+
+# 只读取容器头部的时长字段，不解码音视频；识别不了的格式返回None
+ASF_HEADER_GUID = bytes.fromhex("3026b2758e66cf11a6d900aa0062ce6c")
+ASF_FILE_PROPERTIES_GUID = bytes.fromhex("a1dcab8c47a9cf118ee400c00c205365")
+# MP4/MOV中包含子盒子的容器盒，查找mvhd时只进入这些盒
+MP4_CONTAINER_BOXES = (b"moov",)
+# 查找MP3第一帧时最多跳过的字节数（ID3标签之后的填充等）
+MP3_SYNC_SEARCH = 64 * 1024
+
+# MPEG音频帧头各字段对应的比特率（kbps）和采样率
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+class MemberReader:
+    """只读、可随机访问的zip成员：未压缩的成员直接在压缩包文件中定位，不必从头读取"""
+
+    def __init__(self, zf, info):
+        self.size = info.file_size
+        self.position = 0
+        self.raw = None
+        self.stream = None
+        if info.compress_type == zipfile.ZIP_STORED and zf.filename:
+            self.raw = open(zf.filename, "rb")
+            self.offset = member_data_offset(self.raw, info)
+        else:
+            self.stream = zf.open(info)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for f in (self.raw, self.stream):
+            if f is not None:
+                f.close()
+
+    def seek(self, position):
+        self.position = max(0, min(position, self.size))
+        if self.stream is not None:
+            self.stream.seek(self.position)
+
+    def read(self, length):
+        length = max(0, min(length, self.size - self.position))
+        if self.raw is not None:
+            self.raw.seek(self.offset + self.position)
+            data = self.raw.read(length)
+        else:
+            data = self.stream.read(length)
+        self.position += len(data)
+        return data
+
+
+def _mp4_duration_ms(f, size):
+    """在moov/mvhd中读取时间刻度和时长"""
+    position, end = 0, size
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(16)
+        if len(header) < 8:
+            return None
+        box_size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if box_size == 1:
+            if len(header) < 16:
+                return None
+            box_size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - position
+        if box_size < header_size:
+            return None
+        if box_type in MP4_CONTAINER_BOXES:
+            # 进入容器盒继续查找
+            position, end = position + header_size, position + box_size
+            continue
+        if box_type == b"mvhd":
+            f.seek(position + header_size)
+            data = f.read(32)
+            if data[:1] == b"\x01":
+                timescale, duration = struct.unpack(">IQ", data[20:32])
+            else:
+                timescale, duration = struct.unpack(">II", data[12:20])
+            # 时长全为1表示未知（例如分段MP4）
+            if not timescale or duration in (0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+                return None
+            return duration * 1000 // timescale
+        position += box_size
+    return None
+
+
+def _asf_duration_ms(f, size):
+    """ASF（WMV/WMA）文件属性对象中的播放时长（100纳秒）减去预卷时间（毫秒）"""
+    position = 30
+    while position + 24 <= size:
+        f.seek(position)
+        header = f.read(24)
+        if len(header) < 24:
+            return None
+        object_size = struct.unpack("<Q", header[16:24])[0]
+        if header[:16] == ASF_FILE_PROPERTIES_GUID:
+            data = f.read(64)
+            if len(data) < 64:
+                return None
+            play_duration, _, preroll = struct.unpack("<QQQ", data[40:64])
+            return max(0, play_duration // 10000 - preroll)
+        if object_size < 24:
+            return None
+        position += object_size
+    return None
+
+
+def _riff_chunks(f, size, start=12):
+    """遍历RIFF块，产生 (块类型, 数据位置, 数据长度)"""
+    position = start
+    while position + 8 <= size:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        chunk_id, chunk_size = struct.unpack("<4sI", header)
+        yield chunk_id, position + 8, chunk_size
+        # 块按2字节对齐
+        position += 8 + chunk_size + (chunk_size & 1)
+
+
+def _wav_duration_ms(f, size):
+    byte_rate = None
+    for chunk_id, position, length in _riff_chunks(f, size):
+        if chunk_id == b"fmt ":
+            f.seek(position)
+            byte_rate = struct.unpack("<I", f.read(12)[8:12])[0]
+        elif chunk_id == b"data" and byte_rate:
+            # 流式写入的文件长度字段可能为0或0xFFFFFFFF，此时数据一直到文件末尾
+            if length in (0, 0xFFFFFFFF) or position + length > size:
+                length = size - position
+            return length * 1000 // byte_rate
+    return None
+
+
+def _avi_duration_ms(f, size):
+    """AVI主头（avih）中的每帧微秒数乘以总帧数"""
+    for chunk_id, position, length in _riff_chunks(f, size):
+        if chunk_id != b"LIST":
+            continue
+        f.seek(position)
+        if f.read(4) != b"hdrl":
+            continue
+        for sub_id, sub_position, _ in _riff_chunks(f, position + length, position + 4):
+            if sub_id == b"avih":
+                f.seek(sub_position)
+                data = f.read(20)
+                micro_per_frame, total_frames = struct.unpack("<I", data[:4])[0], struct.unpack("<I", data[16:20])[0]
+                return micro_per_frame * total_frames // 1000
+    return None
+
+
+def _parse_mp3_header(header):
+    """解析MPEG音频帧头，返回 (版本, 层, 比特率kbps, 采样率, 声道模式, 帧长) ，不是有效帧头时返回None"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = {0: 2.5, 2: 2, 3: 1}.get((header[1] >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((header[1] >> 1) & 3)
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 1
+    if layer == 1:
+        frame_length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        coefficient = 72 if layer == 3 and version != 1 else 144
+        frame_length = coefficient * bitrate * 1000 // sample_rate + padding
+    return version, layer, bitrate, sample_rate, header[3] >> 6, frame_length
+
+
+def _mp3_duration_ms(f, size):
+    """VBR文件读取第一帧中的Xing/Info或VBRI帧数，CBR文件按比特率和音频数据长度计算"""
+    f.seek(0)
+    start = 0
+    head = f.read(10)
+    if head[:3] == b"ID3":
+        # ID3v2标签长度为4个7位字节，设置了footer标志时再加10字节
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+    f.seek(start)
+    window = f.read(MP3_SYNC_SEARCH)
+    for offset in range(len(window) - 3):
+        frame = _parse_mp3_header(window[offset:offset + 4])
+        # 连续两个有效帧头才认为找到了帧同步，避免把数据中的0xFF误认为帧头
+        if frame and _parse_mp3_header(window[offset + frame[5]:offset + frame[5] + 4]):
+            break
+    else:
+        return None
+    version, layer, bitrate, sample_rate, channel_mode, _ = frame
+    samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+    data = window[offset:offset + 200]
+    side_info = (32 if channel_mode != 3 else 17) if version == 1 else (17 if channel_mode != 3 else 9)
+    xing = data[4 + side_info:4 + side_info + 12]
+    frames = None
+    if xing[:4] in (b"Xing", b"Info") and struct.unpack(">I", xing[4:8])[0] & 1:
+        frames = struct.unpack(">I", xing[8:12])[0]
+    elif data[36:40] == b"VBRI":
+        frames = struct.unpack(">I", data[50:54])[0]
+    if frames:
+        return frames * samples_per_frame * 1000 // sample_rate
+    audio_size = size - start - offset
+    f.seek(size - 128)
+    if f.read(3) == b"TAG":
+        audio_size -= 128
+    return audio_size * 8 // bitrate
+
+
+def probe_duration_ms(f, size):
+    """按文件头识别格式并读取时长（毫秒），f需支持seek和read"""
+    f.seek(0)
+    head = f.read(16)
+    if len(head) < 16:
+        return None
+    if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+        return _mp4_duration_ms(f, size)
+    if head == ASF_HEADER_GUID:
+        return _asf_duration_ms(f, size)
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return _wav_duration_ms(f, size)
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return _avi_duration_ms(f, size)
+    if head[:3] == b"ID3" or _parse_mp3_header(head[:4]):
+        return _mp3_duration_ms(f, size)
+    return None
+
+
+def probe_file(path):
+    """读取磁盘上媒体文件的时长（毫秒），无法识别或读取失败时返回None"""
+    try:
+        with open(path, "rb") as f:
+            return probe_duration_ms(f, os.path.getsize(path))
+    except (OSError, struct.error, IndexError):
+        return None
+
+
+def probe_member(zf, name):
+    """读取压缩包中媒体部件的时长（毫秒），无法识别或读取失败时返回None"""
+    try:
+        info = zf.getinfo(name)
+        with MemberReader(zf, info) as f:
+            return probe_duration_ms(f, info.file_size)
+    except (KeyError, OSError, zipfile.BadZipFile, struct.error, IndexError):
+        return None
@@ -0,0 +1,167 @@
+# -*- coding: UTF-8 -*-
+
+import collections
+
+
+# 输出容器及扩展名；PowerPoint的CreateVideo按扩展名直接输出WMV或MP4
+CONTAINERS = {"wmv": ".wmv", "mp4": ".mp4"}
+
+PRESET_FAST = "fast"
+PRESET_SMALL = "small"
+PRESETS = (PRESET_FAST, PRESET_SMALL)
+
+# 转码方式：None表示直接使用渲染结果，copy表示只重新封装（不重新编码）
+CODEC_COPY = "copy"
+
+# 可用的视频编码：ffmpeg编码器、可用容器、两种预设下的编码器速度参数和默认质量（CRF或-q:v）
+VideoCodec = collections.namedtuple("VideoCodec", ["encoder", "containers", "speed", "quality", "audio"])
+VIDEO_CODECS = {
+    "h264": VideoCodec("libx264", ("mp4",), {PRESET_FAST: "veryfast", PRESET_SMALL: "slow"},
+                       {PRESET_FAST: 23, PRESET_SMALL: 28}, "aac"),
+    "hevc": VideoCodec("libx265", ("mp4",), {PRESET_FAST: "veryfast", PRESET_SMALL: "slow"},
+                       {PRESET_FAST: 26, PRESET_SMALL: 30}, "aac"),
+    "wmv2": VideoCodec("wmv2", ("wmv",), {}, {PRESET_FAST: 2, PRESET_SMALL: 6}, "wmav2"),
+}
+AUDIO_BITRATES = {PRESET_FAST: "128k", PRESET_SMALL: "96k"}
+# 未指定编码时各容器使用的编码（静态页编码、整体导出切分）
+DEFAULT_CODECS = {"wmv": "wmv2", "mp4": "h264"}
+
+DEFAULT_PROFILE = "wmv"
+
+
+class OutputProfile:
+    """输出格式：容器、编码、码率/CRF和预设
+
+    codec为None时直接使用PowerPoint输出的视频；为copy时用ffmpeg重新封装；其他编码在渲染后由ffmpeg转码。
+    静态页快速通道和整体导出切分总是直接编码为该格式。
+    """
+
+    def __init__(self, name, container="wmv", codec=None, preset=PRESET_FAST, crf=None, bitrate=None,
+                 render_quality=100, label=None):
+        if container not in CONTAINERS:
+            raise ValueError(f"不支持的容器格式: {container}")
+        if preset not in PRESETS:
+            raise ValueError(f"不支持的预设: {preset}")
+        if codec not in (None, CODEC_COPY):
+            if codec not in VIDEO_CODECS:
+                raise ValueError(f"不支持的视频编码: {codec}")
+            if container not in VIDEO_CODECS[codec].containers:
+                raise ValueError(f"{codec}编码不能使用{container}容器")
+        self.name = name
+        self.container = container
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.bitrate = bitrate
+        # 传给CreateVideo的质量参数（1-100）
+        self.render_quality = render_quality
+        self.label = label or name
+
+    @property
+    def extension(self):
+        return CONTAINERS[self.container]
+
+    @property
+    def transcodes(self):
+        """渲染后是否需要经过ffmpeg"""
+        return self.codec is not None
+
+    def video_args(self, still=False):
+        """ffmpeg视频编码参数；codec为None或copy时使用容器的默认编码（用于静态页和切分）"""
+        codec_name = self.codec if self.codec not in (None, CODEC_COPY) else DEFAULT_CODECS[self.container]
+        codec = VIDEO_CODECS[codec_name]
+        args = ["-c:v", codec.encoder]
+        if codec.speed:
+            args += ["-preset", codec.speed[self.preset]]
+        if still and codec.encoder == "libx264":
+            args += ["-tune", "stillimage"]
+        if self.bitrate:
+            args += ["-b:v", self.bitrate]
+        elif codec.encoder == "wmv2":
+            args += ["-q:v", str(self.crf if self.crf is not None else codec.quality[self.preset])]
+        else:
+            args += ["-crf", str(self.crf if self.crf is not None else codec.quality[self.preset])]
+        if codec_name == "hevc":
+            # 苹果设备只识别hvc1标记的HEVC
+            args += ["-tag:v", "hvc1"]
+        if codec.encoder != "wmv2":
+            args += ["-pix_fmt", "yuv420p"]
+        return args
+
+    def audio_args(self):
+        codec_name = self.codec if self.codec not in (None, CODEC_COPY) else DEFAULT_CODECS[self.container]
+        return ["-c:a", VIDEO_CODECS[codec_name].audio, "-b:a", AUDIO_BITRATES[self.preset]]
+
+    def container_args(self):
+        if self.container == "mp4":
+            # moov放在文件开头，上传到CDN后可以边下边播
+            return ["-movflags", "+faststart"]
+        return []
+
+    def encoder_args(self):
+        """完整的编码参数（视频、音频、容器）"""
+        return self.video_args() + self.audio_args() + self.container_args()
+
+    def transcode_args(self):
+        """把渲染结果转为本格式的参数"""
+        if self.codec == CODEC_COPY:
+            return ["-c", "copy"] + self.container_args()
+        return self.encoder_args()
+
+    def to_dict(self):
+        return {"name": self.name, "container": self.container, "codec": self.codec, "preset": self.preset,
+                "crf": self.crf, "bitrate": self.bitrate, "render_quality": self.render_quality}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __repr__(self):
+        return f"OutputProfile({self.to_dict()})"
+
+
+# 预置的输出格式，按界面中的显示顺序排列
+PROFILES = collections.OrderedDict((profile.name, profile) for profile in [
+    OutputProfile("wmv", "wmv", label="WMV（PowerPoint原始输出）"),
+    OutputProfile("mp4", "mp4", label="MP4（PowerPoint直接输出）"),
+    OutputProfile("mp4-fast", "mp4", CODEC_COPY, PRESET_FAST, label="MP4 快速（仅重新封装）"),
+    OutputProfile("mp4-small", "mp4", "h264", PRESET_SMALL, label="MP4 H.264 小文件"),
+    OutputProfile("hevc-small", "mp4", "hevc", PRESET_SMALL, label="MP4 HEVC 更小文件"),
+    OutputProfile("wmv-small", "wmv", "wmv2", PRESET_SMALL, label="WMV 小文件"),
+])
+
+
+def get_profile(name=None, codec=None, preset=None, crf=None, bitrate=None):
+    """按名称获取输出格式，其余参数不为None时覆盖预置值"""
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"未知的输出格式: {name}")
+    data = PROFILES[name].to_dict()
+    overrides = {"codec": codec, "preset": preset, "crf": crf, "bitrate": bitrate}
+    overrides = {key: value for key, value in overrides.items() if value is not None}
+    if overrides:
+        data.update(overrides)
+        data["name"] = "custom"
+    return OutputProfile.from_dict(data)
+
+
+def resolve_profile(value):
+    """把名称、字典（任务队列中保存的格式）或OutputProfile统一转为OutputProfile"""
+    if isinstance(value, OutputProfile):
+        return value
+    if isinstance(value, dict):
+        return OutputProfile.from_dict(value)
+    return get_profile(value)
+
+
+def profile_params(profile):
+    """写入渲染参数的格式信息；默认格式不写入，保证已有的渲染缓存和转换记录仍然有效"""
+    if profile.to_dict() == PROFILES[DEFAULT_PROFILE].to_dict():
+        return {}
+    return {"output_profile": profile.to_dict()}
+
+
+def profile_from_params(params):
+    """从渲染参数中取出输出格式"""
+    data = params.get("output_profile")
+    return OutputProfile.from_dict(data) if data else PROFILES[DEFAULT_PROFILE]
@@ -0,0 +1,622 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import time
+import uuid
+import queue
+import tempfile
+import threading
+import collections
+
+from fast_path import PATH_FULL, export_with_fast_path
+from output_profiles import profile_from_params
+from profiling import NULL_PROFILER
+from resource_governor import remove_temp_file
+from transcode import transcode_video
+from video_verify import verify_video
+
+
+# 相邻阶段之间的队列长度：上游最多领先下游这么多项，临时文件不会无限堆积
+DEFAULT_QUEUE_SIZE = 2
+# 调用线程等待队列的间隔（秒），期间处理已完成的结果
+POLL_INTERVAL = 0.05
+# 渲染或校验失败的页最多重试的次数，第一次重试前等待的秒数，之后每次等待时间乘以RETRY_BACKOFF
+DEFAULT_RETRIES = 2
+RETRY_DELAY = 1.0
+RETRY_BACKOFF = 2.0
+
+# 流水线中一项的最终状态
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+# 一项的处理结果：键（页码）、最后的值、状态、错误信息、结束时所在的阶段
+PipelineResult = collections.namedtuple("PipelineResult", ["key", "value", "status", "error", "stage"])
+
+_STOP = object()
+
+
+class Stage:
+    """流水线的一个阶段：func(key, value) 返回传给下一阶段的值，抛出异常时该项失败，不再进入后续阶段
+
+    concurrency 为该阶段的线程数；为0时在调用run的线程中执行（COM对象只能在创建它的线程中使用），
+    整条流水线最多只能有一个这样的阶段。announce为True时，每项进入该阶段前调用run的on_start。
+    """
+
+    def __init__(self, name, func, concurrency=1, label=None, announce=False):
+        if concurrency < 0:
+            raise ValueError(f"阶段{name}的并发数不能小于0")
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency
+        self.label = label or name
+        self.announce = announce
+
+    @property
+    def inline(self):
+        return self.concurrency == 0
+
+    @property
+    def worker_count(self):
+        return max(1, self.concurrency)
+
+
+class StageMetrics:
+    """一个阶段的统计：处理数量、忙碌时间、输入队列深度、等待输入和等待下游的时间"""
+
+    def __init__(self, name, label, concurrency):
+        self.name = name
+        self.label = label
+        self.concurrency = concurrency
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        # 各线程等待输入的总时间：上游太慢时变大
+        self.starved = 0.0
+        # 输出队列已满、等待下游取走的总时间：下游太慢时变大
+        self.blocked = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self.lock = threading.Lock()
+
+    def add_busy(self, seconds, ok):
+        with self.lock:
+            self.processed += 1
+            self.failed += 0 if ok else 1
+            self.busy += seconds
+
+    def add_starved(self, seconds):
+        with self.lock:
+            self.starved += seconds
+
+    def add_blocked(self, seconds):
+        with self.lock:
+            self.blocked += seconds
+
+    def sample_depth(self, depth):
+        """每有一项进入输入队列时记录队列长度"""
+        with self.lock:
+            self.depth_samples += 1
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+
+    @property
+    def mean_depth(self):
+        return self.depth_total / self.depth_samples if self.depth_samples else 0.0
+
+    def utilization(self, wall):
+        """忙碌时间占全部线程可用时间的比例"""
+        capacity = wall * max(1, self.concurrency)
+        return self.busy / capacity if capacity > 0 else 0.0
+
+    def to_dict(self, wall):
+        return {
+            "label": self.label,
+            "concurrency": self.concurrency,
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy": round(self.busy, 6),
+            "utilization": round(self.utilization(wall), 4),
+            "starved": round(self.starved, 6),
+            "blocked": round(self.blocked, 6),
+            "mean_queue_depth": round(self.mean_depth, 3),
+            "max_queue_depth": self.max_depth,
+        }
+
+
+class PipelineMetrics:
+    """流水线各阶段的统计，按阶段顺序排列"""
+
+    def __init__(self, stages):
+        self.stages = collections.OrderedDict(
+            (stage.name, StageMetrics(stage.name, stage.label, stage.concurrency)) for stage in stages)
+        self.wall = 0.0
+
+    def bottleneck(self):
+        """利用率最高的阶段即瓶颈；没有处理过任何项时返回None"""
+        active = [metrics for metrics in self.stages.values() if metrics.processed]
+        if not active:
+            return None
+        return max(active, key=lambda metrics: metrics.utilization(self.wall)).name
+
+    def summary(self):
+        return {
+            "wall": round(self.wall, 6),
+            "bottleneck": self.bottleneck(),
+            "stages": collections.OrderedDict((name, metrics.to_dict(self.wall)) for name, metrics in self.stages.items()),
+        }
+
+    def format_summary(self):
+        """生成可读的统计，每个阶段一行"""
+        lines = []
+        for metrics in self.stages.values():
+            threads = "调用线程" if metrics.concurrency == 0 else f"{metrics.concurrency}线程"
+            lines.append(f"{metrics.label}（{threads}）: {metrics.processed}项, 忙碌{metrics.utilization(self.wall):.0%}, "
+                         f"队列平均{metrics.mean_depth:.1f}/最大{metrics.max_depth}, "
+                         f"等待输入{metrics.starved:.1f}秒, 等待下游{metrics.blocked:.1f}秒")
+        bottleneck = self.bottleneck()
+        if bottleneck:
+            lines.append(f"瓶颈: {self.stages[bottleneck].label}")
+        return "\n".join(lines)
+
+
+class StagedPipeline:
+    """由有界队列连接的多阶段流水线，各阶段同时处理不同的项
+
+    下游处理不过来时上游在put处等待；每项按顺序经过所有阶段，失败或被取消的项直接交给结果处理。
+    """
+
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE, profiler=None):
+        self.stages = list(stages)
+        if not self.stages:
+            raise ValueError("流水线至少需要一个阶段")
+        inline = [index for index, stage in enumerate(self.stages) if stage.inline]
+        if len(inline) > 1:
+            raise ValueError("最多只能有一个阶段在调用线程中执行")
+        self.inline_index = inline[0] if inline else None
+        self.queue_size = queue_size
+        # 每项在每个阶段的耗时也记入profiler（阶段名、键）
+        self.profiler = profiler or NULL_PROFILER
+        self.metrics = PipelineMetrics(self.stages)
+
+    def run(self, items, on_result=None, on_start=None, is_cancelled=None):
+        """处理 [(键, 值)]，每项结束时调用 on_result(PipelineResult)，返回全部结果
+
+        on_start(阶段名, 键) 在一项进入announce阶段前调用；回调都在调用run的线程中执行。
+        is_cancelled() 返回True后不再放入新的项，已放入的项作为cancelled结果返回；
+        取消后阶段中抛出的异常（例如被中断的渲染）同样作为cancelled，而不是failed。
+        回调抛出异常时流水线同样按取消处理，等各线程结束后再抛出。
+        """
+        self.metrics = PipelineMetrics(self.stages)
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.aborted = False
+        self.on_start = on_start
+        self.queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self.results = queue.Queue()
+        self.remaining = [stage.worker_count for stage in self.stages]
+        self.remaining_lock = threading.Lock()
+        start = time.perf_counter()
+
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            if not stage.inline:
+                threads += [threading.Thread(target=self._work, args=(index,), daemon=True)
+                            for _ in range(stage.concurrency)]
+        for thread in threads:
+            thread.start()
+
+        results = []
+        error = None
+        inline_open = self.inline_index is not None
+        finished = False
+        while not finished:
+            try:
+                if inline_open:
+                    inline_open = self._step(self.inline_index, timeout=POLL_INTERVAL)
+                    message = self._next_message(block=False)
+                else:
+                    message = self._next_message(block=True)
+                while message is not None and not finished:
+                    finished = self._dispatch(message, results, on_result)
+                    if not finished:
+                        message = self._next_message(block=False)
+            except Exception as e:
+                # 回调出错：停止放入新的项，继续排空队列让各线程正常结束
+                if error is None:
+                    error = e
+                self.aborted = True
+
+        for thread in threads:
+            thread.join()
+        self.metrics.wall = time.perf_counter() - start
+        if error is not None:
+            raise error
+        return results
+
+    def _stopping(self):
+        return self.aborted or self.is_cancelled()
+
+    def _next_message(self, block):
+        try:
+            return self.results.get(timeout=POLL_INTERVAL) if block else self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _dispatch(self, message, results, on_result):
+        """处理一条结果消息，收到结束消息时返回True"""
+        kind = message[0]
+        if kind == "finished":
+            return True
+        if kind == "result":
+            results.append(message[1])
+            if on_result and not self.aborted:
+                on_result(message[1])
+        elif kind == "start" and self.on_start and not self.aborted:
+            self.on_start(message[1], message[2])
+        return False
+
+    def _feed(self, items):
+        first = self.queues[0]
+        metrics = self.metrics.stages[self.stages[0].name]
+        try:
+            for key, value in items:
+                if self._stopping():
+                    break
+                first.put((key, value))
+                metrics.sample_depth(first.qsize())
+        finally:
+            for _ in range(self.stages[0].worker_count):
+                first.put(_STOP)
+
+    def _work(self, index):
+        while self._step(index):
+            pass
+
+    def _step(self, index, timeout=None):
+        """从第index个阶段的输入队列取一项处理；该阶段的输入已结束时返回False"""
+        stage = self.stages[index]
+        metrics = self.metrics.stages[stage.name]
+        waited = time.perf_counter()
+        try:
+            item = self.queues[index].get(timeout=timeout)
+        except queue.Empty:
+            metrics.add_starved(time.perf_counter() - waited)
+            return True
+        metrics.add_starved(time.perf_counter() - waited)
+        if item is _STOP:
+            self._stage_finished(index)
+            return False
+        self._forward(index, self._process(stage, metrics, item))
+        return True
+
+    def _process(self, stage, metrics, item):
+        key, value = item
+        if self._stopping():
+            return PipelineResult(key, value, STATUS_CANCELLED, None, stage.name)
+        if stage.announce:
+            if stage.inline:
+                if self.on_start and not self.aborted:
+                    self.on_start(stage.name, key)
+            else:
+                self.results.put(("start", stage.name, key))
+        started = time.perf_counter()
+        try:
+            with self.profiler.stage(stage.name, key):
+                value = stage.func(key, value)
+        except Exception as e:
+            metrics.add_busy(time.perf_counter() - started, False)
+            if self._stopping():
+                return PipelineResult(key, value, STATUS_CANCELLED, str(e) or None, stage.name)
+            return PipelineResult(key, value, STATUS_FAILED, str(e) or e.__class__.__name__, stage.name)
+        metrics.add_busy(time.perf_counter() - started, True)
+        return key, value
+
+    def _forward(self, index, outcome):
+        """把一项交给下一阶段；已结束（失败、取消或通过最后一个阶段）的项交给结果队列"""
+        stage = self.stages[index]
+        if isinstance(outcome, PipelineResult):
+            self.results.put(("result", outcome))
+            return
+        if index + 1 == len(self.stages):
+            self.results.put(("result", PipelineResult(outcome[0], outcome[1], STATUS_DONE, None, stage.name)))
+            return
+        target = self.queues[index + 1]
+        waited = time.perf_counter()
+        target.put(outcome)
+        self.metrics.stages[stage.name].add_blocked(time.perf_counter() - waited)
+        self.metrics.stages[self.stages[index + 1].name].sample_depth(target.qsize())
+
+    def _stage_finished(self, index):
+        """一个线程处理完该阶段的全部输入；最后一个线程结束时通知下一阶段"""
+        with self.remaining_lock:
+            self.remaining[index] -= 1
+            last = self.remaining[index] == 0
+        if not last:
+            return
+        if index + 1 == len(self.stages):
+            self.results.put(("finished",))
+        else:
+            for _ in range(self.stages[index + 1].worker_count):
+                self.queues[index + 1].put(_STOP)
+
+
+# 单页导出的四个阶段
+STAGE_PREPARE = "prepare"
+STAGE_RENDER = "render"
+STAGE_POST = "post"
+STAGE_PUBLISH = "publish"
+STAGES = (STAGE_PREPARE, STAGE_RENDER, STAGE_POST, STAGE_PUBLISH)
+STAGE_LABELS = {STAGE_PREPARE: "准备", STAGE_RENDER: "渲染", STAGE_POST: "校验/转码", STAGE_PUBLISH: "发布"}
+DEFAULT_CONCURRENCY = {STAGE_PREPARE: 1, STAGE_RENDER: 1, STAGE_POST: 1, STAGE_PUBLISH: 1}
+
+# 一页的导出结果：页码、是否成功、导出通道、渲染耗时（秒）、错误信息
+ExportResult = collections.namedtuple("ExportResult", ["slide", "ok", "path", "seconds", "error"])
+
+
+class SlideExportError(Exception):
+    """单页导出失败，错误信息会显示在进度中"""
+
+
+def retry_delay(attempt, delay=RETRY_DELAY, backoff=RETRY_BACKOFF):
+    """第attempt次重试前等待的秒数（指数退避）"""
+    return delay * backoff ** (attempt - 1)
+
+
+def retry_message(slide_index, attempt, error, delay):
+    """重试时显示的进度信息"""
+    return f"第{slide_index}页{error or '导出失败'}，{delay:.0f}秒后第{attempt}次重试"
+
+
+def parse_concurrency(text):
+    """解析 "prepare=2,post=2" 形式的各阶段并发数"""
+    concurrency = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_CONCURRENCY:
+            raise ValueError(f"未知的流水线阶段: {name}（可用: {', '.join(STAGES)}）")
+        if not value.strip().isdigit():
+            raise ValueError(f"阶段{name}的并发数必须是非负整数")
+        concurrency[name] = int(value)
+    return concurrency
+
+
+def partial_path_for(output_path):
+    """输出目录中的临时文件名，保留扩展名（CreateVideo和ffmpeg按扩展名决定格式）"""
+    base, extension = os.path.splitext(output_path)
+    return f"{base}.partial-{uuid.uuid4().hex[:8]}{extension}"
+
+
+class SlideJob:
+    """一页在各阶段之间传递的数据及其临时文件"""
+
+    def __init__(self, slide_index, output_path, static_duration=None, params=None, expected_duration=None, attempt=0):
+        self.slide = slide_index
+        self.output_path = output_path
+        self.static_duration = static_duration
+        # 本页的渲染参数（时长规划可能为单页设置不同的默认时长）
+        self.params = params
+        # 视频应有的时长（秒），校验时用于发现被截断的视频；None表示不检查时长
+        self.expected_duration = expected_duration
+        # 第几次重试（0为首次导出）；渲染或校验失败时retryable为True，可以重新导出
+        self.attempt = attempt
+        self.retryable = False
+        # prepare生成的单页演示文稿
+        self.source = None
+        # 需要转码时PowerPoint的渲染结果
+        self.render_path = None
+        # 输出目录中的临时文件，发布时改名为output_path，未完成的页不会覆盖已有的视频
+        self.partial_path = partial_path_for(output_path)
+        self.path = None
+        self.seconds = 0.0
+        self.published = False
+
+    def retry(self):
+        """重新导出本页的新任务，使用新的临时文件"""
+        return SlideJob(self.slide, self.output_path, self.static_duration, self.params, self.expected_duration,
+                        self.attempt + 1)
+
+
+class SlideExportPipeline:
+    """逐页导出流水线：准备单页演示文稿、渲染、校验/转码、发布到输出目录，四个阶段由有界队列连接
+
+    渲染当前页的同时，上一页在转码、下一页的单页文件已经生成；各阶段的并发数可以单独设置，
+    渲染后端要求同一线程（COM）时渲染阶段在调用线程中执行。stages可以替换任意阶段的实现，
+    便于在没有PowerPoint的环境中测试。完成的结果在调用线程中交给on_result。
+    slide_params 为 {页码: 渲染参数}，这些页使用单独的参数（例如按时长规划延长的默认时长）。
+
+    校验阶段解析视频的容器头，检查文件完整、时长没有被截断（expected_durations 为 {页码: 秒数}）、
+    分辨率和帧率与请求一致，而不是只相信CreateVideo的状态。渲染或校验失败的页在本轮结束后
+    重新导出，最多retries次，每次等待时间按指数退避；只有最终结果交给on_result。
+
+    resources 为resource_governor.ResourceGate时，渲染前先取得渲染名额（多个进程共用，数量随内存调整），
+    生成单页演示文稿前等待临时空间，临时文件默认写在其临时目录中。
+    """
+
+    def __init__(self, backend, params, static_durations=None, concurrency=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 work_dir=None, stages=None, slide_params=None, expected_durations=None, retries=DEFAULT_RETRIES,
+                 retry_delay=RETRY_DELAY, resources=None):
+        self.backend = backend
+        self.params = params
+        self.slide_params = slide_params or {}
+        self.expected_durations = expected_durations or {}
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # 假后端等不输出真实视频的后端只检查结果非空
+        self.verify = backend.produces_video
+        # 第一轮导出的队列统计（重试的轮次只处理少数页，不计入）
+        self.first_metrics = None
+        self.profile = profile_from_params(params)
+        self.static_durations = static_durations or {}
+        self.resources = resources
+        self.is_cancelled = lambda: False
+        self.work_dir = work_dir or (resources and resources.temp_dir) or tempfile.gettempdir()
+        self.concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+        if backend.thread_affine:
+            self.concurrency[STAGE_RENDER] = 0
+        funcs = {STAGE_PREPARE: self.prepare, STAGE_RENDER: self.render, STAGE_POST: self.post_process,
+                 STAGE_PUBLISH: self.publish}
+        funcs.update(stages or {})
+        self.pipeline = StagedPipeline(
+            [Stage(name, funcs[name], self.concurrency[name], STAGE_LABELS[name], announce=name == STAGE_RENDER)
+             for name in STAGES],
+            queue_size, backend.profiler)
+
+    @property
+    def metrics(self):
+        return self.first_metrics or self.pipeline.metrics
+
+    def run(self, output_paths, on_started=None, on_result=None, is_cancelled=None, on_retry=None):
+        """按页码顺序导出 {页码: 输出路径}，每页结束时调用 on_result(ExportResult)，返回全部结果
+
+        每页开始渲染时调用 on_started(页码)；被取消时未完成的页不产生结果，临时文件全部删除。
+        失败的页准备重试时调用 on_retry(页码, 第几次重试, 错误信息, 等待秒数)。
+        """
+        is_cancelled = self.is_cancelled = is_cancelled or (lambda: False)
+        jobs = [SlideJob(i, output_paths[i], self.static_durations.get(i), self.slide_params.get(i, self.params),
+                         self.expected_durations.get(i))
+                for i in sorted(output_paths)]
+        all_jobs = list(jobs)
+        results = []
+        self.first_metrics = None
+
+        def handle(result):
+            job = result.value
+            if result.status != STATUS_DONE:
+                self.discard(job)
+            if result.status == STATUS_CANCELLED:
+                return
+            if result.status == STATUS_FAILED and job.retryable and job.attempt < self.retries:
+                retries.append((job.retry(), result.error))
+                return
+            export = ExportResult(job.slide, result.status == STATUS_DONE, job.path, job.seconds, result.error)
+            results.append(export)
+            if on_result:
+                on_result(export)
+
+        def started(stage, slide_index):
+            if on_started:
+                on_started(slide_index)
+
+        try:
+            while jobs:
+                retries = []
+                self.pipeline.run(((job.slide, job) for job in jobs), handle, started, is_cancelled)
+                if self.first_metrics is None:
+                    self.first_metrics = self.pipeline.metrics
+                if not retries:
+                    break
+                # 同一轮失败的页一起重试，等待时间按本轮的重试次数计算
+                attempt = max(job.attempt for job, _ in retries)
+                delay = retry_delay(attempt, self.retry_delay)
+                if on_retry:
+                    for job, error in retries:
+                        on_retry(job.slide, job.attempt, error, delay)
+                if not self._wait(delay, is_cancelled):
+                    break
+                jobs = [job for job, _ in retries]
+                all_jobs += jobs
+        finally:
+            for job in all_jobs:
+                if not job.published:
+                    self.discard(job)
+        return results
+
+    @staticmethod
+    def _wait(seconds, is_cancelled):
+        """等待重试，期间被取消时返回False"""
+        deadline = time.monotonic() + seconds
+        while not is_cancelled():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(POLL_INTERVAL, remaining))
+        return False
+
+    def prepare(self, slide_index, job):
+        """生成单页演示文稿；静态页走快速通道，只在快速通道失败时才在渲染阶段生成"""
+        if job.static_duration is None:
+            if self.resources is not None:
+                self.resources.wait_for_temp_room(self.is_cancelled)
+            job.source = self.backend.prepare_slide(slide_index, job.params)
+        return job
+
+    def render(self, slide_index, job):
+        """渲染到输出目录中的临时文件；需要转码时完整渲染先写到work_dir"""
+        if self.resources is None:
+            return self._render(slide_index, job)
+        if not self.resources.acquire_render(self.is_cancelled):
+            raise SlideExportError("已取消")
+        try:
+            return self._render(slide_index, job)
+        finally:
+            self.resources.release_render()
+
+    def _render(self, slide_index, job):
+        if self.profile.transcodes:
+            job.render_path = os.path.normpath(os.path.join(self.work_dir,
+                                                            f"temp_render_{uuid.uuid4().hex}{self.profile.extension}"))
+        ok, job.path, job.seconds = export_with_fast_path(self.backend, slide_index, job.partial_path, job.params,
+                                                          job.static_duration, job.render_path, job.source)
+        if job.path != PATH_FULL:
+            # 快速通道已直接编码为输出格式
+            self._remove(job.render_path)
+            job.render_path = None
+        if not ok:
+            job.retryable = True
+            raise SlideExportError("渲染失败")
+        return job
+
+    def post_process(self, slide_index, job):
+        """删除单页演示文稿，校验渲染结果，需要时转码为输出格式并校验转码结果"""
+        self.backend.release_source(job.source)
+        job.source = None
+        rendered = job.render_path or job.partial_path
+        if not os.path.exists(rendered) or os.path.getsize(rendered) == 0:
+            job.retryable = True
+            raise SlideExportError("渲染结果为空")
+        self.verify_output(job, rendered)
+        if job.render_path:
+            try:
+                transcode_video(job.render_path, job.partial_path, self.profile)
+            except Exception as e:
+                raise SlideExportError(f"转码失败: {e}")
+            finally:
+                self._remove(job.render_path)
+                job.render_path = None
+            self.verify_output(job, job.partial_path)
+        return job
+
+    def verify_output(self, job, path):
+        """解析视频头检查完整性、时长、分辨率和帧率，不符合时本页失败并可以重试"""
+        if not self.verify:
+            return
+        expected_ms = int(round(job.expected_duration * 1000)) if job.expected_duration else None
+        problems = verify_video(path, expected_ms, job.params["vert_resolution"], job.params["frames_per_second"])
+        if problems:
+            job.retryable = True
+            raise SlideExportError(f"校验失败: {'，'.join(problems)}")
+
+    def publish(self, slide_index, job):
+        """把临时文件改名为最终的输出文件（同一目录内，替换是原子的）"""
+        os.replace(job.partial_path, job.output_path)
+        job.published = True
+        return job
+
+    def discard(self, job):
+        """删除未发布的页留下的临时文件"""
+        try:
+            self.backend.release_source(job.source)
+        except:
+            pass
+        job.source = None
+        self._remove(job.render_path)
+        if not job.published:
+            self._remove(job.partial_path)
+
+    @staticmethod
+    def _remove(path):
+        remove_temp_file(path)
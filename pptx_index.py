@@ -0,0 +1,212 @@
+# -*- coding: UTF-8 -*-
+
+import zipfile
+import xml.etree.ElementTree as ET
+
+from pptx_package import (HIDDEN_SHOW_VALUES, NS_PRESENTATION, NS_RELATIONSHIPS, REL_MEDIA_TYPES, read_relationships,
+                          slide_part_names)
+
+
+NS_P14 = "http://schemas.microsoft.com/office/powerpoint/2010/main"
+
+# 未指定p14:dur时，切换速度对应的时长（毫秒）
+TRANSITION_SPEED_MS = {"fast": 500, "med": 750, "slow": 1000}
+
+_TAG_SLIDE = f"{{{NS_PRESENTATION}}}sld"
+_TAG_TRANSITION = f"{{{NS_PRESENTATION}}}transition"
+_TAG_TIMING = f"{{{NS_PRESENTATION}}}timing"
+_TAG_CTN = f"{{{NS_PRESENTATION}}}cTn"
+_TAG_SEQ = f"{{{NS_PRESENTATION}}}seq"
+_TAG_CHILD_TN_LST = f"{{{NS_PRESENTATION}}}childTnLst"
+_TAG_ST_COND_LST = f"{{{NS_PRESENTATION}}}stCondLst"
+_TAG_COND = f"{{{NS_PRESENTATION}}}cond"
+# 动画行为和媒体节点的cTn包在这些元素中
+_CTN_HOLDERS = (f"{{{NS_PRESENTATION}}}cBhvr", f"{{{NS_PRESENTATION}}}cMediaNode")
+_TAG_P14_MEDIA = f"{{{NS_P14}}}media"
+_TAG_P14_TRIM = f"{{{NS_P14}}}trim"
+_ATTR_EMBED = f"{{{NS_RELATIONSHIPS}}}embed"
+_TRANSITION_NON_EFFECT_TAGS = (f"{{{NS_PRESENTATION}}}sndAc", f"{{{NS_PRESENTATION}}}extLst")
+
+
+class SlideInfo:
+    """从pptx中读取的单页信息，时长均为毫秒"""
+
+    def __init__(self, index, part_name):
+        self.index = index
+        self.part_name = part_name
+        self.hidden = False
+        self.has_transition = False
+        self.transition_ms = 0
+        # 未设置自动换片时间时为None
+        self.advance_after_ms = None
+        self.has_timing = False
+        self.animation_count = 0
+        self.media = []
+        self.external_media = []
+        # 主动画序列按顺序播放完所需的时长（单击触发的步骤视为紧接上一步）
+        self.animation_ms = 0
+        # 媒体部件路径 -> 剪裁后保留的 (开始毫秒, 结束毫秒)，结束为None表示到结尾
+        self.media_trims = {}
+
+    @property
+    def has_media(self):
+        return bool(self.media or self.external_media)
+
+    def duration_ms(self, default_ms):
+        """本页在视频中的时长：切换时长 + 停留时长"""
+        advance_ms = default_ms if self.advance_after_ms is None else self.advance_after_ms
+        return self.transition_ms + advance_ms
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def _time_ms(value):
+    """时间属性转为毫秒，indefinite等非数字值返回None"""
+    return int(value) if value and value.isdigit() else None
+
+
+def _find_ctn(node):
+    """时间节点（par、seq、动画行为、媒体）对应的cTn"""
+    ctn = node.find(_TAG_CTN)
+    if ctn is not None:
+        return ctn
+    for holder in _CTN_HOLDERS:
+        element = node.find(holder)
+        if element is not None:
+            return element.find(_TAG_CTN)
+    return None
+
+
+def _ctn_end_ms(ctn, sequential):
+    """时间节点从开始到结束的时长：延迟 + max(自身时长, 子节点时长)；seq的子节点依次播放，其他节点同时播放"""
+    delays = [_time_ms(cond.get("delay")) for cond in ctn.iterfind(f"{_TAG_ST_COND_LST}/{_TAG_COND}")]
+    delay = max([d for d in delays if d is not None], default=0)
+    duration = _time_ms(ctn.get("dur")) or 0
+    repeat = _time_ms(ctn.get("repeatCount"))
+    if repeat:
+        # repeatCount以千分之一次为单位
+        duration = duration * repeat // 1000
+    child_ends = []
+    children = ctn.find(_TAG_CHILD_TN_LST)
+    for child in (children if children is not None else ()):
+        child_ctn = _find_ctn(child)
+        if child_ctn is not None:
+            child_ends.append(_ctn_end_ms(child_ctn, child.tag == _TAG_SEQ))
+    body = sum(child_ends) if sequential else max(child_ends, default=0)
+    return delay + max(duration, body)
+
+
+def animation_timeline_ms(timing):
+    """p:timing中主动画序列（mainSeq）的总时长，交互触发的序列不计入"""
+    for ctn in timing.iter(_TAG_CTN):
+        if ctn.get("nodeType") == "mainSeq":
+            return _ctn_end_ms(ctn, True)
+    return 0
+
+
+def parse_slide(zf, index, part_name):
+    """流式解析一页幻灯片，只关注隐藏标记、切换、动画时间线和媒体剪裁"""
+    info = SlideInfo(index, part_name)
+    seen_transition = False
+    in_timing = False
+    media_rel_id = None
+    trims = {}
+    with zf.open(part_name) as f:
+        for event, element in ET.iterparse(f, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                if tag == _TAG_SLIDE:
+                    info.hidden = element.get("show") in HIDDEN_SHOW_VALUES
+                elif tag == _TAG_TIMING:
+                    info.has_timing = True
+                    in_timing = True
+                elif tag == _TAG_CTN and element.get("presetClass"):
+                    info.animation_count += 1
+                elif tag == _TAG_P14_MEDIA:
+                    media_rel_id = element.get(_ATTR_EMBED)
+            elif tag == _TAG_TIMING:
+                # 时间线需要完整的节点树，结束时一次计算后再释放
+                in_timing = False
+                info.animation_ms = animation_timeline_ms(element)
+                element.clear()
+            elif tag == _TAG_P14_TRIM and media_rel_id:
+                start = float(element.get("st") or 0)
+                end = element.get("end")
+                trims[media_rel_id] = (int(start), int(float(end)) if end else None)
+                element.clear()
+            elif tag == _TAG_TRANSITION and not seen_transition:
+                # 新版本文件中切换放在mc:AlternateContent里，第一个（p14版本）信息最全
+                seen_transition = True
+                if element.get("advTm") is not None:
+                    info.advance_after_ms = int(element.get("advTm"))
+                # 只有换片计时而没有切换效果时，不产生切换动画
+                effects = [child for child in element if child.tag not in _TRANSITION_NON_EFFECT_TAGS]
+                if effects:
+                    info.has_transition = True
+                    duration = element.get(f"{{{NS_P14}}}dur")
+                    if duration is not None:
+                        info.transition_ms = int(duration)
+                    else:
+                        info.transition_ms = TRANSITION_SPEED_MS.get(element.get("spd", "fast"), 500)
+            elif tag != _TAG_TRANSITION and not in_timing:
+                # 已处理完的节点及时释放，大幅幻灯片也只占用少量内存
+                element.clear()
+
+    for rel in read_relationships(zf, part_name):
+        if rel.type_name in REL_MEDIA_TYPES:
+            target_list = info.external_media if rel.external else info.media
+            if rel.target not in target_list:
+                target_list.append(rel.target)
+            if rel.rel_id in trims and not rel.external:
+                info.media_trims[rel.target] = trims[rel.rel_id]
+    return info
+
+
+class PptxIndex:
+    """直接读取pptx压缩包获取页数、顺序和计时信息，无需启动PowerPoint；各页按需解析"""
+
+    def __init__(self, pptx_path):
+        self.pptx_path = pptx_path
+        self.zf = zipfile.ZipFile(pptx_path)
+        self._part_names = None
+        self._slides = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.zf.close()
+
+    @property
+    def part_names(self):
+        """按放映顺序排列的幻灯片部件路径"""
+        if self._part_names is None:
+            self._part_names = slide_part_names(self.zf)
+        return self._part_names
+
+    @property
+    def slide_count(self):
+        return len(self.part_names)
+
+    def slide(self, index):
+        """获取第index页（从1开始）的信息"""
+        if index not in self._slides:
+            self._slides[index] = parse_slide(self.zf, index, self.part_names[index - 1])
+        return self._slides[index]
+
+    def __iter__(self):
+        for index in range(1, self.slide_count + 1):
+            yield self.slide(index)
+
+    @property
+    def hidden_slides(self):
+        return [info.index for info in self if info.hidden]
+
+    def total_duration_ms(self, default_ms):
+        """按当前计时估算整体视频时长"""
+        return sum(info.duration_ms(default_ms) for info in self)
+
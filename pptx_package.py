@@ -0,0 +1,125 @@
+# -*- coding: UTF-8 -*-
+
+import posixpath
+import xml.etree.ElementTree as ET
+
+
+# OOXML命名空间
+NS_PRESENTATION = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_RELATIONSHIPS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PACKAGE_RELATIONSHIPS = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_CONTENT_TYPES = "http://schemas.openxmlformats.org/package/2006/content-types"
+
+PRESENTATION_PART = "ppt/presentation.xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+# 包根部件，其关系部件为 _rels/.rels
+PACKAGE_ROOT = ""
+# p:sld的show属性是xsd:boolean，取这些值时该页在放映中隐藏
+HIDDEN_SHOW_VALUES = ("0", "false")
+
+# 关系类型只比较最后一段，兼容 Transitional 与 Strict 两套命名空间
+REL_SLIDE = "slide"
+REL_SLIDE_LAYOUT = "slideLayout"
+REL_SLIDE_MASTER = "slideMaster"
+REL_NOTES_SLIDE = "notesSlide"
+REL_MEDIA_TYPES = ("video", "audio", "media")
+
+
+def rel_type_name(rel_type):
+    """关系类型URI的最后一段，例如 slideLayout"""
+    return rel_type.rsplit("/", 1)[-1]
+
+
+def rels_part_for(part_name):
+    """部件对应的关系部件路径，例如 ppt/slides/_rels/slide1.xml.rels"""
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, "_rels", name + ".rels")
+
+
+def resolve_target(source_part, target):
+    """把关系中的相对Target解析为包内部件路径"""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+class Relationship:
+    """包内的一条关系"""
+
+    def __init__(self, rel_id, rel_type, target, external):
+        self.rel_id = rel_id
+        self.rel_type = rel_type
+        self.target = target
+        self.external = external
+
+    @property
+    def type_name(self):
+        return rel_type_name(self.rel_type)
+
+
+def relative_target(source_part, target_part):
+    """resolve_target的逆运算：部件路径转为相对于source_part的Target"""
+    return posixpath.relpath(target_part, posixpath.dirname(source_part) or ".")
+
+
+def read_relationships(zf, part_name):
+    """读取部件的关系列表，内部关系的target已解析为部件路径"""
+    try:
+        data = zf.read(rels_part_for(part_name))
+    except KeyError:
+        return []
+    return parse_relationships(part_name, data)
+
+
+def parse_relationships(part_name, data):
+    """解析关系部件的内容"""
+    relationships = []
+    for element in ET.fromstring(data):
+        external = element.get("TargetMode") == "External"
+        target = element.get("Target")
+        if not external:
+            target = resolve_target(part_name, target)
+        relationships.append(Relationship(element.get("Id"), element.get("Type"), target, external))
+    return relationships
+
+
+def slide_part_names(zf):
+    """按放映顺序返回幻灯片部件路径，与PowerPoint中的页码顺序一致"""
+    rel_targets = {rel.rel_id: rel.target for rel in read_relationships(zf, PRESENTATION_PART)}
+    root = ET.fromstring(zf.read(PRESENTATION_PART))
+    slide_list = root.find(f"{{{NS_PRESENTATION}}}sldIdLst")
+    if slide_list is None:
+        return []
+    return [rel_targets[sld_id.get(f"{{{NS_RELATIONSHIPS}}}id")] for sld_id in slide_list]
+
+
+def should_follow(source_part, relationship):
+    """判断渲染一页幻灯片时是否需要沿该关系继续查找部件"""
+    if relationship.external:
+        return False
+    type_name = relationship.type_name
+    # 备注不参与渲染；幻灯片之间的超链接不影响本页内容
+    if type_name in (REL_NOTES_SLIDE, REL_SLIDE):
+        return False
+    # 母版引用了它的所有版式，只需要本页实际使用的那个版式
+    if type_name == REL_SLIDE_LAYOUT and "slideMasters/" in source_part:
+        return False
+    return True
+
+
+def reachable_parts(zf, start_part):
+    """从起始部件出发，沿关系找到渲染所需的全部部件"""
+    existing = set(zf.namelist())
+    found = []
+    seen = set()
+    stack = [start_part]
+    while stack:
+        part_name = stack.pop()
+        if part_name in seen or part_name not in existing:
+            continue
+        seen.add(part_name)
+        found.append(part_name)
+        for relationship in read_relationships(zf, part_name):
+            if should_follow(part_name, relationship):
+                stack.append(relationship.target)
+    return found
@@ -0,0 +1,166 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import csv
+import json
+import time
+import threading
+import collections
+
+
+PROFILE_CSV = "profile.csv"
+PROFILE_JSON = "profile.json"
+
+# 线程CPU时间（Python 3.7+），GUI在转换线程中运行时不会计入界面线程的开销
+_thread_time = getattr(time, "thread_time", time.process_time)
+
+
+# 一个阶段的一次计时：阶段名、页码（与单页无关时为None）、墙钟秒数、CPU秒数、是否正常结束、进程编号
+StageRecord = collections.namedtuple("StageRecord", ["stage", "slide", "wall", "cpu", "ok", "worker"])
+
+
+def percentile(sorted_values, fraction):
+    """按线性插值计算分位数，sorted_values需已从小到大排序"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class _Stage:
+    def __init__(self, profiler, name, slide):
+        self.profiler = profiler
+        self.name = name
+        self.slide = slide
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = _thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add(StageRecord(self.name, self.slide, time.perf_counter() - self.wall_start,
+                                      _thread_time() - self.cpu_start, exc_type is None, self.profiler.worker))
+        return False
+
+
+class StageProfiler:
+    """记录转换各阶段的墙钟时间和CPU时间
+
+    CPU时间只统计当前线程；PowerPoint、soffice、ffmpeg在其他进程中工作，墙钟时间远大于CPU时间的阶段
+    说明时间花在等待外部程序上。阶段可以嵌套，例如 slide 包含 isolate、create_video、wait 等。
+    """
+
+    enabled = True
+
+    def __init__(self, worker=0):
+        self.worker = worker
+        self.records = []
+        self.lock = threading.Lock()
+
+    def stage(self, name, slide=None):
+        """用法：with profiler.stage("wait", 3): ..."""
+        return _Stage(self, name, slide)
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def extend(self, records):
+        """合并工作进程发回的记录"""
+        with self.lock:
+            self.records.extend(StageRecord(*record) for record in records)
+
+    def summary(self):
+        """按阶段汇总，返回 {阶段: 统计}，时间单位为秒，阶段按首次出现的顺序排列"""
+        groups = {}
+        for record in self.records:
+            groups.setdefault(record.stage, []).append(record)
+        result = {}
+        for stage, records in groups.items():
+            walls = sorted(record.wall for record in records)
+            wall_total = sum(walls)
+            result[stage] = {
+                "count": len(records),
+                "failed": sum(1 for record in records if not record.ok),
+                "wall_total": wall_total,
+                "cpu_total": sum(record.cpu for record in records),
+                "wall_mean": wall_total / len(walls),
+                "p50": percentile(walls, 0.5),
+                "p90": percentile(walls, 0.9),
+                "p99": percentile(walls, 0.99),
+                "max": walls[-1],
+            }
+        return result
+
+    def slide_totals(self, stage="slide"):
+        """每页在指定阶段上的墙钟和CPU时间，返回 {页码: (墙钟秒数, CPU秒数)}"""
+        totals = {}
+        for record in self.records:
+            if record.stage == stage and record.slide is not None:
+                wall, cpu = totals.get(record.slide, (0.0, 0.0))
+                totals[record.slide] = (wall + record.wall, cpu + record.cpu)
+        return totals
+
+    def format_summary(self):
+        """生成可读的统计表，时间单位为毫秒"""
+        columns = ("count", "wall_total", "wall_mean", "p50", "p90", "p99", "max", "cpu_total")
+        lines = ["阶段: 次数 总计 平均 P50 P90 P99 最大 CPU"]
+        for stage, s in self.summary().items():
+            values = [str(s["count"])] + [f"{s[key] * 1000:.1f}" for key in columns[1:]]
+            lines.append(f"{stage}: " + " ".join(values))
+        return "\n".join(lines)
+
+    def write_csv(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(StageRecord._fields)
+            for record in self.records:
+                writer.writerow([record.stage, "" if record.slide is None else record.slide,
+                                 f"{record.wall:.6f}", f"{record.cpu:.6f}", int(record.ok), record.worker])
+
+    def write_json(self, path):
+        data = {
+            "summary": self.summary(),
+            "records": [dict(record._asdict()) for record in self.records],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+    def save(self, output_dir):
+        """在输出目录中写入 profile.csv 和 profile.json，返回两个文件路径"""
+        csv_path = os.path.join(output_dir, PROFILE_CSV)
+        json_path = os.path.join(output_dir, PROFILE_JSON)
+        self.write_csv(csv_path)
+        self.write_json(json_path)
+        return csv_path, json_path
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class NullProfiler:
+    """未开启性能分析时使用，各阶段不做任何记录"""
+
+    enabled = False
+    records = ()
+
+    def stage(self, name, slide=None):
+        return _NULL_STAGE
+
+    def add(self, record):
+        pass
+
+    def extend(self, records):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+NULL_PROFILER = NullProfiler()
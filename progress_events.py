@@ -0,0 +1,136 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import time
+import queue
+import threading
+
+
+# 事件类型
+DECK_STARTED = "deck_started"        # 开始转换一个文件：slide_count, selected_count, duplicate_count, output_dir
+SLIDE_QUEUED = "slide_queued"        # 一页需要渲染：slide, path（fast/full）
+RENDER_STARTED = "render_started"    # 开始渲染一页：slide, worker
+ENCODE_PROGRESS = "encode_progress"  # 视频编码中：slide, elapsed, bytes
+SLIDE_DONE = "slide_done"            # 一页完成：slide, origin, seconds, bytes, path
+SLIDE_FAILED = "slide_failed"        # 一页失败：slide, error
+DECK_FINISHED = "deck_finished"      # 文件转换结束：success_count, slide_count（本次输出的页数）, elapsed, output_dir, avoided_renders, resources（有渲染时）
+DECK_COMBINED = "deck_combined"      # 合并视频完成：path, chapters_path, mode, duration_ms
+DECK_FAILED = "deck_failed"          # 文件转换出错：error
+RESOURCE_DECISION = "resource_decision"  # 调整同时渲染的页数：old_limit, new_limit, reason, rss, memory_available, temp_free, temp_used
+MESSAGE = "message"                  # 给用户看的文字信息：text
+
+
+class ProgressEvent:
+    """一条进度事件，kind为事件类型，data为事件字段"""
+
+    def __init__(self, kind, **data):
+        self.kind = kind
+        self.time = time.time()
+        self.data = data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def to_dict(self):
+        result = {"event": self.kind, "time": round(self.time, 3)}
+        result.update(self.data)
+        return result
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def __repr__(self):
+        return f"ProgressEvent({self.to_json()})"
+
+
+class EventQueue:
+    """线程安全的事件队列：转换线程写入，界面线程按固定频率批量取出"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def put(self, event):
+        self.queue.put(event)
+
+    def emit(self, kind, **data):
+        self.put(ProgressEvent(kind, **data))
+
+    def drain(self, max_events=None):
+        """取出当前所有事件（最多max_events条），不阻塞"""
+        events = []
+        while max_events is None or len(events) < max_events:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+
+class JsonLinesWriter:
+    """把事件逐行写成JSON，供外部工具读取；多线程写入时加锁保证每行完整"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        line = event.to_json() + "\n"
+        with self.lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+class ProgressState:
+    """把事件流汇总为当前进度，界面和汇总报告共用"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.deck = None
+        self.slide_count = 0
+        self.finished = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = None
+        self.message = ""
+        self.current_slide = None
+        # 跳过隐藏页、复用重复页、缓存命中和断点续传省掉的渲染次数（文件转换结束时更新）
+        self.avoided_renders = 0
+
+    def apply(self, event):
+        kind = event.kind
+        if kind == DECK_STARTED:
+            self.reset()
+            self.deck = event.get("deck")
+            # 只输出部分页时按选中的页数计算进度
+            self.slide_count = event.get("selected_count", event.get("slide_count", 0))
+            self.started = event.time
+        elif kind == RENDER_STARTED:
+            self.current_slide = event.get("slide")
+        elif kind == SLIDE_DONE:
+            self.finished += 1
+            self.bytes += event.get("bytes") or 0
+        elif kind == SLIDE_FAILED:
+            self.finished += 1
+            self.failed += 1
+        elif kind == DECK_FINISHED:
+            self.avoided_renders = event.get("avoided_renders") or 0
+        elif kind == MESSAGE:
+            self.message = event.get("text", "")
+
+    @property
+    def percent(self):
+        if not self.slide_count:
+            return 0
+        return int(self.finished * 100 / self.slide_count)
+
+    def throughput(self, now=None):
+        """每分钟完成的页数"""
+        if self.started is None or not self.finished:
+            return 0.0
+        elapsed = (now or time.time()) - self.started
+        return self.finished * 60.0 / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,319 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import zipfile
+import argparse
+
+from pptx_package import PRESENTATION_PART, read_relationships, should_follow, slide_part_names
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# 缓存格式或渲染方式变化时递增，使旧缓存全部失效
+CACHE_VERSION = 2
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024 * 1024
+
+# 元数据中没有记录扩展名的旧条目都是WMV
+DEFAULT_EXTENSION = ".wmv"
+
+# Linux的FICLONE ioctl：在btrfs、XFS等支持写时复制的文件系统上克隆数据块，不实际复制
+_FICLONE = 0x40049409
+
+# presentation.xml中与单页渲染无关的部分：页列表、自定义放映和节，增删页时不应使所有页的缓存失效
+_PRESENTATION_SLIDE_LISTS = re.compile(
+    rb"<((?:[\w.-]+:)?(?:sldIdLst|custShowLst|sectionLst))\b[^>]*?(?:/>|>.*?</\1>)", re.S)
+
+
+def default_cache_dir():
+    """默认缓存目录"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pptx_to_single_video", "render_cache")
+
+
+class SlideHasher:
+    """计算幻灯片的内容哈希：本页XML、引用的媒体、版式和母版
+
+    canonical为函数时，部件内容先经它规范化（接收部件名和内容，返回bytes）再计算哈希，
+    并忽略不影响渲染的关系（备注、页间超链接）；用于查找内容相同的页，结果不用作缓存键。
+    """
+
+    def __init__(self, zf, canonical=None):
+        self.zf = zf
+        self.existing = set(zf.namelist())
+        self.part_digests = {}
+        self.canonical = canonical
+
+    def part_digest(self, part_name, visiting=()):
+        """部件内容及其下游关系的哈希（Merkle方式），结果按部件缓存"""
+        if part_name in self.part_digests:
+            return self.part_digests[part_name]
+        h = hashlib.sha256()
+        if part_name not in self.existing:
+            h.update(b"missing")
+            return h.hexdigest()
+        # 不包含部件路径本身，幻灯片调整顺序或媒体改名不会使缓存失效
+        if self.canonical is not None and part_name.endswith(".xml"):
+            h.update(self.canonical(part_name, self.zf.read(part_name)))
+        else:
+            with self.zf.open(part_name) as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+        visiting = visiting + (part_name,)
+        for rel in sorted(read_relationships(self.zf, part_name), key=lambda r: r.rel_id):
+            if self.canonical is not None and not rel.external and not should_follow(part_name, rel):
+                continue
+            h.update(f"\0{rel.rel_id}\0{rel.type_name}\0".encode("utf-8"))
+            if rel.external:
+                h.update(rel.target.encode("utf-8"))
+            elif should_follow(part_name, rel) and rel.target not in visiting:
+                h.update(self.part_digest(rel.target, visiting).encode("ascii"))
+        digest = h.hexdigest()
+        self.part_digests[part_name] = digest
+        return digest
+
+
+def render_params_key(params):
+    """把渲染参数规范化为字符串"""
+    return json.dumps({"version": CACHE_VERSION, "params": params}, sort_keys=True)
+
+
+def presentation_digest(zf):
+    """演示文稿级别影响渲染的设置（幻灯片大小sldSz、默认文本样式、嵌入字体等）的哈希，不包括页列表和节"""
+    h = hashlib.sha256()
+    if PRESENTATION_PART in zf.namelist():
+        h.update(_PRESENTATION_SLIDE_LISTS.sub(b"", zf.read(PRESENTATION_PART)))
+    return h.hexdigest()
+
+
+def compute_slide_digests(pptx_path):
+    """计算每页的内容哈希（与渲染参数无关），包含演示文稿级别的设置，返回 {页码: 哈希}"""
+    with zipfile.ZipFile(pptx_path) as zf:
+        hasher = SlideHasher(zf)
+        deck_digest = presentation_digest(zf)
+        return {index: hashlib.sha256(f"{deck_digest}\0{hasher.part_digest(part_name)}".encode("ascii")).hexdigest()
+                for index, part_name in enumerate(slide_part_names(zf), start=1)}
+
+
+def slide_cache_keys(slide_digests, params, slide_params=None, routes=None):
+    """由内容哈希和渲染参数得到每页的缓存键，slide_params中的页使用各自的参数
+
+    routes 为 {页码: 导出通道}（fast_path.PATH_FAST/PATH_FULL，或整体导出时的"whole_deck"），
+    不同通道的输出（单帧编码、逐页渲染、从整体渲染中切分）不互相命中。
+    """
+    params_key = render_params_key(params)
+    slide_params = slide_params or {}
+    routes = routes or {}
+    keys = {}
+    for index, digest in slide_digests.items():
+        h = hashlib.sha256()
+        h.update(digest.encode("ascii"))
+        h.update((render_params_key(slide_params[index]) if index in slide_params else params_key).encode("utf-8"))
+        h.update(f"\0{routes.get(index, '')}".encode("utf-8"))
+        keys[index] = h.hexdigest()
+    return keys
+
+
+def compute_slide_cache_keys(pptx_path, params, routes=None):
+    """计算每页的缓存键，返回 {页码: 键}"""
+    return slide_cache_keys(compute_slide_digests(pptx_path), params, routes=routes)
+
+
+def _reflink(src, dst):
+    """在支持写时复制的文件系统上克隆文件，不支持时返回False"""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as source, open(dst, "wb") as target:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def clone_file(src, dst):
+    """把src复制为dst：支持写时复制时只克隆数据块，否则完整复制；通过临时文件保证替换是原子的
+
+    不使用硬链接：缓存条目与输出文件共用一个inode时，任何一方被原地改写（ffmpeg -y、重新导出、用户编辑）另一方也会被改坏。
+    """
+    temp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        if not _reflink(src, temp_path):
+            shutil.copyfile(src, temp_path)
+        os.replace(temp_path, dst)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class RenderCache:
+    """持久化的渲染结果缓存，按总大小进行LRU淘汰
+
+    各种输出格式共用一个缓存目录（输出格式是缓存键的一部分），视频文件的扩展名取自存入的文件，
+    即按输出格式（output_profiles）决定，记录在条目的元数据中。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = os.path.normpath(os.path.abspath(cache_dir or default_cache_dir()))
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _video_path(self, key, meta=None):
+        extension = (meta or {}).get("extension") or DEFAULT_EXTENSION
+        return os.path.join(self.cache_dir, key + extension)
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _write_meta(self, key, meta):
+        # 每个条目单独一个元数据文件，多进程同时读写时互不影响
+        temp_path = f"{self._meta_path(key)}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self._meta_path(key))
+
+    def _read_meta(self, key):
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fetch(self, key, output_path):
+        """命中时把缓存的视频放到output_path并返回True"""
+        meta = self._read_meta(key)
+        if meta is None:
+            return False
+        video_path = self._video_path(key, meta)
+        if not os.path.exists(video_path):
+            return False
+        if os.path.getsize(video_path) != meta.get("size"):
+            # 文件被截断或修改，丢弃该条目
+            self.remove(key)
+            return False
+        clone_file(video_path, output_path)
+        meta["last_access"] = time.time()
+        meta["hits"] = meta.get("hits", 0) + 1
+        self._write_meta(key, meta)
+        return True
+
+    def store(self, key, video_path, source=None):
+        """把渲染结果存入缓存"""
+        if not os.path.exists(video_path) or os.path.getsize(video_path) == 0:
+            return False
+        extension = os.path.splitext(video_path)[1].lower() or DEFAULT_EXTENSION
+        clone_file(video_path, self._video_path(key, {"extension": extension}))
+        now = time.time()
+        self._write_meta(key, {
+            "extension": extension,
+            "size": os.path.getsize(video_path),
+            "created": now,
+            "last_access": now,
+            "hits": 0,
+            "source": source,
+        })
+        return True
+
+    def remove(self, key):
+        """删除一个条目"""
+        for path in (self._video_path(key, self._read_meta(key)), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def entries(self):
+        """列出所有条目，按最近访问时间从旧到新排序"""
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            meta = self._read_meta(key)
+            if meta is None or not os.path.exists(self._video_path(key, meta)):
+                continue
+            meta["key"] = key
+            result.append(meta)
+        result.sort(key=lambda m: m.get("last_access", 0))
+        return result
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self.entries())
+
+    def prune(self, max_bytes=None):
+        """淘汰最久未使用的条目直到总大小不超过上限，返回删除的条目数"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(entry["size"] for entry in entries)
+        removed = 0
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            self.remove(entry["key"])
+            total -= entry["size"]
+            removed += 1
+        return removed
+
+    def clear(self):
+        """清空缓存"""
+        entries = self.entries()
+        for entry in entries:
+            self.remove(entry["key"])
+        return len(entries)
+
+
+def format_size(size):
+    """格式化文件大小"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}" if unit != "B" else f"{size}{unit}"
+        size /= 1024.0
+
+
+def main(argv=None):
+    """渲染缓存管理命令行"""
+    parser = argparse.ArgumentParser(description="查看和清理幻灯片渲染缓存")
+    parser.add_argument("--dir", default=None, help="缓存目录（默认为用户缓存目录）")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("stats", help="显示缓存统计")
+    subparsers.add_parser("list", help="列出缓存条目")
+    prune_parser = subparsers.add_parser("prune", help="按LRU淘汰到指定大小")
+    prune_parser.add_argument("--max-size", type=float, required=True, help="保留的最大大小（MB）")
+    subparsers.add_parser("clear", help="清空缓存")
+    args = parser.parse_args(argv)
+
+    cache = RenderCache(args.dir)
+    if args.command == "list":
+        for entry in cache.entries():
+            last_access = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["last_access"]))
+            print(f"{entry['key'][:16]}  {format_size(entry['size']):>10}  命中{entry.get('hits', 0):>4}次  "
+                  f"{last_access}  {entry.get('source') or ''}")
+    elif args.command == "prune":
+        removed = cache.prune(int(args.max_size * 1024 * 1024))
+        print(f"已删除{removed}个条目，当前大小 {format_size(cache.total_bytes())}")
+    elif args.command == "clear":
+        print(f"已删除{cache.clear()}个条目")
+    else:
+        entries = cache.entries()
+        total = sum(entry["size"] for entry in entries)
+        hits = sum(entry.get("hits", 0) for entry in entries)
+        print(f"缓存目录: {cache.cache_dir}")
+        print(f"条目数: {len(entries)}")
+        print(f"总大小: {format_size(total)} / 上限 {format_size(cache.max_bytes)}")
+        print(f"累计命中: {hits}次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,418 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import time
+import atexit
+import shutil
+import weakref
+import tempfile
+import collections
+import multiprocessing
+
+from render_cache import format_size
+from session_pool import process_alive, process_memory, psutil
+
+
+# 系统可用内存低于保留值时减少同时渲染的页数；未指定时保留总内存的10%，至少1GB
+MEMORY_RESERVE_RATIO = 0.1
+MIN_MEMORY_RESERVE = 1024 * 1024 * 1024
+# 可用内存超过保留值的这个倍数才算充足，留出滞后区间，避免在阈值附近来回调整
+HEALTHY_MARGIN = 1.5
+# 本次转换临时文件（单页演示文稿、静态页图片、待转码的视频）的总大小上限
+DEFAULT_TEMP_BUDGET = 2 * 1024 * 1024 * 1024
+# 临时目录所在磁盘至少保留的剩余空间
+DEFAULT_MIN_TEMP_FREE = 1024 * 1024 * 1024
+# 两次采样的最短间隔（秒）
+SAMPLE_INTERVAL = 2.0
+# 连续这么多次采样资源充足后增加一个并发
+INCREASE_AFTER = 3
+# 等待渲染名额和临时空间的检查间隔（秒）
+SLOT_POLL_INTERVAL = 0.05
+TEMP_WAIT_INTERVAL = 0.1
+# 临时空间一直不足时最多等待的秒数，之后照常生成（例如有删不掉的临时文件，不能一直卡住）
+MAX_TEMP_WAIT = 60.0
+# 本次转换临时目录的名称前缀，后接进程号；进程已不存在的目录在下次启动时删除
+TEMP_PREFIX = "pptx2video_"
+
+# 调整原因
+REASON_MEMORY = "memory"
+REASON_RSS = "rss"
+REASON_TEMP_DISK = "temp_disk"
+REASON_TEMP_BUDGET = "temp_budget"
+REASON_RECOVERED = "recovered"
+REASON_LABELS = {REASON_MEMORY: "系统可用内存不足", REASON_RSS: "渲染进程内存超过上限", REASON_TEMP_DISK: "临时磁盘空间不足",
+                 REASON_TEMP_BUDGET: "临时文件超过预算", REASON_RECOVERED: "资源恢复充足"}
+
+# 尚未删除的临时目录，程序正常退出时删除（调用方忘记关闭或转换线程被中断）
+_OPEN_SPACES = weakref.WeakSet()
+
+# 一次采样：本程序及渲染进程的内存合计、系统内存总量和可用量、临时磁盘剩余空间、本次转换的临时文件大小（字节，读不到为None）
+ResourceSample = collections.namedtuple("ResourceSample", ["time", "rss", "memory_total", "memory_available", "temp_free",
+                                                           "temp_used"])
+# 一次调整：调整前后同时渲染的页数、原因和当时的采样
+Decision = collections.namedtuple("Decision", ["time", "old_limit", "new_limit", "reason", "sample"])
+
+
+def system_memory():
+    """系统物理内存 (总量, 可用量)，无法获取时返回 (None, None)"""
+    if psutil is not None:
+        memory = psutil.virtual_memory()
+        return memory.total, memory.available
+    if os.name == "nt":
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong)] + \
+                       [(name, ctypes.c_ulonglong) for name in ("ullTotalPhys", "ullAvailPhys", "ullTotalPageFile",
+                                                               "ullAvailPageFile", "ullTotalVirtual", "ullAvailVirtual",
+                                                               "ullAvailExtendedVirtual")]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(status)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys, status.ullAvailPhys
+        return None, None
+    values = {}
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in ("MemTotal", "MemAvailable"):
+                    values[name] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return values.get("MemTotal"), values.get("MemAvailable")
+
+
+def disk_free(path):
+    """path所在磁盘的剩余空间，无法获取时返回None"""
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+
+def directory_size(path):
+    """目录中所有文件的总大小；扫描期间被删除的文件忽略"""
+    total = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+def remove_temp_file(path):
+    """删除临时文件，返回是否已删除；失败时打印原因（文件留在本次转换的临时目录中，结束时或下次启动时再删除）"""
+    if not path or not os.path.exists(path):
+        return True
+    try:
+        os.remove(path)
+        return True
+    except OSError as e:
+        print(f"删除临时文件失败: {path}: {e}")
+        return False
+
+
+def sweep_stale_temp_dirs(root=None):
+    """删除进程已不存在的转换留下的临时目录（上次崩溃或被强制结束），返回删除的目录数"""
+    root = root or tempfile.gettempdir()
+    removed = 0
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return 0
+    for name in names:
+        pid = name[len(TEMP_PREFIX):].split("_", 1)[0]
+        if not name.startswith(TEMP_PREFIX) or not pid.isdigit() or process_alive(int(pid)):
+            continue
+        path = os.path.join(root, name)
+        shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(path):
+            print(f"无法删除上次遗留的临时目录: {path}")
+        else:
+            removed += 1
+    return removed
+
+
+class TempSpace:
+    """本次转换的临时目录：所有临时文件都写在这里，转换结束或取消时整个删除，程序崩溃时由下次启动时删除
+
+    budget 为临时文件总大小上限，min_free 为磁盘至少保留的剩余空间（0为不检查）；
+    对象可以传给工作进程使用，只有创建它的进程会删除目录。
+    """
+
+    def __init__(self, root=None, budget=DEFAULT_TEMP_BUDGET, min_free=DEFAULT_MIN_TEMP_FREE):
+        root = root or tempfile.gettempdir()
+        self.swept = sweep_stale_temp_dirs(root)
+        self.path = tempfile.mkdtemp(prefix=f"{TEMP_PREFIX}{os.getpid()}_", dir=root)
+        self.budget = budget
+        self.min_free = min_free
+        self.owner = os.getpid()
+        self.closed = False
+        self.cleanup_failures = 0
+        _OPEN_SPACES.add(self)
+
+    def usage(self):
+        return directory_size(self.path)
+
+    def free(self):
+        return disk_free(self.path)
+
+    def pressure(self):
+        """已有临时文件且超过预算或磁盘空间不足时返回原因，否则返回None；没有临时文件时总是允许生成，避免卡住"""
+        used = self.usage()
+        if used == 0:
+            return None
+        if self.budget and used >= self.budget:
+            return REASON_TEMP_BUDGET
+        free = self.free()
+        if self.min_free and free is not None and free < self.min_free:
+            return REASON_TEMP_DISK
+        return None
+
+    def close(self):
+        """删除临时目录，删不掉的文件打印提示并计数"""
+        if self.closed or os.getpid() != self.owner:
+            return
+        self.closed = True
+        failures = []
+        shutil.rmtree(self.path, onerror=lambda func, path, exc_info: failures.append(path))
+        if failures:
+            self.cleanup_failures += len(failures)
+            print(f"有{len(failures)}个临时文件无法删除，下次启动时再删除: {self.path}")
+
+
+@atexit.register
+def _close_open_spaces():
+    for temp_space in list(_OPEN_SPACES):
+        temp_space.close()
+
+
+class ResourceGate:
+    """各渲染线程和工作进程共用的限制：同时渲染的页数（由ResourceGovernor调整）和临时空间预算
+
+    计数保存在共享内存中，对象可以作为参数传给工作进程。
+    """
+
+    def __init__(self, limit, temp_space=None, context=None):
+        context = context or multiprocessing.get_context("spawn")
+        self.limit = context.Value("i", limit)
+        self.active = context.Value("i", 0)
+        # 等待临时空间的次数和总秒数（所有进程合计）
+        self.temp_waits = context.Value("i", 0)
+        self.temp_wait_seconds = context.Value("d", 0.0)
+        self.temp_space = temp_space
+
+    @property
+    def temp_dir(self):
+        return self.temp_space.path if self.temp_space else None
+
+    def acquire_render(self, is_cancelled=None):
+        """等待渲染名额，被取消时返回False"""
+        is_cancelled = is_cancelled or (lambda: False)
+        while True:
+            with self.active.get_lock():
+                if self.active.value < max(1, self.limit.value):
+                    self.active.value += 1
+                    return True
+            if is_cancelled():
+                return False
+            time.sleep(SLOT_POLL_INTERVAL)
+
+    def release_render(self):
+        with self.active.get_lock():
+            self.active.value -= 1
+
+    def wait_for_temp_room(self, is_cancelled=None):
+        """生成临时文件前等待其他页的临时文件删除，最多等待MAX_TEMP_WAIT秒，返回等待的秒数"""
+        if self.temp_space is None:
+            return 0.0
+        is_cancelled = is_cancelled or (lambda: False)
+        started = time.monotonic()
+        waited = False
+        while self.temp_space.pressure() and time.monotonic() - started < MAX_TEMP_WAIT and not is_cancelled():
+            waited = True
+            time.sleep(TEMP_WAIT_INTERVAL)
+        if not waited:
+            return 0.0
+        seconds = time.monotonic() - started
+        with self.temp_waits.get_lock():
+            self.temp_waits.value += 1
+        with self.temp_wait_seconds.get_lock():
+            self.temp_wait_seconds.value += seconds
+        return seconds
+
+
+class ResourceGovernor:
+    """按内存和临时磁盘空间调整同时渲染的页数（加性增、乘性减），并管理本次转换的临时目录
+
+    并发数在 [min_renders, max_renders] 内，开始时为max_renders；资源紧张时减半，连续INCREASE_AFTER次采样
+    资源充足后加一。memory_reserve 为系统至少保留的可用内存（None按总内存计算），max_rss 为本程序及渲染进程
+    合计的内存上限（None为不限）。调用poll时按需采样，每次调整调用 on_decision(Decision)。
+    """
+
+    def __init__(self, min_renders=1, max_renders=1, memory_reserve=None, max_rss=None, temp_budget=DEFAULT_TEMP_BUDGET,
+                 min_temp_free=DEFAULT_MIN_TEMP_FREE, temp_root=None, sample_interval=SAMPLE_INTERVAL, on_decision=None):
+        self.min_renders = max(1, min_renders)
+        self.max_renders = max(self.min_renders, max_renders)
+        self.memory_reserve = memory_reserve
+        self.max_rss = max_rss
+        self.sample_interval = sample_interval
+        self.on_decision = on_decision
+        self.temp_space = TempSpace(temp_root, temp_budget, min_temp_free)
+        self.gate = ResourceGate(self.max_renders, self.temp_space)
+        self.last_sample_at = None
+        self.healthy_samples = 0
+        self.decisions = []
+        self.samples = 0
+        # 各原因出现的采样次数，已在最低并发时也会计数
+        self.pressure_counts = {}
+        self.lowest_limit = self.max_renders
+        self.peak_rss = 0
+        self.min_available = None
+        self.min_temp_free = None
+        self.peak_temp_used = 0
+
+    @property
+    def limit(self):
+        return self.gate.limit.value
+
+    def reserve_for(self, memory_total):
+        if self.memory_reserve is not None:
+            return self.memory_reserve
+        return max(MIN_MEMORY_RESERVE, int((memory_total or 0) * MEMORY_RESERVE_RATIO))
+
+    def sample(self, pids=()):
+        """采样本进程和pids（工作进程、PowerPoint等）的内存合计、系统内存和临时空间"""
+        rss = 0
+        for pid in {os.getpid()} | {pid for pid in pids if pid}:
+            rss += process_memory(pid) or 0
+        total, available = system_memory()
+        return ResourceSample(time.time(), rss, total, available, self.temp_space.free(), self.temp_space.usage())
+
+    def poll(self, pids=()):
+        """距上次采样超过sample_interval时采样并按需调整，返回本次的Decision或None"""
+        now = time.monotonic()
+        if self.last_sample_at is not None and now - self.last_sample_at < self.sample_interval:
+            return None
+        self.last_sample_at = now
+        return self.adjust(self.sample(pids))
+
+    def pressure(self, sample):
+        """资源紧张的原因，没有时返回None"""
+        if sample.memory_available is not None and sample.memory_available < self.reserve_for(sample.memory_total):
+            return REASON_MEMORY
+        if self.max_rss and sample.rss > self.max_rss:
+            return REASON_RSS
+        temp_space = self.temp_space
+        if temp_space.min_free and sample.temp_free is not None and sample.temp_free < temp_space.min_free:
+            return REASON_TEMP_DISK
+        if temp_space.budget and sample.temp_used > temp_space.budget:
+            return REASON_TEMP_BUDGET
+        return None
+
+    def healthy(self, sample):
+        """资源充足：各项都比阈值多出HEALTHY_MARGIN倍的余量"""
+        if sample.memory_available is not None and \
+                sample.memory_available < self.reserve_for(sample.memory_total) * HEALTHY_MARGIN:
+            return False
+        if self.max_rss and sample.rss * HEALTHY_MARGIN > self.max_rss:
+            return False
+        temp_space = self.temp_space
+        if temp_space.min_free and sample.temp_free is not None and sample.temp_free < temp_space.min_free * HEALTHY_MARGIN:
+            return False
+        return not temp_space.budget or sample.temp_used * HEALTHY_MARGIN <= temp_space.budget
+
+    def adjust(self, sample):
+        """按一次采样调整并发数，返回Decision；没有调整时返回None"""
+        self.samples += 1
+        self.peak_rss = max(self.peak_rss, sample.rss)
+        self.peak_temp_used = max(self.peak_temp_used, sample.temp_used)
+        if sample.memory_available is not None:
+            self.min_available = min(self.min_available or sample.memory_available, sample.memory_available)
+        if sample.temp_free is not None:
+            self.min_temp_free = min(self.min_temp_free or sample.temp_free, sample.temp_free)
+        limit = self.limit
+        new_limit = limit
+        reason = self.pressure(sample)
+        if reason is not None:
+            self.pressure_counts[reason] = self.pressure_counts.get(reason, 0) + 1
+            self.healthy_samples = 0
+            new_limit = max(self.min_renders, limit // 2)
+        elif self.healthy(sample):
+            self.healthy_samples += 1
+            if self.healthy_samples >= INCREASE_AFTER and limit < self.max_renders:
+                self.healthy_samples = 0
+                reason = REASON_RECOVERED
+                new_limit = limit + 1
+        else:
+            self.healthy_samples = 0
+        if new_limit == limit:
+            return None
+        self.gate.limit.value = new_limit
+        self.lowest_limit = min(self.lowest_limit, new_limit)
+        decision = Decision(sample.time, limit, new_limit, reason, sample)
+        self.decisions.append(decision)
+        if self.on_decision:
+            self.on_decision(decision)
+        return decision
+
+    def summary(self):
+        """资源统计，写入转换记录和DECK_FINISHED事件"""
+        return {
+            "min_renders": self.min_renders,
+            "max_renders": self.max_renders,
+            "lowest_limit": self.lowest_limit,
+            "final_limit": self.limit,
+            "samples": self.samples,
+            "decisions": len(self.decisions),
+            "pressure": dict(self.pressure_counts),
+            "peak_rss": self.peak_rss,
+            "min_memory_available": self.min_available,
+            "min_temp_free": self.min_temp_free,
+            "peak_temp_used": self.peak_temp_used,
+            "temp_waits": self.gate.temp_waits.value,
+            "temp_wait_seconds": round(self.gate.temp_wait_seconds.value, 3),
+            "swept_temp_dirs": self.temp_space.swept,
+            "cleanup_failures": self.temp_space.cleanup_failures,
+        }
+
+    def format_summary(self):
+        """可读的资源统计，一行"""
+        parts = [f"同时渲染{self.lowest_limit}-{self.max_renders}页（调整{len(self.decisions)}次）"]
+        if self.peak_rss:
+            parts.append(f"内存峰值{format_size(self.peak_rss)}")
+        if self.min_available is not None:
+            parts.append(f"系统可用内存最低{format_size(self.min_available)}")
+        parts.append(f"临时文件峰值{format_size(self.peak_temp_used)}")
+        if self.gate.temp_waits.value:
+            parts.append(f"等待临时空间{self.gate.temp_waits.value}次共{self.gate.temp_wait_seconds.value:.1f}秒")
+        if self.pressure_counts:
+            parts.append("资源紧张: " + "，".join(f"{REASON_LABELS[reason]}{count}次"
+                                                 for reason, count in sorted(self.pressure_counts.items())))
+        if self.temp_space.swept:
+            parts.append(f"已删除上次遗留的临时目录{self.temp_space.swept}个")
+        return "，".join(parts)
+
+    def close(self):
+        """删除本次转换的临时目录"""
+        self.temp_space.close()
+
+
+def describe_decision(decision):
+    """调整的说明，显示在进度信息中"""
+    sample = decision.sample
+    if decision.reason == REASON_MEMORY:
+        detail = f"（可用{format_size(sample.memory_available)}）"
+    elif decision.reason == REASON_RSS:
+        detail = f"（{format_size(sample.rss)}）"
+    elif decision.reason == REASON_TEMP_DISK:
+        detail = f"（剩余{format_size(sample.temp_free)}）"
+    elif decision.reason == REASON_TEMP_BUDGET:
+        detail = f"（{format_size(sample.temp_used)}）"
+    else:
+        detail = ""
+    return f"{REASON_LABELS[decision.reason]}{detail}，同时渲染的页数 {decision.old_limit} → {decision.new_limit}"
@@ -0,0 +1,540 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import json
+import time
+import signal
+import threading
+import subprocess
+import collections
+
+try:
+    import psutil
+except ImportError:
+    # 没有psutil时用系统接口代替；Windows下无法读取内存占用，不按内存增长重启
+    psutil = None
+
+
+# 一个实例处理多少个文件后重启，PowerPoint长时间运行后内存和句柄会逐渐增长
+DEFAULT_MAX_JOBS = 50
+# 内存占用比刚启动时增长超过该值（字节）后重启
+DEFAULT_MAX_MEMORY_GROWTH = 1024 * 1024 * 1024
+# 空闲超过该时间（秒）的实例在交出前先探活
+PROBE_INTERVAL = 30.0
+# 启动失败时的重试次数和间隔（秒，每次递增）
+MAX_START_ATTEMPTS = 3
+START_RETRY_DELAY = 2.0
+# 退出实例后等待进程结束的时间（秒），超时则强制结束
+QUIT_TIMEOUT = 10.0
+
+# 重启原因
+RECYCLE_JOBS = "jobs"
+RECYCLE_MEMORY = "memory"
+RECYCLE_PROBE = "probe"
+RECYCLE_CLOSED = "closed"
+RECYCLE_LABELS = {RECYCLE_JOBS: "达到处理数量", RECYCLE_MEMORY: "内存增长", RECYCLE_PROBE: "探活失败",
+                  RECYCLE_CLOSED: "关闭"}
+
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+_STILL_ACTIVE = 259
+
+
+def default_registry_dir():
+    """默认的实例进程记录目录，与渲染缓存、任务队列放在一起"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pptx_to_single_video", "sessions")
+
+
+def process_alive(pid):
+    """进程是否仍在运行（已退出但未回收的僵尸进程视为不在运行）"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+    if os.name == "nt":
+        # Windows下os.kill会直接结束进程，不能用来检查
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == _STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+
+def process_name(pid):
+    """进程的可执行文件名，无法获取时返回None"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).name()
+        except psutil.Error:
+            return None
+    if os.name == "nt":
+        try:
+            output = subprocess.run(["tasklist", "/FI", f"PID eq {pid}", "/FO", "CSV", "/NH"], capture_output=True,
+                                    creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)).stdout
+            line = output.decode("mbcs", errors="replace").strip()
+            return line.split('","')[0].strip('"') if line.startswith('"') else None
+        except OSError:
+            return None
+    try:
+        with open(f"/proc/{pid}/comm", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def process_started(pid):
+    """进程的启动时间（秒），用于确认进程号没有被其他进程复用；无法获取时返回None"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).create_time()
+        except psutil.Error:
+            return None
+    return None
+
+
+def running_processes(name):
+    """可执行文件名为name（不区分大小写）的进程号集合，无法列出时返回None"""
+    name = name.lower()
+    if psutil is not None:
+        pids = set()
+        for process in psutil.process_iter(["name"]):
+            if (process.info.get("name") or "").lower() == name:
+                pids.add(process.pid)
+        return pids
+    if os.name == "nt":
+        try:
+            output = subprocess.run(["tasklist", "/FI", f"IMAGENAME eq {name}", "/FO", "CSV", "/NH"], capture_output=True,
+                                    creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)).stdout
+        except OSError:
+            return None
+        pids = set()
+        for line in output.decode("mbcs", errors="replace").splitlines():
+            fields = line.strip().strip('"').split('","')
+            if len(fields) > 1 and fields[0].lower() == name and fields[1].isdigit():
+                pids.add(int(fields[1]))
+        return pids
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    return {int(entry) for entry in entries if entry.isdigit() and (process_name(int(entry)) or "").lower() == name}
+
+
+def process_memory(pid):
+    """进程占用的物理内存（字节），无法获取时返回None"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def kill_process(pid):
+    """强制结束进程，成功返回True"""
+    try:
+        if psutil is not None:
+            psutil.Process(pid).kill()
+        elif os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], capture_output=True,
+                           creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        else:
+            os.kill(pid, signal.SIGKILL)
+        return True
+    except Exception:
+        return False
+
+
+class SessionError(Exception):
+    """无法启动或获取应用实例"""
+
+
+class SessionRegistry:
+    """把本进程启动的实例进程号记录到文件中（每个进程一个文件）
+
+    进程崩溃后这些实例不会被退出；下一个会话池启动时检查记录，拥有者已不在运行的实例会被强制结束。
+    只记录由本工具启动的实例（见SessionPool），进程名和启动时间都一致时才结束，进程号被复用时不会误杀。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_registry_dir()
+        self.path = os.path.join(self.directory, f"{os.getpid()}.json")
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def register(self, pid):
+        with self.lock:
+            # 同时记录进程名和启动时间，进程号被其他程序复用时不会误杀
+            self.entries[pid] = (process_name(pid), process_started(pid))
+            self._save()
+
+    def unregister(self, pid):
+        with self.lock:
+            self.entries.pop(pid, None)
+            self._save()
+
+    def _save(self):
+        try:
+            if not self.entries:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            sessions = [{"pid": pid, "name": name, "started": started}
+                        for pid, (name, started) in self.entries.items()]
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"owner": os.getpid(), "sessions": sessions}, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"写入实例进程记录失败: {e}")
+
+    def reap(self):
+        """结束拥有者已退出的实例进程，返回被结束的进程号列表"""
+        killed = []
+        if not os.path.isdir(self.directory):
+            return killed
+        for filename in os.listdir(self.directory):
+            owner, extension = os.path.splitext(filename)
+            if extension != ".json" or not owner.isdigit():
+                continue
+            owner = int(owner)
+            if owner == os.getpid() or process_alive(owner):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    sessions = json.load(f).get("sessions", [])
+            except (OSError, ValueError):
+                sessions = []
+            for entry in sessions:
+                pid, name = entry.get("pid"), entry.get("name")
+                if not pid or not process_alive(pid):
+                    continue
+                if name and process_name(pid) != name:
+                    continue
+                started = entry.get("started")
+                if started is not None and process_started(pid) != started:
+                    continue
+                if kill_process(pid):
+                    killed.append(pid)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return killed
+
+
+class NullRegistry:
+    """不记录实例进程（测试或应用不提供进程号时使用）"""
+
+    def register(self, pid):
+        pass
+
+    def unregister(self, pid):
+        pass
+
+    def reap(self):
+        return []
+
+
+class Session:
+    """池中的一个已启动实例及其使用情况"""
+
+    def __init__(self, session_id, app, pid=None, baseline_memory=None):
+        self.id = session_id
+        self.app = app
+        self.pid = pid
+        # 刚启动时的内存占用，用于判断内存增长
+        self.baseline_memory = baseline_memory
+        self.jobs = 0
+        self.failures = 0
+        self.last_used = time.monotonic()
+
+
+class _Lease:
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.session = None
+
+    def __enter__(self):
+        self.session = self.pool.acquire(self.timeout)
+        return self.session.app
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool.release(self.session, failed=exc_type is not None)
+        return False
+
+
+class SessionPool:
+    """保持size个已启动的应用实例（例如PowerPoint），多个文件依次复用，省去每个文件的冷启动
+
+    factory() 创建未启动的实例，实例需要提供 start()、ping()、process_id()、owns_process()、close()；渲染后端已实现
+    这些方法，测试时可以换成假的应用对象。交出前对空闲较久的实例探活；交回时按处理数量、内存增长和探活结果决定是否重启，
+    重启在后台进行。启动时结束上次崩溃遗留的实例进程。
+
+    PowerPoint在系统中只有一个实例，启动时可能连接到用户已打开的PowerPoint：owns_process()为False的实例
+    （不是本工具启动的，或其中有不是本工具打开的演示文稿）不记录、不按内存增长重启，退出超时也不强制结束。
+    """
+
+    def __init__(self, factory, size=1, max_jobs=DEFAULT_MAX_JOBS, max_memory_growth=DEFAULT_MAX_MEMORY_GROWTH,
+                 probe_interval=PROBE_INTERVAL, registry=None, memory_probe=process_memory, name=None):
+        if size < 1:
+            raise ValueError("会话池至少需要一个实例")
+        self.factory = factory
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_memory_growth = max_memory_growth
+        self.probe_interval = probe_interval
+        self.registry = registry if registry is not None else SessionRegistry()
+        self.memory_probe = memory_probe
+        self.name = name
+        self.idle = collections.deque()
+        # 已启动和正在启动的实例数，不超过size
+        self.count = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.next_id = 1
+        self.stats = collections.Counter()
+        self.threads = []
+
+    def start(self, warm=True):
+        """结束遗留的实例进程；warm为True时立即启动全部实例，返回被结束的遗留进程数"""
+        reaped = self.registry.reap()
+        self.stats["reaped"] += len(reaped)
+        if warm:
+            with self.condition:
+                missing = max(self.size - self.count, 0)
+                self.count += missing
+            # 启动失败的名额由_start_replacement释放，还没轮到启动的名额在这里释放
+            attempted = 0
+            try:
+                for _ in range(missing):
+                    attempted += 1
+                    self._start_replacement(background=False)
+            finally:
+                if attempted < missing:
+                    with self.condition:
+                        self.count -= missing - attempted
+                        self.condition.notify_all()
+        return len(reaped)
+
+    def lease(self, timeout=None):
+        """用法：with pool.lease() as app: ...，代码块中抛出异常时交回后先探活"""
+        return _Lease(self, timeout)
+
+    def acquire(self, timeout=None):
+        """取出一个可用的实例（Session），全部在使用中时等待；空闲较久的实例先探活，失败则重启"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.condition:
+                while not self.idle and self.count >= self.size and not self.closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise SessionError("等待可用的应用实例超时")
+                    self.condition.wait(remaining)
+                if self.closed:
+                    raise SessionError("会话池已关闭")
+                session = self.idle.popleft() if self.idle else None
+                if session is None:
+                    self.count += 1
+            if session is None:
+                try:
+                    return self._launch()
+                except Exception:
+                    with self.condition:
+                        self.count -= 1
+                        self.condition.notify()
+                    raise
+            if time.monotonic() - session.last_used < self.probe_interval or self._ping(session):
+                self.stats["reused"] += 1
+                return session
+            # 实例已失去响应：结束后在本线程重新启动
+            self._retire(session, RECYCLE_PROBE)
+            try:
+                return self._launch()
+            except Exception:
+                with self.condition:
+                    self.count -= 1
+                    self.condition.notify()
+                raise
+
+    def release(self, session, failed=False):
+        """交回实例；failed为True（使用中出错）时先探活"""
+        session.jobs += 1
+        session.last_used = time.monotonic()
+        if failed:
+            session.failures += 1
+        reason = RECYCLE_CLOSED if self.closed else self._recycle_reason(session, failed)
+        if reason is None:
+            with self.condition:
+                self.idle.append(session)
+                self.condition.notify()
+            return
+        self._retire(session, reason)
+        if reason == RECYCLE_CLOSED:
+            with self.condition:
+                self.count -= 1
+                self.condition.notify()
+        else:
+            # 名额保留给替换的实例，下一次取用时不必等待冷启动
+            self._start_replacement(background=True)
+
+    def _recycle_reason(self, session, failed):
+        if failed and not self._ping(session):
+            return RECYCLE_PROBE
+        if self.max_jobs and session.jobs >= self.max_jobs:
+            return RECYCLE_JOBS
+        if self.max_memory_growth and session.pid and session.baseline_memory is not None:
+            memory = self.memory_probe(session.pid)
+            if memory is not None and memory - session.baseline_memory > self.max_memory_growth:
+                return RECYCLE_MEMORY
+        return None
+
+    def _ping(self, session):
+        try:
+            alive = bool(session.app.ping())
+        except Exception:
+            alive = False
+        if alive and session.pid and not process_alive(session.pid):
+            alive = False
+        if not alive:
+            self.stats["probe_failed"] += 1
+        return alive
+
+    def _launch(self):
+        """启动一个新实例，失败时按递增的间隔重试"""
+        last_error = None
+        for attempt in range(MAX_START_ATTEMPTS):
+            if attempt:
+                time.sleep(START_RETRY_DELAY * attempt)
+            app = self.factory()
+            try:
+                app.start()
+            except Exception as e:
+                last_error = e
+                self.stats["start_failed"] += 1
+                self._dispose(app, None)
+                continue
+            try:
+                pid = app.process_id()
+            except Exception:
+                pid = None
+            owned = bool(pid) and self._owns(app)
+            if owned:
+                self.registry.register(pid)
+            else:
+                self.stats["attached"] += 1
+            with self.condition:
+                session_id = self.next_id
+                self.next_id += 1
+            self.stats["launched"] += 1
+            return Session(session_id, app, pid, self.memory_probe(pid) if owned else None)
+        raise SessionError(f"无法启动应用实例（已重试{MAX_START_ATTEMPTS}次）: {last_error}")
+
+    def _start_replacement(self, background):
+        """启动一个实例放入空闲队列（名额已由调用方占用）"""
+        def run():
+            try:
+                session = self._launch()
+            except Exception as e:
+                with self.condition:
+                    self.count -= 1
+                    self.condition.notify()
+                if not background:
+                    raise
+                print(f"启动替换实例失败: {e}")
+                return
+            with self.condition:
+                if not self.closed:
+                    self.idle.append(session)
+                    self.condition.notify()
+                    return
+                self.count -= 1
+            self._retire(session, RECYCLE_CLOSED)
+
+        if not background:
+            run()
+            return
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def _retire(self, session, reason):
+        """退出实例；进程在QUIT_TIMEOUT内没有结束时强制结束"""
+        self.stats[f"recycled_{reason}"] += 1
+        self._dispose(session.app, session.pid)
+        if session.pid:
+            self.registry.unregister(session.pid)
+
+    def _dispose(self, app, pid):
+        try:
+            app.close()
+        except Exception:
+            pass
+        # 不是本工具启动的实例（或其中还有用户的演示文稿）只退出本工具的部分，不强制结束
+        if not pid or not self._owns(app):
+            return
+        deadline = time.monotonic() + QUIT_TIMEOUT
+        while process_alive(pid) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if process_alive(pid) and kill_process(pid):
+            self.stats["killed"] += 1
+
+    @staticmethod
+    def _owns(app):
+        try:
+            return bool(app.owns_process())
+        except Exception:
+            return False
+
+    def close(self):
+        """退出所有空闲实例，使用中的实例在交回时退出"""
+        with self.condition:
+            self.closed = True
+            sessions = list(self.idle)
+            self.idle.clear()
+            self.count -= len(sessions)
+            self.condition.notify_all()
+        for session in sessions:
+            self._retire(session, RECYCLE_CLOSED)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def format_stats(self):
+        """生成可读的统计"""
+        parts = [f"启动{self.stats['launched']}次", f"复用{self.stats['reused']}次"]
+        for reason, label in RECYCLE_LABELS.items():
+            if reason != RECYCLE_CLOSED and self.stats[f"recycled_{reason}"]:
+                parts.append(f"因{label}重启{self.stats[f'recycled_{reason}']}次")
+        if self.stats["killed"]:
+            parts.append(f"强制结束{self.stats['killed']}个未响应的实例")
+        if self.stats["reaped"]:
+            parts.append(f"清理遗留实例{self.stats['reaped']}个")
+        return "，".join(parts)
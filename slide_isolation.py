@@ -0,0 +1,289 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import re
+import zipfile
+import threading
+import xml.etree.ElementTree as ET
+
+from pptx_package import (CONTENT_TYPES_PART, HIDDEN_SHOW_VALUES, NS_CONTENT_TYPES, NS_PACKAGE_RELATIONSHIPS,
+                          NS_PRESENTATION, NS_RELATIONSHIPS, PACKAGE_ROOT, PRESENTATION_PART, REL_SLIDE,
+                          REL_SLIDE_LAYOUT, REL_SLIDE_MASTER, parse_relationships, rel_type_name, relative_target,
+                          rels_part_for, slide_part_names)
+from zip_writer import StreamingZipWriter, WriteStats, ZipLimitError
+
+
+NS_P14 = "http://schemas.microsoft.com/office/powerpoint/2010/main"
+
+
+# 各部件都按文本改写，只删除或修改需要的元素，其余内容（命名空间前缀、mc:Ignorable等）原样保留；
+# 用ElementTree重新序列化会改写前缀，PowerPoint可能因此认为文件已损坏
+
+
+def _namespace_prefix(xml_text, namespace):
+    """查找命名空间在文档中使用的前缀，默认命名空间返回空字符串"""
+    match = re.search(r'xmlns(?::([\w.-]+))?="' + re.escape(namespace) + '"', xml_text)
+    if match is None:
+        return None
+    return match.group(1) + ":" if match.group(1) else ""
+
+
+def _remove_elements(xml_text, prefix, local_name, should_remove):
+    """删除满足条件的元素（自闭合或带子元素），should_remove接收元素开始标签"""
+    tag = re.escape(prefix + local_name)
+    pattern = re.compile(rf"<{tag}\b[^>]*?(?:/>|>.*?</{tag}>)", re.S)
+    return pattern.sub(lambda m: "" if should_remove(m.group(0)) else m.group(0), xml_text)
+
+
+def _attribute(start_tag, name):
+    match = re.search(rf"""\s{re.escape(name)}=(["'])(.*?)\1""", start_tag)
+    return match.group(2) if match else None
+
+
+def _set_attribute(start_tag, name, value):
+    return re.sub(rf"""(\s{re.escape(name)}=)(["']).*?\2""", lambda m: f'{m.group(1)}"{value}"', start_tag, count=1)
+
+
+def rewrite_presentation(data, keep_rel_id):
+    """只保留一页：过滤sldIdLst、节（p14:sectionLst），删除自定义放映"""
+    text = data.decode("utf-8")
+    p = _namespace_prefix(text, NS_PRESENTATION)
+    r = _namespace_prefix(text, NS_RELATIONSHIPS)
+    root = ET.fromstring(data)
+    keep_id = None
+    for sld_id in root.iter(f"{{{NS_PRESENTATION}}}sldId"):
+        if sld_id.get(f"{{{NS_RELATIONSHIPS}}}id") == keep_rel_id:
+            keep_id = sld_id.get("id")
+
+    list_match = re.search(rf"<{re.escape(p)}sldIdLst\b.*?</{re.escape(p)}sldIdLst>", text, re.S)
+    if list_match:
+        slide_list = _remove_elements(list_match.group(0), p, "sldId",
+                                      lambda tag: _attribute(tag, f"{r}id") != keep_rel_id)
+        text = text[:list_match.start()] + slide_list + text[list_match.end():]
+
+    # 自定义放映引用了其他页，视频导出用不到，整体删除
+    text = _remove_elements(text, p, "custShowLst", lambda tag: True)
+
+    p14 = _namespace_prefix(text, NS_P14)
+    if p14 is not None:
+        section_match = re.search(rf"<{re.escape(p14)}sectionLst\b.*?</{re.escape(p14)}sectionLst>", text, re.S)
+        if section_match:
+            sections = _remove_elements(section_match.group(0), p14, "sldId",
+                                        lambda tag: _attribute(tag, "id") != keep_id)
+            text = text[:section_match.start()] + sections + text[section_match.end():]
+    return text.encode("utf-8")
+
+
+def unhide_slide(data):
+    """去掉幻灯片根元素上的 show="0"（或 "false"），隐藏页单独导出时也能出现在视频中"""
+    text = data.decode("utf-8")
+    match = re.search(r"<([\w.-]+:)?sld\b[^>]*>", text)
+    if match is None or _attribute(match.group(0), "show") not in HIDDEN_SHOW_VALUES:
+        return data
+    start_tag = re.sub(r"""\sshow=(["'])(?:0|false)\1""", "", match.group(0), count=1)
+    return (text[:match.start()] + start_tag + text[match.end():]).encode("utf-8")
+
+
+def _filter_relationships(data, should_remove):
+    """删除满足条件的关系，should_remove接收Relationship开始标签"""
+    text = data.decode("utf-8")
+    prefix = _namespace_prefix(text, NS_PACKAGE_RELATIONSHIPS) or ""
+    return _remove_elements(text, prefix, "Relationship", should_remove).encode("utf-8")
+
+
+def _retarget_relationships(source_part, data, removed_slides, keep_slide):
+    """把指向已删除页的关系（如页间超链接）改为指向保留的页，避免出现悬空引用；无需修改时返回None"""
+    rel_ids = {rel.rel_id for rel in parse_relationships(source_part, data)
+               if not rel.external and rel.type_name == REL_SLIDE and rel.target in removed_slides}
+    if not rel_ids:
+        return None
+    text = data.decode("utf-8")
+    prefix = _namespace_prefix(text, NS_PACKAGE_RELATIONSHIPS) or ""
+    target = relative_target(source_part, keep_slide)
+
+    def retarget(match):
+        tag = match.group(0)
+        return _set_attribute(tag, "Target", target) if _attribute(tag, "Id") in rel_ids else tag
+
+    return re.sub(rf"<{re.escape(prefix)}Relationship\b[^>]*>", retarget, text).encode("utf-8")
+
+
+def _prune_master_layouts(master_data, rels_data, keep_rel_ids):
+    """母版只保留指定的版式：从sldLayoutIdLst和母版的关系中删除其他版式"""
+    text = master_data.decode("utf-8")
+    p = _namespace_prefix(text, NS_PRESENTATION)
+    r = _namespace_prefix(text, NS_RELATIONSHIPS)
+    if p is None or r is None:
+        return master_data, rels_data
+    list_match = re.search(rf"<{re.escape(p)}sldLayoutIdLst\b.*?</{re.escape(p)}sldLayoutIdLst>", text, re.S)
+    if list_match:
+        layouts = _remove_elements(list_match.group(0), p, "sldLayoutId",
+                                   lambda tag: _attribute(tag, f"{r}id") not in keep_rel_ids)
+        text = text[:list_match.start()] + layouts + text[list_match.end():]
+    rels_data = _filter_relationships(
+        rels_data, lambda tag: rel_type_name(_attribute(tag, "Type") or "") == REL_SLIDE_LAYOUT
+        and _attribute(tag, "Id") not in keep_rel_ids)
+    return text.encode("utf-8"), rels_data
+
+
+def _filter_content_types(data, kept_parts):
+    """删除已不存在的部件的Override（部件名不区分大小写）"""
+    text = data.decode("utf-8")
+    prefix = _namespace_prefix(text, NS_CONTENT_TYPES) or ""
+    kept_lower = {name.lower() for name in kept_parts}
+    return _remove_elements(text, prefix, "Override",
+                            lambda tag: (_attribute(tag, "PartName") or "").lstrip("/").lower() not in kept_lower
+                            ).encode("utf-8")
+
+
+class SlideIsolator:
+    """直接改写pptx压缩包，生成只包含一页的演示文稿，不经过PowerPoint和系统剪贴板
+
+    保留页使用的版式、母版、主题、媒体和备注；其他页、母版中未使用的版式及只被它们引用的部件会被删除。
+    未改写的部件直接复制压缩数据，不解压也不重新压缩，媒体再大也不会读入内存；stats累计写出的IO统计。
+    write可以在多个线程中同时调用（流水线准备阶段多线程时），每次调用单独打开源文件复制压缩数据。
+    """
+
+    def __init__(self, pptx_path):
+        self.pptx_path = pptx_path
+        self.zf = zipfile.ZipFile(pptx_path)
+        self.names = set(self.zf.namelist())
+        self.slide_parts = slide_part_names(self.zf)
+        self.presentation_rels = parse_relationships(PRESENTATION_PART, self.zf.read(rels_part_for(PRESENTATION_PART)))
+        self.masters = [rel.target for rel in self.presentation_rels
+                        if not rel.external and rel.type_name == REL_SLIDE_MASTER and rel.target in self.names]
+        self.stats = WriteStats()
+        self.stats_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.zf.close()
+
+    @property
+    def slide_count(self):
+        return len(self.slide_parts)
+
+    def _read(self, part_name, overrides):
+        if part_name in overrides:
+            return overrides[part_name]
+        return self.zf.read(part_name)
+
+    def plan(self, slide_index):
+        """计算单页演示文稿的部件：返回 (保留的部件集合, {部件: 改写后的内容})"""
+        keep_slide = self.slide_parts[slide_index - 1]
+        removed_slides = set(self.slide_parts) - {keep_slide}
+        keep_rel_id = next(rel.rel_id for rel in self.presentation_rels
+                           if not rel.external and rel.target == keep_slide)
+
+        overrides = {
+            PRESENTATION_PART: rewrite_presentation(self.zf.read(PRESENTATION_PART), keep_rel_id),
+            rels_part_for(PRESENTATION_PART): _filter_relationships(
+                self.zf.read(rels_part_for(PRESENTATION_PART)),
+                lambda tag: _attribute(tag, "Id") != keep_rel_id and rel_type_name(_attribute(tag, "Type") or "") == REL_SLIDE),
+            keep_slide: unhide_slide(self.zf.read(keep_slide)),
+        }
+
+        self._prune_layouts(keep_slide, overrides)
+
+        # 从包根出发沿所有关系查找仍被引用的部件，其余部件（其他页、它们的备注和独占的媒体）被删除
+        kept = {CONTENT_TYPES_PART}
+        stack = [PACKAGE_ROOT]
+        while stack:
+            part_name = stack.pop()
+            rels_part = rels_part_for(part_name)
+            if part_name != PACKAGE_ROOT:
+                if part_name in kept or part_name not in self.names:
+                    continue
+                kept.add(part_name)
+            if rels_part not in self.names:
+                continue
+            kept.add(rels_part)
+            data = self._read(rels_part, overrides)
+            retargeted = _retarget_relationships(part_name, data, removed_slides, keep_slide)
+            if retargeted is not None:
+                overrides[rels_part] = data = retargeted
+            for rel in parse_relationships(part_name, data):
+                if not rel.external:
+                    stack.append(rel.target)
+
+        overrides[CONTENT_TYPES_PART] = _filter_content_types(self.zf.read(CONTENT_TYPES_PART), kept)
+        return kept, overrides
+
+    def _prune_layouts(self, keep_slide, overrides):
+        """母版通过关系引用了它的所有版式，只保留本页使用的版式，其他版式及其独占的图片不再写入"""
+        slide_rels_part = rels_part_for(keep_slide)
+        used_layouts = set()
+        if slide_rels_part in self.names:
+            used_layouts = {rel.target for rel in parse_relationships(keep_slide, self.zf.read(slide_rels_part))
+                            if not rel.external and rel.type_name == REL_SLIDE_LAYOUT}
+        for master in self.masters:
+            rels_part = rels_part_for(master)
+            if rels_part not in self.names:
+                continue
+            rels_data = self.zf.read(rels_part)
+            layout_rels = [rel for rel in parse_relationships(master, rels_data)
+                           if not rel.external and rel.type_name == REL_SLIDE_LAYOUT]
+            keep_rel_ids = {rel.rel_id for rel in layout_rels if rel.target in used_layouts}
+            if not keep_rel_ids and layout_rels:
+                # 本页没有使用的母版也至少保留一个版式，否则PowerPoint认为文件已损坏
+                keep_rel_ids = {layout_rels[0].rel_id}
+            if len(keep_rel_ids) == len(layout_rels):
+                continue
+            overrides[master], overrides[rels_part] = _prune_master_layouts(self.zf.read(master), rels_data, keep_rel_ids)
+
+    def _members(self, kept):
+        # [Content_Types].xml 按惯例放在最前面
+        return [info for info in sorted(self.zf.infolist(), key=lambda i: i.filename != CONTENT_TYPES_PART)
+                if info.filename in kept]
+
+    def write(self, slide_index, output_path, recompress=False):
+        """把第slide_index页（从1开始）写成单独的pptx
+
+        默认原样复制未改写部件的压缩数据；recompress为True或需要ZIP64时改用zipfile逐个解压后重新压缩。
+        """
+        kept, overrides = self.plan(slide_index)
+        stats = WriteStats()
+        if not recompress:
+            try:
+                # 复制成员时要seek，共用一个文件对象会与其他线程的读取交错
+                with open(self.pptx_path, "rb") as raw, StreamingZipWriter(output_path, stats) as out:
+                    for info in self._members(kept):
+                        data = overrides.get(info.filename)
+                        if data is None:
+                            out.copy_member(raw, info)
+                        else:
+                            out.write_member(info, data, info.compress_type)
+                self._add_stats(stats)
+                return output_path
+            except ZipLimitError:
+                stats = WriteStats()
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as out:
+            for info in self._members(kept):
+                data = overrides.get(info.filename)
+                if data is None:
+                    data = self.zf.read(info.filename)
+                # 复制一份ZipInfo：writestr会改写其中的偏移和大小，而self.zf还要用原来的
+                member = zipfile.ZipInfo(info.filename, info.date_time)
+                member.external_attr = info.external_attr
+                out.writestr(member, data, compress_type=info.compress_type)
+                stats.compressed_members += 1
+                stats.compressed_input += len(data)
+                stats.compressed_output += out.getinfo(info.filename).compress_size
+        stats.written_bytes += os.path.getsize(output_path)
+        self._add_stats(stats)
+        return output_path
+
+    def _add_stats(self, stats):
+        with self.stats_lock:
+            self.stats.add(stats)
+
+
+def isolate_slide(pptx_path, slide_index, output_path):
+    """生成只包含第slide_index页的pptx"""
+    with SlideIsolator(pptx_path) as isolator:
+        return isolator.write(slide_index, output_path)
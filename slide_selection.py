@@ -0,0 +1,150 @@
+# -*- coding: UTF-8 -*-
+
+import re
+import zipfile
+
+from pptx_package import slide_part_names
+from render_cache import SlideHasher, slide_cache_keys
+
+
+# PowerPoint为每页生成不同的p14:creationId，复制出来的页内容相同但该值不同，比较时去掉
+_CREATION_ID = re.compile(rb"<(?:[\w.-]+:)?creationId\b[^>]*/>")
+# 幻灯片根元素上的隐藏标志：单页导出时会去掉，不影响渲染结果
+_SLIDE_ROOT = re.compile(rb"<(?:[\w.-]+:)?sld\b[^>]*>")
+_HIDDEN_ATTRIBUTE = re.compile(rb"""\sshow=(["'])(?:0|false)\1""")
+_XML_DECLARATION = re.compile(rb"^\s*<\?xml[^>]*\?>\s*")
+# 只去掉换行缩进，文本中的空格（如 <a:t> </a:t>）会影响排版，保留
+_SPACE_BETWEEN_TAGS = re.compile(rb">[ \t\r]*\n\s*<")
+# 去掉creationId后留下的空扩展元素
+_EMPTY_EXTENSION = re.compile(rb"<((?:[\w.-]+:)?ext(?:Lst)?)\b[^>]*>\s*</\1>")
+# 页码字段显示的是本页的序号，内容相同的两页渲染结果也不同
+_SLIDE_NUMBER_FIELD = re.compile(rb"""<(?:[\w.-]+:)?fld\b[^>]*\stype=(["'])slidenum\1""")
+
+
+def parse_slide_ranges(text, slide_count):
+    """解析页码范围，例如 "1-10,15"、"3-"（到最后一页）；返回升序的页码列表，格式错误或超出范围时抛出ValueError"""
+    selected = set()
+    for item in (text or "").replace("，", ",").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        match = re.match(r"^(\d+)\s*(?:-\s*(\d*))?$", item)
+        if match is None:
+            raise ValueError(f"无效的页码范围: {item}")
+        start = int(match.group(1))
+        if match.group(2) is None:
+            end = start
+        else:
+            end = int(match.group(2)) if match.group(2) else slide_count
+        if start < 1 or end < start or end > slide_count:
+            raise ValueError(f"页码范围{item}超出1-{slide_count}")
+        selected.update(range(start, end + 1))
+    if not selected:
+        raise ValueError("没有选择任何页")
+    return sorted(selected)
+
+
+def format_slide_ranges(indexes):
+    """把页码列表写成 "1-3,5" 的形式"""
+    parts = []
+    for index in sorted(indexes):
+        if parts and parts[-1][1] == index - 1:
+            parts[-1][1] = index
+        else:
+            parts.append([index, index])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in parts)
+
+
+def canonical_part(part_name, data):
+    """比较页面内容时使用的规范形式：去掉XML声明、标签间的换行缩进、p14:creationId，幻灯片去掉隐藏标志"""
+    data = _XML_DECLARATION.sub(b"", data)
+    data = _SPACE_BETWEEN_TAGS.sub(b"><", data)
+    data = _CREATION_ID.sub(b"", data)
+    # 先删空的ext，再删因此变空的extLst
+    data = _EMPTY_EXTENSION.sub(b"", _EMPTY_EXTENSION.sub(b"", data))
+    if "/slides/" in part_name:
+        data = _SLIDE_ROOT.sub(lambda m: _HIDDEN_ATTRIBUTE.sub(b"", m.group(0)), data, count=1)
+    return data
+
+
+def find_duplicate_slides(pptx_path, indexes, params, slide_params=None):
+    """在indexes中查找渲染结果必然相同的页：规范化后的XML和引用的媒体、版式、母版都相同，渲染参数也相同
+
+    返回 {重复页: 第一次出现的页}；含页码字段的页不参与比较。
+    """
+    with zipfile.ZipFile(pptx_path) as zf:
+        part_names = slide_part_names(zf)
+        hasher = SlideHasher(zf, canonical_part)
+        digests = {}
+        for index in indexes:
+            part_name = part_names[index - 1]
+            if _SLIDE_NUMBER_FIELD.search(zf.read(part_name)):
+                continue
+            digests[index] = hasher.part_digest(part_name)
+    # 时长规划不同的页参数也不同，键中已包含各页的渲染参数
+    keys = slide_cache_keys(digests, params, slide_params)
+    first = {}
+    duplicates = {}
+    for index in sorted(keys):
+        if keys[index] in first:
+            duplicates[index] = first[keys[index]]
+        else:
+            first[keys[index]] = index
+    return duplicates
+
+
+class SlideSelection:
+    """本次要输出的页：按页码范围和是否跳过隐藏页筛选，duplicates为 {重复页: 与之相同的页}"""
+
+    def __init__(self, slide_count, selected, skipped_hidden=(), duplicates=None):
+        self.slide_count = slide_count
+        self.selected = list(selected)
+        self.skipped_hidden = list(skipped_hidden)
+        self.duplicates = duplicates or {}
+
+    @property
+    def is_full(self):
+        return len(self.selected) == self.slide_count
+
+    @property
+    def unique(self):
+        """需要实际渲染（或从缓存、上次运行取得）的页"""
+        return [i for i in self.selected if i not in self.duplicates]
+
+    @property
+    def avoided_renders(self):
+        """与逐页渲染所有页相比省掉的渲染次数：跳过的隐藏页和重复页"""
+        return len(self.skipped_hidden) + len(self.duplicates)
+
+    def summary(self):
+        """筛选结果的说明，没有筛掉任何页时返回空字符串"""
+        parts = []
+        if not self.is_full:
+            parts.append(f"输出{len(self.selected)}/{self.slide_count}页")
+        if self.skipped_hidden:
+            parts.append(f"跳过隐藏页{len(self.skipped_hidden)}页")
+        if self.duplicates:
+            pairs = "，".join(f"第{dup}页同第{source}页" for dup, source in sorted(self.duplicates.items())[:5])
+            more = "等" if len(self.duplicates) > 5 else ""
+            parts.append(f"重复页{len(self.duplicates)}页（{pairs}{more}）")
+        return "，".join(parts)
+
+
+def select_slides(pptx_path, slide_infos, slides=None, skip_hidden=False, dedup=False, params=None, slide_params=None):
+    """按页码范围（字符串或页码列表，None为全部）、是否跳过隐藏页和是否合并重复页确定要输出的页，返回SlideSelection"""
+    slide_count = len(slide_infos)
+    if slides is None:
+        selected = list(range(1, slide_count + 1))
+    elif isinstance(slides, str):
+        selected = parse_slide_ranges(slides, slide_count)
+    else:
+        selected = sorted(set(slides))
+        if selected and (selected[0] < 1 or selected[-1] > slide_count):
+            raise ValueError(f"页码超出1-{slide_count}")
+    skipped_hidden = []
+    if skip_hidden:
+        hidden = {info.index for info in slide_infos if info.hidden}
+        skipped_hidden = [i for i in selected if i in hidden]
+        selected = [i for i in selected if i not in hidden]
+    duplicates = find_duplicate_slides(pptx_path, selected, params or {}, slide_params) if dedup and selected else {}
+    return SlideSelection(slide_count, selected, skipped_hidden, duplicates)
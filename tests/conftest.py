@@ -0,0 +1,19 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+
+import pytest
+
+# 模块都在仓库根目录，测试直接导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import build_synthetic_deck
+
+
+@pytest.fixture
+def make_deck(tmp_path):
+    """在临时目录中生成合成演示文稿，参数同benchmark.build_synthetic_deck"""
+    def make(slide_count=5, name="deck.pptx", **options):
+        return build_synthetic_deck(str(tmp_path / name), slide_count, **options)
+    return make
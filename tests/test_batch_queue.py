@@ -0,0 +1,57 @@
+# -*- coding: UTF-8 -*-
+
+import os
+
+from batch_queue import JOB_DONE, JOB_RUNNING, SLIDE_DONE, SLIDE_PENDING, JobQueue, collect_decks, run_jobs
+
+
+def test_enqueue_same_deck_returns_existing_job(make_deck, tmp_path):
+    deck = make_deck(3)
+    with JobQueue(str(tmp_path / "jobs.sqlite3")) as queue:
+        job_id = queue.enqueue(deck, str(tmp_path / "out"))
+        assert queue.enqueue(os.path.join(os.path.dirname(deck), ".", "deck.pptx"), str(tmp_path / "out")) == job_id
+        assert len(queue.jobs()) == 1
+        assert queue.get(job_id)["slide_count"] == 3
+        assert queue.slide_statuses(job_id) == {1: SLIDE_PENDING, 2: SLIDE_PENDING, 3: SLIDE_PENDING}
+
+
+def test_same_name_in_other_directory_gets_own_output_dir(make_deck, tmp_path):
+    first = make_deck(2, name="deck.pptx")
+    os.makedirs(tmp_path / "other")
+    second = make_deck(2, name="other/deck.pptx")
+    output_root = str(tmp_path / "out")
+    with JobQueue(str(tmp_path / "jobs.sqlite3")) as queue:
+        first_dir = queue.get(queue.enqueue(first, output_root))["output_dir"]
+        second_dir = queue.get(queue.enqueue(second, output_root))["output_dir"]
+        assert first_dir == os.path.join(output_root, "deck")
+        assert second_dir == os.path.join(output_root, "deck_2")
+        assert collect_decks([str(tmp_path)]) == sorted([first, second])
+
+
+def test_claim_is_atomic_across_connections(make_deck, tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    decks = [make_deck(1, name=f"deck{i}.pptx") for i in range(2)]
+    with JobQueue(db_path) as first, JobQueue(db_path) as second:
+        ids = [first.enqueue(deck, str(tmp_path / "out")) for deck in decks]
+        claimed = [first.claim("a"), second.claim("b")]
+        assert sorted(job.id for job in claimed) == ids
+        assert first.claim("a") is None and second.claim("b") is None
+        assert {row["worker"] for row in first.jobs(JOB_RUNNING)} == {"a", "b"}
+        # 上次中断遗留的转换中任务重新排队后可以再次领取
+        assert second.requeue_stale() == 2
+        assert first.claim("a", job_ids=[ids[1]]).id == ids[1]
+
+
+def test_run_jobs_with_fake_backend(make_deck, tmp_path):
+    deck = make_deck(3)
+    messages = []
+    with JobQueue(str(tmp_path / "jobs.sqlite3")) as queue:
+        job_id = queue.enqueue(deck, str(tmp_path / "out"), {"use_cache": False})
+        assert run_jobs(queue, None, "fake", "test", progress_callback=messages.append) == 1
+        row = queue.get(job_id)
+        assert (row["status"], row["success_count"], row["slide_count"]) == (JOB_DONE, 3, 3)
+        assert queue.slide_statuses(job_id) == {1: SLIDE_DONE, 2: SLIDE_DONE, 3: SLIDE_DONE}
+        assert queue.summary()["jobs"] == {JOB_DONE: 1}
+    assert messages[0] == f"[test] 开始转换: {deck}"
+    assert messages[-1] == f"[test] 完成: {deck}"
+    assert sorted(os.listdir(row["output_dir"]))[:3] == ["deck_1.wmv", "deck_2.wmv", "deck_3.wmv"]
@@ -0,0 +1,30 @@
+# -*- coding: UTF-8 -*-
+
+from converter import PPTToVideoConverter
+from pptx_index import SlideInfo
+
+
+def _infos(hidden):
+    infos = []
+    for i in range(1, 4):
+        info = SlideInfo(i, f"ppt/slides/slide{i}.xml")
+        info.hidden = i in hidden
+        infos.append(info)
+    return infos
+
+
+def test_all_hidden_is_not_reported_as_failure(tmp_path):
+    messages = []
+    result = PPTToVideoConverter().combine_deck("deck", str(tmp_path), {}, _infos({1, 2, 3}), set(), 30,
+                                                messages.append)
+    assert result is None
+    assert messages == ["本次没有输出未隐藏的页，不生成合并视频"]
+
+
+def test_missing_slides_block_combining(tmp_path):
+    messages = []
+    output_paths = {i: str(tmp_path / f"slide_{i}.wmv") for i in (1, 2)}
+    result = PPTToVideoConverter().combine_deck("deck", str(tmp_path), output_paths, _infos({3}), {1}, 30,
+                                                messages.append)
+    assert result is None
+    assert messages == ["有1页未导出成功，不生成合并视频"]
@@ -0,0 +1,44 @@
+# -*- coding: UTF-8 -*-
+
+from concat import SegmentInfo, StreamSignature, choose_target, conform_cost
+
+
+# PowerPoint渲染的WMV9片段（带音频）和快速路径用ffmpeg生成的WMV8片段（无音频）
+POWERPOINT_WMV = StreamSignature(("wmv3", 1280, 720, "yuv420p"), ("wmav2", 44100, 2))
+FAST_WMV = StreamSignature(("wmv2", 1280, 720, "yuv420p"), None)
+POWERPOINT_MP4 = StreamSignature(("h264", 1280, 720, "yuv420p"), ("aac", 48000, 2))
+FAST_MP4 = StreamSignature(("h264", 1280, 720, "yuv420p"), None)
+
+
+def _segments(*signatures):
+    return [SegmentInfo(i, f"slide_{i}.mp4", 5.0, signature) for i, signature in enumerate(signatures, 1)]
+
+
+def test_identical_segments_keep_their_codec():
+    segments = _segments(POWERPOINT_WMV, POWERPOINT_WMV)
+    assert choose_target(segments, ".wmv") == POWERPOINT_WMV
+    assert conform_cost(segments, POWERPOINT_WMV) == (0, 0)
+
+
+def test_mixed_wmv_reencodes_only_the_powerpoint_segments():
+    # WMV9无法由ffmpeg编码，只重新编码PowerPoint渲染的视频，快速路径的片段只补静音
+    segments = _segments(POWERPOINT_WMV, FAST_WMV, FAST_WMV, FAST_WMV)
+    target = choose_target(segments, ".wmv")
+    assert target == StreamSignature(FAST_WMV.video, POWERPOINT_WMV.audio)
+    assert conform_cost(segments, target) == (1, 3)
+
+
+def test_mixed_mp4_copies_all_video():
+    segments = _segments(POWERPOINT_MP4, POWERPOINT_MP4, FAST_MP4)
+    target = choose_target(segments, ".mp4")
+    assert target == POWERPOINT_MP4
+    assert conform_cost(segments, target) == (0, 1)
+
+
+def test_unencodable_codec_is_replaced_by_default():
+    other = StreamSignature(("vp8", 1280, 720, "yuv420p"), None)
+    segments = _segments(POWERPOINT_WMV, other)
+    target = choose_target(segments, ".wmv")
+    assert target.video == ("wmv2", 1280, 720, "yuv420p")
+    assert target.audio == POWERPOINT_WMV.audio
+    assert conform_cost(segments, POWERPOINT_WMV) is None
@@ -0,0 +1,56 @@
+# -*- coding: UTF-8 -*-
+
+from converter import PPTToVideoConverter
+from manifest import ORIGIN_RENDER, ORIGIN_RESUME
+from progress_events import SLIDE_DONE, SLIDE_FAILED
+
+
+def test_failed_slide_reports_error(make_deck, tmp_path):
+    deck = make_deck(3)
+    converter = PPTToVideoConverter()
+    converter.backend_settings = {"fail_slides": [2]}
+    events = []
+    converter.convert_ppt_to_videos(deck, backend="fake", output_dir=str(tmp_path / "out"), use_cache=False,
+                                    event_callback=events.append)
+    done = sorted(event["slide"] for event in events if event.kind == SLIDE_DONE)
+    failed = [event for event in events if event.kind == SLIDE_FAILED]
+    assert done == [1, 3]
+    assert [event["slide"] for event in failed] == [2]
+    assert failed[0]["error"]
+
+
+def _convert(deck, output_dir, stop_after=None, **options):
+    """用假后端转换，返回 {页码: 来源}；stop_after为页码时该页完成后中断转换"""
+    converter = PPTToVideoConverter()
+    origins = {}
+
+    def on_event(event):
+        if event.kind == SLIDE_DONE:
+            origins[event["slide"]] = event["origin"]
+            if event["slide"] == stop_after:
+                converter.stop_conversion()
+    converter.convert_ppt_to_videos(deck, backend="fake", output_dir=output_dir, use_cache=False, fast_path=False,
+                                    event_callback=on_event, **options)
+    return origins
+
+
+def test_resume_skips_finished_slides(make_deck, tmp_path):
+    deck = make_deck(8)
+    output_dir = str(tmp_path / "out")
+    # 中断时流水线中已在处理的页仍会完成，最后一页一定没有开始
+    finished = set(_convert(deck, output_dir, stop_after=2, vert_resolution=720))
+    assert {1, 2} <= finished and 8 not in finished
+
+    # 续传时已完成的页来自上次运行，其余页重新渲染
+    second = _convert(deck, output_dir, resume=True, vert_resolution=720)
+    assert second == {i: ORIGIN_RESUME if i in finished else ORIGIN_RENDER for i in range(1, 9)}
+
+    # 输出文件大小变化的页重新渲染
+    with open(tmp_path / "out" / "deck_3.wmv", "a", encoding="utf-8") as f:
+        f.write("edited")
+    third = _convert(deck, output_dir, resume=True, vert_resolution=720)
+    assert third[3] == ORIGIN_RENDER
+    assert [third[i] for i in third if i != 3] == [ORIGIN_RESUME] * 7
+
+    # 渲染参数变化时所有页都重新渲染
+    assert set(_convert(deck, output_dir, resume=True, vert_resolution=1080).values()) == {ORIGIN_RENDER}
@@ -0,0 +1,59 @@
+# -*- coding: UTF-8 -*-
+
+import os
+
+import pytest
+
+from deck_export import FakeDeckRenderer, FakeSplitter, SlideSegment, SlideTiming, TimestampIndex, WholeDeckExporter
+
+
+# 第2页有0.5秒切换动画，片段包含切换时长
+TIMINGS = [SlideTiming(1, 0, 2000), SlideTiming(2, 500, 1500), SlideTiming(3, 0, 1000)]
+
+
+def _frames(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()[1:]
+
+
+def test_index_accumulates_durations():
+    index = TimestampIndex.from_timings(TIMINGS)
+    assert index.segments == [SlideSegment(1, 0, 2000), SlideSegment(2, 2000, 4000), SlideSegment(3, 4000, 5000)]
+    assert index.total_ms == 5000
+    assert index.segment_for(2) == SlideSegment(2, 2000, 4000)
+    with pytest.raises(KeyError):
+        index.segment_for(4)
+    assert TimestampIndex([]).total_ms == 0
+
+
+@pytest.mark.parametrize("position, slide", [(0, 1), (1999, 1), (2000, 2), (3999.5, 2), (4000, 3), (4999, 3),
+                                             (5000, None), (-1, None)])
+def test_slide_at_boundaries(position, slide):
+    assert TimestampIndex.from_timings(TIMINGS).slide_at(position) == slide
+
+
+def test_render_and_split_round_trip(tmp_path):
+    outputs = {i: str(tmp_path / f"slide_{i}.wmv") for i in (1, 2, 3)}
+    exporter = WholeDeckExporter(FakeDeckRenderer(), FakeSplitter(), str(tmp_path))
+    assert exporter.export(TIMINGS, outputs, vert_resolution=720, frames_per_second=10) == [1, 2, 3]
+    # 每页一个片段，帧数等于该页时长，帧内容都是该页页码
+    for i, length_ms in ((1, 2000), (2, 2000), (3, 1000)):
+        assert _frames(outputs[i]) == [str(i)] * (length_ms * 10 // 1000)
+    # 整体视频是临时文件，导出后删除
+    assert sorted(os.listdir(tmp_path)) == ["slide_1.wmv", "slide_2.wmv", "slide_3.wmv"]
+
+
+def test_skipped_slides_keep_later_bounds(tmp_path):
+    # 第2页隐藏（或已从缓存取得）不需要输出，仍占用整体视频中的时间，第3页的片段不受影响
+    outputs = {i: str(tmp_path / f"slide_{i}.wmv") for i in (1, 3)}
+    exporter = WholeDeckExporter(FakeDeckRenderer(), FakeSplitter(), str(tmp_path))
+    assert exporter.export(TIMINGS, outputs, frames_per_second=10) == [1, 3]
+    assert _frames(outputs[3]) == ["3"] * 10
+    assert not os.path.exists(tmp_path / "slide_2.wmv")
+
+
+def test_cancelled_export_splits_nothing(tmp_path):
+    outputs = {i: str(tmp_path / f"slide_{i}.wmv") for i in (1, 2, 3)}
+    exporter = WholeDeckExporter(FakeDeckRenderer(), FakeSplitter(), str(tmp_path))
+    assert exporter.export(TIMINGS, outputs, is_cancelled=lambda: True) == []
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,99 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import json
+import time
+import functools
+
+from backends import FakeRenderBackend
+from distributed import (CLOCK_SKEW_ALLOWANCE, DistributedCoordinator, DistributedWorker, SharedDeck, read_json,
+                         run_workers)
+from manifest import MANIFEST_NAME, Manifest
+
+
+def _submit(make_deck, tmp_path, slide_count=3, **options):
+    root = str(tmp_path / "shared")
+    coordinator = DistributedCoordinator(root, "fake")
+    deck_id = coordinator.submit(make_deck(slide_count), str(tmp_path / "out"), dict(use_cache=False, **options))
+    return coordinator, root, deck_id
+
+
+def _expire(lease):
+    """把租约改为已过期，模拟持有者失联"""
+    record = read_json(lease.path)
+    record["expires"] = time.time() - CLOCK_SKEW_ALLOWANCE - 1
+    with open(lease.path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+
+
+def test_claim_is_exclusive(make_deck, tmp_path):
+    _, root, deck_id = _submit(make_deck, tmp_path)
+    deck = SharedDeck.load(root, deck_id)
+    lease = deck.try_claim(1, "a", 60)
+    assert lease is not None
+    assert deck.try_claim(1, "b", 60) is None
+    assert deck.states()[2] == [1]
+    lease.release()
+    assert deck.try_claim(1, "b", 60) is not None
+
+
+def test_expired_lease_is_reclaimed_and_counted(make_deck, tmp_path):
+    _, root, deck_id = _submit(make_deck, tmp_path)
+    deck = SharedDeck.load(root, deck_id)
+    lease = deck.try_claim(2, "a", 60)
+    _expire(lease)
+    assert 2 in deck.states()[3]
+    other = deck.try_claim(2, "b", 60)
+    assert other is not None
+    assert deck.attempts() == {2: 1}
+    # 原持有者续约时发现租约已被收回，不会覆盖新持有者的租约
+    assert not lease.renew()
+    assert read_json(lease.path)["token"] == other.token
+    assert other.renew()
+
+
+def test_empty_lease_uses_configured_lease_seconds(make_deck, tmp_path):
+    _, root, deck_id = _submit(make_deck, tmp_path)
+    deck = SharedDeck.load(root, deck_id, lease_seconds=5)
+    path = deck.lease_path(1)
+    open(path, "w").close()
+    assert not deck.lease_expired(1)
+    old = time.time() - 5 - CLOCK_SKEW_ALLOWANCE - 1
+    os.utime(path, (old, old))
+    assert deck.lease_expired(1)
+
+
+def test_worker_renders_and_coordinator_finalizes_selection(make_deck, tmp_path):
+    coordinator, root, deck_id = _submit(make_deck, tmp_path, slide_count=4, slides="2-3")
+    # 转换记录在汇总前被删除时重新创建，仍只记录选择的页
+    os.remove(str(tmp_path / "out" / MANIFEST_NAME))
+    worker = DistributedWorker(root, FakeRenderBackend, name="w1", idle_timeout=0)
+    assert worker.run() == 2
+    result = coordinator.wait([deck_id], poll_interval=0.01)[deck_id]
+    assert result["success_count"] == 2
+    assert result["failed"] == []
+    assert Manifest.load(str(tmp_path / "out")).data["selected"] == [2, 3]
+
+
+class CountingBackend(FakeRenderBackend):
+    """记录每页的渲染次数"""
+
+    renders = {}
+
+    def export_slide(self, slide_index, output_path, params):
+        self.renders[slide_index] = self.renders.get(slide_index, 0) + 1
+        return super().export_slide(slide_index, output_path, params)
+
+
+def test_failed_slide_renders_at_most_max_attempts_times(make_deck, tmp_path):
+    coordinator, root, deck_id = _submit(make_deck, tmp_path)
+    CountingBackend.renders = {}
+    worker = DistributedWorker(root, functools.partial(CountingBackend, fail_slides=[2]), name="w1", idle_timeout=0)
+    worker.run()
+    # 租约的重试已经限制次数，流水线不再重试
+    assert CountingBackend.renders[2] == coordinator.max_attempts
+
+
+def test_run_workers_returns_total_processed(make_deck, tmp_path):
+    _, root, _ = _submit(make_deck, tmp_path, slide_count=4)
+    assert run_workers(root, FakeRenderBackend, count=2, idle_timeout=0) == 4
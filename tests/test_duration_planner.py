@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*-
+
+import zipfile
+
+import pytest
+
+from duration_planner import (SOURCE_ANIMATION, SOURCE_DEFAULT, SOURCE_MEDIA, SOURCE_TIMING, DurationPlan,
+                              media_duration_ms, plan_slide)
+from pptx_index import SlideInfo
+from test_media_probe import build_mp4
+
+
+def _info(index=1, advance_after_ms=None, animation_ms=0, transition_ms=0, media=(), media_trims=None):
+    info = SlideInfo(index, f"ppt/slides/slide{index}.xml")
+    info.advance_after_ms = advance_after_ms
+    info.animation_ms = animation_ms
+    info.transition_ms = transition_ms
+    info.media = list(media)
+    info.media_trims = media_trims or {}
+    return info
+
+
+@pytest.mark.parametrize("options, media_ms, hold_ms, source", [
+    # 设置了换片时间：按换片时间，媒体按作者的设置截断，动画更长时等动画结束
+    (dict(advance_after_ms=3000, animation_ms=1000), 10000, 3000, SOURCE_TIMING),
+    (dict(advance_after_ms=2000, animation_ms=4000), 0, 4000, SOURCE_ANIMATION),
+    # 未设置换片时间：至少默认时长，动画或媒体更长时延长到播放结束
+    (dict(animation_ms=1000), 2000, 5000, SOURCE_DEFAULT),
+    (dict(animation_ms=7000), 6000, 7000, SOURCE_ANIMATION),
+    (dict(animation_ms=7000), 8000, 8000, SOURCE_MEDIA),
+    (dict(animation_ms=7000), 7000, 7000, SOURCE_MEDIA),
+])
+def test_plan_slide_priority(options, media_ms, hold_ms, source):
+    plan = plan_slide(_info(transition_ms=500, **options), 5000, media_ms)
+    assert (plan.hold_ms, plan.source) == (hold_ms, source)
+    assert plan.duration_ms == hold_ms + 500
+
+
+def test_render_duration_and_slide_params():
+    plan = DurationPlan([plan_slide(_info(1), 5000),
+                         plan_slide(_info(2, advance_after_ms=8000), 5000),
+                         plan_slide(_info(3), 5000, media_ms=6200),
+                         plan_slide(_info(4, animation_ms=9000), 5000)], 5)
+    # 设置了换片时间或使用默认时长的页不需要单独的参数；延长的时长向上取整到秒
+    assert [plan.render_duration(i) for i in (1, 2, 3, 4)] == [None, None, 7, 9]
+    params = {"default_slide_duration": 5, "vert_resolution": 720}
+    assert plan.slide_params(params) == {3: dict(params, default_slide_duration=7),
+                                         4: dict(params, default_slide_duration=9)}
+    assert plan.total_ms() == 5000 + 8000 + 6200 + 9000
+    assert plan.total_ms([1, 3]) == 11200
+
+
+def test_summary():
+    plan = DurationPlan([plan_slide(_info(1), 5000, media_ms=6200),
+                         plan_slide(_info(2, animation_ms=7000), 5000),
+                         plan_slide(_info(3, advance_after_ms=2000), 5000),
+                         plan_slide(_info(4, advance_after_ms=9000), 5000)], 5)
+    assert plan.summary() == "1页按音视频延长1.2秒，1页按动画延长2.0秒，1页按换片时间缩短3.0秒"
+    assert DurationPlan([plan_slide(_info(1), 5000)], 5).summary() == ""
+
+
+def test_media_duration_applies_trims(tmp_path):
+    deck = tmp_path / "deck.pptx"
+    with zipfile.ZipFile(deck, "w") as zf:
+        zf.writestr("ppt/media/a.mp4", build_mp4(10000))
+        zf.writestr("ppt/media/b.mp4", build_mp4(4000))
+    durations = {}
+    with zipfile.ZipFile(deck) as zf:
+        trimmed = _info(media=["ppt/media/a.mp4", "ppt/media/b.mp4"], media_trims={"ppt/media/a.mp4": (2000, 6000)})
+        assert media_duration_ms(zf, trimmed, durations) == 4000
+        # 只剪掉开头时播放到结尾；剪裁结束超过媒体时长时按媒体时长
+        assert media_duration_ms(zf, _info(media=["ppt/media/a.mp4"],
+                                           media_trims={"ppt/media/a.mp4": (3000, None)}), durations) == 7000
+        assert media_duration_ms(zf, _info(media=["ppt/media/b.mp4"],
+                                           media_trims={"ppt/media/b.mp4": (1000, 60000)}), durations) == 3000
+        # 读不到时长的媒体不计入
+        assert media_duration_ms(zf, _info(media=["ppt/media/missing.mp4"]), durations) == 0
+    assert durations == {"ppt/media/a.mp4": 10000, "ppt/media/b.mp4": 4000, "ppt/media/missing.mp4": None}
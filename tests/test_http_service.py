@@ -0,0 +1,157 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import json
+import time
+import asyncio
+import threading
+import http.client
+
+import pytest
+
+import http_service
+from converter import PPTToVideoConverter
+from http_service import JOB_CANCELLED, JOB_DONE, ConversionService, ServiceJob
+
+
+@pytest.fixture
+def service(tmp_path):
+    """在后台线程的事件循环中运行使用假后端的服务，返回 (服务, 端口)"""
+    service = ConversionService(str(tmp_path / "service"), backend_name="fake",
+                                default_options={"use_cache": False})
+    loop = asyncio.new_event_loop()
+    ports = []
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        ports.append(loop.run_until_complete(service.start("127.0.0.1", 0)))
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait(10)
+    yield service, ports[0]
+    asyncio.run_coroutine_threadsafe(service.close(), loop).result(30)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def _request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def _upload(port, deck, query="name=deck.pptx"):
+    with open(deck, "rb") as f:
+        return _request(port, "POST", f"/jobs?{query}", f.read())
+
+
+def _wait_finished(port, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, _, body = _request(port, "GET", f"/jobs/{job_id}")
+        job = json.loads(body)
+        if job["status"] in ("done", "failed", "cancelled"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("任务没有在规定时间内结束")
+
+
+def test_upload_convert_and_download(service, make_deck):
+    _, port = service
+    status, headers, body = _upload(port, make_deck(3))
+    assert status == 202
+    job = json.loads(body)
+    assert headers["Location"] == f"/jobs/{job['id']}"
+
+    job = _wait_finished(port, job["id"])
+    assert job["status"] == "done"
+    assert job["success_count"] == 3
+    assert [slide["status"] for slide in job["slides"]] == ["done"] * 3
+
+    status, _, video = _request(port, "GET", job["slides"][1]["url"])
+    assert status == 200 and b" 2 " in video
+    status, headers, part = _request(port, "GET", job["slides"][1]["url"], headers={"Range": "bytes=0-3"})
+    assert status == 206 and part == video[:4]
+    assert headers["Content-Range"] == f"bytes 0-3/{len(video)}"
+
+
+def test_events_stream_replays_history(service, make_deck):
+    _, port = service
+    job = json.loads(_upload(port, make_deck(2))[2])
+    _wait_finished(port, job["id"])
+    status, headers, body = _request(port, "GET", f"/jobs/{job['id']}/events")
+    assert status == 200
+    assert headers["Content-Type"].startswith("text/event-stream")
+    kinds = [line[len("event: "):] for line in body.decode("utf-8").splitlines() if line.startswith("event: ")]
+    assert kinds.count("slide_done") == 2
+    assert kinds[-1] == "job_status"
+
+
+def test_rejects_invalid_requests(service):
+    _, port = service
+    assert _request(port, "POST", "/jobs", b"not a zip file")[0] == 415
+    assert _request(port, "POST", "/jobs?duration=abc", b"PK")[0] == 400
+    assert _request(port, "GET", "/jobs/missing")[0] == 404
+    assert _request(port, "PUT", "/jobs")[0] == 405
+    status, _, body = _request(port, "GET", "/health")
+    assert status == 200 and json.loads(body)["backend"] == "fake"
+
+
+def _direct_job(tmp_path, make_deck, slide_count=3):
+    """不启动服务，直接在当前线程运行任务；发出的事件记录在列表中"""
+    service = ConversionService(str(tmp_path / "service"), backend_name="fake", backend_settings={"delay": 0.05})
+    deck = make_deck(slide_count)
+    job = ServiceJob("job1", "deck.pptx", os.path.dirname(deck), {"use_cache": False})
+    job.deck_path = deck
+    converter = PPTToVideoConverter()
+    converter.backend_settings = dict(service.backend_settings)
+    return service, job, converter
+
+
+def test_cancel_before_conversion_starts_is_not_lost(tmp_path, make_deck):
+    service, job, converter = _direct_job(tmp_path, make_deck)
+    events = []
+    service._post = lambda job, event: events.append(event)
+    # 取消在工作线程取出任务之后、设置job.converter之前到达
+    job.cancel_requested = True
+    service._run_job(converter, job, 1)
+    assert events[-1]["status"] == JOB_CANCELLED
+    assert not os.path.exists(job.output_dir)
+
+
+def test_cancel_before_converter_is_running_stops_it(tmp_path, make_deck):
+    service, job, converter = _direct_job(tmp_path, make_deck, slide_count=5)
+    events = []
+
+    def post(job, event):
+        # 模拟取消在转换器把is_converting置为True之前到达：stop_conversion被覆盖，只留下cancel_requested
+        job.cancel_requested = True
+        events.append(event)
+    service._post = post
+    service._run_job(converter, job, 1)
+    assert events[-1]["status"] == JOB_CANCELLED
+    assert sum(1 for event in events if event.kind == "slide_done") < 5
+
+
+def test_prune_keeps_jobs_being_downloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_service, "MAX_FINISHED_JOBS", 1)
+    service = ConversionService(str(tmp_path / "service"), backend_name="fake")
+    for i in range(3):
+        job = ServiceJob(f"job{i}", "deck.pptx", str(tmp_path / f"job{i}"), {})
+        job.status, job.finished = JOB_DONE, i
+        service.jobs[job.id] = job
+    service.jobs["job0"].downloads = 1
+    service._prune_finished()
+    assert sorted(service.jobs) == ["job0", "job2"]
+    service.jobs["job0"].downloads = 0
+    service._prune_finished()
+    assert sorted(service.jobs) == ["job2"]
@@ -0,0 +1,122 @@
+# -*- coding: UTF-8 -*-
+
+import io
+import struct
+import zipfile
+
+import pytest
+
+from media_probe import ASF_FILE_PROPERTIES_GUID, ASF_HEADER_GUID, probe_duration_ms, probe_file, probe_member
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def build_mp4(duration_ms, version=0):
+    """ftyp + moov/mvhd + mdat，时间刻度600"""
+    if version == 1:
+        mvhd = struct.pack(">IQQIQ", 1 << 24, 0, 0, 600, duration_ms * 600 // 1000)
+    else:
+        mvhd = struct.pack(">IIIII", 0, 0, 0, 600, duration_ms * 600 // 1000)
+    return (_box(b"ftyp", b"isom\0\0\0\0") + _box(b"moov", _box(b"mvhd", mvhd + bytes(80)))
+            + _box(b"mdat", bytes(64)))
+
+
+def build_asf(duration_ms, preroll=3000):
+    properties = bytes(16) + struct.pack("<QQQQQQI", 0, 0, 1, (duration_ms + preroll) * 10000, 0, preroll, 2) + bytes(12)
+    file_properties = ASF_FILE_PROPERTIES_GUID + struct.pack("<Q", 24 + len(properties)) + properties
+    # 文件属性对象前放一个其他对象，检查按对象大小跳过
+    other = bytes(range(16)) + struct.pack("<Q", 40) + bytes(16)
+    return ASF_HEADER_GUID + struct.pack("<QIBB", 30 + len(other) + len(file_properties), 2, 1, 2) + other + file_properties
+
+
+def build_wav(duration_ms, data_length=None):
+    byte_rate = 44100 * 2 * 2
+    data = bytes(byte_rate * duration_ms // 1000)
+    fmt = struct.pack("<HHIIHH", 1, 2, 44100, byte_rate, 4, 16)
+    # 数据块之前有一个奇数长度的块，检查2字节对齐
+    chunks = (b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"LIST" + struct.pack("<I", 3) + b"abc\0"
+              + b"data" + struct.pack("<I", len(data) if data_length is None else data_length) + data)
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks
+
+
+def build_avi(micro_per_frame, frames):
+    avih = struct.pack("<IIIII", micro_per_frame, 0, 0, 0, frames) + bytes(36)
+    hdrl = b"hdrl" + b"avih" + struct.pack("<I", len(avih)) + avih
+    chunks = b"LIST" + struct.pack("<I", len(hdrl)) + hdrl + b"LIST" + struct.pack("<I", 4) + b"movi"
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"AVI " + chunks
+
+
+# MPEG-1 Layer III，128kbps，44100Hz，立体声：每帧417字节、1152个样本
+MP3_HEADER = b"\xff\xfb\x90\x00"
+MP3_FRAME_LENGTH = 417
+
+
+def build_mp3(frame_count, first_frame_tag=b"", id3_size=0, id3v1=False):
+    """frame_count个CBR帧；first_frame_tag写在第一帧的数据中（Xing/VBRI头）"""
+    first = (MP3_HEADER + first_frame_tag).ljust(MP3_FRAME_LENGTH, b"\0")
+    data = first + (MP3_HEADER + bytes(MP3_FRAME_LENGTH - 4)) * (frame_count - 1)
+    if id3_size:
+        size_bytes = bytes((id3_size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+        data = b"ID3\x03\x00\x00" + size_bytes + bytes(id3_size) + data
+    if id3v1:
+        data += b"TAG" + bytes(125)
+    return data
+
+
+def _xing(frames):
+    # 立体声MPEG-1的边信息为32字节
+    return bytes(32) + b"Xing" + struct.pack(">II", 1, frames)
+
+
+def _vbri(frames):
+    return bytes(32) + b"VBRI" + struct.pack(">HHHII", 1, 0, 0, 0, frames)
+
+
+def _probe(data):
+    return probe_duration_ms(io.BytesIO(data), len(data))
+
+
+@pytest.mark.parametrize("data, expected", [
+    (build_mp4(3500), 3500),
+    (build_mp4(125000, version=1), 125000),
+    (build_asf(4200), 4200),
+    (build_wav(1500), 1500),
+    # 流式写入的WAV：数据长度未知，一直到文件末尾
+    (build_wav(1500, data_length=0xFFFFFFFF), 1500),
+    (build_avi(40000, 75), 3000),
+    (build_mp3(100), 100 * MP3_FRAME_LENGTH * 8 // 128),
+    (build_mp3(100, id3_size=300, id3v1=True), 100 * MP3_FRAME_LENGTH * 8 // 128),
+    (build_mp3(10, _xing(200)), 200 * 1152 * 1000 // 44100),
+    (build_mp3(10, _vbri(300), id3_size=50), 300 * 1152 * 1000 // 44100),
+])
+def test_probe_duration(data, expected):
+    assert _probe(data) == expected
+
+
+@pytest.mark.parametrize("data", [b"", b"short", bytes(64),
+                                  # 只有一个孤立的帧头，找不到连续的帧同步
+                                  b"ID3\x03\x00\x00\x00\x00\x00\x00" + MP3_HEADER + bytes(100)])
+def test_unknown_or_damaged_data(data):
+    assert _probe(data) is None
+
+
+def test_probe_file_and_zip_members(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(build_mp4(2000))
+    assert probe_file(str(path)) == 2000
+    assert probe_file(str(tmp_path / "missing.mp4")) is None
+    # 截断在头部中间的文件读取失败时返回None
+    damaged = tmp_path / "damaged.wav"
+    damaged.write_bytes(build_wav(1000)[:28])
+    assert probe_file(str(damaged)) is None
+
+    deck = tmp_path / "deck.zip"
+    with zipfile.ZipFile(deck, "w") as zf:
+        zf.writestr("ppt/media/stored.mp4", build_mp4(2500), zipfile.ZIP_STORED)
+        zf.writestr("ppt/media/deflated.wav", build_wav(700), zipfile.ZIP_DEFLATED)
+    with zipfile.ZipFile(deck) as zf:
+        assert probe_member(zf, "ppt/media/stored.mp4") == 2500
+        assert probe_member(zf, "ppt/media/deflated.wav") == 700
+        assert probe_member(zf, "ppt/media/missing.mp4") is None
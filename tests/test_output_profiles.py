@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+
+from output_profiles import (CODEC_COPY, PROFILES, OutputProfile, get_profile, profile_from_params, profile_params,
+                             resolve_profile)
+
+
+def test_get_profile_and_overrides():
+    assert get_profile().name == "wmv"
+    profile = get_profile("mp4-small", crf=20)
+    assert (profile.name, profile.codec, profile.preset, profile.crf) == ("custom", "h264", "small", 20)
+    assert get_profile("mp4-small").name == "mp4-small"
+    with pytest.raises(ValueError):
+        get_profile("avi")
+
+
+@pytest.mark.parametrize("options", [
+    dict(container="mkv"),
+    dict(preset="medium"),
+    dict(codec="vp9"),
+    dict(container="wmv", codec="h264"),
+])
+def test_invalid_profiles(options):
+    with pytest.raises(ValueError):
+        OutputProfile("bad", **options)
+
+
+def test_resolve_profile():
+    profile = PROFILES["hevc-small"]
+    assert resolve_profile(profile) is profile
+    assert resolve_profile(profile.to_dict()).to_dict() == profile.to_dict()
+    assert resolve_profile("mp4").extension == ".mp4"
+    assert resolve_profile(None).name == "wmv"
+
+
+def test_profile_params_round_trip():
+    # 默认格式不写入参数，已有的缓存键保持不变
+    assert profile_params(PROFILES["wmv"]) == {}
+    assert profile_from_params({}).name == "wmv"
+    params = profile_params(PROFILES["mp4-fast"])
+    assert profile_from_params(params).to_dict() == PROFILES["mp4-fast"].to_dict()
+
+
+@pytest.mark.parametrize("name, still, expected", [
+    ("mp4", False, ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p"]),
+    ("mp4-small", True, ["-c:v", "libx264", "-preset", "slow", "-tune", "stillimage", "-crf", "28",
+                         "-pix_fmt", "yuv420p"]),
+    ("hevc-small", False, ["-c:v", "libx265", "-preset", "slow", "-crf", "30", "-tag:v", "hvc1",
+                           "-pix_fmt", "yuv420p"]),
+    ("wmv", False, ["-c:v", "wmv2", "-q:v", "2"]),
+    ("wmv-small", False, ["-c:v", "wmv2", "-q:v", "6"]),
+])
+def test_video_args(name, still, expected):
+    assert PROFILES[name].video_args(still=still) == expected
+
+
+def test_transcode_args():
+    assert not PROFILES["wmv"].transcodes
+    assert PROFILES["mp4-fast"].transcode_args() == ["-c", "copy", "-movflags", "+faststart"]
+    profile = get_profile("mp4-small", bitrate="2M")
+    assert profile.transcode_args() == ["-c:v", "libx264", "-preset", "slow", "-b:v", "2M", "-pix_fmt", "yuv420p",
+                                        "-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart"]
+    assert PROFILES["wmv-small"].encoder_args()[-4:] == ["-c:a", "wmav2", "-b:a", "96k"]
+    assert OutputProfile("x", "mp4", CODEC_COPY).transcodes
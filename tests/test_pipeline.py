@@ -0,0 +1,70 @@
+# -*- coding: UTF-8 -*-
+
+import os
+
+from backends import FakeRenderBackend
+from converter import build_render_params
+from fast_path import PATH_FAST, PATH_FULL
+from output_profiles import get_profile
+from pipeline import SlideExportPipeline
+
+
+PARAMS = build_render_params(5, 720, 30, get_profile(), "fake")
+
+
+class FlakyBackend(FakeRenderBackend):
+    """前几次渲染指定页时失败，之后成功"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = dict(failures)
+
+    def export_slide(self, slide_index, output_path, params):
+        if self.failures.get(slide_index):
+            self.failures[slide_index] -= 1
+            return False
+        return super().export_slide(slide_index, output_path, params)
+
+
+def _outputs(tmp_path, count):
+    return {i: str(tmp_path / f"slide_{i}.wmv") for i in range(1, count + 1)}
+
+
+def test_exports_every_slide_and_cleans_up(tmp_path):
+    outputs = _outputs(tmp_path, 4)
+    pipeline = SlideExportPipeline(FakeRenderBackend(), PARAMS, static_durations={2: 5.0, 4: 5.0})
+    started = []
+    results = pipeline.run(outputs, on_started=started.append)
+    assert sorted(result.slide for result in results) == [1, 2, 3, 4]
+    assert all(result.ok for result in results)
+    assert {result.slide: result.path for result in results} == {1: PATH_FULL, 2: PATH_FAST, 3: PATH_FULL, 4: PATH_FAST}
+    assert sorted(started) == [1, 2, 3, 4]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in outputs.values())
+
+
+def test_failed_render_is_retried(tmp_path):
+    outputs = _outputs(tmp_path, 3)
+    retries = []
+    pipeline = SlideExportPipeline(FlakyBackend({2: 1}), PARAMS, retry_delay=0)
+    results = pipeline.run(outputs, on_retry=lambda *args: retries.append(args))
+    assert sorted((result.slide, result.ok) for result in results) == [(1, True), (2, True), (3, True)]
+    assert retries == [(2, 1, "渲染失败", 0)]
+
+
+def test_gives_up_after_retries(tmp_path):
+    outputs = _outputs(tmp_path, 3)
+    retries = []
+    pipeline = SlideExportPipeline(FakeRenderBackend(fail_slides=[2]), PARAMS, retries=2, retry_delay=0)
+    results = pipeline.run(outputs, on_retry=lambda *args: retries.append(args))
+    failed = [result for result in results if not result.ok]
+    assert [(result.slide, result.error) for result in failed] == [(2, "渲染失败")]
+    assert [attempt for _, attempt, _, _ in retries] == [1, 2]
+    # 失败的页不留下临时文件，也不产生输出
+    assert sorted(os.listdir(tmp_path)) == ["slide_1.wmv", "slide_3.wmv"]
+
+
+def test_cancelled_run_leaves_no_files(tmp_path):
+    outputs = _outputs(tmp_path, 3)
+    pipeline = SlideExportPipeline(FakeRenderBackend(), PARAMS)
+    assert pipeline.run(outputs, is_cancelled=lambda: True) == []
+    assert os.listdir(tmp_path) == []
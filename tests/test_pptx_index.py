@@ -0,0 +1,97 @@
+# -*- coding: UTF-8 -*-
+
+import zipfile
+
+from benchmark import _NAMESPACES, _XML_HEADER
+from pptx_index import NS_P14, PptxIndex
+
+
+MC = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+
+# 两个单击步骤：第一步0.5秒；第二步延迟0.25秒，效果1秒重复2次
+MAIN_SEQUENCE = (
+    '<p:timing><p:tnLst><p:par><p:cTn id="1" dur="indefinite" nodeType="tmRoot"><p:childTnLst>'
+    '<p:seq><p:cTn id="2" dur="indefinite" nodeType="mainSeq"><p:childTnLst>'
+    '<p:par><p:cTn id="3" fill="hold"><p:stCondLst><p:cond delay="indefinite"/></p:stCondLst><p:childTnLst>'
+    '<p:par><p:cTn id="4" presetClass="entr" nodeType="clickEffect"><p:childTnLst>'
+    '<p:animEffect><p:cBhvr><p:cTn id="5" dur="500"/></p:cBhvr></p:animEffect>'
+    '</p:childTnLst></p:cTn></p:par></p:childTnLst></p:cTn></p:par>'
+    '<p:par><p:cTn id="6" fill="hold"><p:stCondLst><p:cond delay="250"/></p:stCondLst><p:childTnLst>'
+    '<p:par><p:cTn id="7" presetClass="emph" nodeType="clickEffect"><p:childTnLst>'
+    '<p:animEffect><p:cBhvr><p:cTn id="8" dur="1000" repeatCount="2000"/></p:cBhvr></p:animEffect>'
+    '</p:childTnLst></p:cTn></p:par></p:childTnLst></p:cTn></p:par>'
+    '</p:childTnLst></p:cTn></p:seq>'
+    # 交互触发的序列不计入
+    '<p:seq><p:cTn id="9" nodeType="interactiveSeq"><p:childTnLst><p:par><p:cTn id="10" dur="9000"/></p:par>'
+    '</p:childTnLst></p:cTn></p:seq>'
+    '</p:childTnLst></p:cTn></p:par></p:tnLst></p:timing>')
+
+MEDIA_SHAPE = (
+    f'<p:pic><p:nvPicPr><p:cNvPr id="4" name="video"/><p:cNvPicPr/><p:nvPr><a:videoFile r:link="rId2"/><p:extLst>'
+    f'<p:ext uri="{{DAA4B4D4-6D71-4841-9C94-3DE7FCFB9230}}"><p14:media xmlns:p14="{NS_P14}" r:embed="rId2">'
+    f'<p14:trim st="1500" end="4000.5"/></p14:media></p:ext></p:extLst></p:nvPr></p:nvPicPr></p:pic>')
+
+SLIDES = {
+    1: f'<p:sld {_NAMESPACES} show="false"><p:cSld/>'
+       '<p:transition spd="slow" advTm="3000"><p:fade/></p:transition></p:sld>',
+    2: f'<p:sld {_NAMESPACES} xmlns:mc="{MC}" xmlns:p14="{NS_P14}" show="0"><p:cSld><p:spTree>{MEDIA_SHAPE}'
+       '</p:spTree></p:cSld><mc:AlternateContent><mc:Choice Requires="p14">'
+       '<p:transition spd="med" p14:dur="1200" advTm="2500"><p:fade/></p:transition></mc:Choice>'
+       '<mc:Fallback><p:transition spd="med" advTm="2500"><p:fade/></p:transition></mc:Fallback>'
+       '</mc:AlternateContent></p:sld>',
+    # 只有换片计时和声音，没有切换效果
+    3: f'<p:sld {_NAMESPACES} show="1"><p:cSld/><p:transition advTm="4000"><p:sndAc><p:endSnd/></p:sndAc>'
+       f'</p:transition>{MAIN_SEQUENCE}</p:sld>',
+}
+
+
+def _deck(make_deck):
+    """第2页引用视频 ppt/media/media2.mp4（rId2），各页XML替换为SLIDES"""
+    path = make_deck(4, animated_every=0, media_every=2, media_size=1024)
+    with zipfile.ZipFile(path) as source:
+        members = [(info, source.read(info.filename)) for info in source.infolist()]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as target:
+        for info, data in members:
+            for index, xml in SLIDES.items():
+                if info.filename == f"ppt/slides/slide{index}.xml":
+                    data = (_XML_HEADER + xml).encode("utf-8")
+            target.writestr(info, data)
+    return path
+
+
+def test_hidden_flags(make_deck):
+    with PptxIndex(_deck(make_deck)) as index:
+        assert [info.hidden for info in index] == [True, True, False, False]
+        assert index.hidden_slides == [1, 2]
+
+
+def test_transition_and_advance_timing(make_deck):
+    with PptxIndex(_deck(make_deck)) as index:
+        first, second, third, fourth = list(index)
+    assert (first.has_transition, first.transition_ms, first.advance_after_ms) == (True, 1000, 3000)
+    # p14版本的切换带有精确时长，优先于Fallback中的速度
+    assert (second.has_transition, second.transition_ms, second.advance_after_ms) == (True, 1200, 2500)
+    assert (third.has_transition, third.transition_ms, third.advance_after_ms) == (False, 0, 4000)
+    assert (fourth.has_transition, fourth.advance_after_ms) == (False, None)
+    assert fourth.duration_ms(5000) == 5000
+    assert second.duration_ms(5000) == 3700
+
+
+def test_animation_timeline(make_deck):
+    with PptxIndex(_deck(make_deck)) as index:
+        info = index.slide(3)
+    assert info.has_timing
+    assert info.animation_count == 2
+    assert info.animation_ms == 500 + 250 + 2000
+
+
+def test_media_targets_and_trims(make_deck):
+    with PptxIndex(_deck(make_deck)) as index:
+        info = index.slide(2)
+        assert info.media == ["ppt/media/media2.mp4"]
+        assert info.has_media
+        assert info.media_trims == {"ppt/media/media2.mp4": (1500, 4000)}
+        assert not index.slide(1).has_media
+        # 第4页使用benchmark生成的原始XML，同样引用自己的视频
+        assert index.slide(4).media == ["ppt/media/media4.mp4"]
+        assert index.slide(4).media_trims == {}
@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*-
+
+import csv
+import json
+
+import pytest
+
+from profiling import NULL_PROFILER, StageProfiler, StageRecord, percentile
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([4.0], 0.9) == 4.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.9) == pytest.approx(3.7)
+
+
+def _profiler():
+    profiler = StageProfiler(worker=1)
+    for slide, wall in enumerate([0.1, 0.3, 0.2], 1):
+        profiler.add(StageRecord("slide", slide, wall, 0.01, True, 1))
+        profiler.add(StageRecord("wait", slide, wall / 2, 0.0, slide != 2, 1))
+    # 工作进程发回的记录是普通元组
+    profiler.extend([("slide", 1, 0.4, 0.02, True, 2), ("isolate", None, 0.05, 0.05, True, 2)])
+    return profiler
+
+
+def test_summary_aggregates_by_stage():
+    summary = _profiler().summary()
+    assert list(summary) == ["slide", "wait", "isolate"]
+    slide = summary["slide"]
+    assert (slide["count"], slide["failed"]) == (4, 0)
+    assert slide["wall_total"] == pytest.approx(1.0)
+    assert slide["cpu_total"] == pytest.approx(0.05)
+    assert (slide["wall_mean"], slide["p50"], slide["max"]) == (pytest.approx(0.25), pytest.approx(0.25), 0.4)
+    assert summary["wait"]["failed"] == 1
+
+
+def test_slide_totals_and_stage_timing():
+    profiler = _profiler()
+    totals = profiler.slide_totals()
+    assert totals[1] == (pytest.approx(0.5), pytest.approx(0.03))
+    assert set(totals) == {1, 2, 3}
+    with pytest.raises(RuntimeError):
+        with profiler.stage("create_video", 4):
+            raise RuntimeError("失败")
+    record = profiler.records[-1]
+    assert (record.stage, record.slide, record.ok, record.worker) == ("create_video", 4, False, 1)
+    assert record.wall >= 0
+
+
+def test_save(tmp_path):
+    csv_path, json_path = _profiler().save(str(tmp_path))
+    with open(csv_path, encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == list(StageRecord._fields)
+    assert rows[-1] == ["isolate", "", "0.050000", "0.050000", "1", "2"]
+    with open(json_path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["summary"]["slide"]["count"] == 4
+    assert len(data["records"]) == 8
+
+
+def test_null_profiler_records_nothing():
+    with NULL_PROFILER.stage("slide", 1):
+        pass
+    NULL_PROFILER.add(StageRecord("slide", 1, 0.1, 0.1, True, 0))
+    assert not NULL_PROFILER.enabled
+    assert list(NULL_PROFILER.records) == []
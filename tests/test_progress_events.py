@@ -0,0 +1,60 @@
+# -*- coding: UTF-8 -*-
+
+import io
+import json
+import threading
+
+from progress_events import (DECK_FINISHED, DECK_STARTED, MESSAGE, SLIDE_DONE, SLIDE_FAILED, EventQueue,
+                             JsonLinesWriter, ProgressEvent, ProgressState)
+
+
+def test_event_schema():
+    event = ProgressEvent(SLIDE_DONE, slide=3, origin="render", bytes=1024)
+    data = event.to_dict()
+    assert data["event"] == SLIDE_DONE
+    assert isinstance(data["time"], float)
+    assert (event["slide"], event.get("missing", 0)) == (3, 0)
+    assert json.loads(event.to_json()) == data
+    # 中文信息按原样写出，不转义
+    assert "转换完成" in ProgressEvent(MESSAGE, text="转换完成").to_json()
+
+
+def test_json_lines_writer_keeps_lines_whole():
+    stream = io.StringIO()
+    writer = JsonLinesWriter(stream)
+
+    def write(worker):
+        for i in range(200):
+            writer(ProgressEvent(MESSAGE, text="x" * 100, worker=worker, index=i))
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 800
+    records = [json.loads(line) for line in lines]
+    assert {(record["worker"], record["index"]) for record in records} == {(w, i) for w in range(4) for i in range(200)}
+
+
+def test_event_queue_drain():
+    events = EventQueue()
+    for i in range(5):
+        events.emit(MESSAGE, text=str(i))
+    assert [event["text"] for event in events.drain(max_events=2)] == ["0", "1"]
+    assert [event["text"] for event in events.drain()] == ["2", "3", "4"]
+    assert events.drain() == []
+
+
+def test_progress_state():
+    state = ProgressState()
+    state.apply(ProgressEvent(DECK_STARTED, deck="a.pptx", slide_count=10, selected_count=4))
+    state.apply(ProgressEvent(SLIDE_DONE, slide=1, bytes=100))
+    state.apply(ProgressEvent(SLIDE_FAILED, slide=2, error="超时"))
+    state.apply(ProgressEvent(DECK_FINISHED, avoided_renders=3))
+    assert (state.slide_count, state.finished, state.failed, state.bytes) == (4, 2, 1, 100)
+    assert (state.percent, state.avoided_renders) == (50, 3)
+    assert state.throughput(now=state.started + 30) == 4.0
+    # 新文件开始时重新计数
+    state.apply(ProgressEvent(DECK_STARTED, deck="b.pptx", slide_count=2))
+    assert (state.deck, state.slide_count, state.finished, state.percent) == ("b.pptx", 2, 0, 0)
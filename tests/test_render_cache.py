@@ -0,0 +1,106 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import zipfile
+
+from converter import PPTToVideoConverter
+from fast_path import PATH_FAST, PATH_FULL
+from progress_events import SLIDE_DONE
+from render_cache import RenderCache, compute_slide_digests, slide_cache_keys
+
+
+PARAMS = {"default_slide_duration": 5, "vert_resolution": 720, "frames_per_second": 30}
+
+
+def _rewrite_part(path, part_name, replace):
+    """把压缩包中的一个部件按replace(内容)改写，写到新文件"""
+    new_path = path.replace(".pptx", "_changed.pptx")
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(new_path, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            data = source.read(info.filename)
+            target.writestr(info, replace(data) if info.filename == part_name else data)
+    return new_path
+
+
+def test_store_and_fetch_make_independent_copies(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    video = tmp_path / "slide.wmv"
+    video.write_bytes(b"rendered")
+    assert not cache.fetch("k", str(tmp_path / "missing.wmv"))
+    assert cache.store("k", str(video))
+    output = tmp_path / "out.wmv"
+    assert cache.fetch("k", str(output))
+    assert output.read_bytes() == b"rendered"
+    # 原地改写输出文件不影响缓存条目
+    with open(output, "r+b") as f:
+        f.write(b"XX")
+    with open(video, "r+b") as f:
+        f.write(b"YY")
+    again = tmp_path / "again.wmv"
+    assert cache.fetch("k", str(again))
+    assert again.read_bytes() == b"rendered"
+    assert cache.entries()[0]["hits"] == 2
+
+
+def test_truncated_entry_is_dropped(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    video = tmp_path / "slide.wmv"
+    video.write_bytes(b"rendered")
+    cache.store("k", str(video))
+    with open(os.path.join(cache.cache_dir, "k.wmv"), "wb") as f:
+        f.write(b"r")
+    assert not cache.fetch("k", str(tmp_path / "out.wmv"))
+    assert cache.entries() == []
+
+
+def test_entry_keeps_extension_of_output_format(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    video = tmp_path / "slide.mp4"
+    video.write_bytes(b"rendered")
+    assert cache.store("k", str(video))
+    assert sorted(os.listdir(cache.cache_dir)) == ["k.json", "k.mp4"]
+    assert cache.fetch("k", str(tmp_path / "out.mp4"))
+    cache.remove("k")
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_keys_depend_on_route_and_params(make_deck):
+    digests = compute_slide_digests(make_deck(3))
+    full = slide_cache_keys(digests, PARAMS, routes={i: PATH_FULL for i in digests})
+    fast = slide_cache_keys(digests, PARAMS, routes={i: PATH_FAST for i in digests})
+    whole = slide_cache_keys(digests, PARAMS, routes={i: "whole_deck" for i in digests})
+    assert len({full[1], fast[1], whole[1]}) == 3
+    assert slide_cache_keys(digests, PARAMS, routes={i: PATH_FULL for i in digests}) == full
+    assert slide_cache_keys(digests, dict(PARAMS, vert_resolution=1080))[1] != slide_cache_keys(digests, PARAMS)[1]
+    # 内容相同的页（合成演示文稿中只有页码文字不同）键不同
+    assert len(set(full.values())) == 3
+
+
+def test_slide_size_changes_digests(make_deck):
+    deck = make_deck(3)
+    resized = _rewrite_part(deck, "ppt/presentation.xml",
+                            lambda data: data.replace(b'cx="12192000" cy="6858000"', b'cx="9144000" cy="6858000"'))
+    before, after = compute_slide_digests(deck), compute_slide_digests(resized)
+    assert all(before[i] != after[i] for i in before)
+
+
+def test_adding_slides_keeps_digests(make_deck):
+    before = compute_slide_digests(make_deck(3, name="three.pptx"))
+    after = compute_slide_digests(make_deck(5, name="five.pptx"))
+    assert all(before[i] == after[i] for i in before)
+
+
+def test_second_conversion_hits_cache(make_deck, tmp_path):
+    deck = make_deck(4, animated_every=2)
+    converter = PPTToVideoConverter()
+    converter.render_cache = RenderCache(str(tmp_path / "cache"))
+    origins = []
+
+    def on_event(event):
+        if event.kind == SLIDE_DONE:
+            origins.append(event["origin"])
+
+    for output_dir in ("first", "second"):
+        converter.convert_ppt_to_videos(deck, backend="fake", output_dir=str(tmp_path / output_dir), event_callback=on_event)
+    assert origins == ["render"] * 4 + ["cache"] * 4
+
@@ -0,0 +1,106 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import time
+import subprocess
+
+import libreoffice_backend
+from libreoffice_backend import LibreOfficeRenderBackend
+from resource_governor import (INCREASE_AFTER, REASON_MEMORY, REASON_RECOVERED, REASON_RSS, REASON_TEMP_BUDGET,
+                               TEMP_PREFIX, ResourceGovernor, ResourceSample, sweep_stale_temp_dirs)
+
+
+GB = 1024 * 1024 * 1024
+
+
+def _sample(available=8 * GB, rss=GB, temp_used=0):
+    return ResourceSample(time.time(), rss, 16 * GB, available, 100 * GB, temp_used)
+
+
+def _governor(tmp_path, **options):
+    options = dict(max_renders=8, memory_reserve=2 * GB, temp_root=str(tmp_path), **options)
+    return ResourceGovernor(**options)
+
+
+def test_pressure_halves_limit_down_to_minimum(tmp_path):
+    decisions = []
+    governor = _governor(tmp_path, min_renders=2, on_decision=decisions.append)
+    try:
+        assert governor.limit == 8
+        for expected in (4, 2):
+            decision = governor.adjust(_sample(available=GB))
+            assert decision.reason == REASON_MEMORY and decision.new_limit == expected
+        assert governor.adjust(_sample(available=GB)) is None
+        assert governor.limit == 2
+        assert governor.pressure_counts == {REASON_MEMORY: 3}
+        assert len(decisions) == 2
+    finally:
+        governor.close()
+
+
+def test_recovers_one_step_after_healthy_samples(tmp_path):
+    governor = _governor(tmp_path)
+    try:
+        governor.adjust(_sample(available=GB))
+        assert governor.limit == 4
+        for _ in range(INCREASE_AFTER - 1):
+            assert governor.adjust(_sample()) is None
+        decision = governor.adjust(_sample())
+        assert (decision.reason, decision.new_limit) == (REASON_RECOVERED, 5)
+        # 介于紧张和充足之间的采样不增加，并重新计数
+        governor.adjust(_sample(available=int(2.5 * GB)))
+        for _ in range(INCREASE_AFTER - 1):
+            assert governor.adjust(_sample()) is None
+        assert governor.adjust(_sample()).new_limit == 6
+    finally:
+        governor.close()
+
+
+def test_rss_and_temp_budget_limits(tmp_path):
+    governor = _governor(tmp_path, max_rss=2 * GB, temp_budget=GB)
+    try:
+        assert governor.adjust(_sample(rss=3 * GB)).reason == REASON_RSS
+        assert governor.adjust(_sample(temp_used=2 * GB)).reason == REASON_TEMP_BUDGET
+        assert governor.summary()["lowest_limit"] == 2
+    finally:
+        governor.close()
+
+
+def test_close_removes_temp_dir(tmp_path):
+    governor = _governor(tmp_path)
+    path = governor.gate.temp_dir
+    with open(os.path.join(path, "render.wmv"), "wb") as f:
+        f.write(b"x")
+    governor.close()
+    assert not os.path.exists(path)
+
+
+def test_sweeps_dirs_of_exited_processes(tmp_path):
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    stale = tmp_path / f"{TEMP_PREFIX}{process.pid}_old"
+    stale.mkdir()
+    (stale / "slide.pptx").write_bytes(b"x")
+    own = tmp_path / f"{TEMP_PREFIX}{os.getpid()}_current"
+    own.mkdir()
+    assert sweep_stale_temp_dirs(str(tmp_path)) == 1
+    assert not stale.exists() and own.exists()
+
+
+def test_libreoffice_work_dir_is_inside_temp_dir(tmp_path, monkeypatch, make_deck):
+    def convert(args, timeout):
+        # 模拟soffice在--outdir中生成PDF
+        outdir = args[args.index("--outdir") + 1]
+        open(os.path.join(outdir, "deck.pdf"), "wb").close()
+    monkeypatch.setattr(libreoffice_backend, "run_tool", convert)
+    governor = _governor(tmp_path)
+    backend = LibreOfficeRenderBackend()
+    backend.soffice = backend.pdftoppm = "tool"
+    backend.temp_dir = governor.gate.temp_dir
+    try:
+        backend.open(make_deck(2))
+        assert os.path.dirname(backend.work_dir) == governor.gate.temp_dir
+    finally:
+        backend.close()
+        governor.close()
@@ -0,0 +1,167 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+import session_pool
+from session_pool import (NullRegistry, SessionError, SessionPool, SessionRegistry, process_alive, process_name,
+                          running_processes)
+
+
+class FakeApp:
+    """假的应用实例：记录启动和退出，alive为False时探活失败"""
+
+    def __init__(self, fail_starts=0, pid=None, owned=True):
+        self.fail_starts = fail_starts
+        self.pid = pid
+        self.owned = owned
+        self.started = False
+        self.closed = False
+        self.alive = True
+
+    def start(self):
+        if self.fail_starts:
+            raise RuntimeError("启动失败")
+        self.started = True
+
+    def ping(self):
+        return self.alive
+
+    def process_id(self):
+        return self.pid
+
+    def owns_process(self):
+        return self.owned
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(**options):
+    apps = []
+
+    def factory():
+        apps.append(FakeApp())
+        return apps[-1]
+    return SessionPool(factory, registry=NullRegistry(), **options), apps
+
+
+def test_warm_start_and_reuse():
+    pool, apps = _pool(size=2)
+    pool.start()
+    assert len(apps) == 2 and all(app.started for app in apps)
+    with pool.lease() as first:
+        pass
+    with pool.lease() as second:
+        pass
+    assert first in apps and second in apps
+    assert pool.stats["launched"] == 2
+    assert pool.stats["reused"] == 2
+    pool.close()
+    assert all(app.closed for app in apps)
+
+
+def test_recycles_after_max_jobs():
+    pool, apps = _pool(max_jobs=2)
+    pool.start()
+    for _ in range(2):
+        with pool.lease() as app:
+            assert app is apps[0]
+    # 达到处理数量后在后台启动替换的实例，下一次取用得到新实例
+    with pool.lease() as app:
+        assert app is apps[1]
+    assert apps[0].closed
+    assert pool.stats["recycled_jobs"] == 1
+    pool.close()
+
+
+def test_failed_job_restarts_unresponsive_app():
+    pool, apps = _pool()
+    pool.start()
+    with pytest.raises(ValueError):
+        with pool.lease() as app:
+            app.alive = False
+            raise ValueError("渲染出错")
+    with pool.lease() as app:
+        assert app is apps[1]
+    assert pool.stats["recycled_probe"] == 1
+    pool.close()
+
+
+def test_failed_job_keeps_responsive_app():
+    pool, apps = _pool()
+    pool.start()
+    with pytest.raises(ValueError):
+        with pool.lease():
+            raise ValueError("渲染出错")
+    with pool.lease() as app:
+        assert app is apps[0]
+    pool.close()
+
+
+def test_idle_app_is_probed_before_reuse():
+    pool, apps = _pool(probe_interval=0)
+    pool.start()
+    apps[0].alive = False
+    with pool.lease() as app:
+        assert app is apps[1]
+    assert apps[0].closed
+    pool.close()
+
+
+def test_start_is_retried(monkeypatch):
+    monkeypatch.setattr(session_pool, "START_RETRY_DELAY", 0)
+    apps = [FakeApp(fail_starts=1), FakeApp()]
+    pool = SessionPool(lambda: apps.pop(0), registry=NullRegistry())
+    pool.start()
+    assert pool.stats["start_failed"] == 1
+    assert pool.stats["launched"] == 1
+    pool.close()
+
+
+def test_failed_warm_start_releases_reservations(monkeypatch):
+    monkeypatch.setattr(session_pool, "START_RETRY_DELAY", 0)
+    pool = SessionPool(lambda: FakeApp(fail_starts=1), size=3, registry=NullRegistry())
+    with pytest.raises(SessionError):
+        pool.start()
+    assert pool.count == 0
+    pool.close()
+
+
+def test_closed_pool_refuses_leases():
+    pool, _ = _pool()
+    pool.start()
+    pool.close()
+    with pytest.raises(SessionError):
+        pool.acquire(timeout=1)
+
+
+@pytest.fixture
+def child():
+    """模拟应用实例的子进程"""
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    yield process
+    process.kill()
+    process.wait()
+
+
+@pytest.mark.parametrize("owned", [True, False])
+def test_only_launched_instances_are_recorded_and_killed(monkeypatch, tmp_path, child, owned):
+    monkeypatch.setattr(session_pool, "QUIT_TIMEOUT", 0.2)
+    registry = SessionRegistry(str(tmp_path))
+    pool = SessionPool(lambda: FakeApp(pid=child.pid, owned=owned), registry=registry)
+    pool.start()
+    assert (child.pid in registry.entries) == owned
+    # 假实例退出时进程不结束：本工具启动的实例被强制结束，连接到的已有实例保持运行
+    pool.close()
+    child.wait(5) if owned else None
+    assert process_alive(child.pid) != owned
+    assert pool.stats["killed"] == (1 if owned else 0)
+    assert child.pid not in registry.entries
+
+
+def test_running_processes_finds_own_process():
+    assert os.getpid() in running_processes(process_name(os.getpid()))
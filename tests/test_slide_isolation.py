@@ -0,0 +1,96 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import zipfile
+import threading
+
+from pptx_index import parse_slide
+from pptx_package import NS_PRESENTATION, slide_part_names
+from slide_isolation import SlideIsolator, isolate_slide, unhide_slide
+from slide_selection import canonical_part
+
+
+def _slide_text(path):
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        parts = slide_part_names(zf)
+        assert len(parts) == 1
+        return zf.read(parts[0]).decode("utf-8")
+
+
+def test_write_keeps_only_one_slide(make_deck, tmp_path):
+    deck = make_deck(6, media_every=2, media_size=4096)
+    output = isolate_slide(deck, 4, str(tmp_path / "slide4.pptx"))
+    assert "基准测试第4页" in _slide_text(output)
+    with zipfile.ZipFile(output) as zf:
+        media = [name for name in zf.namelist() if name.startswith("ppt/media/") and name.endswith(".mp4")]
+    # 只保留本页引用的视频
+    assert media == ["ppt/media/media4.mp4"]
+
+
+def test_streaming_copy_matches_recompress(make_deck, tmp_path):
+    deck = make_deck(3, media_every=1, media_size=4096)
+    with SlideIsolator(deck) as isolator:
+        copied = isolator.write(2, str(tmp_path / "copied.pptx"))
+        recompressed = isolator.write(2, str(tmp_path / "recompressed.pptx"), recompress=True)
+        stats = isolator.stats
+    with zipfile.ZipFile(copied) as a, zipfile.ZipFile(recompressed) as b:
+        assert sorted(a.namelist()) == sorted(b.namelist())
+        for name in a.namelist():
+            assert a.read(name) == b.read(name)
+    assert stats.copied_members > 0
+    assert stats.copied_bytes > 4096
+
+
+def test_concurrent_writes_match_sequential(make_deck, tmp_path):
+    deck = make_deck(20, media_every=1, media_size=64 * 1024, layout_count=3)
+    sequential_dir = tmp_path / "sequential"
+    concurrent_dir = tmp_path / "concurrent"
+    sequential_dir.mkdir()
+    concurrent_dir.mkdir()
+    with SlideIsolator(deck) as isolator:
+        for index in range(1, 21):
+            isolator.write(index, str(sequential_dir / f"{index}.pptx"))
+    with SlideIsolator(deck) as isolator:
+        errors = []
+
+        def write(indexes):
+            try:
+                for index in indexes:
+                    isolator.write(index, str(concurrent_dir / f"{index}.pptx"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(range(n, 21, 4),)) for n in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = isolator.stats
+    assert errors == []
+    for index in range(1, 21):
+        with open(sequential_dir / f"{index}.pptx", "rb") as a, open(concurrent_dir / f"{index}.pptx", "rb") as b:
+            assert a.read() == b.read(), f"第{index}页"
+        _slide_text(str(concurrent_dir / f"{index}.pptx"))
+    # 各线程的统计都计入了
+    assert stats.written_bytes == sum(os.path.getsize(concurrent_dir / f"{index}.pptx") for index in range(1, 21))
+
+
+def test_both_boolean_forms_count_as_hidden():
+    visible = b'<p:sld xmlns:p="p" xmlns:a="a"><p:cSld/></p:sld>'
+    for value in (b"0", b"false"):
+        hidden = visible.replace(b'<p:sld ', b'<p:sld show="' + value + b'" ')
+        assert unhide_slide(hidden) == visible
+        assert canonical_part("ppt/slides/slide1.xml", hidden) == canonical_part("ppt/slides/slide1.xml", visible)
+    shown = visible.replace(b'<p:sld ', b'<p:sld show="true" ')
+    assert unhide_slide(shown) == shown
+
+
+def test_index_reads_both_boolean_forms(tmp_path):
+    path = str(tmp_path / "slides.zip")
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, show in (("a.xml", "0"), ("b.xml", "false"), ("c.xml", "1")):
+            zf.writestr(name, f'<p:sld xmlns:p="{NS_PRESENTATION}" show="{show}"><p:cSld/></p:sld>')
+    with zipfile.ZipFile(path) as zf:
+        assert [parse_slide(zf, i, name).hidden for i, name in enumerate(("a.xml", "b.xml", "c.xml"), 1)] == \
+            [True, True, False]
@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+
+import zipfile
+
+import pytest
+
+from pptx_index import PptxIndex
+from slide_selection import format_slide_ranges, parse_slide_ranges, select_slides
+
+
+PARAMS = {"default_slide_duration": 5, "vert_resolution": 720, "frames_per_second": 30}
+SLIDE_NUMBER = '<a:fld id="{B6F15528-21DE-4FAA-801E-634DDDAF4B2B}" type="slidenum"><a:t>‹#›</a:t></a:fld>'
+
+
+def _rewrite_slides(path, replace):
+    """把每页的XML按replace(页码, 内容)改写，原地替换文件"""
+    with zipfile.ZipFile(path) as source:
+        members = [(info, source.read(info.filename)) for info in source.infolist()]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as target:
+        for info, data in members:
+            name = info.filename
+            if name.startswith("ppt/slides/slide") and name.endswith(".xml"):
+                index = int(name[len("ppt/slides/slide"):-len(".xml")])
+                data = replace(index, data.decode("utf-8")).encode("utf-8")
+            target.writestr(info, data)
+    return path
+
+
+def _select(deck, **options):
+    with PptxIndex(deck) as index:
+        return select_slides(deck, list(index), params=PARAMS, **options)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1-3,5", [1, 2, 3, 5]),
+    (" 2 , 2-3 ", [2, 3]),
+    ("5-", [5, 6]),
+    ("1，6", [1, 6]),
+    ("4-4", [4]),
+])
+def test_parse_slide_ranges(text, expected):
+    assert parse_slide_ranges(text, 6) == expected
+
+
+@pytest.mark.parametrize("text", ["5-3", "0", "7", "2-9", "abc", "1-2-3", "1;2", "", " , "])
+def test_parse_slide_ranges_rejects(text):
+    with pytest.raises(ValueError):
+        parse_slide_ranges(text, 6)
+
+
+def test_format_slide_ranges():
+    assert format_slide_ranges([5, 1, 2, 3, 7, 8]) == "1-3,5,7-8"
+    assert parse_slide_ranges(format_slide_ranges([1, 2, 4]), 4) == [1, 2, 4]
+
+
+def test_skip_hidden(make_deck):
+    deck = _rewrite_slides(make_deck(5), lambda i, xml: xml.replace("<p:sld ", '<p:sld show="0" ' if i == 2 else
+                                                                     '<p:sld show="false" ' if i == 4 else "<p:sld "))
+    selection = _select(deck, slides="1-4", skip_hidden=True)
+    assert selection.selected == [1, 3]
+    assert selection.skipped_hidden == [2, 4]
+    assert selection.summary() == "输出2/5页，跳过隐藏页2页"
+    # 不跳过时隐藏页照常输出
+    assert _select(deck, slides="1-4").selected == [1, 2, 3, 4]
+
+
+def test_dedup_ignores_hidden_flag_but_not_slide_numbers(make_deck):
+    def replace(index, xml):
+        # 第1、2、4页内容相同（第4页还是隐藏页）；第5、6页内容相同但带页码字段
+        if index in (2, 4):
+            xml = xml.replace(f"基准测试第{index}页", "基准测试第1页")
+        if index == 4:
+            xml = xml.replace("<p:sld ", '<p:sld show="0" ')
+        if index in (5, 6):
+            xml = xml.replace(f"<a:r><a:t>基准测试第{index}页</a:t></a:r>", SLIDE_NUMBER)
+        return xml
+    deck = _rewrite_slides(make_deck(6, animated_every=0), replace)
+    selection = _select(deck, dedup=True)
+    assert selection.duplicates == {2: 1, 4: 1}
+    assert selection.unique == [1, 3, 5, 6]
+    assert selection.avoided_renders == 2
+    # 渲染参数不同的页不算重复
+    with PptxIndex(deck) as index:
+        slide_params = {2: dict(PARAMS, default_slide_duration=8)}
+        assert select_slides(deck, list(index), dedup=True, params=PARAMS, slide_params=slide_params).duplicates == {4: 1}
+
+
+def test_slide_list_out_of_range(make_deck):
+    deck = make_deck(3)
+    assert _select(deck, slides=[3, 1, 3]).selected == [1, 3]
+    with pytest.raises(ValueError):
+        _select(deck, slides=[0, 2])
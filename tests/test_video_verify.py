@@ -0,0 +1,112 @@
+# -*- coding: UTF-8 -*-
+
+import struct
+
+import pytest
+
+from media_probe import ASF_FILE_PROPERTIES_GUID, ASF_HEADER_GUID
+from video_verify import (ASF_DATA_GUID, ASF_EXTENDED_STREAM_PROPERTIES_GUID, ASF_FLAG_BROADCAST,
+                          ASF_HEADER_EXTENSION_GUID, ASF_STREAM_PROPERTIES_GUID, ASF_VIDEO_MEDIA_GUID, VideoFormatError,
+                          read_video_info, verify_video)
+
+
+def _box(box_type, *children):
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def build_mp4(duration_ms=5000, width=1280, height=720, fps=30, mdat_size=1000, moov=True):
+    """最小的MP4：ftyp、moov（mvhd和一个视频trak）和mdat"""
+    timescale = 15360
+    mvhd = _box(b"mvhd", struct.pack(">IIIII", 0, 0, 0, 1000, duration_ms), bytes(80))
+    tkhd = _box(b"tkhd", bytes(76), struct.pack(">II", width << 16, height << 16))
+    mdhd = _box(b"mdhd", struct.pack(">IIIII", 0, 0, 0, timescale, duration_ms * timescale // 1000), bytes(4))
+    hdlr = _box(b"hdlr", bytes(8), b"vide", bytes(12), b"VideoHandler\0")
+    stts = _box(b"stts", struct.pack(">III", 0, 1, fps * duration_ms // 1000), struct.pack(">I", timescale // fps))
+    trak = _box(b"trak", tkhd, _box(b"mdia", mdhd, hdlr, _box(b"minf", _box(b"stbl", stts))))
+    boxes = [_box(b"ftyp", b"isom", bytes(4), b"isomiso2")]
+    if moov:
+        boxes.append(_box(b"moov", mvhd, trak))
+    boxes.append(_box(b"mdat", bytes(mdat_size)))
+    return b"".join(boxes)
+
+
+def _asf_object(guid, payload):
+    return guid + struct.pack("<Q", 24 + len(payload)) + payload
+
+
+def build_asf(duration_ms=5000, width=1280, height=720, fps=30, flags=2, data_size=1000):
+    """最小的ASF：头对象（文件属性、视频流属性、带扩展流属性的头扩展）和数据对象"""
+    preroll = 3000
+    data_object = _asf_object(ASF_DATA_GUID, bytes(data_size))
+
+    def file_properties(file_size):
+        return _asf_object(ASF_FILE_PROPERTIES_GUID, bytes(16) + struct.pack(
+            "<QQQQQQIIII", file_size, 0, 10, (duration_ms + preroll) * 10000, 0, preroll, flags, 0, 0, 0))
+
+    stream = _asf_object(ASF_STREAM_PROPERTIES_GUID, ASF_VIDEO_MEDIA_GUID + bytes(16) + struct.pack(
+        "<QIIHIII", 0, 11, 0, 1, 0, width, height) + bytes(3))
+    extended = _asf_object(ASF_EXTENDED_STREAM_PROPERTIES_GUID, bytes(48) + struct.pack("<HHQ", 1, 0, 10000000 // fps))
+    extension = _asf_object(ASF_HEADER_EXTENSION_GUID, bytes(16) + struct.pack("<HI", 6, len(extended)) + extended)
+    others = stream + extension
+    header_size = 30 + len(file_properties(0)) + len(others)
+    header = (ASF_HEADER_GUID + struct.pack("<QIBB", header_size, 3, 1, 2)
+              + file_properties(header_size + len(data_object)) + others)
+    return header + data_object
+
+
+def _write(tmp_path, data, name="video.bin"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_reads_mp4_header(tmp_path):
+    info = read_video_info(_write(tmp_path, build_mp4()))
+    assert (info.container, info.duration_ms, info.width, info.height, info.complete) == ("mp4", 5000, 1280, 720, True)
+    assert info.fps == pytest.approx(30)
+
+
+def test_reads_asf_header(tmp_path):
+    info = read_video_info(_write(tmp_path, build_asf(duration_ms=4000, height=1080, fps=25)))
+    assert (info.container, info.duration_ms, info.width, info.height, info.complete) == ("asf", 4000, 1280, 1080, True)
+    assert info.fps == pytest.approx(25)
+
+
+def test_asf_broadcast_flag_means_incomplete(tmp_path):
+    assert not read_video_info(_write(tmp_path, build_asf(flags=ASF_FLAG_BROADCAST))).complete
+
+
+@pytest.mark.parametrize("data, cut", [(build_mp4(), 100), (build_asf(), 100)])
+def test_truncated_media_data_is_incomplete(tmp_path, data, cut):
+    path = _write(tmp_path, data[:-cut])
+    assert not read_video_info(path).complete
+    assert verify_video(path) == ["视频文件不完整"]
+
+
+@pytest.mark.parametrize("cut", [60, 120, 200])
+def test_mp4_truncated_inside_moov(tmp_path, cut):
+    assert verify_video(_write(tmp_path, build_mp4()[:cut])) == ["视频文件不完整"]
+
+
+def test_mp4_without_moov_is_incomplete(tmp_path):
+    assert not read_video_info(_write(tmp_path, build_mp4(moov=False))).complete
+
+
+def test_verify_accepts_matching_video(tmp_path):
+    assert verify_video(_write(tmp_path, build_mp4()), expected_ms=5200, height=720, fps=30) == []
+    assert verify_video(_write(tmp_path, build_asf(), "video.wmv"), expected_ms=5000, height=721, fps=29) == []
+
+
+def test_verify_reports_each_mismatch(tmp_path):
+    problems = verify_video(_write(tmp_path, build_mp4()), expected_ms=8000, height=1080, fps=25)
+    assert problems == ["视频时长5.00秒，应为8.00秒", "视频高度720，应为1080", "视频帧率30.00，应为25"]
+
+
+def test_empty_and_unknown_files(tmp_path):
+    assert verify_video(_write(tmp_path, b"")) == ["视频文件为空"]
+    path = _write(tmp_path, b"not a video file at all")
+    assert verify_video(path) == ["无法识别的视频格式"]
+    with pytest.raises(VideoFormatError):
+        read_video_info(path)
+    assert verify_video(str(tmp_path / "missing.mp4"))[0].startswith("无法读取视频")
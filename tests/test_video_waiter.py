@@ -0,0 +1,23 @@
+# -*- coding: UTF-8 -*-
+
+from video_waiter import WaitResult, WaitStats
+
+
+def _stats(values):
+    stats = WaitStats()
+    for value in values:
+        stats.add(WaitResult("done", value, 1, 0.0))
+    return stats
+
+
+def test_percentile_is_nearest_rank():
+    stats = _stats(range(1, 11))
+    assert stats.percentile(50) == 5
+    assert stats.percentile(90) == 9
+    assert stats.percentile(95) == 10
+    assert stats.percentile(100) == 10
+    assert stats.percentile(0) == 1
+
+
+def test_percentile_of_empty_stats():
+    assert WaitStats().percentile(95) == 0.0
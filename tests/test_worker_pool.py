@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import functools
+
+import pytest
+
+from backends import FakeRenderBackend
+from converter import build_render_params
+from output_profiles import get_profile
+from worker_pool import SlideScheduler, shard_slide_range
+
+
+PARAMS = build_render_params(5, 720, 30, get_profile(), "fake")
+
+
+class SharedAppBackend(FakeRenderBackend):
+    """模拟PowerPoint这样的单实例程序：启动、关闭演示文稿和退出都追加记录到log_path"""
+
+    shared_application = True
+
+    def __init__(self, log_path, **options):
+        super().__init__(**options)
+        self.log_path = log_path
+
+    def _log(self, action):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(f"{os.getpid()} {action}\n")
+
+    def start(self):
+        self._log("start")
+
+    def close_presentation(self):
+        self._log("close_presentation")
+
+    def close(self):
+        self._log("quit")
+
+
+@pytest.mark.parametrize("slides, workers, expected", [
+    ([1, 2, 3, 4, 5], 2, [[1, 2, 3], [4, 5]]),
+    ([2, 4, 6], 3, [[2], [4], [6]]),
+    ([1, 2], 4, [[1], [2]]),
+    ([7], 0, [[7]]),
+])
+def test_shard_slide_range(slides, workers, expected):
+    assert shard_slide_range(slides, workers) == expected
+
+
+def test_scheduler_exports_every_slide(tmp_path):
+    outputs = {i: str(tmp_path / f"slide_{i}.wmv") for i in range(1, 6)}
+    finished = []
+    started = {}
+    scheduler = SlideScheduler(functools.partial(FakeRenderBackend, fail_slides=[4]), workers=2)
+    exported = scheduler.run("deck.pptx", outputs, PARAMS, slide_callback=lambda slide, ok, **_: finished.append((slide, ok)),
+                             started_callback=started.__setitem__)
+    assert exported == [1, 2, 3, 5]
+    assert sorted(finished) == [(1, True), (2, True), (3, True), (4, False), (5, True)]
+    # 前三页分给进程0，后两页分给进程1
+    assert started == {1: 0, 2: 0, 3: 0, 4: 1, 5: 1}
+    assert not os.path.exists(outputs[4])
+
+
+def test_shared_application_is_owned_by_parent(tmp_path):
+    log_path = str(tmp_path / "app.log")
+    outputs = {i: str(tmp_path / f"slide_{i}.wmv") for i in range(1, 5)}
+    scheduler = SlideScheduler(functools.partial(SharedAppBackend, log_path), workers=2)
+    assert scheduler.run("deck.pptx", outputs, PARAMS) == [1, 2, 3, 4]
+    with open(log_path, encoding="utf-8") as f:
+        records = [line.split() for line in f]
+    parent = str(os.getpid())
+    # 主进程最先启动、最后退出；工作进程只关闭各自的演示文稿
+    assert records[0] == [parent, "start"] and records[-1] == [parent, "quit"]
+    workers = records[1:-1]
+    assert len(workers) == 2
+    assert all(pid != parent and action == "close_presentation" for pid, action in workers)
@@ -0,0 +1,19 @@
+# -*- coding: UTF-8 -*-
+
+import os
+
+from ffmpeg_tools import run_ffmpeg
+
+
+def transcode_video(source_path, output_path, profile):
+    """用ffmpeg把渲染结果转为输出格式（重新编码或只重新封装），失败时删除不完整的输出"""
+    args = ["-i", source_path, "-map", "0:v:0", "-map", "0:a?"] + profile.transcode_args() + [output_path]
+    try:
+        run_ffmpeg(args)
+    except Exception:
+        if os.path.exists(output_path):
+            try:
+                os.remove(output_path)
+            except:
+                pass
+        raise
@@ -0,0 +1,226 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import struct
+import collections
+
+from media_probe import ASF_FILE_PROPERTIES_GUID, ASF_HEADER_GUID
+
+
+# ASF对象的GUID（按文件中的字节顺序）
+ASF_STREAM_PROPERTIES_GUID = bytes.fromhex("9107dcb7b7a9cf118ee600c00c205365")
+ASF_HEADER_EXTENSION_GUID = bytes.fromhex("b503bf5f2ea9cf118ee300c00c205365")
+ASF_EXTENDED_STREAM_PROPERTIES_GUID = bytes.fromhex("cba5e61472c632438399a96952065b5a")
+ASF_DATA_GUID = bytes.fromhex("3626b2758e66cf11a6d900aa0062ce6c")
+ASF_VIDEO_MEDIA_GUID = bytes.fromhex("c0ef19bc4d5bcf11a8fd00805f5c442b")
+# 文件属性对象flags中的广播标志：文件仍在写入，大小和时长字段无效
+ASF_FLAG_BROADCAST = 1
+
+# 时长比预期短超过该值（毫秒或比例，取较大者）视为被截断；比预期长不算错误（例如按整秒向上取整的默认时长）
+DURATION_TOLERANCE_MS = 500
+DURATION_TOLERANCE_RATIO = 0.05
+# 高度允许的误差（编码器可能对齐到偶数）和帧率允许的相对误差（按样本数和时长计算的平均帧率）
+HEIGHT_TOLERANCE = 2
+FPS_TOLERANCE_RATIO = 0.1
+
+# 从容器头部读出的视频信息，读不到的字段为None；complete为False表示文件不完整（仍在写入或被截断）
+VideoInfo = collections.namedtuple("VideoInfo", ["container", "duration_ms", "width", "height", "fps", "complete"])
+
+
+class VideoFormatError(Exception):
+    """无法识别或解析的视频文件"""
+
+
+def _mp4_boxes(f, start, end):
+    """遍历 [start, end) 内的盒子，产生 (类型, 数据开始, 数据结束, 是否超出范围)"""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            raise VideoFormatError(f"MP4盒子{box_type!r}大小无效")
+        yield box_type, position + header_size, position + size, position + size > end
+        position += size
+
+
+def _find_box(f, start, end, *path):
+    """按路径查找子盒子，返回 (数据开始, 数据结束)，找不到时返回None"""
+    for box_type, data_start, data_end, _ in _mp4_boxes(f, start, end):
+        if box_type == path[0]:
+            return (data_start, data_end) if len(path) == 1 else _find_box(f, data_start, data_end, *path[1:])
+    return None
+
+
+def _read_at(f, position, length):
+    f.seek(position)
+    return f.read(length)
+
+
+def _mp4_track_info(f, start, end):
+    """读取一个trak的处理类型、宽高（tkhd）、时间刻度、时长（mdhd）和样本数（stts）"""
+    hdlr = _find_box(f, start, end, b"mdia", b"hdlr")
+    handler = _read_at(f, hdlr[0] + 8, 4) if hdlr else None
+    width = height = None
+    tkhd = _find_box(f, start, end, b"tkhd")
+    if tkhd and tkhd[1] - tkhd[0] >= 8:
+        # tkhd最后8字节为16.16定点数的宽和高
+        width, height = (value >> 16 for value in struct.unpack(">II", _read_at(f, tkhd[1] - 8, 8)))
+    timescale = duration = None
+    mdhd = _find_box(f, start, end, b"mdia", b"mdhd")
+    if mdhd:
+        data = _read_at(f, mdhd[0], 32)
+        if data[:1] == b"\x01":
+            timescale, duration = struct.unpack(">IQ", data[20:32])
+        else:
+            timescale, duration = struct.unpack(">II", data[12:20])
+    samples = None
+    stts = _find_box(f, start, end, b"mdia", b"minf", b"stbl", b"stts")
+    if stts:
+        count = struct.unpack(">I", _read_at(f, stts[0] + 4, 4))[0]
+        entries = _read_at(f, stts[0] + 8, count * 8)
+        samples = sum(struct.unpack(">II", entries[i:i + 8])[0] for i in range(0, len(entries) - 7, 8))
+    return handler, width, height, timescale, duration, samples
+
+
+def read_mp4_info(f, size):
+    complete = True
+    moov = None
+    has_mdat = False
+    for box_type, data_start, data_end, truncated in _mp4_boxes(f, 0, size):
+        if truncated:
+            complete = False
+        if box_type == b"moov":
+            moov = (data_start, min(data_end, size))
+        elif box_type == b"mdat":
+            has_mdat = True
+    if moov is None or not has_mdat:
+        # 没有moov（索引在编码结束时才写入）或没有媒体数据的文件无法播放
+        return VideoInfo("mp4", None, None, None, None, False)
+    duration_ms = None
+    mvhd = _find_box(f, moov[0], moov[1], b"mvhd")
+    if mvhd:
+        data = _read_at(f, mvhd[0], 32)
+        if data[:1] == b"\x01":
+            timescale, duration = struct.unpack(">IQ", data[20:32])
+        else:
+            timescale, duration = struct.unpack(">II", data[12:20])
+        if timescale:
+            duration_ms = duration * 1000 // timescale
+    width = height = fps = None
+    for box_type, data_start, data_end, _ in _mp4_boxes(f, moov[0], moov[1]):
+        if box_type != b"trak":
+            continue
+        handler, track_width, track_height, timescale, duration, samples = _mp4_track_info(f, data_start, data_end)
+        if handler == b"vide":
+            width, height = track_width, track_height
+            if timescale and duration and samples:
+                fps = samples * timescale / float(duration)
+            break
+    return VideoInfo("mp4", duration_ms, width, height, fps, complete)
+
+
+def _asf_objects(f, start, end):
+    """遍历ASF对象，产生 (GUID, 数据开始, 对象结束)"""
+    position = start
+    while position + 24 <= end:
+        header = _read_at(f, position, 24)
+        if len(header) < 24:
+            return
+        object_size = struct.unpack("<Q", header[16:24])[0]
+        if object_size < 24:
+            raise VideoFormatError("ASF对象大小无效")
+        yield header[:16], position + 24, position + object_size
+        position += object_size
+
+
+def read_asf_info(f, size):
+    header_size = struct.unpack("<Q", _read_at(f, 16, 8))[0]
+    complete = header_size <= size
+    duration_ms = width = height = fps = None
+    video_streams = set()
+    frame_times = {}
+    for guid, data_start, object_end in _asf_objects(f, 30, min(header_size, size)):
+        if guid == ASF_FILE_PROPERTIES_GUID:
+            data = _read_at(f, data_start, 68)
+            file_size, _, packets, play_duration, _, preroll, flags = struct.unpack("<QQQQQQI", data[16:68])
+            duration_ms = max(0, play_duration // 10000 - preroll)
+            if flags & ASF_FLAG_BROADCAST or not packets or (file_size and file_size > size):
+                complete = False
+        elif guid == ASF_STREAM_PROPERTIES_GUID:
+            data = _read_at(f, data_start, 62)
+            if data[:16] == ASF_VIDEO_MEDIA_GUID:
+                stream_number = struct.unpack("<H", data[48:50])[0] & 0x7F
+                video_streams.add(stream_number)
+                if width is None:
+                    width, height = struct.unpack("<II", data[54:62])
+        elif guid == ASF_HEADER_EXTENSION_GUID:
+            # 扩展流属性对象中有每帧的平均时长（100纳秒）
+            for sub_guid, sub_start, _ in _asf_objects(f, data_start + 22, object_end):
+                if sub_guid == ASF_EXTENDED_STREAM_PROPERTIES_GUID:
+                    data = _read_at(f, sub_start, 60)
+                    stream_number, _, time_per_frame = struct.unpack("<HHQ", data[48:60])
+                    if time_per_frame:
+                        frame_times[stream_number] = time_per_frame
+    for stream_number in sorted(video_streams):
+        if stream_number in frame_times:
+            fps = 10000000.0 / frame_times[stream_number]
+            break
+    # 数据对象必须完整
+    data_header = _read_at(f, header_size, 24)
+    if len(data_header) < 24 or data_header[:16] != ASF_DATA_GUID:
+        complete = False
+    elif header_size + struct.unpack("<Q", data_header[16:24])[0] > size:
+        complete = False
+    return VideoInfo("asf", duration_ms, width, height, fps, complete)
+
+
+def read_video_info(path):
+    """解析视频文件头，返回VideoInfo；不是MP4/ASF或无法解析时抛出VideoFormatError"""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(16)
+        try:
+            if head == ASF_HEADER_GUID:
+                return read_asf_info(f, size)
+            if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+                return read_mp4_info(f, size)
+        except struct.error:
+            raise VideoFormatError("视频文件头不完整")
+    raise VideoFormatError("无法识别的视频格式")
+
+
+def verify_video(path, expected_ms=None, height=None, fps=None):
+    """检查导出的视频：文件非空且完整，时长没有被截断，高度和帧率与请求一致；返回问题列表，为空表示通过"""
+    try:
+        if os.path.getsize(path) == 0:
+            return ["视频文件为空"]
+        info = read_video_info(path)
+    except OSError as e:
+        return [f"无法读取视频: {e}"]
+    except VideoFormatError as e:
+        return [str(e)]
+    if not info.complete:
+        return ["视频文件不完整"]
+    problems = []
+    if expected_ms:
+        tolerance = max(DURATION_TOLERANCE_MS, expected_ms * DURATION_TOLERANCE_RATIO)
+        if info.duration_ms is None:
+            problems.append("无法读取视频时长")
+        elif info.duration_ms < expected_ms - tolerance:
+            problems.append(f"视频时长{info.duration_ms / 1000.0:.2f}秒，应为{expected_ms / 1000.0:.2f}秒")
+    if height and info.height is not None and abs(info.height - height) > HEIGHT_TOLERANCE:
+        problems.append(f"视频高度{info.height}，应为{height}")
+    if fps and info.fps is not None and abs(info.fps - fps) > fps * FPS_TOLERANCE_RATIO:
+        problems.append(f"视频帧率{info.fps:.2f}，应为{fps}")
+    return problems
@@ -0,0 +1,164 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import math
+import time
+from collections import namedtuple
+
+
+# PowerPoint的PpMediaTaskStatus取值
+PP_MEDIA_TASK_STATUS_NONE = 0
+PP_MEDIA_TASK_STATUS_IN_PROGRESS = 1
+PP_MEDIA_TASK_STATUS_QUEUED = 2
+PP_MEDIA_TASK_STATUS_DONE = 3
+PP_MEDIA_TASK_STATUS_FAILED = 4
+
+# 等待结果：state 为 done / failed / timeout / stalled / cancelled
+WaitResult = namedtuple("WaitResult", ["state", "elapsed", "polls", "slept"])
+
+
+class VideoStatusProvider:
+    """视频导出状态来源接口"""
+
+    def status(self):
+        raise NotImplementedError
+
+
+class ComVideoStatusProvider(VideoStatusProvider):
+    """读取PowerPoint演示文稿的CreateVideoStatus"""
+
+    def __init__(self, prs):
+        self.prs = prs
+
+    def status(self):
+        return self.prs.CreateVideoStatus
+
+
+class FakeVideoStatusProvider(VideoStatusProvider):
+    """用于测试的状态来源：按顺序返回给定的状态，最后一个状态保持不变"""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def status(self):
+        index = min(self.calls, len(self.statuses) - 1)
+        self.calls += 1
+        return self.statuses[index]
+
+
+class WaitStats:
+    """累计每次等待的耗时统计"""
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, result):
+        self.results.append(result)
+
+    @property
+    def count(self):
+        return len(self.results)
+
+    @property
+    def total_elapsed(self):
+        return sum(r.elapsed for r in self.results)
+
+    @property
+    def total_polls(self):
+        return sum(r.polls for r in self.results)
+
+    def percentile(self, percent):
+        """等待时长的百分位数（最近秩法）"""
+        if not self.results:
+            return 0.0
+        values = sorted(r.elapsed for r in self.results)
+        rank = max(0, min(len(values) - 1, int(math.ceil(percent / 100.0 * len(values))) - 1))
+        return values[rank]
+
+    def summary(self):
+        """生成可读的统计摘要"""
+        if not self.results:
+            return "无等待记录"
+        states = {}
+        for r in self.results:
+            states[r.state] = states.get(r.state, 0) + 1
+        state_text = ", ".join(f"{k}={v}" for k, v in sorted(states.items()))
+        return (f"等待{self.count}次, 共{self.total_elapsed:.1f}秒, 轮询{self.total_polls}次, "
+                f"平均{self.total_elapsed / self.count:.2f}秒, P50={self.percentile(50):.2f}秒, "
+                f"P95={self.percentile(95):.2f}秒, 最长{max(r.elapsed for r in self.results):.2f}秒 ({state_text})")
+
+
+class CompletionWaiter:
+    """等待视频导出完成：指数退避轮询，同时观察输出文件的大小和修改时间"""
+
+    def __init__(self, initial_delay=0.005, max_delay=0.5, backoff=2.0, timeout=None,
+                 stall_timeout=300, is_cancelled=None, stats=None, clock=time.monotonic, sleep=time.sleep,
+                 on_progress=None):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        # timeout 为总等待上限；stall_timeout 为输出文件出现后长时间无变化的上限
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.stats = stats
+        self.clock = clock
+        self.sleep = sleep
+        # 输出文件变化时调用 on_progress(已等待秒数, 文件字节数)
+        self.on_progress = on_progress
+
+    def _file_signature(self, output_path):
+        try:
+            st = os.stat(output_path)
+            return (st.st_size, st.st_mtime)
+        except OSError:
+            return None
+
+    def wait(self, provider, output_path=None):
+        """阻塞直到导出结束，返回WaitResult"""
+        start = self.clock()
+        last_change = start
+        last_signature = None
+        delay = self.initial_delay
+        polls = 0
+        slept = 0.0
+
+        while True:
+            status = provider.status()
+            polls += 1
+            now = self.clock()
+
+            if status == PP_MEDIA_TASK_STATUS_DONE:
+                state = "done"
+                break
+            if status == PP_MEDIA_TASK_STATUS_FAILED:
+                state = "failed"
+                break
+            if self.is_cancelled():
+                state = "cancelled"
+                break
+            if self.timeout is not None and now - start >= self.timeout:
+                state = "timeout"
+                break
+
+            if output_path:
+                signature = self._file_signature(output_path)
+                if signature != last_signature:
+                    last_signature = signature
+                    last_change = now
+                    if signature is not None and self.on_progress:
+                        self.on_progress(now - start, signature[0])
+                # 输出文件可能在编码结束时才出现，只在文件出现后检测停滞
+                elif signature is not None and self.stall_timeout is not None and now - last_change >= self.stall_timeout:
+                    state = "stalled"
+                    break
+
+            self.sleep(delay)
+            slept += delay
+            delay = min(delay * self.backoff, self.max_delay)
+
+        result = WaitResult(state, self.clock() - start, polls, slept)
+        if self.stats is not None:
+            self.stats.add(result)
+        return result
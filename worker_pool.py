@@ -0,0 +1,194 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import queue
+import multiprocessing
+
+from profiling import NULL_PROFILER, StageProfiler
+from pipeline import SlideExportPipeline, retry_message
+
+
+def shard_slide_range(slides, workers):
+    """把页码列表按顺序切分为workers个连续分片"""
+    slides = list(slides)
+    workers = max(1, min(workers, len(slides)))
+    shards = []
+    start = 0
+    for worker_id in range(workers):
+        # 前 len % workers 个分片各多分一页
+        size = len(slides) // workers + (1 if worker_id < len(slides) % workers else 0)
+        shards.append(slides[start:start + size])
+        start += size
+    return shards
+
+
+def _worker_main(worker_id, backend_factory, pptx_path, shard, output_paths, params, result_queue, cancel_event, static_durations=None,
+                 profile=False, stage_concurrency=None, slide_params=None, expected_durations=None, resources=None):
+    """工作进程入口：用逐页导出流水线导出分到的页，并把结果发回主进程
+
+    消息格式为 (类型, 进程编号, 页码, 错误信息, 详情)，导出结束时详情为 (导出通道, 耗时秒数)，准备重试时为 (第几次重试, 等待秒数)；
+    后端启动后发送backend消息，详情为渲染进程的pid（用于采样内存）；退出前发送metrics消息，详情为流水线各阶段的队列统计；profile为True时再发送profile消息，详情为各阶段的计时记录。
+    后端的shared_application为True时应用程序由主进程启动和退出，这里只关闭本进程打开的演示文稿。
+    """
+    static_durations = static_durations or {}
+    profiler = StageProfiler(worker=worker_id) if profile else NULL_PROFILER
+    backend = None
+
+    def started(slide_index):
+        result_queue.put(("started", worker_id, slide_index, None, None))
+
+    def report(result):
+        result_queue.put(("done" if result.ok else "failed", worker_id, result.slide, result.error,
+                          (result.path, result.seconds) if result.path else None))
+
+    def retry(slide_index, attempt, error, delay):
+        result_queue.put(("retry", worker_id, slide_index, error, (attempt, delay)))
+
+    try:
+        with profiler.stage("backend_open"):
+            backend = backend_factory()
+            backend.profiler = profiler
+            if resources is not None:
+                backend.temp_dir = resources.temp_dir
+            backend.open(pptx_path)
+        result_queue.put(("backend", worker_id, None, None, backend.process_id()))
+        pipeline = SlideExportPipeline(backend, params, static_durations, stage_concurrency, slide_params=slide_params,
+                                       expected_durations=expected_durations, resources=resources)
+        pipeline.run({i: output_paths[i] for i in shard}, started, report, is_cancelled=cancel_event.is_set, on_retry=retry)
+        result_queue.put(("metrics", worker_id, None, None, pipeline.metrics.format_summary()))
+    except Exception as e:
+        result_queue.put(("error", worker_id, None, str(e), None))
+    finally:
+        if backend:
+            try:
+                with profiler.stage("backend_close"):
+                    if backend.shared_application:
+                        # 其他工作进程可能还在同一个应用程序中渲染，不能退出
+                        backend.close_presentation()
+                    else:
+                        backend.close()
+            except:
+                pass
+        if profile:
+            result_queue.put(("profile", worker_id, None, None, [tuple(record) for record in profiler.records]))
+        result_queue.put(("exit", worker_id, None, None, None))
+
+
+class SlideScheduler:
+    """把页码范围分片到多个工作进程并行导出
+
+    PowerPoint这样的单实例程序（后端的shared_application为True）由主进程先启动、全部工作进程结束后再退出，
+    各工作进程连接到同一个实例，不会在其他进程还在渲染时把它退出。
+    """
+
+    def __init__(self, backend_factory, workers=None):
+        # backend_factory 会被传到子进程中调用，必须可以被pickle
+        self.backend_factory = backend_factory
+        self.workers = workers or os.cpu_count() or 1
+        # Windows下只能使用spawn，这里统一使用以保证各平台行为一致
+        self.context = multiprocessing.get_context("spawn")
+
+    def run(self, pptx_path, output_paths, params, progress_callback=None, is_cancelled=None,
+            static_durations=None, fast_path_report=None, slide_callback=None, started_callback=None, profiler=None,
+            stage_concurrency=None, slide_params=None, expected_durations=None, governor=None):
+        """导出output_paths中的所有页，返回成功导出的页码列表
+
+        static_durations 为 {页码: 秒数}，这些页走静态页快速通道；fast_path_report 用于记录各页的导出通道；
+        每页开始时调用 started_callback(页码, 进程编号)，结束时调用 slide_callback(页码, 是否成功)，失败时另传 error=失败原因；
+        profiler 开启时合并各工作进程的阶段计时；stage_concurrency 为各进程中流水线各阶段的并发数；slide_params 为单独设置渲染参数的页；
+        expected_durations 为 {页码: 秒数}，校验视频时用于发现被截断的页；
+        governor 为resource_governor.ResourceGovernor时，各进程共用其渲染名额和临时目录，等待结果时按工作进程和渲染进程的内存调整并发。
+        """
+        profile = profiler is not None and profiler.enabled
+        is_cancelled = is_cancelled or (lambda: False)
+        slides = sorted(output_paths)
+        total = len(slides)
+        shards = shard_slide_range(slides, self.workers)
+
+        # 单实例的应用程序由主进程持有，所有工作进程结束后才退出
+        owner = self.backend_factory()
+        if owner.shared_application:
+            owner.start()
+        else:
+            owner = None
+        try:
+            result_queue = self.context.Queue()
+            cancel_event = self.context.Event()
+            processes = []
+            for worker_id, shard in enumerate(shards):
+                process = self.context.Process(
+                    target=_worker_main,
+                    args=(worker_id, self.backend_factory, pptx_path, shard, output_paths, params, result_queue, cancel_event,
+                          static_durations, profile, stage_concurrency, slide_params, expected_durations,
+                          governor.gate if governor else None))
+                process.daemon = True
+                process.start()
+                processes.append(process)
+
+            if progress_callback:
+                progress_callback(f"已启动{len(processes)}个工作进程，共{total}页幻灯片")
+
+            exported = []
+            finished_count = 0
+            running = len(processes)
+            # 工作进程和其中的渲染进程（PowerPoint）的pid
+            backend_pids = {}
+            while running > 0:
+                if is_cancelled():
+                    cancel_event.set()
+                if governor is not None:
+                    governor.poll([p.pid for p in processes if p.is_alive()] + list(backend_pids.values()))
+                try:
+                    kind, worker_id, slide_index, error, detail = result_queue.get(timeout=0.5)
+                except queue.Empty:
+                    # 工作进程异常退出时不会发送exit消息
+                    if not any(p.is_alive() for p in processes) and result_queue.empty():
+                        break
+                    continue
+
+                if kind == "exit":
+                    running -= 1
+                    backend_pids.pop(worker_id, None)
+                elif kind == "backend":
+                    backend_pids[worker_id] = detail
+                elif kind == "profile":
+                    profiler.extend(detail)
+                elif kind == "metrics":
+                    if progress_callback:
+                        progress_callback(f"进程{worker_id}流水线统计:\n{detail}")
+                elif kind == "error":
+                    if progress_callback:
+                        progress_callback(f"工作进程{worker_id}启动失败: {error}")
+                elif kind == "started":
+                    if started_callback:
+                        started_callback(slide_index, worker_id)
+                    if progress_callback:
+                        progress_callback(f"进程{worker_id}正在导出第{slide_index}页为视频... ({finished_count}/{total})")
+                elif kind == "done":
+                    exported.append(slide_index)
+                    if fast_path_report is not None and detail:
+                        fast_path_report.record(slide_index, *detail)
+                    if slide_callback:
+                        slide_callback(slide_index, True)
+                    finished_count += 1
+                    if progress_callback:
+                        progress_callback(f"第{slide_index}页导出完成 ({finished_count}/{total})")
+                elif kind == "retry":
+                    if progress_callback:
+                        progress_callback(retry_message(slide_index, detail[0], error, detail[1]))
+                elif kind == "failed":
+                    finished_count += 1
+                    if slide_callback:
+                        slide_callback(slide_index, False, error=error)
+                    if progress_callback:
+                        suffix = f": {error}" if error else ""
+                        progress_callback(f"第{slide_index}页导出失败{suffix} ({finished_count}/{total})")
+
+            for process in processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+            return sorted(exported)
+        finally:
+            if owner is not None:
+                owner.close()
@@ -0,0 +1,159 @@
+# -*- coding: UTF-8 -*-
+
+import zlib
+import struct
+import zipfile
+
+
+# 复制成员时每次读写的字节数，大的媒体文件不会整个读入内存
+COPY_CHUNK_SIZE = 1024 * 1024
+# 改写后的部件重新压缩时使用的压缩级别（与zipfile默认相同）
+DEFLATE_LEVEL = zlib.Z_DEFAULT_COMPRESSION
+# 不写ZIP64扩展时大小、偏移和成员数的上限
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_MAX_MEMBERS = 0xFFFF
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+_CENTRAL_SIGNATURE = b"PK\x01\x02"
+_END_SIGNATURE = b"PK\x05\x06"
+# 通用标志位：数据描述符（大小写在数据之后）和UTF-8文件名
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_VERSION = 20
+
+
+class ZipLimitError(Exception):
+    """需要ZIP64（成员或文件超过4GB、成员超过65535个），调用方应改用zipfile写出"""
+
+
+def member_data_offset(f, info):
+    """成员压缩数据在压缩包文件中的偏移：本地文件头30字节，之后是文件名和扩展字段（长度可能与中央目录不同）"""
+    f.seek(info.header_offset)
+    header = f.read(30)
+    if len(header) < 30 or header[:4] != _LOCAL_SIGNATURE:
+        raise zipfile.BadZipFile(f"成员{info.filename}的本地文件头无效")
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((max(year, 1980) - 1980) << 9) | (month << 5) | day
+
+
+class WriteStats:
+    """写出压缩包的IO统计：原样复制和重新压缩的成员数与字节数"""
+
+    def __init__(self):
+        self.copied_members = 0
+        # 原样复制的压缩数据字节数（读写各一次，不解压也不重新压缩）
+        self.copied_bytes = 0
+        self.compressed_members = 0
+        # 重新压缩的部件的原始字节数和压缩后字节数
+        self.compressed_input = 0
+        self.compressed_output = 0
+        self.written_bytes = 0
+
+    def add(self, other):
+        for name, value in other.__dict__.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class StreamingZipWriter:
+    """顺序写出zip文件：已压缩的成员直接复制压缩数据，改写过的部件才重新压缩
+
+    不写ZIP64扩展；超过限制时抛出ZipLimitError。
+    """
+
+    def __init__(self, path, stats=None):
+        self.path = path
+        self.stats = stats or WriteStats()
+        self.fp = open(path, "wb")
+        self.entries = []
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.fp.close()
+            self.closed = True
+
+    def _write_header(self, info, flag_bits, compress_type, crc, compress_size, file_size):
+        """写本地文件头，并记下中央目录需要的信息"""
+        try:
+            name = info.filename.encode("ascii")
+            flag_bits &= ~_FLAG_UTF8
+        except UnicodeEncodeError:
+            name = info.filename.encode("utf-8")
+            flag_bits |= _FLAG_UTF8
+        # 大小已知，写在本地文件头中，不再使用数据描述符
+        flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+        offset = self.fp.tell()
+        if max(offset, compress_size, file_size) >= ZIP32_LIMIT or len(self.entries) >= ZIP32_MAX_MEMBERS:
+            raise ZipLimitError(f"{self.path}需要ZIP64")
+        dos_time, dos_date = _dos_time(info.date_time)
+        self.fp.write(_LOCAL_HEADER.pack(_LOCAL_SIGNATURE, _VERSION, 0, flag_bits, compress_type, dos_time, dos_date,
+                                         crc, compress_size, file_size, len(name), 0))
+        self.fp.write(name)
+        self.entries.append((name, flag_bits, compress_type, dos_time, dos_date, crc, compress_size, file_size,
+                             info.external_attr, offset))
+
+    def copy_member(self, source, info):
+        """把source（已打开的源压缩包文件）中的成员原样复制过来，不解压"""
+        self._write_header(info, info.flag_bits, info.compress_type, info.CRC, info.compress_size, info.file_size)
+        source.seek(member_data_offset(source, info))
+        remaining = info.compress_size
+        while remaining > 0:
+            chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"成员{info.filename}的数据不完整")
+            self.fp.write(chunk)
+            remaining -= len(chunk)
+        self.stats.copied_members += 1
+        self.stats.copied_bytes += info.compress_size
+
+    def write_member(self, info, data, compress_type=zipfile.ZIP_DEFLATED):
+        """写入新内容，沿用info的文件名和时间；compress_type只支持存储和deflate"""
+        if compress_type == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+        else:
+            compress_type = zipfile.ZIP_STORED
+            payload = data
+        self._write_header(info, info.flag_bits, compress_type, zlib.crc32(data), len(payload), len(data))
+        self.fp.write(payload)
+        self.stats.compressed_members += 1
+        self.stats.compressed_input += len(data)
+        self.stats.compressed_output += len(payload)
+
+    def close(self):
+        """写中央目录和结尾记录"""
+        if self.closed:
+            return
+        try:
+            directory_offset = self.fp.tell()
+            for name, flag_bits, compress_type, dos_time, dos_date, crc, compress_size, file_size, external_attr, offset \
+                    in self.entries:
+                self.fp.write(_CENTRAL_HEADER.pack(_CENTRAL_SIGNATURE, _VERSION, 0, _VERSION, 0, flag_bits, compress_type,
+                                                   dos_time, dos_date, crc, compress_size, file_size, len(name), 0, 0, 0, 0,
+                                                   external_attr, offset))
+                self.fp.write(name)
+            directory_size = self.fp.tell() - directory_offset
+            if directory_offset + directory_size >= ZIP32_LIMIT:
+                raise ZipLimitError(f"{self.path}需要ZIP64")
+            self.fp.write(_END_RECORD.pack(_END_SIGNATURE, 0, 0, len(self.entries), len(self.entries), directory_size,
+                                           directory_offset, 0))
+            self.stats.written_bytes += self.fp.tell()
+        finally:
+            self.fp.close()
+            self.closed = True